@@ -1,6 +1,12 @@
+import re
 from typing import Generator
 from ollama import Client, Message
 
+# 每条消息在对话模板中的额外开销（角色标记、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 中日韩文字和全角符号，按一个字符一个 token 估算
+CJK_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
 
 class ChatInput:
     messages: list
@@ -22,15 +28,47 @@ class ChatOutput:
         self.response = response
 
 
+def estimate_tokens(text: str) -> int:
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(messages: list) -> int:
+    return sum(estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def fit_to_budget(messages: list, max_tokens: int) -> list:
+    # 保留系统消息和最后一条消息，从最早的对话开始丢弃，直到不超过预算
+    system = [message for message in messages if message.get("role") == "system"]
+    dialog = [message for message in messages if message.get("role") != "system"]
+    if not dialog:
+        return []
+
+    latest = dialog.pop()
+    used = count_message_tokens(system) + count_message_tokens([latest])
+    kept = []
+    for message in reversed(dialog):
+        tokens = count_message_tokens([message])
+        if used + tokens > max_tokens:
+            break
+        kept.append(message)
+        used += tokens
+
+    if used > max_tokens:
+        return []
+    return system + kept[::-1] + [latest]
+
+
 def chat_llm(input: ChatInput) -> ChatOutput:
-    if len(input.messages) == 0 or len(input.messages) > input.max_tokens:
+    messages = fit_to_budget(input.messages, input.max_tokens)
+    if len(messages) == 0:
         return ChatOutput(success=False, response=Message(role="assistant", content=""))
 
     client = Client(host="http://localhost:11434", headers={"Content-Type": "application/json"})
 
     response = client.chat(
         model=f"{input.model}",
-        messages=input.messages,
+        messages=messages,
         stream=False,
     )
 
@@ -38,14 +76,16 @@ def chat_llm(input: ChatInput) -> ChatOutput:
 
 
 def chat_llm_stream(input: ChatInput) -> Generator:
-    if len(input.messages) == 0 or len(input.messages) > input.max_tokens:
-        return ChatOutput(success=False, response=Message(role="assistant", content=""))
+    messages = fit_to_budget(input.messages, input.max_tokens)
+    if len(messages) == 0:
+        # 调用方会迭代返回值，超出预算时返回空的流而不是 ChatOutput
+        return iter(())
 
     client = Client(host="http://localhost:11434", headers={"Content-Type": "application/json"})
 
     response = client.chat(
         model=f"{input.model}",
-        messages=input.messages,
+        messages=messages,
         stream=True,
     )
 
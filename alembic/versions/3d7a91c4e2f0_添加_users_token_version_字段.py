@@ -0,0 +1,26 @@
+"""添加 users.token_version 字段
+
+Revision ID: 3d7a91c4e2f0
+Revises: 8e4f2b6c9a17
+Create Date: 2025-03-18 10:12:45.218306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d7a91c4e2f0'
+down_revision: Union[str, None] = '8e4f2b6c9a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
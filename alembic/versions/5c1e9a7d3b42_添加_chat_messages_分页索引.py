@@ -0,0 +1,32 @@
+"""添加 chat_messages 分页索引
+
+Revision ID: 5c1e9a7d3b42
+Revises: 2610ae5f743d
+Create Date: 2025-03-08 10:12:45.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7d3b42'
+down_revision: Union[str, None] = '2610ae5f743d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 支持按 (created_at, id) 倒序的游标分页，按用户过滤后直接按索引顺序读取
+    op.create_index(
+        'ix_chat_messages_user_created_id',
+        'chat_messages',
+        ['user_id', sa.text('created_at DESC'), 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_messages_user_created_id', table_name='chat_messages')
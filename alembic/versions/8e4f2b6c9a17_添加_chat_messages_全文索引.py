@@ -0,0 +1,48 @@
+"""添加 chat_messages 全文索引
+
+Revision ID: 8e4f2b6c9a17
+Revises: 5c1e9a7d3b42
+Create Date: 2025-03-10 16:40:12.502871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.services.chat_search import (
+    POSTGRES_DDL,
+    POSTGRES_TABLE,
+    SQLITE_DDL,
+    SQLITE_TABLE,
+    rebuild_index,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f2b6c9a17'
+down_revision: Union[str, None] = '5c1e9a7d3b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute(SQLITE_DDL)
+    elif bind.dialect.name == 'postgresql':
+        for statement in POSTGRES_DDL:
+            op.execute(statement)
+    else:
+        return
+
+    # 为已有的聊天记录回填索引，之后由 ORM 事件增量维护
+    rebuild_index(bind)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute(f'DROP TABLE IF EXISTS {SQLITE_TABLE}')
+    elif bind.dialect.name == 'postgresql':
+        op.execute(f'DROP TABLE IF EXISTS {POSTGRES_TABLE}')
@@ -0,0 +1,30 @@
+"""添加 revoked_tokens.reason 字段
+
+Revision ID: c7d3f1a8e264
+Revises: 9a4c6e1d2b85
+Create Date: 2025-03-28 10:12:47.615230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d3f1a8e264'
+down_revision: Union[str, None] = '9a4c6e1d2b85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 已有记录无法区分原因，按普通吊销处理，重复使用时不会让用户的其他会话失效
+    op.add_column(
+        'revoked_tokens',
+        sa.Column('reason', sa.String(length=16), nullable=False, server_default='revoked')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('revoked_tokens', 'reason')
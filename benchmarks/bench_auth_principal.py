@@ -0,0 +1,108 @@
+"""认证主体缓存基准测试
+
+在一个只依赖 get_current_user 的空接口上，对比关闭和开启主体缓存时的：
+
+- 每秒请求数（requests/s）
+- 每个请求的 SQL 语句数
+
+数据库使用独立的 SQLite 文件（模拟真实的磁盘 I/O），请求通过 ASGITransport 直接调用应用，
+并发 --concurrency 个客户端协程持续发送请求。
+
+用法:
+    python benchmarks/bench_auth_principal.py --requests 5000 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("SECRET_KEY", "bench_secret_key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+
+async def _bench(mode: str, requests: int, concurrency: int) -> None:
+    from fastapi import Depends, FastAPI
+    from httpx import ASGITransport, AsyncClient
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from src.auth.jwt import create_access_token, get_current_user
+    from src.auth.principal_cache import principal_cache, token_claims
+    from src.database import Base, get_db
+    from src.models.user import User
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    statements = 0
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(*args):
+        nonlocal statements
+        statements += 1
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        user = User(id=str(uuid.uuid4()), username="bench", hashed_password="x", is_active=True)
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+        token, _ = create_access_token(token_claims(user))
+
+    async def get_bench_db():
+        async with session_maker() as session:
+            yield session
+            await session.commit()
+
+    app = FastAPI()
+    app.dependency_overrides[get_db] = get_bench_db
+
+    @app.get("/noop")
+    async def noop(current_user: User = Depends(get_current_user)):
+        return {"id": current_user.id}
+
+    principal_cache.clear()
+    principal_cache.ttl = 0 if mode == "no_cache" else 30
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get("/noop", headers=headers)  # 预热
+        statements = 0
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get("/noop", headers=headers)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    print(f"{mode:<12}{requests / elapsed:>14.0f}{statements / requests:>16.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="认证主体缓存基准测试")
+    parser.add_argument("--requests", type=int, default=5000, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发客户端数")
+    args = parser.parse_args()
+
+    print(f"{'模式':<12}{'requests/s':>14}{'SQL/请求':>16}")
+    for mode in ("no_cache", "cache"):
+        asyncio.run(_bench(mode, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""进程内缓存（L1）基准测试
+
+对比旧的两个内存缓存实现与新的 L1（cache_service.LRUCache），统计：
+
+- 读写吞吐（ops/s）：50% get、50% set，set 带 TTL
+- 进程峰值内存（peak RSS）
+
+旧实现按原来的逻辑重写在本文件中：
+- cache_manager：CacheManager 的内存降级缓存，每次 get 都扫描全部过期时间
+- cache_service：旧 CacheService 的内存缓存，每次 set 都 json.dumps 整个缓存检查内存
+
+旧实现每次操作都是 O(n)，大规模下每种实现只运行固定时长并按完成的操作数计算吞吐。
+每种实现、每个规模都在独立的子进程中运行，峰值内存互不影响。
+
+用法:
+    python benchmarks/bench_cache_l1.py --sizes 10000 100000 1000000 --seconds 2
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+VALUE = {"id": "00000000-0000-0000-0000-000000000000", "title": "番茄炒蛋", "views_count": 12}
+
+
+class LegacyCacheManager:
+    """旧实现：CacheManager 的内存缓存，get 前清理全部过期条目"""
+
+    def __init__(self):
+        self.memory_cache = {}
+        self.memory_cache_expiry = {}
+
+    def fill(self, key, value, ttl):
+        self.memory_cache[key] = value
+        self.memory_cache_expiry[key] = datetime.now() + timedelta(seconds=ttl)
+
+    def _cleanup_expired_memory_cache(self):
+        now = datetime.now()
+        expired_keys = [k for k, v in self.memory_cache_expiry.items() if now > v]
+        for k in expired_keys:
+            del self.memory_cache[k]
+            del self.memory_cache_expiry[k]
+
+    def get(self, key):
+        self._cleanup_expired_memory_cache()
+        return self.memory_cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.memory_cache[key] = value
+        self.memory_cache_expiry[key] = datetime.now() + timedelta(seconds=ttl)
+
+
+class LegacyCacheService:
+    """旧实现：CacheService 的内存缓存，set 前序列化整个缓存检查内存"""
+
+    def __init__(self, max_memory_mb=100):
+        self.cache = {}
+        self.max_memory = max_memory_mb * 1024 * 1024
+
+    def fill(self, key, value, ttl):
+        self.cache[key] = {"data": value, "expiry": datetime.now() + timedelta(seconds=ttl)}
+
+    def _check_memory_usage(self):
+        # 旧代码直接 json.dumps 会因 datetime 失败，这里补上 default=str 以便对比
+        return sys.getsizeof(json.dumps(self.cache, default=str)) <= self.max_memory
+
+    def _evict_expired(self):
+        now = datetime.now()
+        for key, value in list(self.cache.items()):
+            if value["expiry"] and now > value["expiry"]:
+                del self.cache[key]
+
+    def get(self, key):
+        cached = self.cache.get(key)
+        if not cached:
+            return None
+        if cached["expiry"] and datetime.now() > cached["expiry"]:
+            del self.cache[key]
+            return None
+        return cached["data"]
+
+    def set(self, key, value, ttl):
+        if not self._check_memory_usage():
+            self._evict_expired()
+            if not self._check_memory_usage():
+                return False
+        self.cache[key] = {"data": value, "expiry": datetime.now() + timedelta(seconds=ttl)}
+        return True
+
+
+class CurrentL1:
+    """新实现：按字节预算淘汰、时间轮过期的 LRU"""
+
+    def __init__(self, size):
+        from src.services.cache_service import LRUCache
+
+        self.cache = LRUCache(max_items=size * 2, max_bytes=1 << 40)
+
+    def fill(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        return self.cache.set(key, value, ttl)
+
+
+IMPLEMENTATIONS = {
+    "cache_manager": lambda size: LegacyCacheManager(),
+    "cache_service": lambda size: LegacyCacheService(),
+    "l1": CurrentL1,
+}
+
+
+def _run(mode: str, size: int, seconds: float, queue) -> None:
+    """在子进程中运行一种实现并回报结果"""
+    rng = random.Random(0)
+    cache = IMPLEMENTATIONS[mode](size)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # 预填充不计时，直接写入内部结构，避免旧实现的 O(n²) 填充
+    for i in range(size):
+        cache.fill(f"recipe:{i}", dict(VALUE, views_count=i), rng.randint(60, 600))
+    filled_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    ops = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(16):
+            key = f"recipe:{rng.randrange(size)}"
+            if ops & 1:
+                cache.set(key, VALUE, 300)
+            else:
+                cache.get(key)
+            ops += 1
+    elapsed = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((mode, size, ops / elapsed, baseline_rss, filled_rss, peak_rss))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="进程内缓存基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="缓存条目数")
+    parser.add_argument("--seconds", type=float, default=2.0, help="每种实现的运行时长（秒）")
+    parser.add_argument("--modes", nargs="+", default=list(IMPLEMENTATIONS), choices=list(IMPLEMENTATIONS))
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+
+    print(f"{'实现':<16}{'条目数':>10}{'ops/s':>14}{'填充后RSS MB':>16}{'峰值RSS MB':>14}")
+    for size in args.sizes:
+        for mode in args.modes:
+            process = ctx.Process(target=_run, args=(mode, size, args.seconds, queue))
+            process.start()
+            _, _, throughput, baseline_rss, filled_rss, peak_rss = queue.get()
+            process.join()
+            # Linux 上 ru_maxrss 的单位是 KB
+            print(f"{mode:<16}{size:>10}{throughput:>14.0f}"
+                  f"{(filled_rss - baseline_rss) / 1024:>16.1f}{peak_rss / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
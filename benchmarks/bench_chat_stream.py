@@ -0,0 +1,145 @@
+"""流式聊天基准测试
+
+启动一个本地的假 Gradio/Ollama 服务（独立进程），模拟 /chat_stream 接口逐 token
+返回累积文本，然后通过 AIServiceClient.chat_stream 并发发起多个流式请求，统计：
+
+- 首 token 延迟（TTFT）
+- 每个流消耗的客户端 CPU 时间
+- 整体耗时
+
+用法:
+    python benchmarks/bench_chat_stream.py --streams 200 --tokens 100 --interval 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _free_port() -> int:
+    """获取一个可用的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _run_fake_server(port: int, tokens: int, interval: float) -> None:
+    """运行假 Gradio 服务
+
+    POST /gradio_api/call/chat_stream 返回 event_id，
+    GET /gradio_api/call/chat_stream/{event_id} 以 SSE 逐个返回累积文本。
+    """
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    async def submit(request):
+        await request.json()
+        return JSONResponse({"event_id": uuid.uuid4().hex})
+
+    async def events(request):
+        async def generate():
+            text = ""
+            for i in range(tokens):
+                await asyncio.sleep(interval)
+                text += f"词{i} "
+                yield f"event: generating\ndata: {json.dumps([text], ensure_ascii=False)}\n\n"
+            yield f"event: complete\ndata: {json.dumps([text], ensure_ascii=False)}\n\n"
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    app = Starlette(routes=[
+        Route("/gradio_api/call/chat_stream", submit, methods=["POST"]),
+        Route("/gradio_api/call/chat_stream/{event_id}", events, methods=["GET"]),
+    ])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def _wait_for_server(port: int, timeout: float = 10.0) -> None:
+    """等待假服务启动"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("假 Gradio 服务启动超时")
+
+
+async def _run_benchmark(port: int, streams: int, same_input: bool) -> None:
+    os.environ["CHAT_SERVICE_URL"] = f"http://127.0.0.1:{port}"
+    from src.services.ai_service_client import AIServiceClient
+
+    client = AIServiceClient()
+
+    async def one_stream(i: int = 0):
+        # 默认每个流的输入不同；相同输入的并发流会被合并为一次后端请求
+        content = "你好" if same_input else f"你好 {i}"
+        messages = [{"role": "user", "content": content}]
+        start = time.perf_counter()
+        first_token = None
+        chunks = 0
+        async for _ in client.chat_stream(messages=messages):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            chunks += 1
+        return first_token, time.perf_counter() - start, chunks
+
+    await _wait_for_server(port)
+    # 预热连接
+    await one_stream()
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    results = await asyncio.gather(*(one_stream(i) for i in range(streams)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    await client.close()
+
+    ttft = sorted(r[0] for r in results if r[0] is not None)
+    chunks = sum(r[2] for r in results)
+    print(f"并发流数:          {streams}{'（相同输入）' if same_input else ''}")
+    print(f"总耗时:            {wall:.3f}s")
+    print(f"客户端CPU总计:     {cpu:.3f}s")
+    print(f"每个流CPU:         {cpu / streams * 1000:.2f}ms")
+    print(f"每个chunk CPU:     {cpu / max(chunks, 1) * 1e6:.1f}us")
+    print(f"TTFT p50:          {statistics.median(ttft) * 1000:.1f}ms")
+    print(f"TTFT p95:          {ttft[int(len(ttft) * 0.95) - 1] * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式聊天基准测试")
+    parser.add_argument("--streams", type=int, default=100, help="并发流数量")
+    parser.add_argument("--tokens", type=int, default=100, help="每个流的token数量")
+    parser.add_argument("--interval", type=float, default=0.02, help="token间隔（秒）")
+    parser.add_argument("--same-input", action="store_true", help="所有流使用相同输入（测试请求合并）")
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = multiprocessing.Process(
+        target=_run_fake_server,
+        args=(port, args.tokens, args.interval),
+        daemon=True,
+    )
+    server.start()
+    try:
+        asyncio.run(_run_benchmark(port, args.streams, args.same_input))
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
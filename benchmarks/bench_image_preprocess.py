@@ -0,0 +1,124 @@
+"""图片预处理基准测试
+
+对比旧实现（完整解码 + resize(LANCZOS) + JPEG 重新编码）与新的预处理流程
+（JPEG draft() 缩小解码、EXIF 感知、小图跳过重新编码），统计：
+
+- 每张图片的处理耗时（ms/image）
+- 进程峰值内存（peak RSS）
+
+每种实现都在独立的子进程中运行，峰值内存互不影响。输入包括仓库中的示例图片
+（test_food.png、ai_backend/*.png），以及生成的手机照片尺寸的 JPEG（带 EXIF 方向）。
+
+用法:
+    python benchmarks/bench_image_preprocess.py --rounds 5
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+SAMPLE_FILES = ["test_food.png", "ai_backend/meal.png", "ai_backend/food.png", "ai_backend/res.png"]
+
+
+def _legacy_preprocess(data: bytes) -> bytes:
+    """旧实现：在事件循环中完整解码后缩放并重新编码"""
+    from PIL import Image
+
+    if len(data) <= 1024 * 1024:
+        return data
+    image = Image.open(io.BytesIO(data))
+    max_size = 800
+    ratio = min(max_size / image.width, max_size / image.height)
+    new_size = (int(image.width * ratio), int(image.height * ratio))
+    image = image.resize(new_size, Image.Resampling.LANCZOS)
+    if image.mode not in ("RGB", "L"):
+        # 旧实现遇到带透明通道的 PNG 会保存失败，这里补上转换以便对比
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=75)
+    return output.getvalue()
+
+
+def _phone_photo(width: int, height: int, orientation: int) -> bytes:
+    """生成一张带 EXIF 方向信息的高质量 JPEG"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(noise).resize((width, height), Image.Resampling.BILINEAR)
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=95, exif=exif)
+    return output.getvalue()
+
+
+def _load_inputs():
+    inputs = []
+    for name in SAMPLE_FILES:
+        path = os.path.join(ROOT, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                inputs.append((name, f.read()))
+    inputs.append(("photo_4032x3024_rot6.jpg", _phone_photo(4032, 3024, 6)))
+    inputs.append(("photo_3000x2000.jpg", _phone_photo(3000, 2000, 1)))
+    return inputs
+
+
+def _run(mode: str, rounds: int, inputs, queue) -> None:
+    """在子进程中运行一种实现并回报结果"""
+    from src.services.image_preprocessor import preprocess_image
+
+    func = _legacy_preprocess if mode == "legacy" else preprocess_image
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    results = []
+    for name, data in inputs:
+        func(data)  # 预热
+        start = time.perf_counter()
+        for _ in range(rounds):
+            output = func(data)
+        elapsed = (time.perf_counter() - start) / rounds
+        results.append((name, len(data), len(output), elapsed * 1000))
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((mode, results, baseline_rss, peak_rss))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="图片预处理基准测试")
+    parser.add_argument("--rounds", type=int, default=5, help="每张图片的重复次数")
+    args = parser.parse_args()
+
+    inputs = _load_inputs()
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    reports = {}
+    for mode in ("legacy", "preprocessor"):
+        process = ctx.Process(target=_run, args=(mode, args.rounds, inputs, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        reports[result[0]] = result[1:]
+
+    print(f"{'图片':<28}{'输入KB':>10}{'旧实现ms':>12}{'新实现ms':>12}{'旧输出KB':>12}{'新输出KB':>12}")
+    legacy, current = reports["legacy"][0], reports["preprocessor"][0]
+    for (name, size, legacy_out, legacy_ms), (_, _, new_out, new_ms) in zip(legacy, current):
+        print(f"{name:<28}{size / 1024:>10.0f}{legacy_ms:>12.1f}{new_ms:>12.1f}"
+              f"{legacy_out / 1024:>12.0f}{new_out / 1024:>12.0f}")
+
+    for mode, (_, baseline_rss, peak_rss) in reports.items():
+        # Linux 上 ru_maxrss 的单位是 KB
+        print(f"{mode:<14} 峰值RSS: {peak_rss / 1024:.1f}MB（处理前 {baseline_rss / 1024:.1f}MB）")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,10 @@ setup(
         "pytest",
         "pytest-asyncio",
         "httpx",
-        "slowapi"
+        "redis",
+        "numpy",
+        "scipy",
+        "av"
     ],
     python_requires=">=3.8",
 ) 
\ No newline at end of file
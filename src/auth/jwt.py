@@ -4,15 +4,16 @@
 """
 
 from datetime import datetime, timedelta
+import uuid
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from ..database import get_db
 from ..models.user import User
 from ..config.settings import settings
+from .principal_cache import resolve_user
 import logging
 
 # OAuth2密码承载令牌URL
@@ -31,6 +32,7 @@ def create_access_token(data: dict) -> tuple[str, int]:
         tuple[str, int]: 包含JWT访问令牌和过期时间（秒）的元组
     """
     to_encode = data.copy()
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     # 设置令牌过期时间
     expire = datetime.now() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
@@ -70,25 +72,11 @@ async def get_current_user(
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
         
-    # 从数据库获取用户
-    stmt = select(User).where(User.id == user_id)
-    result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
-    
-    if user is None:
-        raise credentials_exception
-    if not user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="用户已被禁用"
-        )
-    return user
+    # 同一个令牌的后续请求从主体缓存获取用户，不再查询数据库
+    return await resolve_user(payload, db, credentials_exception)
 
 async def optional_current_user(
     token: Optional[str] = Depends(OAuth2PasswordBearer(
@@ -118,19 +106,11 @@ async def optional_current_user(
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-            
-        # 从数据库获取用户
-        stmt = select(User).where(User.id == user_id)
-        result = await db.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if user is None or not user.is_active:
-            return None
-            
-        return user
+        return await resolve_user(
+            payload,
+            db,
+            HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        )
         
-    except JWTError:
+    except (JWTError, HTTPException):
         return None 
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+认证主体缓存模块
+
+get_current_user 原来每个请求都解码 JWT 后再查询一次 users 表。令牌中现在带有
+jti、token_version 和 active 声明，这里按 (user_id, jti) 在进程内缓存用户行的快照：
+- 命中时把快照直接挂到当前会话（merge(load=False)），不发 SELECT，路由仍然可以修改和删除用户
+- 令牌的 token_version 低于用户当前版本时视为已撤销（修改密码后旧令牌失效）
+- 修改密码、删除用户、停用用户时调用 invalidate；其他进程中的副本最多保留 TTL 秒
+"""
+
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from ..models.user import User
+from .revocation import revocation_list
+
+logger = logging.getLogger(__name__)
+
+# 快照保留时间（秒），为 0 时不缓存
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+# 最多缓存的令牌数
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+# 快照保存 users 表的全部列
+USER_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+
+def token_claims(user: User) -> Dict[str, Any]:
+    """生成写入访问令牌的用户声明
+
+    Args:
+        user: 用户对象
+
+    Returns:
+        Dict[str, Any]: sub、token_version、active 和新的 jti
+    """
+    return {
+        "sub": str(user.id),
+        "token_version": user.token_version or 0,
+        "active": bool(user.is_active),
+        "jti": uuid.uuid4().hex,
+    }
+
+
+class PrincipalCache:
+    """按 (user_id, jti) 缓存用户快照"""
+
+    def __init__(
+        self,
+        ttl: float = PRINCIPAL_CACHE_TTL,
+        max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES
+    ):
+        """初始化
+
+        Args:
+            ttl: 快照保留时间（秒），为 0 时不缓存
+            max_entries: 最多缓存的令牌数
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # 用户 -> 该用户已缓存的 jti，失效时不需要遍历全部条目
+        self._by_user: Dict[str, Set[str]] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, user_id: str, jti: str) -> Optional[Dict[str, Any]]:
+        """获取用户快照，不存在或已过期时返回 None"""
+        key = (user_id, jti)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        snapshot, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return snapshot
+
+    def put(self, user_id: str, jti: str, user: User) -> None:
+        """保存用户快照"""
+        if self.ttl <= 0:
+            return
+        key = (user_id, jti)
+        snapshot = {column: getattr(user, column) for column in USER_COLUMNS}
+        self._entries[key] = (snapshot, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        self._by_user.setdefault(user_id, set()).add(jti)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, user_id: str) -> None:
+        """删除某个用户所有令牌的快照"""
+        jtis = self._by_user.pop(str(user_id), None)
+        if not jtis:
+            return
+        for jti in jtis:
+            self._entries.pop((str(user_id), jti), None)
+        self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._by_user.clear()
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        jtis = self._by_user.get(key[0])
+        if jtis is not None:
+            jtis.discard(key[1])
+            if not jtis:
+                del self._by_user[key[0]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "users": len(self._by_user),
+            "ttl": self.ttl,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+# 创建缓存实例
+principal_cache = PrincipalCache()
+
+
+async def resolve_user(
+    payload: Dict[str, Any],
+    db: AsyncSession,
+    credentials_exception: HTTPException
+) -> User:
+    """根据已解码的令牌获取当前用户
+
+    Args:
+        payload: JWT 声明
+        db: 数据库会话
+        credentials_exception: 令牌无效时抛出的异常
+
+    Returns:
+        User: 挂在 db 上的用户对象
+
+    Raises:
+        HTTPException: 令牌无效、已撤销或用户已被禁用
+    """
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise credentials_exception
+    if payload.get("type") == "refresh":
+        # 刷新令牌只能用于 /auth/refresh
+        raise credentials_exception
+    if payload.get("active") is False:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="用户已被禁用"
+        )
+    token_version = payload.get("token_version", 0)
+    jti = payload.get("jti")
+    if jti and await revocation_list.is_revoked(jti, db):
+        raise credentials_exception
+
+    if jti:
+        snapshot = principal_cache.get(user_id, jti)
+        if snapshot is not None and snapshot["is_active"] and (snapshot["token_version"] or 0) == token_version:
+            user = User(**snapshot)
+            make_transient_to_detached(user)
+            return await db.merge(user, load=False)
+
+    user = await db.get(User, user_id)
+    if user is None:
+        raise credentials_exception
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="用户已被禁用"
+        )
+    if token_version < (user.token_version or 0):
+        # 修改密码等操作之前签发的令牌
+        raise credentials_exception
+
+    if jti:
+        principal_cache.put(user_id, jti, user)
+    return user
@@ -0,0 +1,308 @@
+"""
+令牌吊销列表模块
+
+登出、刷新令牌轮换、修改密码和删除账户时吊销令牌的 jti。吊销记录保存在 revoked_tokens 表中，
+但每个请求都查一次数据库会抵消无状态 JWT 的好处，所以热路径只查进程内的布隆过滤器：
+- 过滤器不包含 jti 时一定没有被吊销（绝大多数请求），O(1) 且不访问数据库
+- 过滤器命中时再用请求的数据库会话确认，误判率由过滤器大小控制
+- 本进程吊销的令牌立即加入过滤器；其他进程吊销的令牌在下一次同步后生效
+- 后台协程定期从数据库重建过滤器，并删除已经过期的吊销记录
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session
+from ..models.revoked_token import RevokedTokenModel
+
+logger = logging.getLogger(__name__)
+
+# 过滤器的初始容量（吊销记录数），实际记录更多时同步时自动扩容
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+# 过滤器的目标误判率
+REVOCATION_FILTER_FP_RATE = float(os.getenv("REVOCATION_FILTER_FP_RATE", "0.001"))
+# 从数据库同步的间隔（秒）
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "30"))
+
+# 吊销原因：只有轮换时被换掉的刷新令牌再次出现才说明令牌被盗用，
+# 登出后客户端再用同一个刷新令牌刷新是正常的竞争，不应该让其他会话失效
+REASON_REVOKED = "revoked"
+REASON_ROTATED = "rotated"
+
+_MASK64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    """布隆过滤器（k 个位置由两个 64 位哈希组合得到）"""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        """初始化
+
+        Args:
+            capacity: 预计元素数
+            fp_rate: 目标误判率
+        """
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.size = max(8, int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @staticmethod
+    def _hash(item: str) -> tuple:
+        # jti 是 uuid4 的十六进制字符串，本身就是随机数，直接拆成两个 64 位整数，不用再计算摘要
+        if len(item) == 32:
+            try:
+                return int(item[:16], 16), int(item[16:], 16) | 1
+            except ValueError:
+                pass
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, item: str) -> None:
+        """添加元素"""
+        h1, h2 = self._hash(item)
+        size = self.size
+        bits = self._bits
+        for i in range(self.hashes):
+            position = ((h1 + i * h2) & _MASK64) % size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        h1, h2 = self._hash(item)
+        size = self.size
+        bits = self._bits
+        for i in range(self.hashes):
+            position = ((h1 + i * h2) & _MASK64) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevocationList:
+    """令牌吊销列表"""
+
+    def __init__(
+        self,
+        capacity: int = REVOCATION_FILTER_CAPACITY,
+        fp_rate: float = REVOCATION_FILTER_FP_RATE,
+        sync_interval: float = REVOCATION_SYNC_SECONDS
+    ):
+        """初始化
+
+        Args:
+            capacity: 过滤器的初始容量
+            fp_rate: 目标误判率
+            sync_interval: 从数据库同步的间隔（秒）
+        """
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.sync_interval = sync_interval
+        self._filter = BloomFilter(capacity, fp_rate)
+        # 同步期间本进程新吊销的 jti，重建完成后补进新的过滤器
+        self._added_during_sync: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "checks": 0,
+            "filter_hits": 0,
+            "confirmed": 0,
+            "false_positives": 0,
+            "revoked": 0,
+            "syncs": 0,
+            "sync_errors": 0,
+            "purged": 0,
+            "last_sync_ms": 0.0,
+        }
+
+    async def is_revoked(self, jti: str, db: AsyncSession, exact: bool = False) -> bool:
+        """令牌是否已被吊销
+
+        Args:
+            jti: 令牌唯一标识
+            db: 当前请求的数据库会话（过滤器命中时用于确认）
+            exact: 跳过过滤器直接查询数据库，其他进程刚吊销的令牌也能立即发现（用于刷新令牌轮换）
+
+        Returns:
+            bool: 是否已被吊销
+        """
+        if exact:
+            return await db.get(RevokedTokenModel, jti) is not None
+        self.stats["checks"] += 1
+        if jti not in self._filter:
+            return False
+        self.stats["filter_hits"] += 1
+        if await db.get(RevokedTokenModel, jti) is not None:
+            self.stats["confirmed"] += 1
+            return True
+        self.stats["false_positives"] += 1
+        return False
+
+    async def revocation_reason(self, jti: str, db: AsyncSession) -> Optional[str]:
+        """查询令牌的吊销原因（直接查询数据库，用于刷新令牌轮换）
+
+        Args:
+            jti: 令牌唯一标识
+            db: 数据库会话
+
+        Returns:
+            Optional[str]: 吊销原因，没有被吊销时返回 None
+        """
+        record = await db.get(RevokedTokenModel, jti)
+        return record.reason if record is not None else None
+
+    def _remember(self, jti: str) -> None:
+        self._filter.add(jti)
+        if self._added_during_sync is not None:
+            self._added_during_sync.append(jti)
+
+    async def revoke(
+        self,
+        db: AsyncSession,
+        jti: str,
+        user_id: str,
+        expires_at: datetime,
+        token_type: str = "access",
+        reason: str = REASON_REVOKED
+    ) -> None:
+        """吊销令牌
+
+        记录随 db 的事务一起提交；过滤器立即更新，事务回滚时只会多一次数据库确认
+
+        Args:
+            db: 数据库会话
+            jti: 令牌唯一标识
+            user_id: 用户ID
+            expires_at: 令牌的过期时间
+            token_type: 令牌类型（access 或 refresh）
+            reason: 吊销原因
+        """
+        db.add(RevokedTokenModel(
+            jti=jti,
+            user_id=str(user_id),
+            token_type=token_type,
+            expires_at=expires_at,
+            revoked_at=datetime.now(),
+            reason=reason
+        ))
+        self._remember(jti)
+        self.stats["revoked"] += 1
+
+    async def revoke_claims(
+        self,
+        db: AsyncSession,
+        claims: Dict[str, Any],
+        reason: str = REASON_REVOKED
+    ) -> None:
+        """按已解码的令牌声明吊销令牌（没有 jti 的旧令牌忽略）
+
+        Args:
+            db: 数据库会话
+            claims: JWT 声明
+            reason: 吊销原因
+        """
+        jti = claims.get("jti")
+        if not jti or await self.is_revoked(jti, db, exact=True):
+            return
+        await self.revoke(
+            db,
+            jti,
+            claims["sub"],
+            # exp 由不带时区的本地时间编码而来，按 UTC 还原得到签发时的同一个值
+            datetime.utcfromtimestamp(claims["exp"]),
+            claims.get("type", "access"),
+            reason
+        )
+
+    async def sync(self) -> None:
+        """从数据库重建过滤器，并删除已经过期的吊销记录"""
+        started = time.perf_counter()
+        self._added_during_sync = []
+        try:
+            now = datetime.now()
+            async with async_session() as session:
+                result = await session.execute(
+                    delete(RevokedTokenModel).where(RevokedTokenModel.expires_at <= now)
+                )
+                self.stats["purged"] += result.rowcount or 0
+                await session.commit()
+                jtis = (await session.execute(
+                    select(RevokedTokenModel.jti).where(RevokedTokenModel.expires_at > now)
+                )).scalars().all()
+
+            # 记录数超过容量的一半时扩容，保持误判率
+            capacity = max(self.capacity, len(jtis) * 2)
+            rebuilt = BloomFilter(capacity, self.fp_rate)
+            for jti in jtis:
+                rebuilt.add(jti)
+            for jti in self._added_during_sync:
+                rebuilt.add(jti)
+            self._filter = rebuilt
+            self.stats["syncs"] += 1
+            self.stats["last_sync_ms"] = (time.perf_counter() - started) * 1000
+        finally:
+            self._added_during_sync = None
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["sync_errors"] += 1
+                logger.error(f"同步令牌吊销列表失败: {str(e)}")
+
+    async def start(self) -> None:
+        """加载吊销记录并启动定期同步"""
+        try:
+            await self.sync()
+        except Exception as e:
+            self.stats["sync_errors"] += 1
+            logger.error(f"加载令牌吊销列表失败: {str(e)}")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sync_loop(), name="revocation-sync")
+        logger.info(f"令牌吊销列表已启动，同步间隔: {self.sync_interval:.0f}秒")
+
+    async def stop(self) -> None:
+        """停止定期同步"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息
+
+        Returns:
+            Dict[str, Any]: 包含过滤器大小、命中和误判次数等指标
+        """
+        hits = self.stats["filter_hits"]
+        return {
+            **self.stats,
+            "last_sync_ms": round(self.stats["last_sync_ms"], 2),
+            "filter": {
+                "entries": self._filter.count,
+                "capacity": self._filter.capacity,
+                "bits": self._filter.size,
+                "hashes": self._filter.hashes,
+                "bytes": len(self._filter._bits),
+            },
+            "false_positive_rate": round(self.stats["false_positives"] / hits, 4) if hits else 0.0,
+        }
+
+
+# 创建服务实例
+revocation_list = RevocationList()
@@ -1,19 +1,13 @@
 """速率限制配置模块"""
 
 import os
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
-# 根据环境变量确定是否处于测试模式
-is_test_mode = os.getenv("RATE_LIMIT_TEST_MODE", "false").lower() == "true"
-test_max_requests = int(os.getenv("RATE_LIMIT_TEST_MAX_REQUESTS", "1000"))
+from ..services.cache_service import cache_service
+from ..services.rate_limiter import RateLimiter, get_remote_address
 
-# 根据测试模式设置不同的限制
-default_limits = [f"{test_max_requests} per minute"] if is_test_mode else ["60 per minute"]
-
-# 创建限速器实例
-limiter = Limiter(
+# 创建限速器实例，限流状态保存在 Redis 中，多个 worker 共享；未配置 Redis 时使用进程内状态
+limiter = RateLimiter(
+    cache_service.namespace("rate_limit", ttl=None, l1=False),
     key_func=get_remote_address,
-    default_limits=default_limits,
-    headers_enabled=True
-) 
\ No newline at end of file
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+)
@@ -1,40 +1,492 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import InvalidRequestError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 # 获取数据库URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./food_journey.db")
 
+# 只读副本URL（逗号分隔），为空时读请求使用主库
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# 副本健康检查间隔和超时（秒）
+DB_REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "10"))
+DB_REPLICA_HEALTH_TIMEOUT = float(os.getenv("DB_REPLICA_HEALTH_TIMEOUT", "2"))
+
+# 连接池配置（SQLite 文件库和 PostgreSQL 共用）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# asyncpg 每个连接缓存的预编译语句数量
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+# SQLite PRAGMA 配置
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# SQLite 写事务是否在进程内排队（避免多个写事务争抢文件锁后忙等）
+SQLITE_SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "true").lower() == "true"
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的连接池"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats["timeouts"] += 1
+            raise
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.wait_stats["checkouts"] += 1
+        self.wait_stats["wait_ms_total"] += wait_ms
+        self.wait_stats["wait_ms_max"] = max(self.wait_stats["wait_ms_max"], wait_ms)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+class WriteGate:
+    """进程内的 SQLite 单写者队列
+
+    SQLite 同一时间只允许一个写事务。写事务在第一次写入前排队获取写锁，
+    提交或回滚后释放，按先来先到的顺序执行，不再在文件锁上忙等重试
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.stats = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    async def acquire(self) -> None:
+        """获取写锁"""
+        started = time.perf_counter()
+        if self._lock.locked():
+            self.stats["waited"] += 1
+        await self._lock.acquire()
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.stats["acquired"] += 1
+        self.stats["wait_ms_total"] += wait_ms
+        self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait_ms)
+
+    def release(self) -> None:
+        """释放写锁"""
+        self._lock.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        acquired = self.stats["acquired"]
+        return {
+            "locked": self._lock.locked(),
+            "acquired": acquired,
+            "waited": self.stats["waited"],
+            "wait_ms": {
+                "max": round(self.stats["wait_ms_max"], 2),
+                "avg": round(self.stats["wait_ms_total"] / acquired, 2) if acquired else 0.0,
+            },
+        }
+
+
+class SerializedWriteSession(AsyncSession):
+    """写事务经过单写者队列的会话
+
+    有待写入的对象或执行 insert/update/delete 语句时先获取写锁，事务结束后释放；只读的会话不排队
+    """
+
+    def __init__(self, *args: Any, write_gate: Optional[WriteGate] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._write_gate = write_gate
+        self._holds_write_gate = False
+
+    def _has_pending_writes(self) -> bool:
+        return bool(self.new or self.dirty or self.deleted)
+
+    async def _acquire_write_gate(self) -> None:
+        if self._write_gate is not None and not self._holds_write_gate:
+            await self._write_gate.acquire()
+            self._holds_write_gate = True
+
+    def _release_write_gate(self) -> None:
+        if self._holds_write_gate:
+            self._holds_write_gate = False
+            self._write_gate.release()
+
+    async def execute(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        if getattr(statement, "is_dml", False):
+            await self._acquire_write_gate()
+        return await super().execute(statement, *args, **kwargs)
+
+    async def flush(self, objects: Any = None) -> None:
+        if self._has_pending_writes():
+            await self._acquire_write_gate()
+        await super().flush(objects)
+
+    async def commit(self) -> None:
+        if self._has_pending_writes():
+            await self._acquire_write_gate()
+        try:
+            await super().commit()
+        finally:
+            self._release_write_gate()
+
+    async def rollback(self) -> None:
+        try:
+            await super().rollback()
+        finally:
+            self._release_write_gate()
+
+    async def close(self) -> None:
+        try:
+            await super().close()
+        finally:
+            self._release_write_gate()
+
+
+def _is_sqlite_memory(url) -> bool:
+    database = url.database or ""
+    return database in ("", ":memory:") or "mode=memory" in str(url)
+
+
+def _sqlite_on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+    """为每个新的 SQLite 连接设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def create_engine_for_url(url: str, **overrides: Any) -> AsyncEngine:
+    """根据数据库类型创建异步引擎
+
+    - SQLite 文件库：WAL 模式、synchronous=NORMAL、busy_timeout、mmap 和页缓存等 PRAGMA，连接复用
+    - SQLite 内存库：所有会话共用同一个连接
+    - PostgreSQL（asyncpg）：带等待统计的 QueuePool，开启预编译语句缓存
+
+    Args:
+        url: 数据库URL
+        **overrides: 覆盖默认的引擎参数
+
+    Returns:
+        AsyncEngine: 异步引擎
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+
+    if backend == "sqlite":
+        options: Dict[str, Any] = {
+            "connect_args": {
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+                "check_same_thread": False,  # 允许跨线程使用连接
+            },
+        }
+        if _is_sqlite_memory(parsed):
+            options["poolclass"] = StaticPool
+        else:
+            options.update(
+                poolclass=InstrumentedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+            )
+        options.update(overrides)
+        sqlite_engine = create_async_engine(url, echo=False, future=True, **options)
+        if not _is_sqlite_memory(parsed):
+            event.listen(sqlite_engine.sync_engine, "connect", _sqlite_on_connect)
+        return sqlite_engine
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,  # 连接前ping一下，确保连接有效
+    }
+    if parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {"application_name": "food_journey"},
+        }
+    options.update(overrides)
+    return create_async_engine(url, echo=False, future=True, **options)
+
+
+def create_session_factory(bind: AsyncEngine) -> sessionmaker:
+    """创建会话工厂，SQLite 文件库的写事务经过单写者队列"""
+    url = bind.url
+    if url.get_backend_name() == "sqlite" and not _is_sqlite_memory(url) and SQLITE_SINGLE_WRITER:
+        return sessionmaker(
+            bind, class_=SerializedWriteSession, expire_on_commit=False, autoflush=False,
+            write_gate=WriteGate()
+        )
+    return sessionmaker(bind, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+
+def get_pool_stats(bind: AsyncEngine) -> Dict[str, Any]:
+    """获取连接池的运行指标
+
+    Args:
+        bind: 异步引擎
+
+    Returns:
+        Dict[str, Any]: 连接池大小、已借出/溢出连接数和获取连接的等待时间
+    """
+    pool = bind.sync_engine.pool
+    stats: Dict[str, Any] = {
+        "dialect": bind.dialect.name,
+        "driver": bind.dialect.driver,
+        "pool_class": type(pool).__name__,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        checkouts = wait_stats["checkouts"]
+        stats.update(
+            checkouts=checkouts,
+            timeouts=wait_stats["timeouts"],
+            wait_ms={
+                "max": round(wait_stats["wait_ms_max"], 2),
+                "avg": round(wait_stats["wait_ms_total"] / checkouts, 2) if checkouts else 0.0,
+            },
+        )
+    return stats
+
+
+class ReadOnlySession(AsyncSession):
+    """只读会话
+
+    连接处于自动提交模式，查询不开启事务，结束时也不需要提交；
+    写入直接报错，避免写操作落到只读副本上
+    """
+
+    def _check_no_writes(self) -> None:
+        if self.new or self.dirty or self.deleted:
+            raise InvalidRequestError("只读会话不能写入数据")
+
+    async def execute(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        if getattr(statement, "is_dml", False):
+            raise InvalidRequestError("只读会话不能执行写语句")
+        return await super().execute(statement, *args, **kwargs)
+
+    async def flush(self, objects: Any = None) -> None:
+        self._check_no_writes()
+        await super().flush(objects)
+
+    async def commit(self) -> None:
+        self._check_no_writes()
+        await super().commit()
+
+
+class _Replica:
+    """单个只读副本的状态"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.healthy = True
+        self.reads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+
+class ReadReplicaSet:
+    """只读副本集合
+
+    读会话按轮询选择健康的副本。查询出现连接错误或健康检查失败的副本被摘除，
+    后台定期检查，恢复后重新加入；没有可用副本时回退到主库
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: List[AsyncEngine],
+        health_interval: float = DB_REPLICA_HEALTH_INTERVAL,
+        health_timeout: float = DB_REPLICA_HEALTH_TIMEOUT
+    ):
+        """初始化
+
+        Args:
+            primary: 主库引擎
+            replicas: 只读副本引擎
+            health_interval: 健康检查间隔（秒）
+            health_timeout: 健康检查超时（秒）
+        """
+        self.primary = primary.execution_options(isolation_level="AUTOCOMMIT")
+        self.replicas = [_Replica(replica) for replica in replicas]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._next = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "primary_reads": 0,
+            "health_checks": 0,
+        }
+        for replica in self.replicas:
+            self._listen_errors(replica)
+
+    def _listen_errors(self, replica: _Replica) -> None:
+        def on_error(context: Any) -> None:
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                self._mark_down(replica, context.original_exception)
+
+        event.listen(replica.engine.sync_engine, "handle_error", on_error)
+
+    def _mark_down(self, replica: _Replica, error: BaseException) -> None:
+        replica.errors += 1
+        replica.last_error = str(error) or type(error).__name__
+        if replica.healthy:
+            replica.healthy = False
+            logger.warning(f"只读副本已摘除: {replica.name}, 错误: {replica.last_error}")
+
+    def _ensure_started(self) -> None:
+        """在当前事件循环中启动健康检查协程"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._health_loop())
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"只读副本健康检查出错: {str(e)}")
+
+    async def _ping(self, replica: _Replica) -> None:
+        async with replica.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def _check(self, replica: _Replica) -> None:
+        self.stats["health_checks"] += 1
+        try:
+            await asyncio.wait_for(self._ping(replica), self.health_timeout)
+        except Exception as e:
+            self._mark_down(replica, e)
+            return
+        if not replica.healthy:
+            replica.healthy = True
+            logger.info(f"只读副本已恢复: {replica.name}")
+
+    async def check_health(self) -> None:
+        """检查所有副本，恢复可以连接的副本"""
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    def pick(self) -> AsyncEngine:
+        """轮询选择一个健康的副本，没有可用副本时返回主库
+
+        Returns:
+            AsyncEngine: 自动提交模式的引擎
+        """
+        if self.replicas:
+            self._ensure_started()
+        count = len(self.replicas)
+        for _ in range(count):
+            replica = self.replicas[self._next % count]
+            self._next += 1
+            if replica.healthy:
+                replica.reads += 1
+                return replica.read_engine
+        self.stats["primary_reads"] += 1
+        return self.primary
+
+    def session(self) -> ReadOnlySession:
+        """创建只读会话"""
+        return ReadOnlySession(bind=self.pick(), expire_on_commit=False, autoflush=False)
+
+    async def stop(self) -> None:
+        """停止健康检查并关闭副本连接池"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            **self.stats,
+            "replicas": [
+                {
+                    "url": replica.name,
+                    "healthy": replica.healthy,
+                    "reads": replica.reads,
+                    "errors": replica.errors,
+                    "last_error": replica.last_error,
+                    "pool": get_pool_stats(replica.engine),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
 # 创建异步引擎
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True,
-    # 对于SQLite，使用以下配置提高并发性能
-    connect_args={
-        "timeout": 30,  # 连接超时时间（秒）
-        "check_same_thread": False,  # 允许跨线程使用连接
-    },
-    # 移除不支持的连接池参数
-    # pool_size=5,  # 连接池大小
-    # max_overflow=10,  # 最大溢出连接数
-    # pool_timeout=30,  # 从连接池获取连接的超时时间
-    pool_recycle=1800,  # 连接回收时间（秒）
-    pool_pre_ping=True,  # 连接前ping一下，确保连接有效
-)
+engine = create_engine_for_url(DATABASE_URL)
 
 # 创建会话工厂
-async_session = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
-)
+async_session = create_session_factory(engine)
+
+# 创建只读副本集合（未配置副本时读会话使用主库）
+read_replicas = ReadReplicaSet(engine, [create_engine_for_url(url) for url in DATABASE_REPLICA_URLS])
 
 # 创建基类
 Base = declarative_base()
 
 # 创建获取数据库会话的函数
 async def get_db():
-    """获取数据库会话"""
+    """获取读写数据库会话（主库），请求结束时提交事务"""
     async with async_session() as session:
         try:
             yield session
@@ -46,4 +498,18 @@ async def get_db():
             raise
         finally:
             # 确保关闭会话
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+
+# 写会话始终使用主库
+get_write_db = get_db
+
+
+async def get_read_db():
+    """获取只读数据库会话
+
+    会话使用自动提交连接，优先路由到只读副本；请求结束时直接关闭，不提交事务。
+    副本可能有复制延迟，刚写入的数据需要立即读到时使用 get_write_db
+    """
+    async with read_replicas.session() as session:
+        yield session
@@ -9,7 +9,7 @@ from dotenv import load_dotenv
 import numpy as np
 from PIL import Image
 import logging
-from .services.ai_service_client import AIServiceClient
+from .services.ai_service_client import get_ai_client
 from .database import get_db
 from .models.user import UserProfileModel
 from sqlalchemy import select
@@ -23,7 +23,7 @@ class GradioService:
     
     def __init__(self):
         """初始化服务"""
-        self.ai_client = AIServiceClient()
+        self.ai_client = get_ai_client()
         self.chat_history = {}  # 用于存储每个会话的历史记录
         
     async def chat_stream(
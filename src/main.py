@@ -7,15 +7,12 @@ from sqlalchemy.exc import SQLAlchemyError
 import os
 import logging
 from .config import config, setup_cors
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 import traceback
 from .middleware.version import VersionMiddleware
 from .docs import custom_openapi
 import asyncio
 from .config.limiter import limiter
+from .services.rate_limiter import RateLimitExceeded
 
 # 配置日志级别为INFO或DEBUG以查看更多日志
 logging.getLogger().setLevel(logging.INFO)  # 或者使用logging.DEBUG查看所有日志
@@ -33,8 +30,18 @@ from .models import (
     FavoriteModel, ChatMessageModel, ExerciseRecord,
     ExerciseSet, MealRecord, DailyNutritionSummary
 )
-from .database import Base, engine
-from .routers import auth, profile, chat, workout, recipes, favorites
+from .database import Base, engine, read_replicas
+from .routers import auth, profile, chat, workout, recipes, favorites, metrics
+from .services.profile_extraction_service import profile_extraction_queue
+from .services.ai_service_client import close_ai_client
+from .services.audio_decoder import audio_decoder
+from .services.image_preprocessor import image_preprocessor
+from .services.message_writer import message_writer
+from .services.image_variants import UploadStaticFiles, image_variants
+from .services.storage import storage_engine
+from .services.cache_service import cache_service
+from .services.password_hasher import password_hasher
+from .auth.revocation import revocation_list
 
 logger = logging.getLogger(__name__)
 
@@ -56,7 +63,8 @@ app.state.limiter = limiter
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     return JSONResponse(
         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-        content={"detail": str(exc)}
+        content={"detail": exc.detail},
+        headers=exc.headers
     )
 
 # 添加响应包装中间件
@@ -104,8 +112,25 @@ async def init_db():
 async def startup_event():
     """应用启动时的事件处理"""
     await init_db()
+    await revocation_list.start()
     logger.info("应用启动初始化完成")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时的事件处理"""
+    await message_writer.stop()
+    await profile_extraction_queue.stop()
+    await revocation_list.stop()
+    await close_ai_client()
+    audio_decoder.shutdown()
+    await image_variants.join()
+    image_preprocessor.shutdown()
+    password_hasher.shutdown()
+    await storage_engine.backend.close()
+    await read_replicas.stop()
+    await cache_service.close()
+    logger.info("后台任务已停止")
+
 # 配置 CORS
 setup_cors(app)
 
@@ -119,6 +144,16 @@ os.makedirs(os.path.join(config.UPLOAD_DIR, "avatars"), exist_ok=True)
 # 挂载头像静态文件
 app.mount("/avatars", StaticFiles(directory=os.path.join(config.UPLOAD_DIR, "avatars")), name="avatars")
 
+# 挂载本地存储的上传文件（只挂载内容目录，不暴露暂存和缓存目录）
+# 文件按内容哈希命名，使用 immutable 缓存头；图片的衍生图缺失时按需生成
+for category, variants in (("avatars", image_variants), ("images", image_variants), ("voices", None)):
+    os.makedirs(os.path.join(config.UPLOAD_DIR, category), exist_ok=True)
+    app.mount(
+        f"/uploads/{category}",
+        UploadStaticFiles(directory=os.path.join(config.UPLOAD_DIR, category), category=category, variants=variants),
+        name=f"uploads-{category}",
+    )
+
 # 添加路由
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["认证"])
 app.include_router(profile.router, prefix="/api/v1/profile", tags=["用户档案"])
@@ -126,6 +161,7 @@ app.include_router(chat.router, prefix="/api/v1/chat", tags=["聊天"])
 app.include_router(recipes.router, prefix="/api/v1/recipes", tags=["食谱"])
 app.include_router(favorites.router, prefix="/api/v1/favorites", tags=["收藏"])
 app.include_router(workout.router, prefix="/api/v1/workouts", tags=["运动"])
+app.include_router(metrics.router, prefix="/api/v1/metrics", tags=["监控"])
 
 app.openapi = lambda: custom_openapi(app)  # 绑定自定义OpenAPI生成函数，确保文档端点可访问
 
@@ -11,6 +11,11 @@ from .rating import RatingModel
 from .chat import ChatMessageModel
 from .favorite import FavoriteModel
 from .nutrition import FoodItem, MealRecord, DailyNutritionSummary
+from .revoked_token import RevokedTokenModel
+
+# 注册聊天记录和菜谱全文索引的建表和增量更新事件
+from ..services import chat_search as _chat_search  # noqa: E402,F401
+from ..services import recipe_search as _recipe_search  # noqa: E402,F401
 
 __all__ = [
     'Base',
@@ -25,5 +30,6 @@ __all__ = [
     'FavoriteModel',
     'FoodItem',
     'MealRecord',
-    'DailyNutritionSummary'
+    'DailyNutritionSummary',
+    'RevokedTokenModel'
 ] 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Enum as SQLEnum, Text, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, Enum as SQLEnum, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -47,5 +47,10 @@ class ChatMessageModel(Base):
     suggestions = Column(Text)
     created_at = Column(DateTime, default=lambda: datetime.now())
     
+    # 按用户倒序浏览历史（游标分页）使用的复合索引
+    __table_args__ = (
+        Index("ix_chat_messages_user_created_id", user_id, created_at.desc(), id),
+    )
+    
     # 关系
     user = relationship("User", back_populates="chat_messages") 
\ No newline at end of file
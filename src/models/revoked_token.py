@@ -0,0 +1,21 @@
+"""已吊销令牌数据模型
+
+保存登出、刷新令牌轮换和删除账户时吊销的令牌 jti，令牌过期后定期清理
+"""
+
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+
+from . import Base
+
+class RevokedTokenModel(Base):
+    """已吊销令牌"""
+
+    __tablename__ = 'revoked_tokens'
+
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(String(36), index=True, nullable=False)
+    token_type = Column(String(16), nullable=False, default="access")  # access 或 refresh
+    expires_at = Column(DateTime, index=True, nullable=False)  # 令牌本身的过期时间，之后可以删除
+    revoked_at = Column(DateTime, default=lambda: datetime.now())
+    reason = Column(String(16), nullable=False, default="revoked")  # revoked（登出、改密码等）或 rotated（刷新令牌轮换）
@@ -22,6 +22,7 @@ class User(Base):
     updated_at = Column(DateTime, default=lambda: datetime.now(), onupdate=lambda: datetime.now())
     last_login = Column(DateTime, nullable=True)  # 最后登录时间
     login_count = Column(Integer, default=0)  # 登录次数
+    token_version = Column(Integer, default=0, server_default='0', nullable=False)  # 令牌版本，递增后旧令牌失效
     
     # 关系
     profile = relationship("UserProfileModel", back_populates="user", uselist=False)
@@ -14,22 +14,27 @@ from fastapi.responses import JSONResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from passlib.context import CryptContext
 
 from ..config import config
 from ..models.user import User
 from ..schemas.auth import (
     UserCreate, UserLogin, Token, UserResponse,
     RegisterResponse, LoginResponse, LoginJsonResponse,
-    ChangePassword, ValidationErrorResponse, RateLimitErrorResponse, ErrorResponse, AccountLockedErrorResponse
+    ChangePassword, RefreshTokenRequest, ValidationErrorResponse, RateLimitErrorResponse, ErrorResponse, AccountLockedErrorResponse
 )
 from ..utils.auth import (
-    get_password_hash, verify_password,
-    create_access_token, get_current_user
+    get_password_hash, verify_password, verify_and_update_password,
+    create_access_token, create_refresh_token, decode_token,
+    get_current_user, get_token_claims
 )
+from ..auth.jwt import optional_current_user
+from ..auth.principal_cache import principal_cache, token_claims
+from ..auth.revocation import REASON_ROTATED, revocation_list
+from ..services.chat_context_cache import chat_context_cache
 from ..services.file import file_service
 from ..database import get_db
-from ..utils.cache import CacheManager, get_cache_manager
+from ..services.cache_service import profile_cache
+from ..services.rate_limiter import SharedCounter, get_login_attempts
 from ..utils.auth_utils import (
     is_account_locked, increment_failed_attempts,
     reset_failed_attempts, get_user_by_username
@@ -47,9 +52,6 @@ router = APIRouter()
 # 创建OAuth2密码Bearer
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-# 密码加密
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # 锁定配置
 MAX_LOGIN_ATTEMPTS = settings.MAX_LOGIN_ATTEMPTS  # 最大尝试次数
 LOCKOUT_DURATION = int(os.getenv("LOCKOUT_DURATION", settings.LOCKOUT_DURATION))  # 从环境变量获取锁定时间，默认使用settings中的值
@@ -65,19 +67,28 @@ async def authenticate_user(db: AsyncSession, username: str, password: str) -> O
         
     Returns:
         Optional[User]: 如果验证成功返回用户对象，否则返回None
+        
+    Raises:
+        HTTPException: 密码哈希队列已满时抛出 429
     """
     try:
         user = await get_user_by_username(db, username)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        matched, new_hash = await verify_and_update_password(password, user.hashed_password)
+        if not matched:
             return None
+        if new_hash:
+            # bcrypt 轮数已调整，随登录信息一起保存新的哈希
+            user.hashed_password = new_hash
         return user
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"验证用户身份时发生错误: {str(e)}")
         return None
 
-async def check_account_lockout(username: str, cache: CacheManager) -> None:
+async def check_account_lockout(username: str, cache: SharedCounter) -> None:
     """检查账户是否被锁定
     
     Args:
@@ -104,7 +115,7 @@ async def check_account_lockout(username: str, cache: CacheManager) -> None:
             }
         )
 
-async def record_failed_login(username: str, cache: CacheManager) -> None:
+async def record_failed_login(username: str, cache: SharedCounter) -> None:
     """记录登录失败尝试
     
     Args:
@@ -114,11 +125,10 @@ async def record_failed_login(username: str, cache: CacheManager) -> None:
     await increment_failed_attempts(cache, username)
     
     # 获取当前尝试次数
-    key = f"login_attempts:{username}"
-    attempts = await cache.get(key)
+    attempts, _ = await cache.get(username)
     logger.warning(f"登录失败: username={username}, attempts={attempts}/{MAX_LOGIN_ATTEMPTS}")
 
-async def reset_failed_login_attempts(username: str, cache: CacheManager) -> None:
+async def reset_failed_login_attempts(username: str, cache: SharedCounter) -> None:
     """重置登录失败计数
     
     Args:
@@ -143,7 +153,7 @@ async def register(
     request: Request,
     user_data: UserCreate,
     db: AsyncSession = Depends(get_db),
-    cache: CacheManager = Depends(get_cache_manager)
+    cache: SharedCounter = Depends(get_login_attempts)
 ) -> JSONResponse:
     """
     用户注册接口
@@ -177,7 +187,7 @@ async def register(
         user = User(
             id=str(uuid.uuid4()),
             username=user_data.username,
-            hashed_password=get_password_hash(user_data.password),
+            hashed_password=await get_password_hash(user_data.password),
             is_active=True,
             created_at=datetime.now(),
             updated_at=datetime.now()
@@ -187,8 +197,9 @@ async def register(
         await db.commit()
         await db.refresh(user)
         
-        # 生成访问令牌
-        token = create_access_token(data={"sub": user.id})
+        # 生成访问令牌和刷新令牌
+        token = create_access_token(data=token_claims(user))
+        refresh = create_refresh_token(data=token_claims(user))
         
         # 记录注册成功
         logger.info(f"用户注册成功: user_id={user.id} username={user.username}")
@@ -198,7 +209,8 @@ async def register(
             "token": {
                 "access_token": token.access_token,
                 "token_type": token.token_type,
-                "expires_in": token.expires_in
+                "expires_in": token.expires_in,
+                "refresh_token": refresh
             },
             "user": {
                 "id": str(user.id),
@@ -246,7 +258,7 @@ async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db),
-    cache: CacheManager = Depends(get_cache_manager)
+    cache: SharedCounter = Depends(get_login_attempts)
 ) -> JSONResponse:
     """用户登录
     
@@ -299,9 +311,11 @@ async def login(
         user.login_count += 1
         user.updated_at = datetime.now()
         await db.commit()
+        principal_cache.invalidate(user.id)
         
-        # 生成访问令牌
-        token = create_access_token(data={"sub": str(user.id)})
+        # 生成访问令牌和刷新令牌
+        token = create_access_token(data=token_claims(user))
+        refresh = create_refresh_token(data=token_claims(user))
         
         # 记录登录成功
         logger.info(f"用户登录成功: user_id={user.id} username={user.username}")
@@ -311,7 +325,8 @@ async def login(
             "token": {
                 "access_token": token.access_token,
                 "token_type": token.token_type,
-                "expires_in": token.expires_in
+                "expires_in": token.expires_in,
+                "refresh_token": refresh
             },
             "user": {
                 "id": str(user.id),
@@ -354,7 +369,7 @@ async def login_json(
     request: Request,
     user_data: UserLogin,
     db: AsyncSession = Depends(get_db),
-    cache: CacheManager = Depends(get_cache_manager)
+    cache: SharedCounter = Depends(get_login_attempts)
 ) -> JSONResponse:
     """用户登录（JSON格式）
     
@@ -407,9 +422,11 @@ async def login_json(
         user.login_count += 1
         user.updated_at = datetime.now()
         await db.commit()
+        principal_cache.invalidate(user.id)
         
-        # 生成访问令牌
-        token = create_access_token(data={"sub": str(user.id)})
+        # 生成访问令牌和刷新令牌
+        token = create_access_token(data=token_claims(user))
+        refresh = create_refresh_token(data=token_claims(user))
         
         # 记录登录成功
         logger.info(f"用户登录成功: user_id={user.id}")
@@ -419,7 +436,8 @@ async def login_json(
             "token": {
                 "access_token": token.access_token,
                 "token_type": token.token_type,
-                "expires_in": token.expires_in
+                "expires_in": token.expires_in,
+                "refresh_token": refresh
             },
             "user": {
                 "id": str(user.id),
@@ -503,6 +521,7 @@ async def change_password(
     request: Request,
     password_data: ChangePassword,
     current_user: User = Depends(get_current_user),
+    claims: Dict[str, Any] = Depends(get_token_claims),
     db: AsyncSession = Depends(get_db)
 ) -> dict:
     """修改密码
@@ -513,6 +532,7 @@ async def change_password(
         request: 请求对象
         password_data: 密码修改数据
         current_user: 当前登录用户
+        claims: 当前访问令牌的声明
         db: 数据库会话
         
     Returns:
@@ -522,7 +542,7 @@ async def change_password(
     
     try:
         # 验证当前密码
-        if not verify_password(password_data.current_password, current_user.hashed_password):
+        if not await verify_password(password_data.current_password, current_user.hashed_password):
             logger.warning(f"修改密码失败：当前密码错误 user_id={current_user.id}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -531,7 +551,9 @@ async def change_password(
             
         # 生成新密码哈希
         try:
-            new_password_hash = get_password_hash(password_data.new_password)
+            new_password_hash = await get_password_hash(password_data.new_password)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"生成密码哈希失败: user_id={current_user.id}, error={str(e)}")
             raise HTTPException(
@@ -542,8 +564,13 @@ async def change_password(
         # 更新密码
         try:
             current_user.hashed_password = new_password_hash
+            # 递增令牌版本，修改密码之前签发的令牌全部失效
+            current_user.token_version = (current_user.token_version or 0) + 1
             current_user.updated_at = datetime.now()
+            # 同时吊销当前令牌，其他进程中缓存的主体在下一次同步后也会拒绝它
+            await revocation_list.revoke_claims(db, claims)
             await db.commit()
+            principal_cache.invalidate(current_user.id)
         except SQLAlchemyError as e:
             logger.error(f"更新密码失败: user_id={current_user.id}, error={str(e)}")
             await db.rollback()
@@ -604,6 +631,8 @@ async def avatar(
         
         try:
             await db.commit()
+            principal_cache.invalidate(current_user.id)
+            await profile_cache.delete(current_user.id)
             logger.info(f"用户头像更新成功: user_id={current_user.id}")
         except SQLAlchemyError as e:
             await db.rollback()
@@ -653,29 +682,77 @@ async def avatar(
 @limiter.limit("60/minute")
 async def refresh_token(
     request: Request,
-    current_user: User = Depends(get_current_user)
+    body: Optional[RefreshTokenRequest] = None,
+    current_user: Optional[User] = Depends(optional_current_user),
+    db: AsyncSession = Depends(get_db)
 ) -> JSONResponse:
     """刷新访问令牌
     
-    为当前用户生成新的访问令牌，并返回用户信息
+    请求体带有刷新令牌时轮换令牌：吊销旧的刷新令牌，签发新的访问令牌和刷新令牌。
+    轮换时被换掉的刷新令牌再次出现说明令牌被盗用，递增用户的令牌版本，该用户所有令牌全部失效；
+    登出等其他原因吊销的刷新令牌只拒绝本次请求。
+    没有请求体时兼容旧的用法，用有效的访问令牌换一个新的访问令牌。
     
     Args:
         request: 请求对象
-        current_user: 当前登录用户
+        body: 刷新令牌请求（可选）
+        current_user: 当前登录用户（可选）
+        db: 数据库会话
         
     Returns:
         JSONResponse: 包含新访问令牌和用户信息的响应
     """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无效的刷新令牌",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    if body is not None:
+        claims = decode_token(body.refresh_token)
+        if claims is None or claims.get("type") != "refresh" or not claims.get("jti"):
+            raise credentials_exception
+        
+        user = await db.get(User, claims.get("sub"))
+        if user is None or not user.is_active:
+            raise credentials_exception
+        
+        reason = await revocation_list.revocation_reason(claims["jti"], db)
+        if reason == REASON_ROTATED:
+            logger.warning(f"检测到已轮换的刷新令牌被重复使用: user_id={user.id}, jti={claims['jti']}")
+            user.token_version = (user.token_version or 0) + 1
+            user.updated_at = datetime.now()
+            await db.commit()
+            principal_cache.invalidate(user.id)
+            raise credentials_exception
+        if reason is not None:
+            logger.info(f"刷新令牌已被吊销: user_id={user.id}, jti={claims['jti']}, reason={reason}")
+            raise credentials_exception
+        
+        if claims.get("token_version", 0) < (user.token_version or 0):
+            raise credentials_exception
+        
+        await revocation_list.revoke_claims(db, claims, reason=REASON_ROTATED)
+        await db.commit()
+        current_user = user
+    elif current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的凭证",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     logger.info(f"开始刷新令牌: user_id={current_user.id}")
     
     try:
         # 创建新的访问令牌
         token = create_access_token(
             data={
-                "sub": str(current_user.id),
+                **token_claims(current_user),
                 "refresh_time": datetime.now().timestamp()
             }
         )
+        refresh = create_refresh_token(data=token_claims(current_user))
         
         # 记录成功日志
         logger.info(f"令牌刷新成功: user_id={current_user.id}")
@@ -685,7 +762,8 @@ async def refresh_token(
             "token": {
                 "access_token": token.access_token,
                 "token_type": token.token_type,
-                "expires_in": token.expires_in
+                "expires_in": token.expires_in,
+                "refresh_token": refresh
             },
             "user": {
                 "id": str(current_user.id),
@@ -710,11 +788,65 @@ async def refresh_token(
             detail="刷新令牌失败，请稍后重试"
         )
 
+@router.post("/logout",
+    status_code=status.HTTP_200_OK,
+    responses={
+        401: {"model": ErrorResponse},
+        429: {"model": RateLimitErrorResponse},
+        500: {"model": ErrorResponse}
+    }
+)
+@limiter.limit("60/minute")
+async def logout(
+    request: Request,
+    body: Optional[RefreshTokenRequest] = None,
+    current_user: User = Depends(get_current_user),
+    claims: Dict[str, Any] = Depends(get_token_claims),
+    db: AsyncSession = Depends(get_db)
+) -> dict:
+    """退出登录
+    
+    吊销当前访问令牌，请求体带有刷新令牌时一并吊销
+    
+    Args:
+        request: 请求对象
+        body: 刷新令牌请求（可选）
+        current_user: 当前登录用户
+        claims: 当前访问令牌的声明
+        db: 数据库会话
+        
+    Returns:
+        dict: 包含成功消息的响应
+    """
+    try:
+        await revocation_list.revoke_claims(db, claims)
+        if body is not None:
+            refresh_claims = decode_token(body.refresh_token)
+            if (
+                refresh_claims is not None
+                and refresh_claims.get("type") == "refresh"
+                and refresh_claims.get("sub") == str(current_user.id)
+            ):
+                await revocation_list.revoke_claims(db, refresh_claims)
+        await db.commit()
+        principal_cache.invalidate(current_user.id)
+    except SQLAlchemyError as e:
+        logger.error(f"退出登录失败: user_id={current_user.id}, error={str(e)}")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="退出登录失败，请稍后重试"
+        )
+    
+    logger.info(f"退出登录成功: user_id={current_user.id}")
+    return {"message": "已退出登录"}
+
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 @limiter.limit("60/minute")
 async def delete_user(
     request: Request,
     current_user: User = Depends(get_current_user),
+    claims: Dict[str, Any] = Depends(get_token_claims),
     db: AsyncSession = Depends(get_db)
 ) -> None:
     """删除当前用户账户
@@ -731,6 +863,7 @@ async def delete_user(
     Args:
         request: 请求对象
         current_user: 当前登录用户
+        claims: 当前访问令牌的声明
         db: 数据库会话
         
     Returns:
@@ -750,7 +883,11 @@ async def delete_user(
             
             # 删除用户记录
             await db.delete(current_user)
+            await revocation_list.revoke_claims(db, claims)
             await db.commit()
+            chat_context_cache.invalidate(current_user.id)
+            principal_cache.invalidate(current_user.id)
+            await profile_cache.delete(current_user.id)
             
         except SQLAlchemyError as e:
             logger.error(f"删除用户数据失败: user_id={current_user.id}, error={str(e)}")
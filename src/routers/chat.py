@@ -11,14 +11,14 @@ from fastapi import (
 )
 from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, and_, or_
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import os
 import logging
 from pathlib import Path
 import base64
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..auth.jwt import get_current_user
 from ..models.user import User, UserProfileModel
 from ..models.chat import ChatMessageModel as ChatMessage, MessageType
@@ -29,18 +29,34 @@ from ..schemas.chat import (
     MessageResponse,
     MessageHistory,
     PaginationInfo,
+    ChatSearchResponse,
 )
-from ..services.ai_service_client import AIServiceClient
+from ..services.ai_service_client import get_ai_client
+from ..services.chat_context_cache import chat_context_cache, snapshot_message
+from ..services.chat_search import chat_search
+from ..services.context_builder import CHAT_HISTORY_FETCH_LIMIT, context_builder
+from ..services.image_variants import image_variants, variant_urls
+from ..services.message_writer import message_writer
+from ..services.pagination import chat_history_counts, decode_cursor, encode_cursor
 import uuid
 import re
 from ..services.file import file_service
+from ..services.profile_extraction_service import profile_extraction_queue
+from ..services.storage import FileTooLarge, StorageError, StoredFile, storage_engine
+from ..services.voice_stream_service import (
+    PCM_CONTENT_TYPES,
+    DuplexStreamingResponse,
+    StreamingPCMDecoder,
+    VoiceStreamTranscriber,
+)
 from fastapi.security import OAuth2PasswordRequestForm
 from ..config.limiter import limiter
 import json
+import asyncio
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-ai_client = AIServiceClient()
+ai_client = get_ai_client()
 
 # 常量定义
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
@@ -53,21 +69,36 @@ ALLOWED_AUDIO_TYPES = {
     "audio/aac",
     "audio/ogg",
 }
+# 流式语音上传保存时使用的扩展名
+STREAM_AUDIO_EXTENSIONS = {
+    "audio/wav": "wav",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/m4a": "m4a",
+    "audio/x-m4a": "m4a",
+    "audio/aac": "aac",
+    "audio/ogg": "ogg",
+}
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif"}
 MAX_MESSAGE_LENGTH = 1000  # 设置最大消息长度为1000字符
+# 聊天图片保存时使用的扩展名
+IMAGE_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif"}
 
-# 创建上传目录
-UPLOAD_DIR = Path("uploads")
-VOICE_DIR = UPLOAD_DIR / "voices"
-IMAGE_DIR = UPLOAD_DIR / "images"
-VOICE_DIR.mkdir(parents=True, exist_ok=True)
-IMAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+async def _store_upload(file: UploadFile, category: str, ext: str) -> StoredFile:
+    """把上传文件按块写入存储引擎，存储错误转换为 HTTP 错误"""
+    try:
+        return await storage_engine.save_upload(file, category, max_size=MAX_FILE_SIZE, ext=ext)
+    except FileTooLarge:
+        raise HTTPException(status_code=413, detail=f"文件大小超过限制: {MAX_FILE_SIZE} bytes")
+    except StorageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-async def get_chat_history_for_response(
-    user_id: str, db: AsyncSession, limit: int = 10
+
+async def _load_recent_messages(
+    user_id: str, db: AsyncSession, limit: int
 ) -> List[Dict[str, Any]]:
-    """获取用于响应的聊天历史"""
+    """从数据库加载最近的消息快照（按时间正序）"""
     query = (
         select(ChatMessage)
         .filter(ChatMessage.user_id == user_id)
@@ -75,25 +106,46 @@ async def get_chat_history_for_response(
         .limit(limit)
     )
     result = await db.execute(query)
-    messages = result.scalars().all()
+    return [snapshot_message(msg) for msg in reversed(result.scalars().all())]
+
+
+def _add_message(db: AsyncSession, message: ChatMessage) -> None:
+    """写入聊天消息，并同步追加到上下文缓存"""
+    db.add(message)
+    chat_context_cache.append_message(message.user_id, message)
+
+
+def build_history_frame(
+    recent_messages: List[Dict[str, Any]], *turn: ChatMessage, limit: int = 10
+) -> List[Dict[str, Any]]:
+    """用请求开始时取到的最近消息和本轮消息构建响应中的历史记录，无需重新查询"""
+    turn_ids = {msg.id for msg in turn}
+    messages = [msg for msg in recent_messages if msg["id"] not in turn_ids]
+    messages.extend(snapshot_message(msg) for msg in turn)
 
     history = []
-    for msg in reversed(messages):
+    for msg in messages[-limit:]:
         history.append(
             {
-                "content": msg.content,
-                "is_user": msg.is_user,
-                "created_at": msg.created_at.isoformat(),
-                "voice_url": msg.voice_url,
-                "image_url": msg.image_url,
-                "transcribed_text": msg.transcribed_text,
+                "content": msg["content"],
+                "is_user": msg["is_user"],
+                "created_at": msg["created_at"].isoformat(),
+                "voice_url": msg["voice_url"],
+                "image_url": msg["image_url"],
+                "image_variants": variant_urls(msg["image_url"]),
+                "transcribed_text": msg["transcribed_text"],
             }
         )
     return history
 
 
 async def get_user_profile(user_id: str, db: AsyncSession) -> Dict[str, Any]:
-    """获取用户画像信息"""
+    """获取用户画像信息（优先使用缓存的画像快照）"""
+    return await chat_context_cache.profile(user_id, lambda: _load_user_profile(user_id, db))
+
+
+async def _load_user_profile(user_id: str, db: AsyncSession) -> Dict[str, Any]:
+    """从数据库加载用户画像信息"""
     query = select(UserProfileModel).filter(UserProfileModel.user_id == user_id)
     result = await db.execute(query)
     profile = result.scalar_one_or_none()
@@ -144,39 +196,48 @@ async def get_user_profile(user_id: str, db: AsyncSession) -> Dict[str, Any]:
         "exercise_history": profile.exercise_history or [],
         "training_time_preference": profile.training_time_preference,
         "equipment_preferences": profile.equipment_preferences or [],
-        "extended_attributes": profile.extended_attributes or {}
+        "extended_attributes": profile.extended_attributes or {},
+        "updated_at": profile.updated_at.isoformat() if profile.updated_at else None
     }
 
 
-async def get_recent_chat_history(
-    user_id: str, db: AsyncSession, limit: int = 5
-) -> List[Dict[str, str]]:
-    """获取最近的聊天历史"""
-    query = (
-        select(ChatMessage)
-        .filter(ChatMessage.user_id == user_id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(limit)
+async def get_recent_messages(
+    user_id: str, db: AsyncSession, limit: int = CHAT_HISTORY_FETCH_LIMIT
+) -> List[Dict[str, Any]]:
+    """获取最近的消息快照（按时间正序）"""
+    return await chat_context_cache.recent_messages(
+        user_id, limit, lambda n: _load_recent_messages(user_id, db, n)
     )
-    result = await db.execute(query)
-    messages = result.scalars().all()
 
-    history = []
-    for msg in reversed(messages):
-        history.append(
-            {"role": "user" if msg.is_user else "assistant", "content": msg.content}
-        )
-    return history
+
+def to_chat_history(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """把消息快照转换为发送给模型的聊天历史
+
+    返回的是候选历史，实际发送给模型的条数由上下文构建器按 token 预算决定
+    """
+    return [
+        {"role": "user" if msg["is_user"] else "assistant", "content": msg["content"]}
+        for msg in messages
+    ]
 
 
 # 修改这个函数，整合新旧功能
 async def process_stream_response(
     user_id: str,
-    db: AsyncSession,
     messages: List[Dict[str, str]],
     user_message: ChatMessage,
+    recent_messages: List[Dict[str, Any]],
+    usage: Optional[Dict[str, Any]] = None,
 ):
-    """处理流式响应的通用函数"""
+    """处理流式响应的通用函数
+
+    不使用请求的数据库会话：AI 回复交给后台写入器批量写入，
+    最后的历史记录由请求开始时取到的最近消息和本轮消息构建
+    """
+    if usage is not None:
+        # 先告诉客户端本次提示词的 token 用量
+        yield f"data: {json.dumps({'type': 'usage', 'data': usage})}\n\n"
+
     # 使用列表收集响应内容
     full_content = []
     async for chunk in ai_client.chat_stream(messages=messages):
@@ -195,50 +256,13 @@ async def process_stream_response(
         is_user=False,
         created_at=datetime.now(),
     )
-    db.add(system_message)
-    # 只使用flush，不要在这里commit
-    await db.flush()  
+    chat_context_cache.append_message(user_id, system_message)
+    await message_writer.submit(system_message)
 
-    try:
-        # 尝试从用户消息中提取用户画像更新信息，而不是从AI回复中提取
-        logger.info(f"正在从用户消息中提取用户画像更新信息，用户ID: {user_id}")
-        # 获取用户消息内容
-        user_content = user_message.content
-        # 使用extract_profile_updates从用户消息中提取信息
-        updates = ai_client.extract_profile_updates(user_content)
-        
-        if updates:
-            logger.info(f"检测到用户画像更新，用户ID: {user_id}, 更新内容: {updates}")
-            
-            # 记录当前事务状态
-            logger.info(f"提取到的用户画像更新，准备处理，事务状态：{db.is_active}")
-            
-            # 处理用户画像更新 - 确保这个函数内部不会提交事务
-            update_result = await ai_client.process_profile_updates(
-                user_id=user_id, 
-                updates=updates, 
-                db=db
-            )
-            
-            if update_result["success"] and update_result["updated_fields"]:
-                logger.info(f"用户画像更新成功，用户ID: {user_id}, 更新字段: {update_result['updated_fields']}")
-                # 只使用flush，不要在这里commit
-                await db.flush()
-                logger.info(f"已执行flush操作保存用户画像更新，用户ID: {user_id}")
-            else:
-                logger.error(f"用户画像更新失败或无更新，用户ID: {user_id}, 结果: {update_result}")
-        else:
-            logger.info(f"未检测到用户画像更新，用户ID: {user_id}")
+    # 用户画像提取交给后台队列处理，不等待LLM分析结果，直接返回历史消息
+    profile_extraction_queue.enqueue(user_id, user_message.content)
 
-    except Exception as e:
-        logger.error(f"处理用户画像更新过程中出错: {str(e)}")
-        # 打印详细堆栈信息以便调试
-        import traceback
-        logger.error(f"出错详细信息: {traceback.format_exc()}")
-        # 不要让更新错误影响到主流程，但也不要在这里回滚，让路由处理程序来处理
-
-    # 获取用于响应的历史消息并正确格式化为JSON字符串
-    history = await get_chat_history_for_response(user_id, db)
+    history = build_history_frame(recent_messages, user_message, system_message)
     history_data = {"type": "history", "data": history}
     yield f"data: {json.dumps(history_data)}\n\n"
 
@@ -264,54 +288,33 @@ async def stream_chat(
         )
         
         # 添加到数据库
-        db.add(user_message)
+        _add_message(db, user_message)
         
         # 获取用户画像和聊天历史
         user_profile = await get_user_profile(current_user.id, db)
-        chat_history = await get_recent_chat_history(current_user.id, db, limit=5)
-        
-        # 立即提交用户消息，释放锁
+        recent_messages = await get_recent_messages(current_user.id, db)
+
+        # 立即提交用户消息并释放会话，调用模型期间不占用数据库连接
         await db.commit()
+        await db.close()
         logger.info(f"用户消息已保存并提交，用户ID: {current_user.id}, 消息ID: {message_id}")
-        
+
         # 构建消息列表
-        messages = ai_client._build_chat_messages(
+        context = context_builder.build(
             user_profile=user_profile,
             current_message=request.message,
-            chat_history=chat_history,
+            chat_history=to_chat_history(recent_messages),
         )
-        
+
         # 创建流式响应
-        response_stream = process_stream_response(
-            user_id=current_user.id,
-            db=db,
-            messages=messages,
-            user_message=user_message,
-        )
-        
-        # 注册一个回调，确保流式响应完成后提交数据库事务
-        async def stream_with_commit():
-            try:
-                logger.info(f"开始流式响应处理，用户ID: {current_user.id}")
-                async for chunk in response_stream:
-                    yield chunk
-                # 在提交事务前先执行flush确保所有操作可见
-                logger.info(f"流式响应完成，准备提交数据库事务，用户ID: {current_user.id}")
-                await db.flush()
-                await db.commit()
-                logger.info(f"流式响应完成，数据库事务已提交，用户ID: {current_user.id}")
-            except Exception as e:
-                # 异常情况下回滚事务
-                logger.error(f"流式响应出错，回滚数据库事务: {str(e)}, 用户ID: {current_user.id}")
-                try:
-                    await db.rollback()
-                    logger.info(f"已回滚事务，用户ID: {current_user.id}")
-                except Exception as rollback_error:
-                    logger.error(f"回滚事务失败: {rollback_error}")
-                raise
-        
         return StreamingResponse(
-            stream_with_commit(),
+            process_stream_response(
+                user_id=current_user.id,
+                messages=context.messages,
+                user_message=user_message,
+                recent_messages=recent_messages,
+                usage=context.usage(),
+            ),
             media_type="text/event-stream",
         )
         
@@ -320,6 +323,7 @@ async def stream_chat(
         # 确保回滚事务
         try:
             await db.rollback()
+            chat_context_cache.invalidate(current_user.id)
             logger.info(f"已回滚事务，用户ID: {current_user.id}")
         except Exception as rollback_error:
             logger.error(f"回滚事务失败: {rollback_error}")
@@ -397,43 +401,14 @@ async def voice_chat_stream(
                 detail=f"不支持的音频格式: {content_type}。支持的格式: {', '.join(ALLOWED_AUDIO_TYPES)}",
             )
 
-        file_content = await file.read()
-        file_size = len(file_content)
-        
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"文件大小超过限制: {MAX_FILE_SIZE} bytes"
-            )
-
-        # 保存语音文件, 根据文件类型选择正确的扩展名
-        if content_type == "audio/wav":
-            ext = "wav"
-        elif content_type in {"audio/mpeg", "audio/mp3"}:
-            ext = "mp3"
-        elif content_type in {"audio/m4a", "audio/x-m4a"}:
-            ext = "m4a"
-        elif content_type == "audio/aac":
-            ext = "aac"
-        elif content_type == "audio/ogg":
-            ext = "ogg"
-        else:
-            raise HTTPException(
-                status_code=400, detail=f"不支持的音频格式: {content_type}"
-            )
-
-        voice_filename = f"{uuid.uuid4()}.{ext}"
-        voice_path = VOICE_DIR / voice_filename
-        voice_url = f"/uploads/voices/{voice_filename}"
-
-        # 保存文件
-        with open(voice_path, "wb") as f:
-            f.write(file_content)
-        logger.info(f"语音文件已保存: {voice_path}")
+        # 按块写入存储，根据文件类型选择正确的扩展名
+        stored = await _store_upload(file, "voices", STREAM_AUDIO_EXTENSIONS[content_type])
+        voice_url = stored.url
 
-        # 语音转文字
+        # 语音转文字（本地存储直接从磁盘解码，其他存储读取文件内容）
         try:
-            transcribed_text = await ai_client.process_voice(voice_url)
+            audio_source = str(stored.local_path) if stored.local_path else await storage_engine.read(stored.key)
+            transcribed_text = await ai_client.process_voice(audio_source)
             if not transcribed_text:
                 raise ValueError("语音识别结果为空")
             logger.info(f"语音识别成功: {transcribed_text}")
@@ -443,7 +418,7 @@ async def voice_chat_stream(
 
         # 获取用户画像和聊天历史
         user_profile = await get_user_profile(current_user.id, db)
-        chat_history = await get_recent_chat_history(current_user.id, db, limit=5)
+        recent_messages = await get_recent_messages(current_user.id, db)
 
         # 保存用户消息
         user_message = ChatMessage(
@@ -456,43 +431,27 @@ async def voice_chat_stream(
             is_user=True,
             created_at=datetime.now(),
         )
-        db.add(user_message)
+        _add_message(db, user_message)
+        # 提交后释放会话，调用模型期间不占用数据库连接
         await db.commit()
+        await db.close()
 
         # 构建消息列表
-        messages = ai_client._build_chat_messages(
+        context = context_builder.build(
             user_profile=user_profile,
             current_message=transcribed_text,
-            chat_history=chat_history,
+            chat_history=to_chat_history(recent_messages),
         )
 
         # 创建流式响应
-        response_stream = process_stream_response(
-            user_id=current_user.id,
-            db=db,
-            messages=messages,
-            user_message=user_message,
-        )
-        
-        # 注册一个回调，确保流式响应完成后提交数据库事务
-        async def stream_with_commit():
-            try:
-                logger.info(f"开始流式响应处理，用户ID: {current_user.id}")
-                async for chunk in response_stream:
-                    yield chunk
-                # 在提交事务前先执行flush确保所有操作可见
-                logger.info(f"流式响应完成，准备提交数据库事务，用户ID: {current_user.id}")
-                await db.flush()
-                await db.commit()
-                logger.info(f"流式响应完成，数据库事务已提交，用户ID: {current_user.id}")
-            except Exception as e:
-                # 异常情况下回滚事务
-                logger.error(f"流式响应出错，回滚数据库事务: {str(e)}, 用户ID: {current_user.id}")
-                await db.rollback()
-                raise
-                
         return StreamingResponse(
-            stream_with_commit(),
+            process_stream_response(
+                user_id=current_user.id,
+                messages=context.messages,
+                user_message=user_message,
+                recent_messages=recent_messages,
+                usage=context.usage(),
+            ),
             media_type="text/event-stream",
         )
 
@@ -500,10 +459,133 @@ async def voice_chat_stream(
         raise
     except Exception as e:
         await db.rollback()
+        chat_context_cache.invalidate(current_user.id)
         logger.error(f"流式语音处理失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"流式语音处理失败: {str(e)}")
 
 
+@router.post("/voice/stream")
+async def voice_stream_transcribe(
+    request: Request,
+    chat: bool = Query(False, description="转写完成后是否直接开始流式聊天"),
+    sample_rate: int = Query(16000, ge=8000, le=48000, description="裸 PCM 的采样率"),
+    channels: int = Query(1, ge=1, le=2, description="裸 PCM 的声道数"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """流式语音转写接口
+    
+    请求体为原始音频数据（不是表单），边上传边转写，通过 SSE 返回：
+    - {"type": "transcript_partial", "data": {...}} 每个音频窗口的转写结果
+    - {"type": "transcript", "data": {...}} 完整的转写结果
+    wav 和裸 PCM（audio/pcm、audio/L16）可以在上传过程中逐窗口转写，
+    其他格式在上传完成后解码。chat=true 时转写完成后直接开始流式聊天，
+    返回格式与 /stream 接口相同。
+    """
+    content_type = (request.headers.get("content-type") or "audio/wav").split(";")[0].strip().lower()
+    if content_type not in ALLOWED_AUDIO_TYPES and content_type not in PCM_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的音频格式: {content_type}。支持的格式: {', '.join(ALLOWED_AUDIO_TYPES | PCM_CONTENT_TYPES)}",
+        )
+
+    decoder = StreamingPCMDecoder(content_type, sample_rate=sample_rate, channels=channels)
+    transcriber = VoiceStreamTranscriber(ai_client.transcribe_samples)
+
+    # 上传的数据边接收边写入存储引擎，接收完成后按内容哈希保存
+    staged = storage_engine.stage(
+        "voices", max_size=MAX_FILE_SIZE, ext=STREAM_AUDIO_EXTENSIONS.get(content_type, "pcm")
+    )
+    uploaded: Dict[str, StoredFile] = {}
+
+    body_consumed = asyncio.Event()
+
+    async def tee_body():
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await staged.write(chunk)
+                    yield chunk
+            uploaded["voice"] = await staged.commit()
+        except BaseException:
+            await staged.abort()
+            raise
+        finally:
+            body_consumed.set()
+
+    async def event_stream():
+        transcribed_text = ""
+        body = tee_body()
+        try:
+            async for event in transcriber.run(body, decoder, max_bytes=MAX_FILE_SIZE):
+                if event["type"] == "final":
+                    transcribed_text = event["text"]
+                    data = {"type": "transcript", "data": {"text": event["text"], "duration": event["duration"]}}
+                else:
+                    data = {"type": "transcript_partial", "data": {k: v for k, v in event.items() if k != "type"}}
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"流式语音转写失败: {str(e)}, 用户ID: {current_user.id}")
+            yield f"data: {json.dumps({'type': 'error', 'data': f'语音识别失败: {str(e)}'}, ensure_ascii=False)}\n\n"
+            return
+        finally:
+            # 转写失败或客户端断开时请求体可能没有读完，关闭读取并删除未提交的暂存文件
+            await body.aclose()
+            if "voice" not in uploaded:
+                await staged.abort()
+
+        logger.info(f"流式语音转写完成: {transcribed_text}, 用户ID: {current_user.id}")
+        if not chat:
+            return
+        if not transcribed_text:
+            transcribed_text = "无法识别语音内容"
+
+        # 转写完成后立即开始流式聊天
+        try:
+            user_profile = await get_user_profile(current_user.id, db)
+            recent_messages = await get_recent_messages(current_user.id, db)
+
+            user_message = ChatMessage(
+                id=str(uuid.uuid4()),
+                user_id=current_user.id,
+                type=MessageType.voice,
+                content=transcribed_text,
+                voice_url=uploaded["voice"].url,
+                transcribed_text=transcribed_text,
+                is_user=True,
+                created_at=datetime.now(),
+            )
+            _add_message(db, user_message)
+            await db.commit()
+            await db.close()
+        except Exception as e:
+            logger.error(f"保存语音消息失败，回滚数据库事务: {str(e)}, 用户ID: {current_user.id}")
+            await db.rollback()
+            chat_context_cache.invalidate(current_user.id)
+            raise
+
+        context = context_builder.build(
+            user_profile=user_profile,
+            current_message=transcribed_text,
+            chat_history=to_chat_history(recent_messages),
+        )
+        async for chunk in process_stream_response(
+            user_id=current_user.id,
+            messages=context.messages,
+            user_message=user_message,
+            recent_messages=recent_messages,
+            usage=context.usage(),
+        ):
+            yield chunk
+        logger.info(f"流式语音聊天完成，用户ID: {current_user.id}")
+
+    return DuplexStreamingResponse(
+        event_stream(),
+        body_consumed=body_consumed,
+        media_type="text/event-stream",
+    )
+
+
 @router.post("/image/stream")
 async def image_chat_stream(
     file: UploadFile = File(...),
@@ -519,30 +601,15 @@ async def image_chat_stream(
                 status_code=400, detail=f"不支持的图片格式: {file.content_type}"
             )
 
-        # 读取文件内容 - 修改这里，确保完全读取文件内容
-        file_content = await file.read()
-        file_size = len(file_content)
-        
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413, detail=f"文件大小超过限制: {MAX_FILE_SIZE} bytes"
-            )
+        # 按块写入存储，相同内容的图片只保存一份
+        stored = await _store_upload(file, "images", IMAGE_EXTENSIONS[file.content_type])
+        image_url = stored.url
+        image_variants.schedule(stored)
 
-        # 保存图片文件
-        image_filename = f"{uuid.uuid4()}.{file.filename.split('.')[-1]}"
-        image_path = IMAGE_DIR / image_filename
-        image_url = f"/uploads/images/{image_filename}"
-        
-        # 保存文件
-        with open(image_path, "wb") as f:
-            f.write(file_content)
-        logger.info(f"图片文件已保存: {image_path}")
-
-        # 确保文件指针重置，以防后续需要再次读取
+        # 识别服务需要完整的图片数据，从上传文件中重新读取；重复上传的图片会命中识别结果缓存
         await file.seek(0)
-
-        # 识别图片内容 - 修改为使用文件路径而不是文件对象
-        recognition_result = await ai_client.recognize_food(str(image_path))
+        file_content = await file.read()
+        recognition_result = await ai_client.recognize_food(file_content)
         if not recognition_result["success"]:
             raise HTTPException(
                 status_code=400,
@@ -562,7 +629,7 @@ async def image_chat_stream(
 
         # 获取用户画像和聊天历史
         user_profile = await get_user_profile(current_user.id, db)
-        chat_history = await get_recent_chat_history(current_user.id, db, limit=5)
+        recent_messages = await get_recent_messages(current_user.id, db)
 
         # 保存用户消息
         user_message = ChatMessage(
@@ -574,64 +641,163 @@ async def image_chat_stream(
             is_user=True,
             created_at=datetime.now(),
         )
-        db.add(user_message)
+        _add_message(db, user_message)
+        # 提交后释放会话，调用模型期间不占用数据库连接
         await db.commit()
+        await db.close()
 
         # 构建消息列表
-        messages = ai_client._build_chat_messages(
+        context = context_builder.build(
             user_profile=user_profile,
             current_message=full_message,
-            chat_history=chat_history,
+            chat_history=to_chat_history(recent_messages),
         )
 
         # 创建流式响应
-        response_stream = process_stream_response(
-            user_id=current_user.id,
-            db=db,
-            messages=messages,
-            user_message=user_message,
-        )
-        
-        # 注册一个回调，确保流式响应完成后提交数据库事务
-        async def stream_with_commit():
-            try:
-                logger.info(f"开始流式响应处理，用户ID: {current_user.id}")
-                async for chunk in response_stream:
-                    yield chunk
-                # 在提交事务前先执行flush确保所有操作可见
-                logger.info(f"流式响应完成，准备提交数据库事务，用户ID: {current_user.id}")
-                await db.flush()
-                await db.commit()
-                logger.info(f"流式响应完成，数据库事务已提交，用户ID: {current_user.id}")
-            except Exception as e:
-                # 异常情况下回滚事务
-                logger.error(f"流式响应出错，回滚数据库事务: {str(e)}, 用户ID: {current_user.id}")
-                await db.rollback()
-                raise
-                
         return StreamingResponse(
-            stream_with_commit(),
+            process_stream_response(
+                user_id=current_user.id,
+                messages=context.messages,
+                user_message=user_message,
+                recent_messages=recent_messages,
+                usage=context.usage(),
+            ),
             media_type="text/event-stream",
         )
 
     except Exception as e:
         await db.rollback()
+        chat_context_cache.invalidate(current_user.id)
         logger.error(f"流式图片处理失败: {str(e)}")
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"流式图片处理失败: {str(e)}")
 
 
+def _history_message(msg: ChatMessage) -> MessageResponse:
+    """把数据库中的消息转换为历史记录响应"""
+    return MessageResponse(
+        schema_version="1.0",
+        id=str(msg.id),
+        message=msg.content,
+        is_user=msg.is_user,
+        created_at=msg.created_at,
+        voice_url=msg.voice_url,
+        image_url=msg.image_url,
+        image_variants=variant_urls(msg.image_url),
+        transcribed_text=msg.transcribed_text,
+    )
+
+
+async def _get_chat_history_by_cursor(
+    query,
+    order,
+    cursor: str,
+    per_page: int,
+    include_total: bool,
+    count_key: tuple,
+    db: AsyncSession,
+) -> MessageHistory:
+    """按游标获取一页聊天历史
+
+    多取一条记录用于判断是否还有下一页，不需要 COUNT(*) 和 OFFSET
+    """
+    total = total_pages = None
+    if include_total:
+        # 总数按 (用户, 过滤条件) 缓存，翻页时不再重复统计
+        total = chat_history_counts.get(count_key)
+        if total is None:
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
+            chat_history_counts.set(count_key, total)
+        total_pages = (total + per_page - 1) // per_page
+
+    if cursor:
+        try:
+            cursor_time, cursor_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # 倒序时间、正序ID：排在游标之后的记录
+        query = query.filter(
+            or_(
+                ChatMessage.created_at < cursor_time,
+                and_(ChatMessage.created_at == cursor_time, ChatMessage.id > cursor_id),
+            )
+        )
+
+    result = await db.execute(query.order_by(*order).limit(per_page + 1))
+    messages = result.scalars().all()
+    has_more = len(messages) > per_page
+    messages = messages[:per_page]
+    next_cursor = (
+        encode_cursor(messages[-1].created_at, str(messages[-1].id)) if has_more else None
+    )
+
+    return MessageHistory(
+        schema_version="1.0",
+        messages=[_history_message(msg) for msg in messages],
+        pagination=PaginationInfo(
+            per_page=per_page,
+            total=total,
+            total_pages=total_pages,
+            next_cursor=next_cursor,
+            has_more=has_more,
+        ),
+    )
+
+
+@router.get("/search", response_model=ChatSearchResponse)
+async def search_chat_history(
+    q: str = Query(..., min_length=1, max_length=100, description="查询字符串"),
+    per_page: int = Query(20, gt=0, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    sort: str = Query("relevance", description="排序方式：relevance（相关度）或 recent（时间倒序）"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """全文检索聊天记录
+
+    在消息内容和语音转写文本中检索，中文按相邻两字匹配，英文按单词前缀匹配；
+    返回命中位置附近的摘要，使用游标分页
+    """
+    try:
+        page = await chat_search.search(
+            db, current_user.id, q, limit=per_page, cursor=cursor, sort=sort
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"检索聊天记录失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"检索聊天记录失败: {str(e)}")
+
+    return ChatSearchResponse(
+        schema_version="1.0",
+        query=q,
+        results=page["results"],
+        pagination=PaginationInfo(
+            per_page=per_page,
+            next_cursor=page["next_cursor"],
+            has_more=page["has_more"],
+        ),
+    )
+
+
 @router.get("/history", response_model=MessageHistory)
 async def get_chat_history(
     page: int = Query(1, gt=0),
     per_page: int = Query(20, gt=0, le=100),
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor，传空字符串获取第一页"),
+    include_total: bool = Query(False, description="游标分页时是否返回总数（缓存的近似值）"),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """获取聊天历史记录"""
+    """获取聊天历史记录
+
+    支持两种分页方式：
+    - 页码分页（默认）：使用 page 和 per_page，返回精确的总数
+    - 游标分页：传入 cursor 参数，按 (created_at, id) 定位，翻页开销与页码深度无关
+    """
     try:
         # 构建基础查询
         query = select(ChatMessage).filter(ChatMessage.user_id == current_user.id)
@@ -642,12 +808,21 @@ async def get_chat_history(
         if end_date:
             query = query.filter(ChatMessage.created_at <= end_date)
 
+        # 排序与复合索引 (user_id, created_at DESC, id) 一致
+        order = (ChatMessage.created_at.desc(), ChatMessage.id.asc())
+
+        if cursor is not None:
+            return await _get_chat_history_by_cursor(
+                query, order, cursor, per_page, include_total,
+                (current_user.id, start_date, end_date), db
+            )
+
         # 获取总记录数
         count_query = select(func.count()).select_from(query.subquery())
         total = await db.scalar(count_query)
 
         # 分页
-        query = query.order_by(ChatMessage.created_at.desc())
+        query = query.order_by(*order)
         query = query.offset((page - 1) * per_page).limit(per_page)
 
         # 执行查询
@@ -656,18 +831,8 @@ async def get_chat_history(
 
         # 构建响应
         return MessageHistory(
-            messages=[
-                MessageResponse(
-                    id=str(msg.id),
-                    content=msg.content,
-                    is_user=msg.is_user,
-                    created_at=msg.created_at,
-                    voice_url=msg.voice_url,
-                    image_url=msg.image_url,
-                    transcribed_text=msg.transcribed_text,
-                )
-                for msg in messages
-            ],
+            schema_version="1.0",
+            messages=[_history_message(msg) for msg in messages],
             pagination=PaginationInfo(
                 total=total,
                 page=page,
@@ -676,6 +841,8 @@ async def get_chat_history(
             ),
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取聊天历史失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取聊天历史失败: {str(e)}")
@@ -0,0 +1,247 @@
+"""运行时指标相关的路由处理模块"""
+
+from typing import Any, Dict
+import logging
+
+from fastapi import APIRouter, Depends
+
+from ..auth.jwt import get_current_user
+from ..auth.principal_cache import principal_cache
+from ..auth.revocation import revocation_list
+from ..config.limiter import limiter
+from ..database import async_session, engine, get_pool_stats, read_replicas
+from ..models.user import User
+from ..services.ai_service_client import get_ai_client
+from ..services.cache_service import cache_service
+from ..services.chat_context_cache import chat_context_cache
+from ..services.context_builder import context_builder
+from ..services.image_variants import image_variants
+from ..services.message_writer import message_writer
+from ..services.password_hasher import password_hasher
+from ..services.profile_extraction_service import profile_extraction_queue
+from ..services.prompt_templates import profile_block_cache
+from ..services.recognition_cache import recognition_cache
+from ..services.storage import storage_engine
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/profile-extraction")
+async def get_profile_extraction_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取用户画像提取队列的运行指标
+
+    返回队列深度、处理延迟、丢弃数量等统计信息
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": profile_extraction_queue.get_stats()
+    }
+
+
+@router.get("/ai-transport")
+async def get_ai_transport_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取AI服务传输层的运行指标
+
+    返回各接口的并发数、排队等待时间、重试和错误次数，以及请求合并的次数
+    """
+    client = get_ai_client()
+    return {
+        "schema_version": "1.0",
+        "metrics": {
+            **client.transport.get_stats(),
+            "single_flight": client.get_single_flight_stats()
+        }
+    }
+
+
+@router.get("/recognition-cache")
+async def get_recognition_cache_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取食物识别结果缓存的运行指标
+
+    返回缓存条目数、命中/未命中次数和命中率
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": recognition_cache.get_stats()
+    }
+
+
+@router.get("/profile-block-cache")
+async def get_profile_block_cache_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取用户画像块缓存的运行指标
+
+    返回缓存条目数、命中次数和未命中次数
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": profile_block_cache.get_stats()
+    }
+
+
+@router.get("/chat-context")
+async def get_chat_context_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取聊天上下文构建的运行指标
+
+    返回 token 预算、平均/最大提示词 token 数以及截断和丢弃的历史消息数
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": context_builder.get_stats()
+    }
+
+
+@router.get("/chat-context-cache")
+async def get_chat_context_cache_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取按用户缓存的最近消息和画像快照的运行指标
+
+    返回缓存的用户数、消息和画像的命中/未命中次数以及淘汰次数
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": chat_context_cache.get_stats()
+    }
+
+
+@router.get("/message-writer")
+async def get_message_writer_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取聊天消息后台写入器的运行指标
+
+    返回队列深度、每批写入条数、提交耗时和写入延迟
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": message_writer.get_stats()
+    }
+
+
+@router.get("/storage")
+async def get_storage_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取上传文件存储引擎的运行指标
+
+    返回存储后端、上传次数、去重命中次数和写入/节省的字节数
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": storage_engine.get_stats()
+    }
+
+
+@router.get("/image-variants")
+async def get_image_variant_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取图片衍生图服务的运行指标
+
+    返回生成的衍生图数量、按需生成次数、失败次数和渲染耗时
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": image_variants.get_stats()
+    }
+
+
+@router.get("/db-pool")
+async def get_db_pool_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取数据库连接池的运行指标
+
+    返回连接池大小、已借出和溢出的连接数、获取连接的等待时间，
+    SQLite 文件库还返回单写者队列的排队情况，以及只读副本的健康状态和读请求分布
+    """
+    metrics = get_pool_stats(engine)
+    write_gate = async_session.kw.get("write_gate")
+    if write_gate is not None:
+        metrics["write_gate"] = write_gate.get_stats()
+    metrics["read_replicas"] = read_replicas.get_stats()
+    return {
+        "schema_version": "1.0",
+        "metrics": metrics
+    }
+
+
+@router.get("/cache")
+async def get_cache_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取缓存服务的运行指标
+
+    返回 Redis 是否可用、进程内缓存的条目数和淘汰次数，以及各命名空间的命中率
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": cache_service.get_stats()
+    }
+
+
+@router.get("/principal-cache")
+async def get_principal_cache_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取认证主体缓存的运行指标
+
+    返回命中率、缓存的令牌数和失效次数
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": principal_cache.get_stats()
+    }
+
+
+@router.get("/password-hashing")
+async def get_password_hashing_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取密码哈希线程池的运行指标
+
+    返回排队数、拒绝数，以及哈希、校验和排队耗时的分位数
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": password_hasher.get_stats()
+    }
+
+
+@router.get("/rate-limit")
+async def get_rate_limit_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取接口限流的运行指标
+
+    返回限流状态保存在 Redis 还是进程内，以及放行和拒绝的请求数
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": limiter.get_stats()
+    }
+
+
+@router.get("/revocation")
+async def get_revocation_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """获取令牌吊销列表的运行指标
+
+    返回布隆过滤器的大小、命中次数、误判率和最近一次同步的耗时
+    """
+    return {
+        "schema_version": "1.0",
+        "metrics": revocation_list.get_stats()
+    }
@@ -6,6 +6,8 @@ from datetime import datetime
 from ..models.user import User
 from ..database import get_db
 from ..auth.jwt import get_current_user
+from ..services.cache_service import profile_cache
+from ..services.profile_extraction_service import invalidate_profile_caches
 from ..schemas.profile import (
     CompleteProfile, BasicInfoUpdate, DietPreferencesUpdate,
     FitnessPreferencesUpdate, HealthStatsResponse, UpdateResponse,
@@ -34,6 +36,11 @@ async def get_profile(
         CompleteProfile: 包含用户所有档案信息的响应
     """
     try:
+        # 画像在修改基础信息、饮食和健身偏好或更新头像时失效
+        cached = await profile_cache.get(current_user.id)
+        if cached is not None:
+            return CompleteProfile(**cached)
+
         # 使用显式查询获取用户的profile数据，而不是通过ORM关系
         from ..models.user import UserProfileModel
         
@@ -43,7 +50,7 @@ async def get_profile(
         user_profile = result.scalar_one_or_none()
         
         # 创建用户档案响应，明确指定各个字段的默认值
-        return CompleteProfile(
+        profile = CompleteProfile(
             schema_version="1.0",
             user_profile={
                 "id": current_user.id,
@@ -96,6 +103,8 @@ async def get_profile(
             },
             extended_attributes=user_profile.extended_attributes if user_profile else {}
         )
+        await profile_cache.set(current_user.id, profile.model_dump(mode="json"))
+        return profile
     except Exception as e:
         logging.error(f"获取用户档案失败: {str(e)}")
         logging.error(traceback.format_exc())
@@ -178,6 +187,7 @@ async def update_basic_info(
         
         current_user.updated_at = datetime.now()
         await db.commit()
+        await invalidate_profile_caches(current_user.id)
         
         return UpdateResponse(
             schema_version="1.0",
@@ -260,6 +270,7 @@ async def update_diet_preferences(
                     logging.warning(f"无法将字段 {field} 添加到extended_attributes: {str(e)}")
         
         await db.commit()
+        await invalidate_profile_caches(current_user.id)
         
         return UpdateResponse(
             schema_version="1.0",
@@ -334,6 +345,7 @@ async def update_fitness_preferences(
                     logging.warning(f"无法将字段 {field} 添加到extended_attributes: {str(e)}")
         
         await db.commit()
+        await invalidate_profile_caches(current_user.id)
         
         return UpdateResponse(
             schema_version="1.0",
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
 from typing import List, Optional
 import logging
 import uuid
@@ -8,11 +8,13 @@ from datetime import datetime
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models.recipe import RecipeModel as Recipe
 from ..models.user import User
 from ..models.rating import RatingModel as Rating
-from ..schemas.recipe import RecipeCreate, RecipeResponse, RecipeUpdate, RecipeListResponse, RatingCreate, PaginationInfo
+from ..schemas.recipe import Recipe as RecipeDetail, RecipeCreate, RecipeResponse, RecipeUpdate, RecipeListResponse, RatingCreate, PaginationInfo
+from ..services.cache_service import recipe_cache
+from ..services.recipe_search import recipe_search
 from ..auth import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -106,28 +108,46 @@ async def get_recipe(
         500: 服务器内部错误
     """
     try:
-        # 查询菜谱
-        query = select(Recipe).where(Recipe.id == recipe_id)
-        result = await db.execute(query)
-        recipe = result.scalar_one_or_none()
+        # 更新浏览次数，一条语句同时确认菜谱存在并取回新的计数
+        stmt = (
+            update(Recipe)
+            .where(Recipe.id == recipe_id)
+            .values(
+                views_count=func.coalesce(Recipe.views_count, 0) + 1,
+                updated_at=datetime.now()
+            )
+            .returning(Recipe.views_count, Recipe.updated_at)
+        )
+        counters = (await db.execute(stmt)).first()
         
-        if not recipe:
+        if counters is None:
             await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="菜谱不存在"
             )
-            
-        # 更新浏览次数
-        recipe.views_count = recipe.views_count + 1 if recipe.views_count else 1
-        recipe.updated_at = datetime.now()
         await db.commit()
-        await db.refresh(recipe)
         
-        # 构造响应
+        # 菜谱内容从缓存读取，修改、评分和删除时失效
+        recipe = await recipe_cache.get(recipe_id)
+        if recipe is None:
+            db_recipe = await db.get(Recipe, recipe_id)
+            if db_recipe is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="菜谱不存在"
+                )
+            recipe = RecipeDetail.model_validate(db_recipe).model_dump(mode="json")
+            await recipe_cache.set(recipe_id, recipe)
+        
+        # 构造响应，浏览次数和更新时间使用刚写入的值
         response_data = RecipeResponse(
             schema_version="1.0",
-            recipe=recipe
+            recipe={
+                **recipe,
+                "views_count": counters.views_count,
+                "updated_at": counters.updated_at
+            }
         )
         
         return response_data
@@ -149,51 +169,50 @@ async def search_recipes(
     cuisine_type: Optional[str] = None,
     page: int = Query(1, gt=0),
     per_page: int = Query(20, gt=0, le=100),
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor，传空字符串获取第一页"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     搜索菜谱
+
+    关键词在标题、描述、食材和菜系中检索，按相关度排序；没有关键词时按创建时间倒序。
+    返回难度和菜系的分面计数。传入 cursor 时使用游标分页，后续页不再重复计算总数和分面。
     """
     try:
-        query = select(Recipe)
-        
-        # 添加过滤条件
-        if keyword:
-            query = query.where(Recipe.title.ilike(f"%{keyword}%"))
-        if difficulty:
-            query = query.where(Recipe.difficulty == difficulty)
-        if cuisine_type:
-            query = query.where(Recipe.cuisine_type == cuisine_type)
-            
-        # 计算总数
-        subquery = query.subquery()
-        count_query = select(func.count()).select_from(subquery)
-        total = await db.scalar(count_query)
-        
-        # 分页
-        query = query.offset((page - 1) * per_page).limit(per_page)
-        result = await db.execute(query)
-        recipes = result.scalars().all()
-        
-        pagination = PaginationInfo(
-            total=total,
-            page=page,
-            per_page=per_page,
-            pages=(total + per_page - 1) // per_page
-        )
-        
-        response_data = RecipeListResponse(
-            schema_version="1.0",
-            recipes=list(recipes),
-            pagination=pagination
+        result = await recipe_search.search(
+            db,
+            keyword=keyword,
+            difficulty=difficulty,
+            cuisine_type=cuisine_type,
+            limit=per_page,
+            cursor=cursor,
+            offset=(page - 1) * per_page if cursor is None else 0,
+            with_facets=not cursor
         )
-        return response_data
-        
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         await db.rollback()
         logger.error(f"搜索菜谱失败: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="搜索菜谱失败")
 
+    total = result.get("total")
+    pagination = PaginationInfo(
+        total=total,
+        page=None if cursor is not None else page,
+        per_page=per_page,
+        pages=(total + per_page - 1) // per_page if total is not None else None,
+        next_cursor=result["next_cursor"],
+        has_more=result["has_more"]
+    )
+
+    return RecipeListResponse(
+        schema_version="1.0",
+        recipes=list(result["recipes"]),
+        pagination=pagination,
+        facets=result.get("facets")
+    )
+
 @router.post("/{recipe_id}/rate", response_model=RecipeResponse)
 async def rate_recipe(
     recipe_id: str,
@@ -261,6 +280,7 @@ async def rate_recipe(
         recipe.updated_at = datetime.now()
         
         await db.commit()
+        await recipe_cache.delete(recipe_id)
         await db.refresh(recipe)
         
         response_data = RecipeResponse(
@@ -328,6 +348,7 @@ async def update_recipe(
             
         recipe.updated_at = datetime.now()  # 使用 UTC 时间
         await db.commit()
+        await recipe_cache.delete(recipe_id)
         await db.refresh(recipe)
         
         response_data = RecipeResponse(schema_version="1.0", recipe=recipe)
@@ -389,6 +410,7 @@ async def update_recipe(
             
         recipe.updated_at = datetime.now()  # 使用 UTC 时间
         await db.commit()
+        await recipe_cache.delete(recipe_id)
         await db.refresh(recipe)
         
         response_data = RecipeResponse(
@@ -449,6 +471,7 @@ async def delete_recipe(
         # 删除菜谱
         await db.delete(recipe)
         await db.commit()
+        await recipe_cache.delete(recipe_id)
         
     except HTTPException:
         await db.rollback()
@@ -6,7 +6,7 @@ from datetime import datetime, timedelta, date
 from collections import defaultdict
 from datetime import timezone
 
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models.workout import (
     Workout as WorkoutModel, 
     WorkoutExercise as WorkoutExerciseModel,
@@ -19,13 +19,13 @@ from ..schemas.workout import (
 )
 from ..auth.jwt import get_current_user
 from ..models.user import User
-from ..services.ai_service_client import AIServiceClient
+from ..services.ai_service_client import get_ai_client
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-ai_client = AIServiceClient()
+ai_client = get_ai_client()
 
 @router.post("", response_model=WorkoutResponse, status_code=201)
 async def create_workout(
@@ -244,7 +244,7 @@ async def get_workout_stats(
     start_date: Optional[str] = Query(None, description="统计开始日期 (ISO格式: YYYY-MM-DD 或 YYYY-MM-DDTHH:MM:SSZ)"),
     end_date: Optional[str] = Query(None, description="统计结束日期 (ISO格式: YYYY-MM-DD 或 YYYY-MM-DDTHH:MM:SSZ)"),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取训练统计数据
     
@@ -85,16 +85,22 @@ class Token(BaseModel):
     access_token: str = Field(..., description="访问令牌")
     token_type: str = Field(default="bearer", description="令牌类型")
     expires_in: int = Field(..., description="令牌过期时间（秒）")
+    refresh_token: Optional[str] = Field(None, description="刷新令牌，每次刷新后旧的刷新令牌失效")
 
     class Config:
         json_schema_extra = {
             "example": {
                 "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
                 "token_type": "bearer",
-                "expires_in": 3600
+                "expires_in": 3600,
+                "refresh_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9..."
             }
         }
 
+class RefreshTokenRequest(BaseModel):
+    """刷新令牌请求模型"""
+    refresh_token: str = Field(..., description="刷新令牌")
+
 class TokenData(BaseModel):
     """令牌数据模型"""
     user_id: str = Field(..., description="用户ID")
@@ -33,10 +33,12 @@ class MessageResponse(BaseModel):
     
     Attributes:
         schema_version: schema版本号
+        id: 消息ID(可选)
         message: 消息内容
         suggestions: 建议列表(可选)
         voice_url: 语音URL(可选)
         image_url: 图片URL(可选)
+        image_variants: 图片衍生图URL(可选)，键为 "<宽度>.<格式>"
         transcribed_text: 语音转写文本(可选)
         analysis_result: 分析结果(可选)
         created_at: 创建时间(可选)
@@ -44,10 +46,12 @@ class MessageResponse(BaseModel):
         history: 历史消息列表(可选)，按时间正序排列
     """
     schema_version: str = Field(..., description="schema版本号")
+    id: Optional[str] = Field(None, description="消息ID")
     message: str = Field(..., description="消息内容")
     suggestions: Optional[List[str]] = Field(default=[], description="建议列表")
     voice_url: Optional[str] = Field(None, description="语音URL")
     image_url: Optional[str] = Field(None, description="图片URL")
+    image_variants: Optional[Dict[str, str]] = Field(None, description="图片衍生图URL，键为 \"<宽度>.<格式>\"")
     transcribed_text: Optional[str] = Field(None, description="语音转写文本")
     analysis_result: Optional[str] = Field(None, description="分析结果")
     created_at: Optional[datetime] = Field(None, description="创建时间")
@@ -58,15 +62,19 @@ class PaginationInfo(BaseModel):
     """分页信息
     
     Attributes:
-        page: 当前页码
+        page: 当前页码（游标分页时为空）
         per_page: 每页记录数
-        total: 总记录数
+        total: 总记录数（游标分页时只在请求时返回，可能是缓存的近似值）
         total_pages: 总页数
+        next_cursor: 下一页的游标（游标分页时返回，没有更多数据时为空）
+        has_more: 是否还有更多数据（游标分页时返回）
     """
-    page: int = Field(..., description="当前页码")
+    page: Optional[int] = Field(None, description="当前页码")
     per_page: int = Field(..., description="每页记录数")
-    total: int = Field(..., description="总记录数")
-    total_pages: int = Field(..., description="总页数")
+    total: Optional[int] = Field(None, description="总记录数")
+    total_pages: Optional[int] = Field(None, description="总页数")
+    next_cursor: Optional[str] = Field(None, description="下一页的游标")
+    has_more: Optional[bool] = Field(None, description="是否还有更多数据")
 
 class MessageHistory(BaseModel):
     """聊天历史
@@ -78,4 +86,41 @@ class MessageHistory(BaseModel):
     """
     schema_version: str = Field(..., description="schema版本号")
     messages: List[MessageResponse] = Field(..., description="消息列表")
-    pagination: PaginationInfo = Field(..., description="分页信息") 
\ No newline at end of file
+    pagination: PaginationInfo = Field(..., description="分页信息") 
+class ChatSearchResult(BaseModel):
+    """聊天记录检索结果
+
+    Attributes:
+        id: 消息ID
+        snippet: 命中位置附近的摘要
+        highlights: 摘要中命中片段的 [起始, 结束) 位置
+        matched_field: 命中的字段（content 或 transcribed_text）
+        is_user: 是否为用户消息
+        created_at: 创建时间
+        voice_url: 语音URL(可选)
+        image_url: 图片URL(可选)
+        score: 相关度得分，越大越相关
+    """
+    id: str = Field(..., description="消息ID")
+    snippet: str = Field(..., description="命中位置附近的摘要")
+    highlights: List[List[int]] = Field(default=[], description="摘要中命中片段的 [起始, 结束) 位置")
+    matched_field: str = Field(..., description="命中的字段")
+    is_user: bool = Field(..., description="是否为用户消息")
+    created_at: datetime = Field(..., description="创建时间")
+    voice_url: Optional[str] = Field(None, description="语音URL")
+    image_url: Optional[str] = Field(None, description="图片URL")
+    score: float = Field(..., description="相关度得分")
+
+class ChatSearchResponse(BaseModel):
+    """聊天记录检索响应
+
+    Attributes:
+        schema_version: schema版本号
+        query: 查询字符串
+        results: 检索结果
+        pagination: 分页信息（游标分页）
+    """
+    schema_version: str = Field(..., description="schema版本号")
+    query: str = Field(..., description="查询字符串")
+    results: List[ChatSearchResult] = Field(..., description="检索结果")
+    pagination: PaginationInfo = Field(..., description="分页信息")
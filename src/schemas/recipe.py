@@ -129,16 +129,24 @@ class RecipeResponse(BaseModel):
 
 class PaginationInfo(BaseModel):
     """分页信息模型"""
-    total: int = Field(..., description="总记录数")
-    page: int = Field(..., description="当前页码")
+    total: Optional[int] = Field(None, description="总记录数（游标分页的后续页不返回）")
+    page: Optional[int] = Field(None, description="当前页码（游标分页时为空）")
     per_page: int = Field(..., description="每页记录数")
-    pages: int = Field(..., description="总页数")
+    pages: Optional[int] = Field(None, description="总页数（游标分页的后续页不返回）")
+    next_cursor: Optional[str] = Field(None, description="下一页的游标，没有更多数据时为空")
+    has_more: Optional[bool] = Field(None, description="是否还有更多数据")
+
+class RecipeFacets(BaseModel):
+    """搜索结果的分面计数"""
+    difficulty: Dict[str, int] = Field(default_factory=dict, description="各难度的菜谱数")
+    cuisine_type: Dict[str, int] = Field(default_factory=dict, description="各菜系的菜谱数")
 
 class RecipeListResponse(BaseModel):
     """食谱列表响应模型"""
     schema_version: str = "1.0"
     recipes: List[Recipe]
     pagination: PaginationInfo = Field(..., description="分页信息")
+    facets: Optional[RecipeFacets] = Field(None, description="分面计数（游标分页的后续页不返回）")
 
 class RecipeSearchParams(BaseModel):
     """食谱搜索参数模型"""
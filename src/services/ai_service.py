@@ -6,12 +6,12 @@ AI服务模块
 
 from typing import Dict, List, Optional
 import logging
-from .cache_service import CacheService, CachePrefix
+from .cache_service import CachePrefix, cache_service
 from .error_service import error_handler, ErrorService, ErrorCode
 
 class AIService:
     def __init__(self):
-        self.cache_service = CacheService()
+        self.cache_service = cache_service
         self.error_service = ErrorService()
         self.logger = logging.getLogger(__name__)
 
@@ -1,21 +1,27 @@
 import httpx
 import logging
-from typing import Optional, Dict, List, Union, BinaryIO, Any, AsyncGenerator
+from typing import Optional, Dict, List, Union, BinaryIO, Any, AsyncGenerator, Tuple
 import os
 from dotenv import load_dotenv
 from gradio_client import Client, handle_file
 import json
-from PIL import Image
-import io
 import base64
-import tempfile
 import asyncio
 import time
 import random  # 添加这行导入
+import threading
+from contextlib import aclosing
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from src.models.user import UserProfileModel
+from src.services.ai_transport import AITransport
+from src.services.audio_decoder import TARGET_SAMPLE_RATE, audio_decoder
+from src.services.image_preprocessor import image_preprocessor
+from src.services.context_builder import CHAT_CONTEXT_TOKEN_BUDGET, context_builder
+from src.services.prompt_templates import PROFILE_EXTRACTION_PROMPT
+from src.services.recognition_cache import recognition_cache
+from src.services.single_flight import SingleFlight, StreamSingleFlight, make_key
 
 load_dotenv()
 
@@ -25,137 +31,138 @@ class AIServiceClient:
     负责与独立的AI服务进行通信，处理语音识别、LLM对话和图像识别请求
     """
     
-    def __init__(self):
-        """初始化AI服务客户端"""
-        # 初始化各个服务的客户端
-        self.chat_client = Client(
-            os.getenv("CHAT_SERVICE_URL", "https://gradio.infsols.com/")
-        )
-        self.voice_client = Client(
-            os.getenv("VOICE_SERVICE_URL", "https://gradio.infsols.com/")
-        )
-        self.food_client = Client(
-            os.getenv("FOOD_SERVICE_URL", "https://gradio.infsols.com/")
-        )
+    def __init__(self, transport: Optional[AITransport] = None):
+        """初始化AI服务客户端
+
+        Args:
+            transport: AI服务传输层，为空时创建独立实例；
+                应用内请通过 get_ai_client() 获取共享客户端
+        """
+        # 各个服务的地址；Gradio 客户端在首次使用时才创建，避免导入时阻塞握手
+        self.chat_service_url = os.getenv("CHAT_SERVICE_URL", "https://gradio.infsols.com/").rstrip("/")
+        self.voice_service_url = os.getenv("VOICE_SERVICE_URL", "https://gradio.infsols.com/").rstrip("/")
+        self.food_service_url = os.getenv("FOOD_SERVICE_URL", "https://gradio.infsols.com/").rstrip("/")
+        self._chat_client: Optional[Client] = None
+        self._voice_client: Optional[Client] = None
+        self._food_client: Optional[Client] = None
+        # Gradio 客户端可能在线程池中被并发创建
+        self._client_lock = threading.Lock()
+
+        # 连接池、并发限制、重试和同步调用线程池都由传输层负责
+        self.transport = transport or AITransport()
         
+        # 相同输入的并发请求只向后端发起一次
+        self._chat_flights = StreamSingleFlight("流式聊天")
+        self._vision_flights = SingleFlight("食物识别")
+
         logging.info("AI服务客户端初始化成功")
-        
-    async def process_voice(self, audio_file: Union[str, BinaryIO, bytes]) -> str:
+
+    def _get_gradio_client(self, attr: str, url: str) -> Client:
+        """线程安全地获取或创建 Gradio 客户端"""
+        client = getattr(self, attr)
+        if client is None:
+            with self._client_lock:
+                client = getattr(self, attr)
+                if client is None:
+                    client = Client(url)
+                    setattr(self, attr, client)
+        return client
+
+    @property
+    def chat_client(self) -> Client:
+        """聊天服务的 Gradio 客户端"""
+        return self._get_gradio_client("_chat_client", self.chat_service_url)
+
+    @property
+    def voice_client(self) -> Client:
+        """语音服务的 Gradio 客户端"""
+        return self._get_gradio_client("_voice_client", self.voice_service_url)
+
+    @property
+    def food_client(self) -> Client:
+        """食物识别服务的 Gradio 客户端"""
+        return self._get_gradio_client("_food_client", self.food_service_url)
+
+    def _predict_voice(self, sample_rate: int, audio_array: Any) -> Any:
+        """同步调用语音识别服务（在传输层线程池中执行）"""
+        return self.voice_client.predict(
+            audio=(sample_rate, audio_array),
+            api_name="/voice_transcribe"
+        )
+
+    async def process_voice(self, audio_file: Union[str, BinaryIO, bytes, bytearray, memoryview]) -> str:
         """处理语音文件，转写为文本
         
+        音频在内存中解码为 16kHz 单声道 int16 数组后发送给语音识别服务，
+        本地上传的语音文件直接从磁盘读取，不再通过 HTTP 回读。
+        
         参数:
-            audio_file: 音频文件路径或URL
+            audio_file: 音频数据（bytes/memoryview/文件对象）、本地上传路径
+                （/uploads/voices/...）、本地文件路径或外部URL
         返回:
             str: 识别出的文本
         """
         try:
-            # 如果是文件路径，转换为numpy格式
-            if isinstance(audio_file, str):
-                if audio_file.startswith("/uploads/voices/"):
-                    # 将相对路径转换为完整URL
-                    audio_url = f"{os.getenv('BASE_URL', 'http://localhost:8000')}{audio_file}"
-                    logging.info(f"处理语音文件URL: {audio_url}")
+            try:
+                if isinstance(audio_file, str):
+                    local_path = audio_decoder.resolve_upload_path(audio_file)
+                    if local_path is not None:
+                        logging.info(f"处理本地语音文件: {local_path}")
+                        audio_array = await audio_decoder.decode_file(local_path)
+                    elif audio_file.startswith(("http://", "https://")):
+                        logging.info(f"处理外部语音URL: {audio_file}")
+                        response = await self.transport.request("voice_download", "GET", audio_file)
+                        audio_array = await audio_decoder.decode(response.content)
+                    else:
+                        audio_array = await audio_decoder.decode_file(audio_file)
+                elif isinstance(audio_file, (bytes, bytearray, memoryview)):
+                    logging.info("处理二进制音频数据")
+                    audio_array = await audio_decoder.decode(audio_file)
+                elif hasattr(audio_file, "read"):
+                    logging.info("处理音频文件对象")
+                    audio_array = await audio_decoder.decode(audio_file.read())
                 else:
-                    audio_url = audio_file
-                    logging.info(f"处理外部语音URL: {audio_url}")
+                    raise ValueError("不支持的音频输入类型")
                 
-                try:
-                    # 将音频文件转换为numpy格式
-                    import scipy.io.wavfile
-                    import numpy as np
-                    
-                    # 下载文件到临时位置
-                    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                        if audio_url.startswith(('http://', 'https://')):
-                            # 如果是URL，下载文件
-                            with httpx.stream('GET', audio_url) as r:
-                                for chunk in r.iter_bytes():
-                                    temp_file.write(chunk)
-                        else:
-                            # 如果是本地文件路径，直接复制
-                            with open(audio_url, 'rb') as src_file:
-                                temp_file.write(src_file.read())
-                        temp_path = temp_file.name
-                    
-                    # 读取音频文件为numpy格式
-                    sample_rate, audio_array = scipy.io.wavfile.read(temp_path)
-                    logging.info(f"音频文件转换为numpy格式: 采样率={sample_rate}, 形状={audio_array.shape}")
-                    
-                    # 调用语音识别服务，传递numpy格式
-                    result = self.voice_client.predict(
-                        audio=(sample_rate, audio_array),
-                        api_name="/voice_transcribe"
-                    )
-                    logging.info(f"语音识别结果: {result}")
-                    
-                    # 清理临时文件
-                    try:
-                        os.unlink(temp_path)
-                        logging.info(f"临时文件已删除: {temp_path}")
-                    except Exception as e:
-                        logging.warning(f"临时文件删除失败: {str(e)}")
-                        
-                except Exception as e:
-                    logging.error(f"音频转换或语音识别服务调用失败: {str(e)}")
-                    raise ValueError(f"语音识别服务调用失败: {str(e)}")
-                
-                if isinstance(result, dict):
-                    if "error" in result:
-                        raise ValueError(f"语音识别失败: {result['error']}")
-                    return result.get("text", "")
-                return str(result)
+                logging.info(f"音频解码完成: 采样率={TARGET_SAMPLE_RATE}, 采样数={audio_array.shape[0]}")
                 
-            elif isinstance(audio_file, (bytes, BinaryIO)):
-                logging.info("处理二进制音频数据")
-                # 如果是字节数据或文件对象，保存为临时文件
-                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                    if isinstance(audio_file, bytes):
-                        temp_file.write(audio_file)
-                    else:
-                        temp_file.write(audio_file.read())
-                    temp_path = temp_file.name
-                    logging.info(f"临时文件保存至: {temp_path}")
-                
-                try:
-                    # 将音频文件转换为numpy格式
-                    import scipy.io.wavfile
-                    import numpy as np
-                    
-                    # 读取音频文件为numpy格式
-                    sample_rate, audio_array = scipy.io.wavfile.read(temp_path)
-                    logging.info(f"音频文件转换为numpy格式: 采样率={sample_rate}, 形状={audio_array.shape}")
-                    
-                    # 调用语音识别服务，传递numpy格式
-                    result = self.voice_client.predict(
-                        audio=(sample_rate, audio_array),
-                        api_name="/voice_transcribe"
-                    )
-                    logging.info(f"语音识别结果: {result}")
-                    
-                except Exception as e:
-                    logging.error(f"音频转换或语音识别服务调用失败: {str(e)}")
-                    raise ValueError(f"语音识别服务调用失败: {str(e)}")
-                finally:
-                    # 清理临时文件
-                    try:
-                        os.unlink(temp_path)
-                        logging.info(f"临时文件已删除: {temp_path}")
-                    except Exception as e:
-                        logging.warning(f"临时文件删除失败: {str(e)}")
-                
-                if isinstance(result, dict):
-                    if "error" in result:
-                        raise ValueError(f"语音识别失败: {result['error']}")
-                    return result.get("text", "")
-                return str(result)
+            except Exception as e:
+                logging.error(f"音频解码失败: {str(e)}")
+                raise ValueError(f"音频解码失败: {str(e)}")
             
-            else:
-                raise ValueError("不支持的音频输入类型")
+            return await self.transcribe_samples(audio_array)
                 
         except Exception as e:
             logging.error(f"语音识别失败: {str(e)}")
             raise ValueError(f"语音识别失败: {str(e)}")
             
+    async def transcribe_samples(self, audio_array: Any) -> str:
+        """转写已解码的 16kHz 单声道 int16 音频
+        
+        参数:
+            audio_array: 16kHz 单声道 int16 NumPy 数组
+        返回:
+            str: 识别出的文本
+        """
+        try:
+            # 调用语音识别服务，传递numpy格式
+            result = await self.transport.run_sync(
+                "voice_transcribe",
+                self._predict_voice,
+                TARGET_SAMPLE_RATE,
+                audio_array
+            )
+            logging.info(f"语音识别结果: {result}")
+        except Exception as e:
+            logging.error(f"语音识别服务调用失败: {str(e)}")
+            raise ValueError(f"语音识别服务调用失败: {str(e)}")
+        
+        if isinstance(result, dict):
+            if "error" in result:
+                raise ValueError(f"语音识别失败: {result['error']}")
+            return result.get("text", "")
+        return str(result)
+            
     def _build_chat_messages(
         self,
         user_profile: Dict[str, Any],
@@ -172,147 +179,11 @@ class AIServiceClient:
         Returns:
             List[Dict[str, str]]: 构建好的消息列表
         """
-        messages = []
-        
-        # 1. 添加系统提示词
-        system_prompt = """你是一名专业的营养学家、健康管理师和运动指导专家。请基于用户画像和对话内容，为用户提供全方位的健康生活指导方案。
-
-营养建议要点：
-1. 宏量营养素分配：
-   - 根据用户的BMI、体脂率和运动水平，计算每日所需的蛋白质、碳水化合物和脂肪比例
-   - 考虑用户的运动强度和时间，调整碳水化合物的补充时机
-   - 确保优质蛋白的摄入，推荐具体的蛋白质来源
-
-2. 微量营养素补充：
-   - 基于用户的健康状况和营养目标，建议所需的维生素和矿物质补充
-   - 推荐富含特定营养素的食材
-   - 注意可能的营养素相互作用
-
-3. 膳食规划：
-   - 设计符合用户口味和烹饪水平的食谱
-   - 考虑用户的饮食限制和过敏原
-   - 提供详细的食材选购指南和烹饪方法
-   - 建议适合的进餐时间和份量
-
-健康管理建议：
-1. 体重管理：
-   - 根据用户的BMI和体脂率，制定合理的体重目标
-   - 设计可持续的减重/增重计划
-   - 建议每周体重监测频率
-
-2. 健康风险评估：
-   - 分析用户现有的健康问题
-   - 评估潜在的健康风险
-   - 提供针对性的预防建议
-
-3. 生活方式指导：
-   - 作息时间建议
-   - 压力管理方法
-   - 饮水建议
-   - 建议戒除不良习惯
-
-运动指导方案：
-1. 有氧运动：
-   - 根据用户的体能水平推荐合适的有氧运动
-   - 指导心率控制范围
-   - 建议运动时长和频率
-
-2. 力量训练：
-   - 设计适合用户水平的训练计划
-   - 推荐具体的动作和组数
-   - 注意动作要领和安全事项
-
-3. 运动营养策略：
-   - 运动前后的营养补充建议
-   - 运动期间的补水方案
-   - 恢复期的营养摄入指导
-
-回复要求：
-1. 专业性：
-   - 使用准确的专业术语
-   - 提供科学依据
-   - 引用权威研究或指南（如有）
-
-2. 个性化：
-   - 充分考虑用户的个人情况和限制
-   - 根据用户的生活方式调整建议
-   - 考虑实施建议的可行性
-
-3. 安全性：
-   - 注意可能的禁忌症
-   - 提醒潜在风险
-   - 建议必要时咨询医生
-
-4. 动态调整：
-   - 根据用户反馈调整方案
-   - 设定阶段性目标
-   - 提供进展监测方法
-
-5. 输入处理：
-   - 对于图片输入：分析食物的营养价值，评估是否符合用户的健康目标
-   - 对于语音输入：确保回复简明易懂，适合口头表达
-   - 对于文字输入：提供详细的专业建议和具体的执行方案
-
-7. 非相关问题处理：
-   - 礼貌地说明你只能回答与饮食、营养、运动、健康相关的问题
-   - 不要给出任何非饮食、营养、运动、健康相关的问题的回答
-   - 引导用户询问相关领域的问题
-   - 如果问题部分相关，尽量从健康角度给出建议
-
-请确保每次回复都体现专业性、针对性和全面性，帮助用户建立健康的生活方式。如果用户询问与饮食、营养、运动、健康无关的问题，请礼貌地说明你的专业范围并建议用户寻求相关领域的专家帮助。"""
-        
-        # 检查历史消息中是否已包含系统消息
-        has_system_msg = False
-        if chat_history:
-            for msg in chat_history:
-                if msg.get("role") == "system":
-                    has_system_msg = True
-                    break
-        
-        # 只有在历史消息不包含系统消息时才添加
-        if not has_system_msg:
-            messages.append({
-                "role": "system",
-                "content": system_prompt
-            })
-        
-            # 2. 添加用户画像信息
-            if user_profile:
-                profile_str = f"""用户画像信息：
-- 性别：{user_profile.get('gender', '未知')}
-- 年龄：{user_profile.get('age', '未知')}岁
-- 身高：{user_profile.get('height', '未知')}cm
-- 体重：{user_profile.get('weight', '未知')}kg
-- BMI：{user_profile.get('bmi', '未知')}
-- 体脂率：{user_profile.get('body_fat_percentage', '未知')}%
-- 健康状况：{', '.join(user_profile.get('health_conditions', ['无']))}
-- 健康目标：{', '.join(user_profile.get('health_goals', ['无']))}
-- 饮食偏好：{', '.join(user_profile.get('food_preferences', ['无']))}
-- 饮食限制：{', '.join(user_profile.get('dietary_restrictions', ['无']))}
-- 食物过敏：{', '.join(user_profile.get('allergies', ['无']))}
-- 烹饪水平：{user_profile.get('cooking_level', '初级')}
-- 营养目标：{', '.join(user_profile.get('nutrition_goals', ['无']))}
-- 健身水平：{user_profile.get('fitness_level', '未知')}
-- 运动频率：每周{user_profile.get('exercise_frequency', '未知')}次
-- 健身目标：{', '.join(user_profile.get('fitness_goals', ['无']))}"""
-                
-                messages.append({
-                    "role": "system",
-                    "content": profile_str
-                })
+        messages = context_builder.build(user_profile, current_message, chat_history).messages
         
-        # 3. 添加历史对话记录
-        if chat_history:
-            messages.extend(chat_history)
-        
-        # 4. 添加当前用户消息
-        messages.append({
-            "role": "user",
-            "content": current_message
-        })
-        
-        # 记录最终构建的消息列表
-        logging.debug(f"构建的完整消息列表: {json.dumps(messages, ensure_ascii=False)}")
+        # 记录最终构建的消息列表（只在开启调试日志时序列化）
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(f"构建的完整消息列表: {json.dumps(messages, ensure_ascii=False)}")
         
         return messages
             
@@ -320,20 +191,43 @@ class AIServiceClient:
         self,
         messages: List[Dict[str, str]],
         model: str = "qwen2.5:14b",
-        max_tokens: int = 2000,
+        max_tokens: int = CHAT_CONTEXT_TOKEN_BUDGET,
         user_profile: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[str, None]:
         """发送流式聊天请求
         
+        消息、模型和 max_tokens 都相同的并发请求（如重复点击发送、客户端重试）
+        只向后端发起一次生成，每个调用方都会从头收到完整的文本流。
+        
         Args:
             messages: 消息历史
             model: 模型名称
-            max_tokens: 最大token数
+            max_tokens: 提示词 token 预算（后端超出预算时从最早的对话开始丢弃）
             user_profile: 用户画像信息（可选）
             
         Yields:
             str: 生成的文本片段
         """
+        normalized = [
+            {"role": msg.get("role"), "content": (msg.get("content") or "").strip()}
+            for msg in messages
+        ]
+        key = make_key(normalized, model, max_tokens)
+        async with aclosing(self._chat_flights.subscribe(
+            key,
+            lambda: self._chat_stream_upstream(messages, model, max_tokens)
+        )) as stream:
+            async for chunk in stream:
+                yield chunk
+            
+    async def _chat_stream_upstream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        user_profile: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        """向后端发起流式聊天请求，只产出新增的文本片段"""
         try:
             # 检查消息列表是否为空
             if not messages:
@@ -368,53 +262,37 @@ class AIServiceClient:
             #     chat_history=chat_history
             # )
             
-            # 记录发送给模型的消息，便于调试
-            logging.debug(f"发送给模型的完整消息: {json.dumps(full_messages, ensure_ascii=False)}")
-            
-            # 调用预测接口获取流式响应
-            result = self.chat_client.submit(
-                messages=full_messages,
-                model=model,
-                max_tokens=max_tokens,
-                api_name="/chat_stream"
-            )
-            
-            # 处理流式响应
-            current = ""
-            while True:
-                try:
-                    # 获取最新的输出
-                    outputs = result.outputs()
-                    if outputs is None:
-                        # 如果outputs为None，等待一会再试
-                        await asyncio.sleep(0.1)
+            # 记录发送给模型的消息，便于调试（只在开启调试日志时序列化）
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug(f"发送给模型的完整消息: {json.dumps(full_messages, ensure_ascii=False)}")
+            
+            # 通过 SSE 订阅流式响应，事件到达即处理，不再轮询 outputs()
+            # 后端每次返回的是累积文本，这里只产出新增的部分
+            current_length = 0
+            # 提前结束时显式关闭事件流，及时释放连接和并发名额
+            async with aclosing(self.transport.sse_events(
+                self.chat_service_url,
+                "/chat_stream",
+                [full_messages, model, max_tokens]
+            )) as events:
+                async for event, payload in events:
+                    if event == "error":
+                        raise ValueError(f"聊天服务返回错误: {payload}")
+                    if event not in ("generating", "complete") or not payload:
+                        # 心跳等其他事件直接忽略
                         continue
-                        
-                    # 确保outputs是列表且不为空
-                    if not outputs:
-                        await asyncio.sleep(0.1)
+                    
+                    outputs = json.loads(payload)
+                    if not outputs or not isinstance(outputs[-1], str):
                         continue
-                        
-                    # 获取最新的文本
+                    
                     new_text = outputs[-1]
-                    if not isinstance(new_text, str):
-                        continue
-                        
-                    # 只产出新增的部分
-                    if len(new_text) > len(current):
-                        new_part = new_text[len(current):]
-                        yield new_part
-                        current = new_text
+                    if len(new_text) > current_length:
+                        yield new_text[current_length:]
+                        current_length = len(new_text)
                     
-                    # 检查是否已完成
-                    if result.done():
+                    if event == "complete":
                         break
-                        
-                    await asyncio.sleep(0.01)
-                    
-                except Exception as e:
-                    logging.error(f"处理流式响应时发生错误: {e}")
-                    break
                     
         except Exception as e:
             logging.error(f"流式聊天请求失败: {e}")
@@ -443,46 +321,19 @@ class AIServiceClient:
             else:
                 image_bytes = image_data
             
-            # 2. 处理图片大小
-            image_size = len(image_bytes)
-            if image_size > 1024 * 1024:  # 如果大于1MB
-                image = Image.open(io.BytesIO(image_bytes))
-                max_size = 800
-                ratio = min(max_size / image.width, max_size / image.height)
-                new_size = (int(image.width * ratio), int(image.height * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                output = io.BytesIO()
-                image.save(output, format='JPEG', quality=75)
-                image_bytes = output.getvalue()
-            
-            # 3. 转换为base64
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-            
-            # 4. 调用食物识别服务
-            result = self.food_client.predict(
-                file=image_base64,
-                api_name="/food_recognition"
+            # 相同内容的图片直接返回缓存的识别结果，不再调用视觉模型
+            cache_key = await recognition_cache.key_for(image_bytes)
+            cached = await recognition_cache.get(cache_key)
+            if cached is not None:
+                logging.info(f"食物识别命中缓存: {cache_key[:16]}")
+                return cached
+            
+            # 同一张图片的并发请求（如客户端重试）共享同一次识别
+            return await self._vision_flights.do(
+                cache_key,
+                lambda: self._recognize_food_upstream(image_bytes, cache_key)
             )
             
-            if not result:
-                return {
-                    "success": False,
-                    "message": "识别服务未返回结果"
-                }
-            
-            # 5. 解析识别结果
-            if isinstance(result, str):
-                try:
-                    result = json.loads(result)
-                except json.JSONDecodeError:
-                    # 如果不是JSON格式，假设是直接的食物名称
-                    result = {"items": [{"name": result, "confidence": 1.0}]}
-            
-            return {
-                "success": True,
-                "food_items": result.get("items", [])
-            }
-            
         except Exception as e:
             logging.error(f"食物识别请求失败: {e}", exc_info=True)
             error_message = str(e)
@@ -500,10 +351,53 @@ class AIServiceClient:
                 "message": f"食物识别失败: {error_message}"
             }
             
+    async def _recognize_food_upstream(self, image_bytes: bytes, cache_key: str) -> Dict:
+        """预处理图片并调用食物识别服务，成功的结果写入缓存"""
+        # 2. 处理图片大小（大于1MB时在进程池中缩小并重新编码）
+        image_bytes = await image_preprocessor.preprocess(image_bytes)
+        
+        # 3. 转换为base64
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        
+        # 4. 调用食物识别服务
+        result = await self.transport.predict(
+            self.food_service_url,
+            "/food_recognition",
+            [image_base64]
+        )
+        
+        if not result:
+            return {
+                "success": False,
+                "message": "识别服务未返回结果"
+            }
+        
+        # 5. 解析识别结果
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except json.JSONDecodeError:
+                # 如果不是JSON格式，假设是直接的食物名称
+                result = {"items": [{"name": result, "confidence": 1.0}]}
+        
+        response = {
+            "success": True,
+            "food_items": result.get("items", [])
+        }
+        await recognition_cache.set(cache_key, response)
+        return response
+            
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        """获取请求合并的统计信息"""
+        return {
+            "chat_stream": self._chat_flights.get_stats(),
+            "food_recognition": self._vision_flights.get_stats()
+        }
+        
     async def close(self):
         """关闭客户端连接"""
-        # Gradio Client 会自动管理连接，不需要手动关闭
-        pass 
+        # Gradio Client 会自动管理连接，只需关闭传输层的连接池和线程池
+        await self.transport.aclose()
 
     async def analyze_user_message(
         self,
@@ -511,7 +405,10 @@ class AIServiceClient:
         message: str,
         db: AsyncSession
     ) -> Dict[str, Any]:
-        """分析用户消息，提取可能的用户画像更新信息"""
+        """分析用户消息，提取可能的用户画像更新信息
+
+        更新由调用者提交，提交成功后需要调用 invalidate_profile_caches 失效画像缓存
+        """
         try:
             logging.info(f"开始分析用户消息，用户ID: {user_id}")
             
@@ -531,47 +428,15 @@ class AIServiceClient:
                 await db.flush()
                 logging.info(f"已将新用户画像添加到会话并刷新，用户ID: {user_id}")
             
-            # 使用LLM分析用户消息中的信息更新
-            system_prompt = """你是一个专门用于分析用户消息并提取用户画像信息的AI助手。
-请分析用户消息中可能包含的个人信息，如身高、体重、年龄、性别、健康状况、饮食偏好、运动习惯等。
-只提取明确提及的信息，不要猜测。如果没有相关信息，返回空对象。
-返回格式必须是有效的JSON，包含以下可能的字段（只包含用户明确提及的字段）：
-{
-    "birth_date": "YYYY-MM-DD",  // 出生日期，格式为ISO日期
-    "gender": "男|女|其他",  // 性别
-    "height": 170.0,  // 身高，单位：厘米
-    "weight": 65.0,  // 体重，单位：千克
-    "body_fat_percentage": 20.0,  // 体脂率，单位：%
-    "muscle_mass": 50.0,  // 肌肉量，单位：千克
-    "health_conditions": ["高血压", "糖尿病"],  // 健康状况
-    "health_goals": ["减重", "增肌"],  // 健康目标
-    "cooking_skill_level": "初级|中级|高级",  // 烹饪技能水平
-    "favorite_cuisines": ["中餐", "日料"],  // 喜爱的菜系
-    "dietary_restrictions": ["无麸质", "素食"],  // 饮食限制
-    "allergies": ["花生", "海鲜"],  // 过敏原
-    "calorie_preference": 2000,  // 卡路里偏好，单位：卡路里
-    "nutrition_goals": {  // 营养目标
-        "protein": 150,  // 蛋白质，单位：克
-        "carbs": 200,  // 碳水化合物，单位：克
-        "fat": 60  // 脂肪，单位：克
-    },
-    "fitness_level": "初级|中级|高级",  // 健身水平
-    "exercise_frequency": 3,  // 运动频率，每周次数
-    "preferred_exercises": ["跑步", "力量训练"],  // 偏好的运动方式
-    "fitness_goals": ["增肌", "提高耐力"],  // 健身目标
-    "update_reason": "基于用户提供的信息..."  // 更新原因说明
-}
-只返回JSON对象，不要有任何其他文字说明。如果没有提取到任何信息，返回空对象 {}。"""
-
             # 构建消息列表
             messages = [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": PROFILE_EXTRACTION_PROMPT},
                 {"role": "user", "content": message}
             ]
             
             # 调用LLM分析用户消息
             full_response = ""
-            async for chunk in self.chat_stream(messages=messages, max_tokens=500):
+            async for chunk in self.chat_stream(messages=messages):
                 full_response += chunk
             
             # 尝试解析JSON响应
@@ -606,7 +471,7 @@ class AIServiceClient:
             logging.error(f"分析用户消息失败: {e}")
             return {"has_updates": False, "updates": {}}
 
-    def extract_profile_updates(self, message: str) -> Optional[Dict[str, Any]]:
+    async def extract_profile_updates(self, message: str) -> Optional[Dict[str, Any]]:
         """从用户消息中提取可能的用户画像更新信息
         
         Args:
@@ -619,54 +484,19 @@ class AIServiceClient:
             # 记录完整的用户消息以便调试
             logging.info(f"尝试从用户消息中提取用户画像更新信息: {message[:200]}...")
             
-            # 构建系统提示词，用于分析用户消息
-            system_prompt = """你是一个专门用于分析用户消息并提取用户画像信息的AI助手。
-请分析用户消息中可能包含的个人信息，如身高、体重、年龄、性别、健康状况、饮食偏好、运动习惯等。
-只提取明确提及的信息，不要猜测。如果没有相关信息，返回空对象。
-返回格式必须是有效的JSON，包含以下可能的字段（只包含用户明确提及的字段）：
-{
-    "birth_date": "YYYY-MM-DD",  // 出生日期，格式为ISO日期
-    "gender": "男|女|其他",  // 性别
-    "height": 170.0,  // 身高，单位：厘米
-    "weight": 65.0,  // 体重，单位：千克
-    "body_fat_percentage": 20.0,  // 体脂率，单位：%
-    "muscle_mass": 50.0,  // 肌肉量，单位：千克
-    "health_conditions": ["高血压", "糖尿病"],  // 健康状况
-    "health_goals": ["减重", "增肌"],  // 健康目标
-    "cooking_skill_level": "初级|中级|高级",  // 烹饪技能水平
-    "favorite_cuisines": ["中餐", "日料"],  // 喜爱的菜系
-    "dietary_restrictions": ["无麸质", "素食"],  // 饮食限制
-    "allergies": ["花生", "海鲜"],  // 过敏原
-    "calorie_preference": 2000,  // 卡路里偏好，单位：卡路里
-    "nutrition_goals": {  // 营养目标
-        "protein": 150,  // 蛋白质，单位：克
-        "carbs": 200,  // 碳水化合物，单位：克
-        "fat": 60  // 脂肪，单位：克
-    },
-    "fitness_level": "初级|中级|高级",  // 健身水平
-    "exercise_frequency": 3,  // 运动频率，每周次数
-    "preferred_exercises": ["跑步", "力量训练"],  // 偏好的运动方式
-    "fitness_goals": ["增肌", "提高耐力"],  // 健身目标
-    "update_reason": "基于用户提供的信息..."  // 更新原因说明
-}
-只返回JSON对象，不要有任何其他文字说明。如果没有提取到任何信息，返回空对象 {}。"""
-
             # 构建消息列表
             messages = [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": PROFILE_EXTRACTION_PROMPT},
                 {"role": "user", "content": message}
             ]
             
-            # 调用LLM分析用户消息
-            full_response = ""
-            for chunk in self.chat_client.predict(
-                messages=messages,
-                model="qwen2.5:14b",
-                max_tokens=500,
-                api_name="/chat"
-            ):
-                if isinstance(chunk, str):
-                    full_response += chunk
+            # 调用LLM分析用户消息（异步等待结果，不阻塞事件循环）
+            result = await self.transport.predict(
+                self.chat_service_url,
+                "/chat",
+                [messages, "qwen2.5:14b", CHAT_CONTEXT_TOKEN_BUDGET]
+            )
+            full_response = result if isinstance(result, str) else ""
             
             # 尝试解析JSON响应
             try:
@@ -702,6 +532,8 @@ class AIServiceClient:
 
     async def process_profile_updates(self, user_id: str, updates: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """处理用户画像更新
+
+        只刷新会话不提交；调用者提交成功后需要调用 invalidate_profile_caches 失效画像缓存
         
         Args:
             user_id: 用户ID
@@ -781,7 +613,6 @@ class AIServiceClient:
                     f"fields={updated_fields}, reason={update_reason}, "
                     f"当前事务状态: {db.is_active}"
                 )
-                
                 return {
                     "success": True,
                     "message": "用户画像更新完成",
@@ -805,4 +636,27 @@ class AIServiceClient:
                 "success": False,
                 "message": f"用户画像更新失败: {str(e)}",
                 "updated_fields": {}
-            }
\ No newline at end of file
+            }
+
+# 进程内共享的AI服务客户端，所有路由和后台任务复用同一个连接池
+_ai_client: Optional[AIServiceClient] = None
+
+
+def get_ai_client() -> AIServiceClient:
+    """获取进程内共享的AI服务客户端
+
+    Returns:
+        AIServiceClient: 共享的客户端实例
+    """
+    global _ai_client
+    if _ai_client is None:
+        _ai_client = AIServiceClient()
+    return _ai_client
+
+
+async def close_ai_client() -> None:
+    """关闭共享的AI服务客户端（应用关闭时调用）"""
+    global _ai_client
+    if _ai_client is not None:
+        await _ai_client.close()
+        _ai_client = None
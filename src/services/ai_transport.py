@@ -0,0 +1,340 @@
+"""
+AI服务传输层模块
+
+为所有 AI 后端调用提供共享的异步传输：连接池化的 httpx.AsyncClient、
+按接口划分的并发限制、带抖动的重试，以及执行剩余同步调用的有界线程池
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Gradio 队列 REST 接口前缀（gradio>=5 为 /gradio_api，旧版本为空字符串）
+GRADIO_API_PREFIX = os.getenv("GRADIO_API_PREFIX", "/gradio_api")
+
+# 连接池配置
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "100"))
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "20"))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# 超时配置（秒）
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "10"))
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "30"))
+# 流式响应两次事件之间允许的最长等待时间
+CHAT_STREAM_READ_TIMEOUT = float(os.getenv("CHAT_STREAM_READ_TIMEOUT", "120"))
+
+# 重试配置
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.2"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "3"))
+
+# 执行同步 predict 调用的线程池大小
+AI_SYNC_POOL_SIZE = int(os.getenv("AI_SYNC_POOL_SIZE", "8"))
+
+# 各接口的最大并发数
+ENDPOINT_CONCURRENCY: Dict[str, int] = {
+    "chat_stream": int(os.getenv("AI_CONCURRENCY_CHAT_STREAM", "64")),
+    "chat": int(os.getenv("AI_CONCURRENCY_CHAT", "16")),
+    "voice_transcribe": int(os.getenv("AI_CONCURRENCY_VOICE", "4")),
+    "food_recognition": int(os.getenv("AI_CONCURRENCY_FOOD", "8")),
+}
+DEFAULT_CONCURRENCY = int(os.getenv("AI_CONCURRENCY_DEFAULT", "16"))
+
+# 可以重试的HTTP状态码
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+# 服务端拒绝处理的状态码，请求没有被执行，任何方法都可以重试
+REJECTED_STATUS_CODES = {429}
+# 幂等的HTTP方法，超时或网关错误后重试不会重复执行
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# 连接阶段的错误，请求还没有发到服务端，任何方法都可以重试
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class AITransport:
+    """AI服务传输层
+
+    一个进程内共享一个实例，所有 AI 请求复用同一个连接池
+    """
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        max_retries: int = AI_MAX_RETRIES,
+        sync_pool_size: int = AI_SYNC_POOL_SIZE
+    ):
+        """初始化传输层
+
+        Args:
+            http_client: 外部提供的HTTP客户端（主要用于测试），为空时按需创建
+            concurrency: 各接口的并发限制，覆盖默认配置
+            max_retries: 最大重试次数
+            sync_pool_size: 同步调用线程池大小
+        """
+        self._http_client = http_client
+        self._owns_client = http_client is None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.concurrency = {**ENDPOINT_CONCURRENCY, **(concurrency or {})}
+        self.max_retries = max_retries
+        self.sync_pool_size = sync_pool_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # 各接口的统计信息
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def _endpoint_stats(self, endpoint: str) -> Dict[str, float]:
+        if endpoint not in self.stats:
+            self.stats[endpoint] = {
+                "requests": 0,
+                "in_flight": 0,
+                "retries": 0,
+                "errors": 0,
+                "wait_ms_total": 0.0
+            }
+        return self.stats[endpoint]
+
+    def _bind_loop(self) -> None:
+        """连接池和信号量都绑定在事件循环上，事件循环变化时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._semaphores = {}
+        if self._owns_client:
+            # 旧连接属于已经结束的事件循环，直接丢弃
+            self._http_client = None
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """获取共享的异步HTTP客户端"""
+        self._bind_loop()
+        if not self._owns_client:
+            return self._http_client
+
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    AI_REQUEST_TIMEOUT,
+                    connect=AI_CONNECT_TIMEOUT,
+                    read=CHAT_STREAM_READ_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=AI_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._http_client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """执行同步调用的有界线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.sync_pool_size,
+                thread_name_prefix="ai-sync"
+            )
+        return self._executor
+
+    @asynccontextmanager
+    async def limit(self, endpoint: str):
+        """按接口限制并发数
+
+        Args:
+            endpoint: 接口名称，如 "chat_stream"
+        """
+        self._bind_loop()
+        endpoint = endpoint.lstrip("/")
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency.get(endpoint, DEFAULT_CONCURRENCY))
+            self._semaphores[endpoint] = semaphore
+
+        stats = self._endpoint_stats(endpoint)
+        started = time.perf_counter()
+        async with semaphore:
+            stats["wait_ms_total"] += (time.perf_counter() - started) * 1000
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            try:
+                yield
+            except Exception:
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+
+    def _retry_delay(self, attempt: int) -> float:
+        """指数退避加全抖动"""
+        return random.uniform(0, min(AI_RETRY_MAX_DELAY, AI_RETRY_BASE_DELAY * (2 ** attempt)))
+
+    async def request(
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        **kwargs
+    ) -> httpx.Response:
+        """发送请求，对可以安全重试的失败进行带抖动的重试
+
+        连接阶段的错误和 429 对任何方法都重试；读取超时和 502/503/504 只对幂等请求重试。
+        POST /call/<api> 会在 Gradio 队列中提交任务，服务端可能已经接受了请求，
+        这时重试会重复提交一个 GPU 任务，在后端过载时进一步加重负载。
+
+        Args:
+            endpoint: 接口名称（用于统计）
+            method: HTTP方法
+            url: 请求地址
+            idempotent: 请求是否幂等，为空时按 HTTP 方法判断
+            **kwargs: 传给 httpx 的其他参数
+
+        Returns:
+            httpx.Response: 响应对象
+        """
+        client = self.get_http_client()
+        stats = self._endpoint_stats(endpoint.lstrip("/"))
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = await client.request(method, url, **kwargs)
+                retryable = response.status_code in (
+                    RETRYABLE_STATUS_CODES if idempotent else REJECTED_STATUS_CODES
+                )
+                if not retryable or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                logger.warning(f"AI服务返回 {response.status_code}，准备重试: {url}")
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, CONNECT_ERRORS)):
+                    raise
+                logger.warning(f"AI服务请求失败，准备重试: {url}, 错误: {str(e)}")
+            stats["retries"] += 1
+            await asyncio.sleep(self._retry_delay(attempt))
+            attempt += 1
+
+    async def sse_events(
+        self,
+        base_url: str,
+        api_name: str,
+        data: List[Any]
+    ) -> AsyncGenerator[Tuple[Optional[str], str], None]:
+        """通过 Gradio 队列 REST 接口提交任务并逐个产出 SSE 事件
+
+        先 POST /call/<api_name> 获取 event_id，再以流的方式读取
+        GET /call/<api_name>/<event_id>，每收到一个完整事件就立即产出。
+
+        Args:
+            base_url: 服务地址
+            api_name: 接口名称，如 "/chat_stream"
+            data: 接口的位置参数列表
+
+        Yields:
+            Tuple[Optional[str], str]: (事件类型, 事件数据的原始JSON字符串)
+        """
+        endpoint = api_name.lstrip("/")
+        call_url = f"{base_url}{GRADIO_API_PREFIX}/call/{endpoint}"
+
+        async with self.limit(endpoint):
+            response = await self.request(endpoint, "POST", call_url, json={"data": data})
+            event_id = response.json()["event_id"]
+
+            client = self.get_http_client()
+            async with client.stream("GET", f"{call_url}/{event_id}") as stream:
+                stream.raise_for_status()
+                event: Optional[str] = None
+                data_lines: List[str] = []
+                async for line in stream.aiter_lines():
+                    if not line:
+                        # 空行表示一个事件结束
+                        if event is not None or data_lines:
+                            yield event, "\n".join(data_lines)
+                        event, data_lines = None, []
+                    elif line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[5:].lstrip())
+                if event is not None or data_lines:
+                    yield event, "\n".join(data_lines)
+
+    async def predict(self, base_url: str, api_name: str, data: List[Any]) -> Any:
+        """调用 Gradio 接口并等待最终结果（非阻塞）
+
+        Args:
+            base_url: 服务地址
+            api_name: 接口名称
+            data: 接口的位置参数列表
+
+        Returns:
+            Any: 接口的第一个输出值
+        """
+        result = None
+        async with aclosing(self.sse_events(base_url, api_name, data)) as events:
+            async for event, payload in events:
+                if event == "error":
+                    raise ValueError(f"AI服务返回错误: {payload}")
+                if event == "complete":
+                    outputs = json.loads(payload) if payload else None
+                    result = outputs[0] if outputs else None
+                    break
+        return result
+
+    async def run_sync(self, endpoint: str, func: Callable, *args, **kwargs) -> Any:
+        """在有界线程池中执行同步调用（如 gradio_client 的 predict）
+
+        Args:
+            endpoint: 接口名称（用于并发限制和统计）
+            func: 同步函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            Any: 函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        async with self.limit(endpoint):
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(func, *args, **kwargs)
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取传输层统计信息"""
+        endpoints = {}
+        for endpoint, stats in self.stats.items():
+            requests = stats["requests"]
+            endpoints[endpoint] = {
+                "limit": self.concurrency.get(endpoint, DEFAULT_CONCURRENCY),
+                "in_flight": stats["in_flight"],
+                "requests": requests,
+                "retries": stats["retries"],
+                "errors": stats["errors"],
+                "avg_wait_ms": round(stats["wait_ms_total"] / requests, 2) if requests else 0.0
+            }
+        return {
+            "max_connections": AI_HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": AI_HTTP_MAX_KEEPALIVE,
+            "sync_pool_size": self.sync_pool_size,
+            "endpoints": endpoints
+        }
+
+    async def aclose(self) -> None:
+        """关闭连接池和线程池"""
+        if self._owns_client and self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,261 @@
+"""
+音频解码服务模块
+
+在内存中把上传的音频（wav/mp3/m4a/aac/ogg）解码为语音识别服务需要的
+16kHz 单声道 int16 NumPy 数组，不写临时文件，也不通过 HTTP 回读本地上传文件。
+CPU 密集的解码和重采样在进程池中执行，避免阻塞事件循环。
+"""
+
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import gcd
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 语音识别服务需要的采样率
+TARGET_SAMPLE_RATE = 16000
+
+# 解码进程池大小
+AUDIO_DECODE_WORKERS = int(os.getenv("AUDIO_DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 小于该大小的 wav 直接在当前进程解码，进程间传输的开销比解码本身更大
+AUDIO_DECODE_INLINE_BYTES = int(os.getenv("AUDIO_DECODE_INLINE_BYTES", str(256 * 1024)))
+
+# 上传目录及语音文件的访问路径前缀
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+VOICE_URL_PREFIX = "/uploads/voices/"
+
+AudioBytes = Union[bytes, bytearray, memoryview]
+
+
+def sniff_audio_format(data: AudioBytes) -> str:
+    """根据文件头判断音频格式
+
+    Args:
+        data: 音频数据
+
+    Returns:
+        str: wav / mp3 / ogg / m4a / aac / flac，无法识别时返回 unknown
+    """
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "m4a"
+    if head[:3] == b"ID3":
+        return "mp3"
+    if len(head) >= 2 and head[0] == 0xFF:
+        # ADTS (AAC) 的同步字为 0xFFF，且 layer 固定为 0；其余视为 MPEG 音频帧
+        if head[1] & 0xF6 == 0xF0:
+            return "aac"
+        if head[1] & 0xE0 == 0xE0:
+            return "mp3"
+    return "unknown"
+
+
+def _decode_wav(data: AudioBytes) -> Tuple[int, np.ndarray]:
+    """解码 wav 数据"""
+    import scipy.io.wavfile
+
+    sample_rate, samples = scipy.io.wavfile.read(io.BytesIO(data))
+    return sample_rate, samples
+
+
+def _decode_compressed(data: AudioBytes, fmt: str) -> Tuple[int, np.ndarray]:
+    """解码压缩音频，优先使用 PyAV（支持全部格式），其次使用 soundfile"""
+    try:
+        import av
+    except ImportError:
+        av = None
+
+    if av is not None:
+        chunks = []
+        sample_rate = TARGET_SAMPLE_RATE
+        with av.open(io.BytesIO(data)) as container:
+            stream = container.streams.audio[0]
+            # 由 FFmpeg 直接重采样为 16kHz 单声道 s16，省去后续处理
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=TARGET_SAMPLE_RATE)
+            for frame in container.decode(stream):
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().reshape(-1))
+        if not chunks:
+            return sample_rate, np.zeros(0, dtype=np.int16)
+        return sample_rate, np.concatenate(chunks)
+
+    try:
+        import soundfile
+    except ImportError:
+        raise ValueError(f"解码 {fmt} 音频需要安装 av 或 soundfile")
+
+    samples, sample_rate = soundfile.read(io.BytesIO(data), dtype="float32")
+    return sample_rate, samples
+
+
+def _to_mono_float(samples: np.ndarray) -> np.ndarray:
+    """转换为 [-1, 1] 区间的单声道 float32"""
+    if samples.dtype == np.uint8:
+        samples = (samples.astype(np.float32) - 128.0) / 128.0
+    elif np.issubdtype(samples.dtype, np.integer):
+        samples = samples.astype(np.float32) / float(np.iinfo(samples.dtype).max + 1)
+    else:
+        samples = samples.astype(np.float32, copy=False)
+
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    return samples
+
+
+def resample(samples: np.ndarray, orig_rate: int, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """多相滤波重采样（向量化实现）
+
+    Args:
+        samples: 单声道 float32 采样
+        orig_rate: 原始采样率
+        target_rate: 目标采样率
+
+    Returns:
+        np.ndarray: 重采样后的 float32 采样
+    """
+    if orig_rate == target_rate or samples.size == 0:
+        return samples
+    from scipy.signal import resample_poly
+
+    divisor = gcd(orig_rate, target_rate)
+    return resample_poly(samples, target_rate // divisor, orig_rate // divisor).astype(np.float32, copy=False)
+
+
+def decode_audio(data: AudioBytes) -> np.ndarray:
+    """把音频数据解码为 16kHz 单声道 int16 数组
+
+    该函数是模块级函数，可以直接提交到进程池执行。
+
+    Args:
+        data: 音频数据
+
+    Returns:
+        np.ndarray: 16kHz 单声道 int16 采样
+    """
+    fmt = sniff_audio_format(data)
+    if fmt == "wav":
+        sample_rate, samples = _decode_wav(data)
+    elif fmt == "unknown":
+        raise ValueError("无法识别的音频格式")
+    else:
+        sample_rate, samples = _decode_compressed(data, fmt)
+
+    if samples.dtype == np.int16 and samples.ndim == 1 and sample_rate == TARGET_SAMPLE_RATE:
+        # 已经是目标格式，无需转换
+        return samples
+
+    samples = resample(_to_mono_float(samples), sample_rate)
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+
+def decode_audio_file(path: Union[str, Path]) -> np.ndarray:
+    """从磁盘读取并解码音频文件（在工作进程中读取，避免在进程间传输原始数据）"""
+    with open(path, "rb") as f:
+        return decode_audio(f.read())
+
+
+class AudioDecoder:
+    """音频解码器
+
+    管理解码进程池，并提供异步的解码接口
+    """
+
+    def __init__(
+        self,
+        workers: int = AUDIO_DECODE_WORKERS,
+        inline_bytes: int = AUDIO_DECODE_INLINE_BYTES,
+        upload_dir: Path = UPLOAD_DIR
+    ):
+        """初始化音频解码器
+
+        Args:
+            workers: 解码进程数，为 0 时在线程池中解码
+            inline_bytes: 小于该大小的 wav 直接在当前进程解码
+            upload_dir: 上传文件根目录
+        """
+        self.workers = workers
+        self.inline_bytes = inline_bytes
+        self.upload_dir = Path(upload_dir)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> Optional[ProcessPoolExecutor]:
+        """解码进程池，首次使用时创建"""
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def resolve_upload_path(self, url: str) -> Optional[Path]:
+        """把 /uploads/voices/... 访问路径映射为本地文件路径
+
+        Args:
+            url: 语音文件的访问路径
+
+        Returns:
+            Optional[Path]: 本地文件路径，不是本地上传文件时返回 None
+        """
+        if not url.startswith(VOICE_URL_PREFIX):
+            return None
+        voice_dir = (self.upload_dir / "voices").resolve()
+        path = (voice_dir / url[len(VOICE_URL_PREFIX):]).resolve()
+        if voice_dir not in path.parents:
+            raise ValueError(f"非法的语音文件路径: {url}")
+        return path
+
+    async def decode(self, data: AudioBytes) -> np.ndarray:
+        """异步解码内存中的音频数据
+
+        Args:
+            data: 音频数据
+
+        Returns:
+            np.ndarray: 16kHz 单声道 int16 采样
+        """
+        if not data:
+            raise ValueError("音频数据为空")
+        if len(data) <= self.inline_bytes and sniff_audio_format(data) == "wav":
+            return decode_audio(data)
+
+        loop = asyncio.get_running_loop()
+        # memoryview 无法序列化到子进程，这里转换为 bytes
+        payload = bytes(data) if isinstance(data, memoryview) else data
+        return await loop.run_in_executor(self.executor, decode_audio, payload)
+
+    async def decode_file(self, path: Union[str, Path]) -> np.ndarray:
+        """异步解码本地音频文件
+
+        Args:
+            path: 本地文件路径
+
+        Returns:
+            np.ndarray: 16kHz 单声道 int16 采样
+        """
+        if not os.path.isfile(path):
+            raise ValueError(f"语音文件不存在: {path}")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, decode_audio_file, str(path))
+
+    def shutdown(self) -> None:
+        """关闭解码进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 创建服务实例
+audio_decoder = AudioDecoder()
@@ -1,567 +1,816 @@
 """
 缓存服务模块
 
-提供统一的缓存管理功能，支持多种缓存策略和自动过期
+统一的异步缓存：进程内 L1（LRU + TTL）加可选的 Redis L2（redis.asyncio 连接池）
+- L1 按条目大小计入字节预算，过期时间由时间轮清理，读写均摊 O(1)
+- 键按命名空间划分：<前缀>:<命名空间>:<键>，每个命名空间单独统计命中率
+- 序列化可插拔（JSON / pickle），只在写入 Redis 时序列化，L1 保存原始对象
+- 批量读写和计数器使用 pipeline，一次往返
+- 配置了 Redis 时 L1 只保留很短时间，避免多进程之间读到过期数据；
+  Redis 不可用时自动降级为只用 L1，一段时间后重试
 """
 
-from typing import Any, Dict, Optional, List, Union
-from datetime import datetime, timedelta
-import logging
-from enum import Enum
-from collections import OrderedDict
-import sys
+import asyncio
 import json
-import redis
+import logging
+import os
 import pickle
-from functools import wraps
+import sys
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from ..config.settings import settings
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Redis 地址，为空时只使用进程内缓存
+REDIS_URL = os.getenv("REDIS_URL", settings.REDIS_URL)
+# Redis 连接池大小
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+# Redis 读写超时（秒），缓存慢于数据库时没有意义
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+# Redis 出错后多久再重试（秒）
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "30"))
+# 缓存键前缀，多个应用共用一个 Redis 时区分
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "food_journey")
+# 默认过期时间（秒）
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_TTL", str(settings.CACHE_TTL)))
+# 进程内缓存的最大条目数
+CACHE_L1_MAX_ITEMS = int(os.getenv("CACHE_L1_MAX_ITEMS", "10000"))
+# 进程内缓存的最大字节数（按条目估算大小累加）
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(64 * 1024 * 1024)))
+# 配置了 Redis 时进程内缓存的过期时间（秒）
+CACHE_L1_TTL = float(os.getenv("CACHE_L1_TTL", "5"))
+# 菜谱详情和用户画像的缓存时间（秒）
+RECIPE_CACHE_TTL = int(os.getenv("RECIPE_CACHE_TTL", "600"))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "600"))
+
+_MISSING = object()
+
 
 class CachePrefix(Enum):
-    """缓存键前缀"""
+    """缓存命名空间"""
     USER_PROFILE = "user_profile"
     RECIPE = "recipe"
     RATING = "rating"
     AI_RESPONSE = "ai_response"
+    LOGIN_ATTEMPTS = "login_attempts"
+
+
+class JSONSerializer:
+    """JSON 序列化（默认，Redis 中的数据可以直接查看）"""
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class PickleSerializer:
+    """pickle 序列化（可以保存任意 Python 对象，只能用于可信数据）"""
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """估算对象占用的内存（字节）
+
+    只在写入时计算一次：容器递归累加元素大小，超过 4 层的嵌套按浅层大小计算
+    """
+    size = sys.getsizeof(value)
+    if _depth >= 4:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
+
+
+class _Entry:
+    """L1 缓存条目"""
+
+    __slots__ = ("value", "size", "expires_at", "tick")
+
+    def __init__(self, value: Any, size: int, expires_at: Optional[float], tick: Optional[int]):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tick = tick
 
-class CacheStrategy(Enum):
-    """缓存策略"""
-    MEMORY = "memory"      # 简单内存缓存
-    LRU = "lru"           # LRU缓存
-    REDIS = "redis"       # Redis缓存
-    MULTI = "multi"       # 多级缓存
 
 class LRUCache:
-    """LRU缓存实现"""
-    
-    def __init__(self, capacity: int):
-        """初始化LRU缓存
-        
+    """进程内 LRU 缓存，按条目数和字节数限制容量
+
+    - 每个条目写入时估算一次大小，总字节数超过预算时按 LRU 顺序淘汰
+    - 过期时间登记在按秒分桶的时间轮中，每次读写只清理已经到期的桶，
+      过期条目不会一直占用预算；没到整秒的过期在读取时检查
+    所有操作均摊 O(1)
+    """
+
+    def __init__(
+        self,
+        max_items: int = CACHE_L1_MAX_ITEMS,
+        max_bytes: int = CACHE_L1_MAX_BYTES,
+        tick_seconds: float = 1.0
+    ):
+        """初始化
+
         Args:
-            capacity: 缓存容量（项数）
+            max_items: 最大条目数
+            max_bytes: 最大字节数
+            tick_seconds: 时间轮每个桶的时间跨度（秒）
         """
-        self.capacity = capacity
-        self.cache = OrderedDict()
-    
-    def get(self, key: str) -> Optional[Dict]:
-        """获取缓存项
-        
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.tick_seconds = tick_seconds
+        self.bytes = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._wheel: Dict[int, set] = {}
+        self._swept_tick = int(time.monotonic() // tick_seconds)
+        self.stats = {"evictions": 0, "expirations": 0, "rejected": 0}
+
+    def _tick(self, expires_at: float) -> int:
+        # 向上取整：桶 t 里的条目都在 t 之前过期，扫到 t 时可以整桶删除
+        return -int(-expires_at // self.tick_seconds)
+
+    def _remove(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.bytes -= entry.size
+        if entry.tick is not None:
+            bucket = self._wheel.get(entry.tick)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._wheel[entry.tick]
+        return entry
+
+    def _expire_due(self, now: float) -> None:
+        """删除到期桶中的条目"""
+        now_tick = int(now // self.tick_seconds)
+        if now_tick <= self._swept_tick:
+            return
+        if now_tick - self._swept_tick > len(self._wheel):
+            # 长时间没有访问时桶比经过的刻度少，直接遍历桶
+            ticks = sorted(tick for tick in self._wheel if tick <= now_tick)
+        else:
+            ticks = range(self._swept_tick + 1, now_tick + 1)
+        for tick in ticks:
+            for key in self._wheel.pop(tick, ()):
+                entry = self._entries.pop(key)
+                self.bytes -= entry.size
+                self.stats["expirations"] += 1
+        self._swept_tick = now_tick
+
+    def _live(self, key: str) -> Optional[_Entry]:
+        now = time.monotonic()
+        self._expire_due(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= now:
+            self._remove(key)
+            self.stats["expirations"] += 1
+            return None
+        return entry
+
+    def get(self, key: str) -> Any:
+        """获取缓存值，不存在或已过期时返回 _MISSING"""
+        entry = self._live(key)
+        if entry is None:
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        size: Optional[int] = None
+    ) -> bool:
+        """设置缓存值
+
         Args:
             key: 缓存键
-            
+            value: 缓存值
+            ttl: 过期时间（秒），为空时不过期
+            size: 条目大小（字节），为空时估算
+
         Returns:
-            Optional[Dict]: 缓存的值
+            bool: 是否写入（单个条目超过字节预算时不写入）
         """
-        if key not in self.cache:
-            return None
-        
-        # 移动到最新
-        value = self.cache.pop(key)
-        self.cache[key] = value
+        now = time.monotonic()
+        self._expire_due(now)
+        self._remove(key)
+        if size is None:
+            size = estimate_size(value)
+        size += sys.getsizeof(key)
+        if size > self.max_bytes:
+            self.stats["rejected"] += 1
+            return False
+
+        expires_at = now + ttl if ttl else None
+        tick = None
+        if expires_at is not None:
+            tick = self._tick(expires_at)
+            self._wheel.setdefault(tick, set()).add(key)
+        self._entries[key] = _Entry(value, size, expires_at, tick)
+        self.bytes += size
+
+        while len(self._entries) > self.max_items or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        """删除缓存值"""
+        return self._remove(key) is not None
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """计数器加 amount，ttl 不为空时重新设置过期时间"""
+        entry = self._live(key)
+        value = (int(entry.value) if entry else 0) + amount
+        if ttl is None and entry is not None:
+            remaining = entry.expires_at - time.monotonic() if entry.expires_at is not None else None
+            self.set(key, value, remaining)
+        else:
+            self.set(key, value, ttl)
         return value
-    
-    def put(self, key: str, value: Dict):
-        """添加缓存项
-        
+
+    def expire(self, key: str, ttl: float) -> bool:
+        """设置过期时间"""
+        entry = self._live(key)
+        if entry is None:
+            return False
+        self.set(key, entry.value, ttl, size=entry.size - sys.getsizeof(key))
+        return True
+
+    def ttl(self, key: str) -> int:
+        """剩余过期时间（秒），与 Redis 一致：不存在返回 -2，没有过期时间返回 -1"""
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        if entry.expires_at is None:
+            return -1
+        return max(0, int(entry.expires_at - time.monotonic()))
+
+    def clear_prefix(self, prefix: str) -> int:
+        """删除指定前缀的所有条目"""
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheNamespace:
+    """一个命名空间的缓存接口
+
+    配置了 Redis 时以 Redis 为准，L1 只作为短时间的本地副本；
+    l1=False 的命名空间（如登录失败计数）需要多进程共享，不使用本地副本
+    """
+
+    def __init__(
+        self,
+        service: "CacheService",
+        name: str,
+        ttl: Optional[int] = CACHE_DEFAULT_TTL,
+        l1: bool = True,
+        l1_ttl: float = CACHE_L1_TTL,
+        serializer: Any = None
+    ):
+        """初始化
+
+        Args:
+            service: 缓存服务
+            name: 命名空间名称
+            ttl: 默认过期时间（秒），为空时不过期
+            l1: 是否使用进程内缓存
+            l1_ttl: 配置了 Redis 时进程内缓存的过期时间（秒）
+            serializer: 序列化器，默认使用服务的序列化器
+        """
+        self.service = service
+        self.name = name
+        self.default_ttl = ttl
+        self.l1 = l1
+        self.l1_ttl = l1_ttl
+        self.serializer = serializer or service.serializer
+        self._prefix = f"{service.key_prefix}:{name}:"
+        self._flights = SingleFlight(f"缓存加载({name})")
+        self.stats = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "deletes": 0,
+            "errors": 0,
+        }
+
+    def key(self, key: str) -> str:
+        """完整的缓存键"""
+        return f"{self._prefix}{key}"
+
+    def _local_ttl(self, ttl: Optional[float]) -> Optional[float]:
+        if not self.service.redis_enabled:
+            return ttl
+        return min(ttl, self.l1_ttl) if ttl else self.l1_ttl
+
+    def _use_l1(self) -> bool:
+        # 不使用本地副本的命名空间在 Redis 不可用时仍然降级到 L1
+        return self.l1 or not self.service.redis_available()
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """获取缓存值
+
+        返回 L1 中保存的对象本身，调用方不要修改
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值
+
+        Returns:
+            Any: 缓存值
+        """
+        full_key = self.key(key)
+        if self._use_l1():
+            value = self.service.l1.get(full_key)
+            if value is not _MISSING:
+                self.stats["l1_hits"] += 1
+                return value
+
+        client = self.service.redis_client()
+        if client is not None:
+            try:
+                data = await client.get(full_key)
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+            else:
+                if data is not None:
+                    value = self.serializer.loads(data)
+                    self.stats["l2_hits"] += 1
+                    if self.l1:
+                        # 已经有序列化后的长度，不用再估算对象大小
+                        self.service.l1.set(full_key, value, self._local_ttl(self.default_ttl), size=len(data))
+                    return value
+
+        self.stats["misses"] += 1
+        return default
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """设置缓存值
+
         Args:
             key: 缓存键
             value: 缓存值
+            ttl: 过期时间（秒），为空时使用命名空间的默认值
+
+        Returns:
+            bool: 是否写入了 Redis 或本地缓存
         """
-        if key in self.cache:
-            self.cache.pop(key)
-        elif len(self.cache) >= self.capacity:
-            self.cache.popitem(last=False)
-        self.cache[key] = value
-
-class RedisCache:
-    """Redis缓存实现"""
-    
-    def __init__(
-        self,
-        host: str = "localhost",
-        port: int = 6379,
-        db: int = 0,
-        password: Optional[str] = None
-    ):
-        """初始化Redis缓存
-        
+        ttl = ttl or self.default_ttl
+        full_key = self.key(key)
+        self.stats["sets"] += 1
+        stored = False
+        client = self.service.redis_client()
+        if client is not None:
+            try:
+                await client.set(full_key, self.serializer.dumps(value), ex=ttl)
+                stored = True
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+        if self._use_l1():
+            stored = self.service.l1.set(full_key, value, self._local_ttl(ttl)) or stored
+        return stored
+
+    async def delete(self, *keys: str) -> None:
+        """删除缓存值
+
         Args:
-            host: Redis主机
-            port: Redis端口
-            db: 数据库编号
-            password: 密码
+            *keys: 缓存键
         """
-        self.redis = None
-        self.host = host
-        self.port = port
-        self.db = db
-        self.password = password
-    
-    async def init(self):
-        """初始化Redis连接"""
-        self.redis = redis.Redis(
-            host=self.host,
-            port=self.port,
-            db=self.db,
-            password=self.password,
-            decode_responses=False
-        )
-    
-    async def get(self, key: str) -> Optional[Dict]:
-        """获取缓存项"""
-        if not self.redis:
+        full_keys = [self.key(key) for key in keys]
+        self.stats["deletes"] += len(full_keys)
+        for full_key in full_keys:
+            self.service.l1.delete(full_key)
+        client = self.service.redis_client()
+        if client is not None and full_keys:
+            try:
+                await client.delete(*full_keys)
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """批量获取缓存值（Redis 一次 MGET）
+
+        Args:
+            keys: 缓存键
+
+        Returns:
+            Dict[str, Any]: 命中的键值对
+        """
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        use_l1 = self._use_l1()
+        for key in keys:
+            value = self.service.l1.get(self.key(key)) if use_l1 else _MISSING
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                self.stats["l1_hits"] += 1
+                found[key] = value
+
+        client = self.service.redis_client()
+        if client is not None and missing:
+            try:
+                values = await client.mget([self.key(key) for key in missing])
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+            else:
+                for key, data in zip(missing, values):
+                    if data is None:
+                        continue
+                    value = self.serializer.loads(data)
+                    found[key] = value
+                    self.stats["l2_hits"] += 1
+                    if self.l1:
+                        self.service.l1.set(
+                            self.key(key), value, self._local_ttl(self.default_ttl), size=len(data)
+                        )
+
+        self.stats["misses"] += sum(1 for key in missing if key not in found)
+        return found
+
+    async def set_many(self, mapping: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """批量设置缓存值（Redis 一次 pipeline）
+
+        Args:
+            mapping: 键值对
+            ttl: 过期时间（秒）
+        """
+        ttl = ttl or self.default_ttl
+        self.stats["sets"] += len(mapping)
+        client = self.service.redis_client()
+        if client is not None and mapping:
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    for key, value in mapping.items():
+                        pipe.set(self.key(key), self.serializer.dumps(value), ex=ttl)
+                    await pipe.execute()
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+        if self._use_l1():
+            for key, value in mapping.items():
+                self.service.l1.set(self.key(key), value, self._local_ttl(ttl))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[int] = None) -> int:
+        """计数器加 amount（Redis 中 INCRBY 和 EXPIRE 在同一个事务中执行）
+
+        计数器不在 L1 中保留副本，Redis 不可用时降级为进程内计数
+
+        Args:
+            key: 缓存键
+            amount: 增加量
+            ttl: 过期时间（秒），为空时保留原来的过期时间
+
+        Returns:
+            int: 增加后的值
+        """
+        full_key = self.key(key)
+        client = self.service.redis_client()
+        if client is not None:
+            try:
+                async with client.pipeline(transaction=True) as pipe:
+                    pipe.incrby(full_key, amount)
+                    if ttl:
+                        pipe.expire(full_key, ttl)
+                    results = await pipe.execute()
+                self.service.l1.delete(full_key)
+                return int(results[0])
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+        return self.service.l1.incr(full_key, amount, ttl)
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        """设置过期时间
+
+        Args:
+            key: 缓存键
+            ttl: 过期时间（秒）
+
+        Returns:
+            bool: 键是否存在
+        """
+        full_key = self.key(key)
+        client = self.service.redis_client()
+        if client is not None:
+            try:
+                return bool(await client.expire(full_key, ttl))
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+        return self.service.l1.expire(full_key, ttl)
+
+    async def ttl(self, key: str) -> int:
+        """剩余过期时间（秒），不存在返回 -2，没有过期时间返回 -1"""
+        full_key = self.key(key)
+        client = self.service.redis_client()
+        if client is not None:
+            try:
+                return int(await client.ttl(full_key))
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+        return self.service.l1.ttl(full_key)
+
+    async def get_with_ttl(self, key: str) -> Tuple[Any, int]:
+        """获取缓存值和剩余过期时间（Redis 一次 pipeline）
+
+        Returns:
+            Tuple[Any, int]: 缓存值（不存在时为 None）和剩余过期时间（秒）
+        """
+        full_key = self.key(key)
+        client = self.service.redis_client()
+        if client is not None:
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.get(full_key)
+                    pipe.ttl(full_key)
+                    data, ttl = await pipe.execute()
+                return (self.serializer.loads(data) if data is not None else None), int(ttl)
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+        value = self.service.l1.get(full_key)
+        return (None if value is _MISSING else value), self.service.l1.ttl(full_key)
+
+    async def run_script(self, script: str, key: str, *args: Any) -> Any:
+        """在 Redis 中原子执行 Lua 脚本，KEYS[1] 为该键的完整缓存键
+
+        Redis 未配置或暂时不可用时返回 None，由调用方降级为进程内实现
+
+        Args:
+            script: Lua 脚本
+            key: 缓存键
+            *args: 脚本参数（ARGV）
+
+        Returns:
+            Any: 脚本返回值
+        """
+        client = self.service.redis_client()
+        if client is None:
             return None
-        
         try:
-            data = self.redis.get(key)
-            return pickle.loads(data) if data else None
-        except Exception:
+            return await self.service.script(script)(keys=[self.key(key)], args=list(args))
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self._redis_error(e)
             return None
-    
-    async def set(
+
+    async def get_or_set(
         self,
         key: str,
-        value: Dict,
-        expire: Optional[int] = None
-    ):
-        """设置缓存项"""
-        if not self.redis:
-            return
-        
-        try:
-            data = pickle.dumps(value)
-            if expire:
-                self.redis.setex(key, expire, data)
-            else:
-                self.redis.set(key, data)
-        except Exception:
-            pass
-    
-    async def delete(self, key: str):
-        """删除缓存项"""
-        if self.redis:
-            self.redis.delete(key)
-    
-    async def clear(self, pattern: str = "*"):
-        """清除缓存"""
-        if self.redis:
-            keys = self.redis.keys(pattern)
-            if keys:
-                self.redis.delete(*keys)
-    
-    async def close(self):
-        """关闭Redis连接"""
-        if self.redis:
-            self.redis.close()
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None
+    ) -> Any:
+        """获取缓存值，未命中时调用 loader 加载并写入缓存
+
+        同一个键的并发未命中只调用一次 loader；loader 返回 None 时不缓存
 
-class MultiLevelCache:
-    """多级缓存实现"""
-    
-    def __init__(
-        self,
-        memory_cache: Union[dict, LRUCache],
-        redis_cache: RedisCache
-    ):
-        """初始化多级缓存
-        
         Args:
-            memory_cache: 内存缓存
-            redis_cache: Redis缓存
+            key: 缓存键
+            loader: 加载函数
+            ttl: 过期时间（秒）
+
+        Returns:
+            Any: 缓存值或加载结果
         """
-        self.memory_cache = memory_cache
-        self.redis_cache = redis_cache
-    
-    async def get(self, key: str) -> Optional[Dict]:
-        """获取缓存项"""
-        # 先从内存缓存获取
-        if isinstance(self.memory_cache, LRUCache):
-            value = self.memory_cache.get(key)
-        else:
-            value = self.memory_cache.get(key)
-        
-        if value:
-            return value.get("data")
-        
-        # 从Redis获取
-        value = await self.redis_cache.get(key)
-        if value:
-            # 更新内存缓存
-            cache_data = {
-                "data": value,
-                "expiry": None,
-                "created_at": datetime.now()
-            }
-            if isinstance(self.memory_cache, LRUCache):
-                self.memory_cache.put(key, cache_data)
-            else:
-                self.memory_cache[key] = cache_data
-        
-        return value
-    
-    async def set(
-        self,
-        key: str,
-        value: Dict,
-        expire: Optional[int] = None
-    ):
-        """设置缓存项"""
-        # 更新内存缓存
-        expiry = (
-            datetime.now() + timedelta(seconds=expire)
-            if expire else None
-        )
-        cache_data = {
-            "data": value,
-            "expiry": expiry,
-            "created_at": datetime.now()
+        value = await self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        async def load() -> Any:
+            loaded = await loader()
+            if loaded is not None:
+                await self.set(key, loaded, ttl)
+            return loaded
+
+        return await self._flights.do(key, load)
+
+    async def clear(self) -> None:
+        """清空命名空间"""
+        self.service.l1.clear_prefix(self._prefix)
+        client = self.service.redis_client()
+        if client is not None:
+            try:
+                keys = [key async for key in client.scan_iter(match=f"{self._prefix}*", count=500)]
+                if keys:
+                    await client.delete(*keys)
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                self._redis_error(e)
+
+    def _redis_error(self, error: BaseException) -> None:
+        self.stats["errors"] += 1
+        self.service.mark_redis_down(error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        lookups = self.stats["l1_hits"] + self.stats["l2_hits"] + self.stats["misses"]
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "ttl": self.default_ttl,
+            "l1": self.l1,
         }
-        
-        if isinstance(self.memory_cache, LRUCache):
-            self.memory_cache.put(key, cache_data)
-        else:
-            self.memory_cache[key] = cache_data
-        
-        # 更新Redis缓存
-        await self.redis_cache.set(key, value, expire)
-    
-    async def delete(self, key: str):
-        """删除缓存项"""
-        # 删除内存缓存
-        if isinstance(self.memory_cache, LRUCache):
-            if key in self.memory_cache.cache:
-                self.memory_cache.cache.pop(key)
-        else:
-            if key in self.memory_cache:
-                del self.memory_cache[key]
-        
-        # 删除Redis缓存
-        await self.redis_cache.delete(key)
+
 
 class CacheService:
     """缓存服务类"""
-    
+
     def __init__(
         self,
-        strategy: CacheStrategy = CacheStrategy.MULTI,
-        capacity: int = 1000,
-        max_memory_mb: int = 100,
-        redis_host: str = "localhost",
-        redis_port: int = 6379,
-        redis_db: int = 0,
-        redis_password: Optional[str] = None
+        redis_url: Optional[str] = REDIS_URL,
+        key_prefix: str = CACHE_KEY_PREFIX,
+        l1_max_items: int = CACHE_L1_MAX_ITEMS,
+        l1_max_bytes: int = CACHE_L1_MAX_BYTES,
+        serializer: Any = None,
+        client: Any = None
     ):
         """初始化缓存服务
-        
+
         Args:
-            strategy: 缓存策略
-            capacity: 缓存容量（项数）
-            max_memory_mb: 最大内存使用量（MB）
-            redis_host: Redis主机
-            redis_port: Redis端口
-            redis_db: Redis数据库编号
-            redis_password: Redis密码
+            redis_url: Redis 地址，为空时只使用进程内缓存
+            key_prefix: 缓存键前缀
+            l1_max_items: 进程内缓存的最大条目数
+            l1_max_bytes: 进程内缓存的最大字节数
+            serializer: 默认序列化器
+            client: 已创建的 redis.asyncio 客户端（测试时注入）
         """
-        self.strategy = strategy
-        self.max_memory = max_memory_mb * 1024 * 1024
-        self.logger = logging.getLogger(__name__)
-        
-        # 初始化缓存
-        if strategy == CacheStrategy.LRU:
-            self.cache = LRUCache(capacity)
-        elif strategy == CacheStrategy.REDIS:
-            self.cache = RedisCache(
-                redis_host,
-                redis_port,
-                redis_db,
-                redis_password
-            )
-        elif strategy == CacheStrategy.MULTI:
-            memory_cache = LRUCache(capacity)
-            redis_cache = RedisCache(
-                redis_host,
-                redis_port,
-                redis_db,
-                redis_password
+        self.redis_url = redis_url or None
+        self.key_prefix = key_prefix
+        self.serializer = serializer or JSONSerializer()
+        self.l1 = LRUCache(l1_max_items, l1_max_bytes)
+        self._client = client
+        self._down_until = 0.0
+        self._namespaces: Dict[str, CacheNamespace] = {}
+        self._scripts: Dict[str, Any] = {}
+        self.stats = {"redis_errors": 0, "redis_down": 0}
+
+    @property
+    def redis_enabled(self) -> bool:
+        """是否配置了 Redis"""
+        return self.redis_url is not None or self._client is not None
+
+    def redis_available(self) -> bool:
+        """Redis 当前是否可用（出错后的重试间隔内视为不可用）"""
+        return self.redis_enabled and time.monotonic() >= self._down_until
+
+    def redis_client(self) -> Optional[Any]:
+        """获取 Redis 客户端，未配置或暂时不可用时返回 None"""
+        if not self.redis_available():
+            return None
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                self.redis_url,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                health_check_interval=30
             )
-            self.cache = MultiLevelCache(memory_cache, redis_cache)
-        else:
-            self.cache = {}
-        
-        # 缓存统计
-        self.stats = {
-            "hits": 0,
-            "misses": 0,
-            "evictions": 0
-        }
-    
-    async def init(self):
-        """初始化缓存服务"""
-        if isinstance(self.cache, RedisCache):
-            await self.cache.init()
-        elif isinstance(self.cache, MultiLevelCache):
-            await self.cache.redis_cache.init()
-    
-    def _build_key(self, prefix: CachePrefix, key: str) -> str:
-        """构建缓存键"""
-        return f"{prefix.value}:{key}"
-    
-    def _check_memory_usage(self) -> bool:
-        """检查内存使用量"""
-        try:
-            if isinstance(self.cache, (RedisCache, MultiLevelCache)):
-                return True
-            
-            cache_size = sys.getsizeof(json.dumps(self.cache))
-            return cache_size <= self.max_memory
-        except Exception as e:
-            self.logger.error(f"检查内存使用量失败: {str(e)}")
-            return True
-    
-    async def _evict_expired(self) -> List[str]:
-        """清除过期的缓存项"""
-        now = datetime.now()
-        evicted_keys = []
-        
-        if isinstance(self.cache, LRUCache):
-            cache_items = list(self.cache.cache.items())
-        elif isinstance(self.cache, dict):
-            cache_items = list(self.cache.items())
-        else:
-            return []
-        
-        for key, value in cache_items:
-            if (
-                "expiry" in value and 
-                value["expiry"] and 
-                now > value["expiry"]
-            ):
-                prefix = CachePrefix(key.split(":")[0])
-                await self.delete(prefix, key.split(":")[1])
-                evicted_keys.append(key)
-                self.stats["evictions"] += 1
-        
-        return evicted_keys
-    
-    async def get(
+        return self._client
+
+    def script(self, lua: str) -> Any:
+        """注册 Lua 脚本（EVALSHA 执行，服务端没有缓存时自动回退到 EVAL）"""
+        script = self._scripts.get(lua)
+        if script is None:
+            script = self.redis_client().register_script(lua)
+            self._scripts[lua] = script
+        return script
+
+    def mark_redis_down(self, error: BaseException) -> None:
+        """Redis 出错后暂停使用一段时间，期间降级为进程内缓存"""
+        self.stats["redis_errors"] += 1
+        if time.monotonic() >= self._down_until:
+            self.stats["redis_down"] += 1
+            logger.warning(f"Redis 不可用，{REDIS_RETRY_SECONDS:.0f} 秒内使用进程内缓存: {str(error)}")
+        self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def namespace(
         self,
-        prefix: CachePrefix,
-        key: str
-    ) -> Optional[Dict]:
+        name: Union[str, CachePrefix],
+        ttl: Optional[int] = CACHE_DEFAULT_TTL,
+        l1: bool = True,
+        l1_ttl: float = CACHE_L1_TTL,
+        serializer: Any = None
+    ) -> CacheNamespace:
+        """获取命名空间（同名的命名空间只创建一次，参数以第一次为准）
+
+        Args:
+            name: 命名空间名称
+            ttl: 默认过期时间（秒）
+            l1: 是否使用进程内缓存
+            l1_ttl: 配置了 Redis 时进程内缓存的过期时间（秒）
+            serializer: 序列化器
+
+        Returns:
+            CacheNamespace: 命名空间
+        """
+        if isinstance(name, CachePrefix):
+            name = name.value
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            namespace = CacheNamespace(self, name, ttl=ttl, l1=l1, l1_ttl=l1_ttl, serializer=serializer)
+            self._namespaces[name] = namespace
+        return namespace
+
+    async def get(self, prefix: Union[str, CachePrefix], key: str, default: Any = None) -> Any:
         """获取缓存值"""
-        try:
-            cache_key = self._build_key(prefix, key)
-            
-            if isinstance(self.cache, (RedisCache, MultiLevelCache)):
-                cached_data = await self.cache.get(cache_key)
-            elif isinstance(self.cache, LRUCache):
-                cached_data = self.cache.get(cache_key)
-            else:
-                cached_data = self.cache.get(cache_key)
-            
-            if not cached_data:
-                self.stats["misses"] += 1
-                return None
-            
-            # 检查是否过期
-            if isinstance(cached_data, dict) and "expiry" in cached_data:
-                if (
-                    cached_data["expiry"] and 
-                    datetime.now() > cached_data["expiry"]
-                ):
-                    await self.delete(prefix, key)
-                    self.stats["evictions"] += 1
-                    return None
-                cached_data = cached_data.get("data")
-            
-            self.stats["hits"] += 1
-            return cached_data
-            
-        except Exception as e:
-            self.logger.error(f"获取缓存失败: {str(e)}")
-            return None
-    
+        return await self.namespace(prefix).get(key, default)
+
     async def set(
         self,
-        prefix: CachePrefix,
+        prefix: Union[str, CachePrefix],
         key: str,
-        value: Dict,
+        value: Any,
         expire_in: Optional[int] = None
     ) -> bool:
         """设置缓存值"""
-        try:
-            # 检查内存使用量
-            if not self._check_memory_usage():
-                # 尝试清理过期项
-                await self._evict_expired()
-                # 再次检查
-                if not self._check_memory_usage():
-                    self.logger.warning("缓存内存使用量超过限制")
-                    return False
-            
-            cache_key = self._build_key(prefix, key)
-            
-            if isinstance(self.cache, (RedisCache, MultiLevelCache)):
-                await self.cache.set(cache_key, value, expire_in)
-            else:
-                # 计算过期时间
-                expiry = (
-                    datetime.now() + timedelta(seconds=expire_in)
-                    if expire_in else None
-                )
-                
-                # 存储数据
-                cache_data = {
-                    "data": value,
-                    "expiry": expiry,
-                    "created_at": datetime.now()
-                }
-                
-                if isinstance(self.cache, LRUCache):
-                    self.cache.put(cache_key, cache_data)
-                else:
-                    self.cache[cache_key] = cache_data
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"设置缓存失败: {str(e)}")
-            return False
-    
-    async def delete(self, prefix: CachePrefix, key: str) -> bool:
+        return await self.namespace(prefix).set(key, value, expire_in)
+
+    async def delete(self, prefix: Union[str, CachePrefix], key: str) -> bool:
         """删除缓存"""
-        try:
-            cache_key = self._build_key(prefix, key)
-            
-            if isinstance(self.cache, (RedisCache, MultiLevelCache)):
-                await self.cache.delete(cache_key)
-            elif isinstance(self.cache, LRUCache):
-                if cache_key in self.cache.cache:
-                    self.cache.cache.pop(cache_key)
-            else:
-                if cache_key in self.cache:
-                    del self.cache[cache_key]
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"删除缓存失败: {str(e)}")
+        await self.namespace(prefix).delete(key)
+        return True
+
+    async def clear(self, prefix: Optional[Union[str, CachePrefix]] = None) -> bool:
+        """清除一个命名空间，prefix 为空时清除所有命名空间"""
+        namespaces = [self.namespace(prefix)] if prefix else list(self._namespaces.values())
+        for namespace in namespaces:
+            await namespace.clear()
+        return True
+
+    async def ping(self) -> bool:
+        """检查 Redis 是否可用"""
+        client = self.redis_client()
+        if client is None:
             return False
-    
-    async def clear(self, prefix: Optional[CachePrefix] = None) -> bool:
-        """清除缓存"""
         try:
-            if isinstance(self.cache, RedisCache):
-                pattern = f"{prefix.value}:*" if prefix else "*"
-                await self.cache.clear(pattern)
-            elif isinstance(self.cache, MultiLevelCache):
-                pattern = f"{prefix.value}:*" if prefix else "*"
-                await self.cache.redis_cache.clear(pattern)
-                # 清除内存缓存
-                if isinstance(self.cache.memory_cache, LRUCache):
-                    self.cache.memory_cache.cache.clear()
-                else:
-                    self.cache.memory_cache.clear()
-            else:
-                if prefix:
-                    # 清除指定前缀的缓存
-                    prefix_str = f"{prefix.value}:"
-                    if isinstance(self.cache, LRUCache):
-                        keys = [
-                            k for k in self.cache.cache.keys()
-                            if k.startswith(prefix_str)
-                        ]
-                        for k in keys:
-                            self.cache.cache.pop(k)
-                    else:
-                        keys = [
-                            k for k in self.cache.keys()
-                            if k.startswith(prefix_str)
-                        ]
-                        for k in keys:
-                            del self.cache[k]
-                else:
-                    # 清除所有缓存
-                    if isinstance(self.cache, LRUCache):
-                        self.cache.cache.clear()
-                    else:
-                        self.cache.clear()
-                    self.stats = {"hits": 0, "misses": 0, "evictions": 0}
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"清除缓存失败: {str(e)}")
+            return bool(await client.ping())
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self.mark_redis_down(e)
             return False
-    
+
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        try:
-            if isinstance(self.cache, RedisCache):
-                # Redis缓存统计
-                return {
-                    "strategy": self.strategy.value,
-                    "hits": self.stats["hits"],
-                    "misses": self.stats["misses"],
-                    "evictions": self.stats["evictions"]
-                }
-            elif isinstance(self.cache, MultiLevelCache):
-                # 多级缓存统计
-                memory_size = (
-                    len(self.cache.memory_cache.cache)
-                    if isinstance(self.cache.memory_cache, LRUCache)
-                    else len(self.cache.memory_cache)
-                )
-                return {
-                    "strategy": self.strategy.value,
-                    "hits": self.stats["hits"],
-                    "misses": self.stats["misses"],
-                    "evictions": self.stats["evictions"],
-                    "memory_items": memory_size
-                }
-            else:
-                # 内存缓存统计
-                if isinstance(self.cache, LRUCache):
-                    total_items = len(self.cache.cache)
-                    cache_items = self.cache.cache
-                else:
-                    total_items = len(self.cache)
-                    cache_items = self.cache
-                
-                expired_items = sum(
-                    1 for item in cache_items.values()
-                    if item.get("expiry") and datetime.now() > item["expiry"]
-                )
-                
-                # 按前缀统计
-                prefix_stats = {}
-                for key in cache_items:
-                    prefix = key.split(":")[0]
-                    prefix_stats[prefix] = prefix_stats.get(prefix, 0) + 1
-                
-                # 计算命中率
-                total_requests = self.stats["hits"] + self.stats["misses"]
-                hit_rate = (
-                    self.stats["hits"] / total_requests * 100 
-                    if total_requests > 0 else 0
-                )
-                
-                return {
-                    "total_items": total_items,
-                    "expired_items": expired_items,
-                    "prefix_stats": prefix_stats,
-                    "strategy": self.strategy.value,
-                    "hits": self.stats["hits"],
-                    "misses": self.stats["misses"],
-                    "evictions": self.stats["evictions"],
-                    "hit_rate": f"{hit_rate:.2f}%",
-                    "memory_usage": sys.getsizeof(json.dumps(cache_items))
-                }
-            
-        except Exception as e:
-            self.logger.error(f"获取缓存统计失败: {str(e)}")
-            return {}
-    
+        return {
+            "redis": {
+                "enabled": self.redis_enabled,
+                "available": self.redis_available(),
+                **self.stats,
+            },
+            "l1": {
+                "items": len(self.l1),
+                "max_items": self.l1.max_items,
+                "bytes": self.l1.bytes,
+                "max_bytes": self.l1.max_bytes,
+                **self.l1.stats,
+            },
+            "namespaces": {
+                name: namespace.get_stats()
+                for name, namespace in self._namespaces.items()
+            },
+        }
+
     async def close(self):
         """关闭缓存服务"""
-        if isinstance(self.cache, RedisCache):
-            await self.cache.close()
-        elif isinstance(self.cache, MultiLevelCache):
-            await self.cache.redis_cache.close() 
\ No newline at end of file
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except Exception as e:
+                logger.error(f"关闭 Redis 连接失败: {str(e)}")
+            self._client = None
+            self._scripts.clear()
+
+
+# 创建服务实例
+cache_service = CacheService()
+
+# 菜谱详情（不含浏览次数）
+recipe_cache = cache_service.namespace(CachePrefix.RECIPE, ttl=RECIPE_CACHE_TTL)
+# 用户完整画像
+profile_cache = cache_service.namespace(CachePrefix.USER_PROFILE, ttl=PROFILE_CACHE_TTL)
@@ -0,0 +1,191 @@
+"""
+聊天上下文缓存模块
+
+在进程内按用户缓存最近的聊天消息和用户画像快照，聊天热路径不再查询数据库：
+- 最近消息保存在固定长度的环形缓冲区中，首次访问时从数据库加载
+- 新消息写入数据库的同时追加到缓冲区（write-through）
+- 用户画像更新后失效画像快照，下次访问时重新加载
+- 用户数量有上限，超出时按 LRU 淘汰最久未访问的用户
+"""
+
+import logging
+import os
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 缓存的最大用户数
+CHAT_CONTEXT_CACHE_USERS = int(os.getenv("CHAT_CONTEXT_CACHE_USERS", "10000"))
+# 每个用户缓存的最近消息条数
+CHAT_CONTEXT_CACHE_MESSAGES = int(os.getenv("CHAT_CONTEXT_CACHE_MESSAGES", "20"))
+
+# 消息快照保留的字段
+MESSAGE_FIELDS = ("id", "content", "is_user", "created_at", "voice_url", "image_url", "transcribed_text")
+
+MessageLoader = Callable[[int], Awaitable[List[Dict[str, Any]]]]
+ProfileLoader = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def snapshot_message(message: Any) -> Dict[str, Any]:
+    """把聊天消息对象转换为与数据库会话无关的快照
+
+    Args:
+        message: 聊天消息模型对象
+
+    Returns:
+        Dict[str, Any]: 消息快照
+    """
+    return {field: getattr(message, field) for field in MESSAGE_FIELDS}
+
+
+class _UserContext:
+    """某个用户的缓存内容"""
+
+    __slots__ = ("messages", "pending", "messages_loaded", "profile", "profile_version")
+
+    def __init__(self, ring_size: int):
+        self.messages: Deque[Dict[str, Any]] = deque(maxlen=ring_size)
+        # 缓冲区加载完成前写入的消息，加载时可能还没有提交到数据库，加载完成后合并
+        self.pending: Deque[Dict[str, Any]] = deque(maxlen=ring_size)
+        self.messages_loaded = False
+        self.profile: Optional[Dict[str, Any]] = None
+        # 画像失效时递增，用于丢弃加载期间已经过时的画像
+        self.profile_version = 0
+
+
+class ChatContextCache:
+    """按用户缓存最近消息和用户画像"""
+
+    def __init__(
+        self,
+        max_users: int = CHAT_CONTEXT_CACHE_USERS,
+        ring_size: int = CHAT_CONTEXT_CACHE_MESSAGES
+    ):
+        """初始化
+
+        Args:
+            max_users: 最大用户数
+            ring_size: 每个用户缓存的最近消息条数
+        """
+        self.max_users = max_users
+        self.ring_size = ring_size
+        self._users: "OrderedDict[str, _UserContext]" = OrderedDict()
+        self.stats = {
+            "message_hits": 0,
+            "message_misses": 0,
+            "profile_hits": 0,
+            "profile_misses": 0,
+            "evictions": 0,
+        }
+
+    def _entry(self, user_id: str) -> _UserContext:
+        """获取（必要时创建）用户的缓存条目，并标记为最近使用"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = _UserContext(self.ring_size)
+            self._users[user_id] = entry
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.stats["evictions"] += 1
+        else:
+            self._users.move_to_end(user_id)
+        return entry
+
+    async def recent_messages(self, user_id: str, limit: int, load: MessageLoader) -> List[Dict[str, Any]]:
+        """获取用户最近的消息（按时间正序）
+
+        Args:
+            user_id: 用户ID
+            limit: 消息条数
+            load: 从数据库加载最近 N 条消息快照（按时间正序）的函数
+
+        Returns:
+            List[Dict[str, Any]]: 消息快照列表
+        """
+        if limit > self.ring_size:
+            # 超出缓冲区长度的请求直接查询数据库
+            self.stats["message_misses"] += 1
+            return await load(limit)
+
+        entry = self._entry(user_id)
+        if entry.messages_loaded:
+            self.stats["message_hits"] += 1
+        else:
+            self.stats["message_misses"] += 1
+            messages = await load(self.ring_size)
+            if self._users.get(user_id) is not entry:
+                # 加载期间缓存被失效或淘汰，本次结果不再缓存
+                return messages[-limit:] if limit else []
+            if not entry.messages_loaded:
+                loaded_ids = {msg["id"] for msg in messages}
+                merged = messages + [msg for msg in entry.pending if msg["id"] not in loaded_ids]
+                merged.sort(key=lambda msg: msg["created_at"])
+                entry.messages.extend(merged)
+                entry.pending.clear()
+                entry.messages_loaded = True
+
+        if not limit:
+            return []
+        return list(entry.messages)[-limit:]
+
+    def append_message(self, user_id: str, message: Any) -> None:
+        """追加新写入的消息
+
+        缓冲区还没有加载时先暂存，加载完成后与数据库中的消息合并
+
+        Args:
+            user_id: 用户ID
+            message: 聊天消息模型对象
+        """
+        entry = self._entry(user_id)
+        if entry.messages_loaded:
+            entry.messages.append(snapshot_message(message))
+        else:
+            entry.pending.append(snapshot_message(message))
+
+    async def profile(self, user_id: str, load: ProfileLoader) -> Dict[str, Any]:
+        """获取用户画像快照
+
+        Args:
+            user_id: 用户ID
+            load: 从数据库加载用户画像的函数
+
+        Returns:
+            Dict[str, Any]: 用户画像（调用方不应修改）
+        """
+        entry = self._entry(user_id)
+        if entry.profile is not None:
+            self.stats["profile_hits"] += 1
+            return entry.profile
+
+        self.stats["profile_misses"] += 1
+        version = entry.profile_version
+        profile = await load()
+        if entry.profile_version == version and self._users.get(user_id) is entry:
+            entry.profile = profile
+        return profile
+
+    def invalidate_profile(self, user_id: str) -> None:
+        """用户画像更新后失效画像快照"""
+        entry = self._users.get(user_id)
+        if entry is not None:
+            entry.profile_version += 1
+            entry.profile = None
+
+    def invalidate(self, user_id: str) -> None:
+        """删除用户的全部缓存（如事务回滚、删除用户后）"""
+        self._users.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "users": len(self._users),
+            "max_users": self.max_users,
+            "ring_size": self.ring_size,
+            **self.stats,
+        }
+
+
+# 创建服务实例
+chat_context_cache = ChatContextCache()
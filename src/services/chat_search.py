@@ -0,0 +1,415 @@
+"""
+聊天记录全文检索模块
+
+在数据库中为聊天消息的 content 和 transcribed_text 建立倒排索引：
+- SQLite 使用 FTS5 虚拟表，PostgreSQL 使用 tsvector + GIN 索引
+- 中文按相邻两个字（bigram）切分，英文和数字按单词切分，在写入索引前完成分词，
+  不依赖数据库的中文分词插件
+- 消息插入、修改、删除时通过 ORM 事件在同一个事务中增量更新索引
+- 查询结果按相关度或时间排序，使用游标分页，并返回带高亮位置的摘要
+"""
+
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import DDL, DateTime, event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.chat import ChatMessageModel
+from .pagination import decode_token, encode_token
+
+logger = logging.getLogger(__name__)
+
+# 摘要的长度（字符）
+CHAT_SEARCH_SNIPPET_CHARS = int(os.getenv("CHAT_SEARCH_SNIPPET_CHARS", "60"))
+# 查询中最多使用的词条数，避免超长查询拖慢检索
+CHAT_SEARCH_MAX_TERMS = int(os.getenv("CHAT_SEARCH_MAX_TERMS", "16"))
+
+SQLITE_TABLE = "chat_messages_fts"
+POSTGRES_TABLE = "chat_messages_search"
+
+# 中文连续片段和英文/数字单词
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+_KEY_PATTERN = re.compile(r"[^a-z0-9]")
+
+SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+    "body, user_key, message_key, message_id UNINDEXED, tokenize = 'unicode61')"
+)
+POSTGRES_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+    "message_id VARCHAR(36) PRIMARY KEY REFERENCES chat_messages(id) ON DELETE CASCADE, "
+    "user_id VARCHAR(36) NOT NULL, "
+    "document TSVECTOR NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS ix_{POSTGRES_TABLE}_document ON {POSTGRES_TABLE} USING GIN (document)",
+    f"CREATE INDEX IF NOT EXISTS ix_{POSTGRES_TABLE}_user_id ON {POSTGRES_TABLE} (user_id)",
+)
+
+
+def _is_cjk(char: str) -> bool:
+    return char >= "\u3400"
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """把文本切分为索引词条
+
+    中文片段切分为相邻两字的 bigram，片段的最后一个字单独作为一个词条，
+    这样单字查询可以用前缀匹配找到任意位置的字
+
+    Args:
+        value: 原文本
+
+    Returns:
+        List[str]: 词条列表
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_PATTERN.findall((value or "").lower()):
+        if _is_cjk(run[0]) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def index_document(content: Optional[str], transcribed_text: Optional[str]) -> str:
+    """生成写入索引的文档（空格分隔的词条）"""
+    tokens = tokenize(content)
+    if transcribed_text and transcribed_text != content:
+        tokens.extend(tokenize(transcribed_text))
+    return " ".join(tokens)
+
+
+def _key(prefix: str, value: str) -> str:
+    """把 ID 转换为只包含字母和数字的索引词条"""
+    return prefix + _KEY_PATTERN.sub("", str(value).lower())
+
+
+def parse_query(query: str) -> List[Tuple[str, List[str]]]:
+    """把查询字符串解析为检索条件
+
+    Returns:
+        List[Tuple[str, List[str]]]: ("phrase", bigram 列表) 或 ("prefix", [词条])，条件之间为 AND
+    """
+    terms: List[Tuple[str, List[str]]] = []
+    for run in _TOKEN_PATTERN.findall(query.lower())[:CHAT_SEARCH_MAX_TERMS]:
+        if _is_cjk(run[0]) and len(run) > 1:
+            # 连续的 bigram 组成短语，等价于子串匹配
+            terms.append(("phrase", [run[i:i + 2] for i in range(len(run) - 1)]))
+        else:
+            # 单字和英文单词按前缀匹配，输入到一半也能搜到
+            terms.append(("prefix", [run]))
+    return terms
+
+
+def highlight_terms(query: str) -> List[str]:
+    """查询中需要在摘要里高亮的原始片段"""
+    return _TOKEN_PATTERN.findall(query.lower())[:CHAT_SEARCH_MAX_TERMS]
+
+
+def build_fts5_query(terms: List[Tuple[str, List[str]]], user_id: str) -> str:
+    """生成 FTS5 的 MATCH 表达式"""
+    parts = [f'user_key : "{_key("u", user_id)}"']
+    for kind, tokens in terms:
+        if kind == "phrase":
+            parts.append(f'body : "{" ".join(tokens)}"')
+        else:
+            parts.append(f'body : "{tokens[0]}"*')
+    return " AND ".join(parts)
+
+
+def build_tsquery(terms: List[Tuple[str, List[str]]]) -> str:
+    """生成 PostgreSQL 的 to_tsquery 表达式"""
+    parts = []
+    for kind, tokens in terms:
+        if kind == "phrase":
+            parts.append("(" + " <-> ".join(tokens) + ")" if len(tokens) > 1 else tokens[0])
+        else:
+            parts.append(f"{tokens[0]}:*")
+    return " & ".join(parts)
+
+
+def make_snippet(value: str, terms: List[str], width: int = CHAT_SEARCH_SNIPPET_CHARS) -> Tuple[str, List[List[int]]]:
+    """截取命中位置附近的摘要
+
+    Args:
+        value: 原文本
+        terms: 需要高亮的片段
+        width: 摘要长度
+
+    Returns:
+        Tuple[str, List[List[int]]]: 摘要文本，以及摘要中每个命中片段的 [起始, 结束) 位置
+    """
+    lowered = value.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [pos for pos in positions if pos >= 0]
+    first = min(positions) if positions else 0
+
+    start = max(0, min(first - width // 3, len(value) - width))
+    end = min(len(value), start + width)
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(value) else ""
+    snippet = prefix + value[start:end] + suffix
+
+    highlights: List[List[int]] = []
+    window = lowered[start:end]
+    for term in terms:
+        pos = window.find(term)
+        while pos >= 0:
+            highlights.append([pos + len(prefix), pos + len(prefix) + len(term)])
+            pos = window.find(term, pos + len(term))
+    highlights.sort()
+    return snippet, highlights
+
+
+def _dialect(connection: Any) -> str:
+    return connection.dialect.name
+
+
+def index_message(connection: Any, message: Any) -> None:
+    """把一条消息写入索引（在 ORM 刷新时的同一个事务中执行）"""
+    document = index_document(message.content, message.transcribed_text)
+    dialect = _dialect(connection)
+    if dialect == "sqlite":
+        connection.execute(
+            text(
+                f"INSERT INTO {SQLITE_TABLE} (body, user_key, message_key, message_id) "
+                "VALUES (:body, :user_key, :message_key, :message_id)"
+            ),
+            {
+                "body": document,
+                "user_key": _key("u", message.user_id),
+                "message_key": _key("m", message.id),
+                "message_id": message.id,
+            },
+        )
+    elif dialect == "postgresql":
+        connection.execute(
+            text(
+                f"INSERT INTO {POSTGRES_TABLE} (message_id, user_id, document) "
+                "VALUES (:message_id, :user_id, to_tsvector('simple', :document)) "
+                "ON CONFLICT (message_id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            {"message_id": message.id, "user_id": message.user_id, "document": document},
+        )
+
+
+def unindex_message(connection: Any, message_id: str) -> None:
+    """从索引中删除一条消息"""
+    dialect = _dialect(connection)
+    if dialect == "sqlite":
+        # message_id 列不建索引，先通过 message_key 词条定位到 rowid
+        connection.execute(
+            text(
+                f"DELETE FROM {SQLITE_TABLE} WHERE rowid IN ("
+                f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH :match "
+                "AND message_id = :message_id)"
+            ),
+            {"match": f'message_key : "{_key("m", message_id)}"', "message_id": message_id},
+        )
+    elif dialect == "postgresql":
+        connection.execute(
+            text(f"DELETE FROM {POSTGRES_TABLE} WHERE message_id = :message_id"),
+            {"message_id": message_id},
+        )
+
+
+@event.listens_for(ChatMessageModel, "after_insert")
+def _index_after_insert(mapper, connection, target) -> None:
+    index_message(connection, target)
+
+
+@event.listens_for(ChatMessageModel, "after_update")
+def _index_after_update(mapper, connection, target) -> None:
+    state = inspect(target)
+    if state.attrs.content.history.has_changes() or state.attrs.transcribed_text.history.has_changes():
+        unindex_message(connection, target.id)
+        index_message(connection, target)
+
+
+@event.listens_for(ChatMessageModel, "after_delete")
+def _index_after_delete(mapper, connection, target) -> None:
+    unindex_message(connection, target.id)
+
+
+# 随 chat_messages 表一起创建和删除索引表
+event.listen(ChatMessageModel.__table__, "after_create", DDL(SQLITE_DDL).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_DDL:
+    event.listen(ChatMessageModel.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(
+    ChatMessageModel.__table__, "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {SQLITE_TABLE}").execute_if(dialect="sqlite")
+)
+event.listen(
+    ChatMessageModel.__table__, "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}").execute_if(dialect="postgresql")
+)
+
+
+class ChatSearchService:
+    """聊天记录检索服务"""
+
+    SORTS = ("relevance", "recent")
+
+    def _search_sql(self, dialect: str, sort: str, has_cursor: bool) -> str:
+        """生成检索 SQL；rank 越小越相关"""
+        if dialect == "postgresql":
+            hits = (
+                "SELECT m.id, m.content, m.transcribed_text, m.is_user, m.created_at, "
+                "m.voice_url, m.image_url, -ts_rank_cd(s.document, q) AS rank "
+                f"FROM {POSTGRES_TABLE} s JOIN chat_messages m ON m.id = s.message_id, "
+                "to_tsquery('simple', :query) q "
+                "WHERE s.user_id = :user_id AND s.document @@ q"
+            )
+        else:
+            hits = (
+                "SELECT m.id, m.content, m.transcribed_text, m.is_user, m.created_at, "
+                f"m.voice_url, m.image_url, bm25({SQLITE_TABLE}, 1.0, 0.0, 0.0) AS rank "
+                f"FROM {SQLITE_TABLE} JOIN chat_messages m ON m.id = {SQLITE_TABLE}.message_id "
+                f"WHERE {SQLITE_TABLE} MATCH :query AND m.user_id = :user_id"
+            )
+
+        if sort == "recent":
+            condition = "(created_at < :after_time OR (created_at = :after_time AND id > :after_id))"
+            order = "created_at DESC, id"
+        else:
+            condition = "(rank > :after_rank OR (rank = :after_rank AND id > :after_id))"
+            order = "rank, id"
+        where = f" WHERE {condition}" if has_cursor else ""
+        return f"SELECT * FROM ({hits}) AS hits{where} ORDER BY {order} LIMIT :limit"
+
+    async def search(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        sort: str = "relevance"
+    ) -> Dict[str, Any]:
+        """检索用户的聊天记录
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            query: 查询字符串
+            limit: 每页条数
+            cursor: 上一页返回的游标
+            sort: 排序方式，relevance（相关度）或 recent（时间倒序）
+
+        Returns:
+            Dict[str, Any]: 包含 results、next_cursor 和 has_more
+
+        Raises:
+            ValueError: 排序方式或游标无效
+        """
+        if sort not in self.SORTS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        terms = parse_query(query)
+        if not terms:
+            return {"results": [], "next_cursor": None, "has_more": False}
+
+        dialect = db.bind.dialect.name
+        params: Dict[str, Any] = {"user_id": user_id, "limit": limit + 1}
+        params["query"] = build_tsquery(terms) if dialect == "postgresql" else build_fts5_query(terms, user_id)
+
+        if cursor:
+            position = decode_token(cursor)
+            try:
+                if position.get("s") != sort:
+                    raise ValueError("游标与排序方式不匹配")
+                params["after_id"] = str(position["i"])
+                if sort == "recent":
+                    params["after_time"] = datetime.fromisoformat(position["t"])
+                else:
+                    params["after_rank"] = float(position["r"])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"无效的分页游标: {cursor}") from e
+
+        statement = text(self._search_sql(dialect, sort, bool(cursor))).columns(created_at=DateTime)
+        rows = (await db.execute(statement, params)).mappings().all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        terms_to_highlight = highlight_terms(query)
+        results = []
+        for row in rows:
+            source = "content"
+            value = row["content"] or ""
+            if row["transcribed_text"] and not any(term in value.lower() for term in terms_to_highlight):
+                # 命中的是语音转写文本
+                source, value = "transcribed_text", row["transcribed_text"]
+            snippet, highlights = make_snippet(value, terms_to_highlight)
+            results.append({
+                "id": row["id"],
+                "snippet": snippet,
+                "highlights": highlights,
+                "matched_field": source,
+                "is_user": bool(row["is_user"]),
+                "created_at": row["created_at"],
+                "voice_url": row["voice_url"],
+                "image_url": row["image_url"],
+                "score": round(-float(row["rank"]), 6),
+            })
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            position = {"s": sort, "i": last["id"]}
+            if sort == "recent":
+                position["t"] = last["created_at"].isoformat()
+            else:
+                position["r"] = float(last["rank"])
+            next_cursor = encode_token(position)
+
+        return {"results": results, "next_cursor": next_cursor, "has_more": has_more}
+
+    async def rebuild(self, db: AsyncSession, batch_size: int = 500) -> int:
+        """重建全部消息的索引（用于迁移后回填已有数据）
+
+        Args:
+            db: 数据库会话
+            batch_size: 每批处理的消息数
+
+        Returns:
+            int: 写入索引的消息数
+        """
+        connection = await db.connection()
+        return await connection.run_sync(rebuild_index, batch_size)
+
+
+def rebuild_index(connection: Any, batch_size: int = 500) -> int:
+    """在同步连接上重建索引，供服务和 Alembic 迁移共用"""
+    dialect = _dialect(connection)
+    if dialect == "sqlite":
+        connection.execute(text(f"DELETE FROM {SQLITE_TABLE}"))
+    elif dialect == "postgresql":
+        connection.execute(text(f"DELETE FROM {POSTGRES_TABLE}"))
+    else:
+        return 0
+
+    total = 0
+    last_id = ""
+    while True:
+        rows = connection.execute(
+            text(
+                "SELECT id, user_id, content, transcribed_text FROM chat_messages "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": batch_size},
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            index_message(connection, row)
+        total += len(rows)
+        last_id = rows[-1].id
+    logger.info(f"聊天记录全文索引重建完成，共 {total} 条消息")
+    return total
+
+
+# 创建服务实例
+chat_search = ChatSearchService()
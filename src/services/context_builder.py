@@ -0,0 +1,321 @@
+"""
+聊天上下文构建模块
+
+按 token 预算组装发送给模型的消息列表：
+- 系统提示词、用户画像和当前消息必定保留
+- 历史消息从最新一条开始向前填充，直到预算用完
+- 单条过长的历史消息（如很长的语音转写）截断为首尾两段
+- token 计数器可替换，默认使用按字符估算的快速计数器
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from src.services.prompt_templates import SYSTEM_PROMPT, profile_block_cache
+
+logger = logging.getLogger(__name__)
+
+# 整个提示词（系统提示词 + 画像 + 历史 + 当前消息）的 token 预算
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+# 单条历史消息的 token 上限，超过时截断
+CHAT_TURN_MAX_TOKENS = int(os.getenv("CHAT_TURN_MAX_TOKENS", "400"))
+# 每次从数据库取出的候选历史消息条数，最终保留多少由预算决定
+CHAT_HISTORY_FETCH_LIMIT = int(os.getenv("CHAT_HISTORY_FETCH_LIMIT", "20"))
+# token 计数器："char"（默认）、"tiktoken:<encoding>" 或 "hf:<模型名或路径>"
+CHAT_TOKENIZER = os.getenv("CHAT_TOKENIZER", "char")
+
+# 每条消息在对话模板中的额外开销（角色标记、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 截断时插入的省略标记
+TRUNCATION_MARKER = "……（中间内容过长已省略）……"
+
+# 中日韩文字和全角符号，这类字符基本上一个字符对应一个 token
+_CJK_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+class Tokenizer:
+    """token 计数器基类
+
+    子类只需要实现 count；truncate 默认按字符二分查找，适用于任意计数器
+    """
+
+    name = "base"
+
+    def count(self, text: str) -> int:
+        """计算文本的 token 数"""
+        raise NotImplementedError
+
+    def truncate(self, text: str, max_tokens: int, from_end: bool = False) -> str:
+        """截取不超过 max_tokens 的前缀（from_end 为 True 时截取后缀）
+
+        Args:
+            text: 原文本
+            max_tokens: token 上限
+            from_end: 是否保留末尾部分
+
+        Returns:
+            str: 截取后的文本
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            part = text[-middle:] if from_end else text[:middle]
+            if self.count(part) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        if low == 0:
+            return ""
+        return text[-low:] if from_end else text[:low]
+
+
+class CharTokenizer(Tokenizer):
+    """按字符估算 token 数
+
+    中文等字符按 1 个 token 计，其余字符按 4 个字符 1 个 token 计，
+    对中文为主的对话略微偏高估，保证不会超出模型的上下文
+    """
+
+    name = "char"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+
+class CallableTokenizer(Tokenizer):
+    """包装外部分词器的编码函数"""
+
+    def __init__(self, name: str, encode: Callable[[str], List[Any]]):
+        """初始化
+
+        Args:
+            name: 计数器名称
+            encode: 把文本编码为 token 列表的函数
+        """
+        self.name = name
+        self._encode = encode
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self._encode(text))
+
+
+def load_tokenizer(spec: str = CHAT_TOKENIZER) -> Tokenizer:
+    """根据配置创建 token 计数器，依赖不可用时回退到按字符估算
+
+    Args:
+        spec: 计数器配置
+
+    Returns:
+        Tokenizer: token 计数器
+    """
+    kind, _, name = spec.partition(":")
+    try:
+        if kind == "tiktoken":
+            import tiktoken
+
+            encoding = tiktoken.get_encoding(name or "cl100k_base")
+            return CallableTokenizer(spec, encoding.encode)
+        if kind == "hf":
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(name)
+            return CallableTokenizer(spec, lambda text: tokenizer.encode(text, add_special_tokens=False))
+    except Exception as e:
+        logger.warning(f"加载分词器 {spec} 失败，使用按字符估算: {e}")
+        return CharTokenizer()
+
+    if kind != "char":
+        logger.warning(f"未知的分词器配置 {spec}，使用按字符估算")
+    return CharTokenizer()
+
+
+@dataclass
+class ChatContext:
+    """构建好的聊天上下文"""
+
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    history_used: int = 0
+    history_dropped: int = 0
+    truncated: int = 0
+    budget: int = CHAT_CONTEXT_TOKEN_BUDGET
+    tokenizer: str = "char"
+
+    def usage(self) -> Dict[str, Any]:
+        """返回可以发给客户端的用量信息"""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "budget": self.budget,
+            "history_messages": self.history_used,
+            "history_dropped": self.history_dropped,
+            "truncated_messages": self.truncated,
+        }
+
+
+class ContextBuilder:
+    """按 token 预算组装聊天上下文"""
+
+    def __init__(
+        self,
+        tokenizer: Optional[Tokenizer] = None,
+        budget: int = CHAT_CONTEXT_TOKEN_BUDGET,
+        turn_max_tokens: int = CHAT_TURN_MAX_TOKENS
+    ):
+        """初始化
+
+        Args:
+            tokenizer: token 计数器，默认根据 CHAT_TOKENIZER 创建
+            budget: 提示词 token 预算
+            turn_max_tokens: 单条历史消息的 token 上限
+        """
+        self.tokenizer = tokenizer or load_tokenizer()
+        self.budget = budget
+        self.turn_max_tokens = turn_max_tokens
+        # 系统提示词和画像块会被反复计数，缓存计数结果
+        self._count_cached = lru_cache(maxsize=4096)(self.tokenizer.count)
+        self.stats = {
+            "requests": 0,
+            "prompt_tokens_total": 0,
+            "prompt_tokens_max": 0,
+            "truncated_messages": 0,
+            "dropped_messages": 0,
+        }
+
+    def _message_tokens(self, content: str, cached: bool = False) -> int:
+        count = self._count_cached(content) if cached else self.tokenizer.count(content)
+        return count + MESSAGE_OVERHEAD_TOKENS
+
+    def truncate_turn(self, text: str, max_tokens: int) -> str:
+        """把过长的消息截断为首尾两段，保留开头的主题和结尾的结论
+
+        Args:
+            text: 消息内容
+            max_tokens: token 上限
+
+        Returns:
+            str: 截断后的内容（未超出上限时原样返回）
+        """
+        if self.tokenizer.count(text) <= max_tokens:
+            return text
+        available = max_tokens - self.tokenizer.count(TRUNCATION_MARKER)
+        if available <= 0:
+            return self.tokenizer.truncate(text, max_tokens)
+        head = self.tokenizer.truncate(text, available * 2 // 3)
+        tail = self.tokenizer.truncate(text, available - available * 2 // 3, from_end=True)
+        return f"{head}{TRUNCATION_MARKER}{tail}"
+
+    def build(
+        self,
+        user_profile: Optional[Dict[str, Any]],
+        current_message: str,
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> ChatContext:
+        """构建聊天上下文
+
+        Args:
+            user_profile: 用户画像信息
+            current_message: 当前用户消息
+            chat_history: 历史对话记录（按时间正序）
+
+        Returns:
+            ChatContext: 消息列表和 token 用量
+        """
+        history = list(chat_history or [])
+        # 当前消息在查询历史前已写入会话时会出现在历史末尾，避免重复发送
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == current_message:
+            history.pop()
+
+        head: List[Dict[str, str]] = []
+        used = 0
+        # 历史消息中已包含系统消息时不再重复添加系统提示词和画像
+        if not any(msg.get("role") == "system" for msg in history):
+            head.append({"role": "system", "content": SYSTEM_PROMPT})
+            used += self._message_tokens(SYSTEM_PROMPT, cached=True)
+            if user_profile:
+                profile_block = profile_block_cache.get(user_profile)
+                head.append({"role": "system", "content": profile_block})
+                used += self._message_tokens(profile_block, cached=True)
+
+        truncated = 0
+        current_tokens = self._message_tokens(current_message)
+        if used + current_tokens > self.budget:
+            # 当前消息本身就超出预算时截断到剩余的预算，总量不能超过预算，否则后端会拒绝整个请求。
+            # 剩余预算连一条历史消息的长度都放不下时去掉画像块；系统提示词本身就超出预算时也去掉
+            wanted = min(current_tokens, self.turn_max_tokens + MESSAGE_OVERHEAD_TOKENS)
+            if len(head) > 1 and self.budget - used < wanted:
+                used -= self._message_tokens(head.pop()["content"], cached=True)
+                logger.warning("提示词预算不足，本次请求不发送用户画像")
+            while head and self.budget - used <= MESSAGE_OVERHEAD_TOKENS:
+                used -= self._message_tokens(head.pop()["content"], cached=True)
+                logger.warning("系统提示词超出提示词预算，本次请求不发送系统提示词")
+            shortened = self.truncate_turn(current_message, self.budget - used - MESSAGE_OVERHEAD_TOKENS)
+            if shortened is not current_message:
+                current_message = shortened
+                current_tokens = self._message_tokens(current_message)
+                truncated += 1
+        used += current_tokens
+
+        # 从最新的历史消息开始填充，遇到放不下的消息就停止，保证保留的历史是连续的
+        selected: List[Dict[str, str]] = []
+        for msg in reversed(history):
+            content = msg.get("content") or ""
+            shortened = self.truncate_turn(content, self.turn_max_tokens)
+            tokens = self._message_tokens(shortened)
+            if used + tokens > self.budget:
+                break
+            if shortened is not content:
+                truncated += 1
+                msg = {**msg, "content": shortened}
+            selected.append(msg)
+            used += tokens
+        selected.reverse()
+
+        dropped = len(history) - len(selected)
+        self.stats["requests"] += 1
+        self.stats["prompt_tokens_total"] += used
+        self.stats["prompt_tokens_max"] = max(self.stats["prompt_tokens_max"], used)
+        self.stats["truncated_messages"] += truncated
+        self.stats["dropped_messages"] += dropped
+        logger.info(
+            f"聊天上下文构建完成: prompt_tokens={used}/{self.budget}, "
+            f"历史消息 {len(selected)} 条, 丢弃 {dropped} 条, 截断 {truncated} 条"
+        )
+
+        return ChatContext(
+            messages=head + selected + [{"role": "user", "content": current_message}],
+            prompt_tokens=used,
+            history_used=len(selected),
+            history_dropped=dropped,
+            truncated=truncated,
+            budget=self.budget,
+            tokenizer=self.tokenizer.name,
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        requests = self.stats["requests"]
+        return {
+            "tokenizer": self.tokenizer.name,
+            "budget": self.budget,
+            "turn_max_tokens": self.turn_max_tokens,
+            "avg_prompt_tokens": round(self.stats["prompt_tokens_total"] / requests, 1) if requests else 0.0,
+            **self.stats,
+        }
+
+
+# 创建服务实例
+context_builder = ContextBuilder()
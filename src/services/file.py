@@ -1,11 +1,10 @@
-from datetime import datetime
 from pathlib import Path
 from typing import Optional, Set
 import logging
 from fastapi import UploadFile, HTTPException, status
-import aiofiles
-import magic
 import re
+from .image_variants import image_variants
+from .storage import FileTooLarge, StorageEngine, StorageError, UnsupportedFileType, storage_engine
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -34,9 +33,10 @@ class FileService:
     MAX_IMAGE_SIZE: int = 5 * 1024 * 1024  # 5MB
     MAX_AUDIO_SIZE: int = 10 * 1024 * 1024  # 10MB
     
-    def __init__(self, base_upload_dir: str = "uploads"):
+    def __init__(self, base_upload_dir: str = "uploads", storage: Optional[StorageEngine] = None):
         self.base_upload_dir = Path(base_upload_dir)
         self.base_upload_dir.mkdir(parents=True, exist_ok=True)
+        self.storage = storage or storage_engine
         
     def _sanitize_filename(self, filename: str) -> str:
         """清理文件名
@@ -61,49 +61,6 @@ class FileService:
             
         return f"{name}{ext}"
         
-    async def _verify_file_type(
-        self,
-        file: UploadFile,
-        allowed_types: Set[str],
-        error_message: str
-    ) -> bytes:
-        """验证文件类型
-        
-        Args:
-            file: 上传的文件
-            allowed_types: 允许的MIME类型集合
-            error_message: 类型错误时的提示消息
-            
-        Returns:
-            bytes: 文件内容
-            
-        Raises:
-            HTTPException: 文件类型不允许时抛出
-        """
-        content = await file.read()
-        
-        try:
-            # 使用python-magic检测实际的MIME类型
-            mime_type = magic.from_buffer(content, mime=True)
-            logger.debug(f"检测到的MIME类型: {mime_type}")
-            
-            if mime_type not in allowed_types:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"{error_message} (检测到的类型: {mime_type})",
-                    headers={"X-Error-Type": "invalid_file_type"}
-                )
-                
-            return content
-            
-        except magic.MagicException as e:
-            logger.error(f"文件类型检测失败: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"文件类型检测失败: {str(e)}",
-                headers={"X-Error-Type": "magic_detection_failed"}
-            )
-            
     async def save_file(
         self,
         file: UploadFile,
@@ -111,10 +68,14 @@ class FileService:
         allowed_types: Set[str],
         max_size: int,
         error_message: str,
-        user_id: Optional[str] = None
+        user_id: Optional[str] = None,
+        generate_variants: bool = False
     ) -> str:
         """保存文件
         
+        文件按块流式写入存储引擎，只用开头的数据检测MIME类型，
+        按内容哈希命名，相同内容的文件只保存一份
+        
         Args:
             file: 上传的文件
             subdir: 子目录名
@@ -122,6 +83,7 @@ class FileService:
             max_size: 最大文件大小(字节)
             error_message: 类型错误时的提示消息
             user_id: 用户ID(可选)
+            generate_variants: 是否在后台生成图片衍生图
             
         Returns:
             str: 文件的相对URL路径
@@ -130,35 +92,40 @@ class FileService:
             HTTPException: 文件验证失败时抛出
         """
         try:
-            # 首先验证文件大小
-            if file.size > max_size:
+            # 首先验证文件大小（写入过程中还会按实际大小再次校验）
+            if file.size is not None and file.size > max_size:
                 raise HTTPException(
                     status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                     detail=f"文件大小超过限制: {max_size/1024/1024:.1f}MB"
                 )
             
-            # 验证并获取文件内容
-            content = await self._verify_file_type(file, allowed_types, error_message)
-            
-            # 准备保存目录
-            save_dir = self.base_upload_dir / subdir
-            save_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = self._sanitize_filename(file.filename)
-            if user_id:
-                save_path = save_dir / f"{user_id}_{timestamp}_{filename}"
-            else:
-                save_path = save_dir / f"{timestamp}_{filename}"
-            
-            # 保存文件
-            async with aiofiles.open(save_path, 'wb') as f:
-                await f.write(content)
-            
-            # 返回相对URL
-            return f"/{subdir}/{save_path.name}"
+            stored = await self.storage.save_upload(
+                file,
+                subdir,
+                allowed_types=allowed_types,
+                max_size=max_size
+            )
+            logger.debug(f"检测到的MIME类型: {stored.content_type}, 用户ID: {user_id}")
+            if generate_variants:
+                image_variants.schedule(stored)
+            return stored.url
             
+        except UnsupportedFileType as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{error_message} (检测到的类型: {e.mime_type})",
+                headers={"X-Error-Type": "invalid_file_type"}
+            )
+        except FileTooLarge:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"文件大小超过限制: {max_size/1024/1024:.1f}MB"
+            )
+        except StorageError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except HTTPException:
             raise
         except Exception as e:
@@ -184,7 +151,8 @@ class FileService:
             allowed_types=self.ALLOWED_IMAGE_TYPES,
             max_size=self.MAX_IMAGE_SIZE,
             error_message="不支持的图片格式",
-            user_id=user_id
+            user_id=user_id,
+            generate_variants=True
         )
         
     async def save_voice(self, file: UploadFile, user_id: Optional[str] = None) -> str:
@@ -222,7 +190,8 @@ class FileService:
             allowed_types=self.ALLOWED_IMAGE_TYPES,
             max_size=self.MAX_IMAGE_SIZE,
             error_message="不支持的图片格式",
-            user_id=user_id
+            user_id=user_id,
+            generate_variants=True
         )
 
 # 创建服务实例
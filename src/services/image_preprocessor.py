@@ -0,0 +1,145 @@
+"""
+图片预处理服务模块
+
+在发送给视觉模型之前缩小图片。解码和重新编码在进程池中执行，不阻塞事件循环：
+- JPEG 使用 draft() 在解码阶段直接按 1/2、1/4、1/8 缩小，减少解码开销
+- 根据 EXIF 方向信息旋转，且只在缩小之后的小图上旋转
+- 已经小于目标大小的图片直接返回，不解码也不重新编码
+"""
+
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# 缩小后的最长边（像素）
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "800"))
+# 重新编码时的 JPEG 质量
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "75"))
+# 小于该大小的图片直接发送，不做处理
+IMAGE_REENCODE_THRESHOLD = int(os.getenv("IMAGE_REENCODE_THRESHOLD", str(1024 * 1024)))
+# 预处理进程池大小
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# EXIF 方向标签
+_EXIF_ORIENTATION = 0x0112
+
+ImageBytes = Union[bytes, bytearray, memoryview]
+
+
+def preprocess_image(
+    data: ImageBytes,
+    max_side: int = IMAGE_MAX_SIDE,
+    quality: int = IMAGE_JPEG_QUALITY,
+    threshold: int = IMAGE_REENCODE_THRESHOLD
+) -> bytes:
+    """把图片缩小并编码为 JPEG
+
+    该函数是模块级函数，可以直接提交到进程池执行。
+
+    Args:
+        data: 原始图片数据
+        max_side: 缩小后的最长边
+        quality: JPEG 质量
+        threshold: 小于该大小的图片原样返回
+
+    Returns:
+        bytes: 处理后的图片数据
+    """
+    if len(data) <= threshold:
+        return bytes(data)
+
+    with Image.open(io.BytesIO(data)) as image:
+        orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+
+        if image.format == "JPEG":
+            # 解码时直接按 DCT 缩放，得到不小于目标尺寸的最小图
+            image.draft("RGB", (max_side, max_side))
+
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        # thumbnail 只缩小不放大；reducing_gap 先用快速的整数倍缩小再精细重采样
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        if orientation != 1:
+            # 在缩小后的图上处理旋转，代价远小于在原图上处理
+            image = ImageOps.exif_transpose(image)
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality)
+        return output.getvalue()
+
+
+class ImagePreprocessor:
+    """图片预处理器
+
+    管理预处理进程池，并提供异步的预处理接口
+    """
+
+    def __init__(
+        self,
+        workers: int = IMAGE_PREPROCESS_WORKERS,
+        max_side: int = IMAGE_MAX_SIDE,
+        quality: int = IMAGE_JPEG_QUALITY,
+        threshold: int = IMAGE_REENCODE_THRESHOLD
+    ):
+        """初始化图片预处理器
+
+        Args:
+            workers: 进程数，为 0 时在线程池中处理
+            max_side: 缩小后的最长边
+            quality: JPEG 质量
+            threshold: 小于该大小的图片原样返回
+        """
+        self.workers = workers
+        self.max_side = max_side
+        self.quality = quality
+        self.threshold = threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> Optional[ProcessPoolExecutor]:
+        """预处理进程池，首次使用时创建"""
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def preprocess(self, data: ImageBytes) -> bytes:
+        """异步预处理图片
+
+        Args:
+            data: 原始图片数据
+
+        Returns:
+            bytes: 处理后的图片数据
+        """
+        if len(data) <= self.threshold:
+            # 快速路径：小图不需要进入进程池
+            return bytes(data)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            preprocess_image,
+            bytes(data),
+            self.max_side,
+            self.quality,
+            self.threshold
+        )
+
+    def shutdown(self) -> None:
+        """关闭预处理进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 创建服务实例
+image_preprocessor = ImagePreprocessor()
@@ -0,0 +1,323 @@
+"""
+图片衍生图模块
+
+为聊天图片和头像生成固定宽度的 WebP/JPEG 衍生图，历史记录渲染时不再加载原图：
+- 原图按内容哈希命名，衍生图命名为 <哈希>_w<宽度>.<格式>，与原图保存在同一目录
+- 文件名由内容决定，衍生图和原图都可以使用 immutable 缓存头
+- 上传后在后台生成；请求到尚未生成的衍生图时按需生成（仅本地存储）
+- 解码一次生成所有尺寸，在图片预处理进程池中执行，不阻塞事件循环
+"""
+
+import asyncio
+import io
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from .image_preprocessor import image_preprocessor
+from .single_flight import SingleFlight
+from .storage import StorageEngine, StoredFile, storage_engine
+
+logger = logging.getLogger(__name__)
+
+# 衍生图宽度（像素），最小的宽度用作缩略图
+IMAGE_VARIANT_WIDTHS = [int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "160,480,960").split(",")]
+# 衍生图格式
+IMAGE_VARIANT_FORMATS = [fmt.strip() for fmt in os.getenv("IMAGE_VARIANT_FORMATS", "webp,jpg").split(",")]
+# 衍生图编码质量
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+# JPEG 衍生图中透明区域的背景色
+IMAGE_VARIANT_BACKGROUND = os.getenv("IMAGE_VARIANT_BACKGROUND", "#ffffff")
+# 按内容哈希命名的文件的缓存时间（秒）
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 原图可能使用的扩展名（按需生成时用于查找原图）
+ORIGINAL_EXTENSIONS = ("jpg", "png", "gif", "webp")
+# 衍生图格式对应的 Pillow 编码器和 MIME 类型
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+
+# EXIF 方向标签
+_EXIF_ORIENTATION = 0x0112
+# 按内容哈希命名的文件：<哈希>.<扩展名> 或 <哈希>_w<宽度>.<格式>
+_CONTENT_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})(?:_w(?P<width>\d+))?\.(?P<ext>[a-z0-9]+)$")
+
+VariantSpec = Tuple[int, str]
+
+
+def is_content_addressed(path: str) -> bool:
+    """文件名是否由内容哈希决定（内容不会变化，可以长期缓存）"""
+    return _CONTENT_NAME.match(path.rsplit("/", 1)[-1]) is not None
+
+
+def variant_name(digest: str, width: int, fmt: str) -> str:
+    """衍生图文件名"""
+    return f"{digest}_w{width}.{fmt}"
+
+
+def variant_urls(
+    url: Optional[str],
+    widths: List[int] = IMAGE_VARIANT_WIDTHS,
+    formats: List[str] = IMAGE_VARIANT_FORMATS
+) -> Optional[Dict[str, str]]:
+    """根据原图地址推导衍生图地址
+
+    Args:
+        url: 原图地址
+        widths: 衍生图宽度
+        formats: 衍生图格式
+
+    Returns:
+        Optional[Dict[str, str]]: {"<宽度>.<格式>": 地址}，不是按内容哈希命名的原图时返回 None
+    """
+    if not url:
+        return None
+    base, _, name = url.rpartition("/")
+    match = _CONTENT_NAME.match(name)
+    if match is None or match.group("width"):
+        return None
+    digest = match.group("digest")
+    return {
+        f"{width}.{fmt}": f"{base}/{variant_name(digest, width, fmt)}"
+        for width in widths
+        for fmt in formats
+    }
+
+
+def render_variants(
+    data: bytes,
+    specs: List[VariantSpec],
+    quality: int = IMAGE_VARIANT_QUALITY,
+    background: str = IMAGE_VARIANT_BACKGROUND
+) -> List[bytes]:
+    """解码一次，生成所有尺寸和格式的衍生图
+
+    该函数是模块级函数，可以直接提交到进程池执行。比目标宽度小的图片不放大。
+
+    Args:
+        data: 原图数据
+        specs: [(宽度, 格式)]
+        quality: 编码质量
+        background: JPEG 中透明区域的背景色
+
+    Returns:
+        List[bytes]: 与 specs 顺序一致的衍生图数据
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        orientation = source.getexif().get(_EXIF_ORIENTATION, 1)
+        if source.format == "JPEG":
+            # 解码时直接按 DCT 缩放，得到不小于最大目标宽度的最小图
+            largest = max(width for width, _ in specs)
+            source.draft("RGB", (largest, largest))
+
+        image = source.convert("RGBA" if source.mode in ("RGBA", "LA", "P") else "RGB")
+        if orientation != 1:
+            image.info["exif"] = source.info.get("exif", b"")
+            image = ImageOps.exif_transpose(image)
+
+        outputs = []
+        resized: Dict[int, Image.Image] = {}
+        for width, fmt in specs:
+            variant = resized.get(width)
+            if variant is None:
+                variant = image
+                if image.width > width:
+                    height = max(1, round(image.height * width / image.width))
+                    variant = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+                resized[width] = variant
+            encoder, _ = VARIANT_FORMATS[fmt]
+            if encoder == "JPEG" and variant.mode != "RGB":
+                # JPEG 没有透明通道，直接转换时透明区域会变成黑色，先铺到背景色上
+                flattened = Image.new("RGB", variant.size, background)
+                flattened.paste(variant, mask=variant.getchannel("A"))
+                variant = flattened
+            output = io.BytesIO()
+            variant.save(output, format=encoder, quality=quality)
+            outputs.append(output.getvalue())
+        return outputs
+
+
+class ImageVariantService:
+    """图片衍生图服务"""
+
+    def __init__(
+        self,
+        storage: StorageEngine = storage_engine,
+        widths: List[int] = IMAGE_VARIANT_WIDTHS,
+        formats: List[str] = IMAGE_VARIANT_FORMATS,
+        quality: int = IMAGE_VARIANT_QUALITY,
+        background: str = IMAGE_VARIANT_BACKGROUND
+    ):
+        """初始化
+
+        Args:
+            storage: 存储引擎
+            widths: 衍生图宽度
+            formats: 衍生图格式
+            quality: 编码质量
+            background: JPEG 中透明区域的背景色
+        """
+        self.storage = storage
+        self.widths = sorted(set(widths))
+        self.formats = [fmt for fmt in formats if fmt in VARIANT_FORMATS]
+        self.quality = quality
+        self.background = background
+        self._flights = SingleFlight("图片衍生图")
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {
+            "generated": 0,
+            "on_demand": 0,
+            "failed": 0,
+            "render_ms_total": 0.0,
+        }
+
+    def _specs(self) -> List[VariantSpec]:
+        return [(width, fmt) for width in self.widths for fmt in self.formats]
+
+    async def generate(self, key: str) -> int:
+        """为原图生成所有缺失的衍生图（同一原图的并发调用只生成一次）
+
+        Args:
+            key: 原图的存储键
+
+        Returns:
+            int: 新生成的衍生图数量
+        """
+        return await self._flights.do(key, lambda: self._generate(key))
+
+    async def _generate(self, key: str) -> int:
+        directory, _, name = key.rpartition("/")
+        match = _CONTENT_NAME.match(name)
+        if match is None or match.group("width"):
+            raise ValueError(f"不是按内容哈希命名的原图: {key}")
+        digest = match.group("digest")
+
+        specs = []
+        for width, fmt in self._specs():
+            if not await self.storage.exists(f"{directory}/{variant_name(digest, width, fmt)}"):
+                specs.append((width, fmt))
+        if not specs:
+            return 0
+
+        data = await self.storage.read(key)
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        outputs = await loop.run_in_executor(
+            image_preprocessor.executor, render_variants, data, specs, self.quality, self.background
+        )
+        self.stats["render_ms_total"] += (time.monotonic() - started) * 1000
+
+        for (width, fmt), output in zip(specs, outputs):
+            await self.storage.put_bytes(
+                f"{directory}/{variant_name(digest, width, fmt)}", output, VARIANT_FORMATS[fmt][1]
+            )
+        self.stats["generated"] += len(specs)
+        logger.info(f"图片衍生图已生成: {key}, 数量: {len(specs)}")
+        return len(specs)
+
+    def schedule(self, stored: StoredFile) -> None:
+        """上传完成后在后台生成衍生图，不阻塞上传请求
+
+        Args:
+            stored: 已保存的原图
+        """
+        task = asyncio.create_task(self._generate_quietly(stored.key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _generate_quietly(self, key: str) -> None:
+        try:
+            await self.generate(key)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"生成图片衍生图失败: {key}, 错误: {str(e)}")
+
+    async def ensure_variant(self, key: str) -> bool:
+        """请求的衍生图不存在时从原图生成
+
+        Args:
+            key: 衍生图的存储键
+
+        Returns:
+            bool: 衍生图是否已可用
+        """
+        directory, _, name = key.rpartition("/")
+        match = _CONTENT_NAME.match(name)
+        if match is None or not match.group("width"):
+            return False
+        if (int(match.group("width")), match.group("ext")) not in self._specs():
+            return False
+
+        for ext in ORIGINAL_EXTENSIONS:
+            original = f"{directory}/{match.group('digest')}.{ext}"
+            if await self.storage.exists(original):
+                self.stats["on_demand"] += 1
+                try:
+                    await self.generate(original)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"按需生成图片衍生图失败: {key}, 错误: {str(e)}")
+                    return False
+                return True
+        return False
+
+    async def join(self) -> None:
+        """等待后台生成任务完成"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "widths": self.widths,
+            "formats": self.formats,
+            "pending": len(self._tasks),
+            **self.stats,
+        }
+
+
+class UploadStaticFiles(StaticFiles):
+    """上传文件的静态文件服务
+
+    按内容哈希命名的文件加上 immutable 缓存头；开启衍生图时，
+    请求到尚未生成的衍生图会先从原图生成再返回
+    """
+
+    def __init__(self, *args: Any, category: str, variants: Optional[ImageVariantService] = None, **kwargs: Any):
+        """初始化
+
+        Args:
+            category: 文件类别（对应存储键的第一级目录）
+            variants: 衍生图服务，为空时不按需生成
+        """
+        super().__init__(*args, **kwargs)
+        self.category = category
+        self.variants = variants
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        try:
+            response = await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404 or self.variants is None:
+                raise
+            if not await self.variants.ensure_variant(f"{self.category}/{path}"):
+                raise
+            response = await super().get_response(path, scope)
+
+        if response.status_code in (200, 304) and is_content_addressed(path):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+# 创建服务实例
+image_variants = ImageVariantService()
@@ -0,0 +1,211 @@
+"""
+聊天消息后台写入模块
+
+流式聊天结束后，AI 回复不再占用请求的数据库会话写入，而是交给后台写入器：
+- 所有并发流的回复进入同一个队列，由单个写入协程按时间窗口合并成一个事务提交
+- SQLite 只有一个写锁，合并写入可以显著减少锁竞争和提交次数
+- 批量提交失败时重试，仍然失败则逐条写入，只丢弃确实无法写入的消息
+- 写入失败的用户会失效上下文缓存，避免缓存中出现数据库里不存在的消息
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..database import async_session
+from .chat_context_cache import chat_context_cache
+
+logger = logging.getLogger(__name__)
+
+# 合并写入的时间窗口（毫秒）
+MESSAGE_WRITE_INTERVAL_MS = float(os.getenv("MESSAGE_WRITE_INTERVAL_MS", "50"))
+# 单个事务最多写入的消息数
+MESSAGE_WRITE_BATCH_SIZE = int(os.getenv("MESSAGE_WRITE_BATCH_SIZE", "200"))
+# 队列最大长度，队列满时提交方等待（背压）而不是丢弃消息
+MESSAGE_WRITE_QUEUE_SIZE = int(os.getenv("MESSAGE_WRITE_QUEUE_SIZE", "10000"))
+# 批量提交失败时的重试次数
+MESSAGE_WRITE_RETRIES = int(os.getenv("MESSAGE_WRITE_RETRIES", "3"))
+
+
+class MessageWriteBehind:
+    """聊天消息的后台批量写入器"""
+
+    def __init__(
+        self,
+        session_factory: Callable = async_session,
+        interval_ms: float = MESSAGE_WRITE_INTERVAL_MS,
+        batch_size: int = MESSAGE_WRITE_BATCH_SIZE,
+        maxsize: int = MESSAGE_WRITE_QUEUE_SIZE,
+        retries: int = MESSAGE_WRITE_RETRIES
+    ):
+        """初始化
+
+        Args:
+            session_factory: 数据库会话工厂
+            interval_ms: 合并写入的时间窗口（毫秒）
+            batch_size: 单个事务最多写入的消息数
+            maxsize: 队列最大长度
+            retries: 批量提交失败时的重试次数
+        """
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self.maxsize = maxsize
+        self.retries = retries
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计指标
+        self.stats = {
+            "submitted": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "retries": 0,
+            "max_batch_size": 0,
+            "last_commit_ms": 0.0,
+            "max_lag_ms": 0.0,
+            "total_lag_ms": 0.0
+        }
+
+    def _ensure_started(self) -> None:
+        """在当前事件循环中启动写入协程"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._writer(), name="message-writer")
+        logger.info(f"聊天消息后台写入器已启动，合并窗口: {self.interval * 1000:.0f}ms")
+
+    async def submit(self, message: Any) -> None:
+        """提交一条待写入的消息
+
+        消息对象不能已经加入其他数据库会话；队列满时等待直到有空位
+
+        Args:
+            message: 聊天消息模型对象
+        """
+        self._ensure_started()
+        await self._queue.put((time.monotonic(), message))
+        self.stats["submitted"] += 1
+
+    async def _writer(self) -> None:
+        """写入协程：收集一个时间窗口内的消息后一次提交"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            try:
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._write(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"聊天消息后台写入出错: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, messages: List[Any]) -> None:
+        """在独立的数据库会话中提交一组消息"""
+        async with self.session_factory() as session:
+            try:
+                session.add_all(messages)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def _write(self, batch: List[Tuple[float, Any]]) -> None:
+        """写入一批消息，失败时重试，最终退化为逐条写入"""
+        messages = [message for _, message in batch]
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                await self._commit(messages)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f"批量写入聊天消息失败，改为逐条写入: {str(e)}, 条数: {len(messages)}")
+                    await self._write_each(messages)
+                    return
+                self.stats["retries"] += 1
+                await asyncio.sleep(0.05 * 2 ** attempt)
+
+        now = time.monotonic()
+        self.stats["written"] += len(messages)
+        self.stats["batches"] += 1
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(messages))
+        self.stats["last_commit_ms"] = (now - started) * 1000
+        for enqueued_at, _ in batch:
+            lag_ms = (now - enqueued_at) * 1000
+            self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag_ms)
+            self.stats["total_lag_ms"] += lag_ms
+
+    async def _write_each(self, messages: List[Any]) -> None:
+        """逐条写入消息，跳过无法写入的消息"""
+        for message in messages:
+            try:
+                await self._commit([message])
+                self.stats["written"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                # 缓存中已经有这条消息，失效后下次从数据库重新加载
+                chat_context_cache.invalidate(message.user_id)
+                logger.error(f"聊天消息写入失败，已丢弃: {str(e)}, 用户ID: {message.user_id}, 消息ID: {message.id}")
+
+    async def flush(self) -> None:
+        """等待已提交的消息全部写入数据库"""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """写完剩余的消息后停止写入协程"""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入器统计信息
+
+        Returns:
+            Dict[str, Any]: 包含队列深度、批次大小、写入延迟等指标
+        """
+        written = self.stats["written"]
+        batches = self.stats["batches"]
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.maxsize,
+            "interval_ms": self.interval * 1000,
+            "submitted": self.stats["submitted"],
+            "written": written,
+            "failed": self.stats["failed"],
+            "batches": batches,
+            "retries": self.stats["retries"],
+            "batch_size": {
+                "max": self.stats["max_batch_size"],
+                "avg": round(written / batches, 2) if batches else 0.0
+            },
+            "last_commit_ms": round(self.stats["last_commit_ms"], 2),
+            "lag_ms": {
+                "max": round(self.stats["max_lag_ms"], 2),
+                "avg": round(self.stats["total_lag_ms"] / written, 2) if written else 0.0
+            }
+        }
+
+
+# 创建服务实例
+message_writer = MessageWriteBehind()
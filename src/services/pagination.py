@@ -0,0 +1,140 @@
+"""
+游标分页模块
+
+为按 (created_at, id) 排序的列表提供键集（keyset）分页：
+- 游标是不透明的 base64url 字符串，内容为上一页最后一条记录的排序键
+- 翻页只需要按索引定位到游标之后的记录，不会随页码变深而变慢
+- 总数按用户缓存一段时间，游标模式下只在需要时返回近似值
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 总数缓存的有效期（秒）
+PAGINATION_COUNT_TTL = float(os.getenv("PAGINATION_COUNT_TTL", "60"))
+# 总数缓存的最大条目数
+PAGINATION_COUNT_CACHE_SIZE = int(os.getenv("PAGINATION_COUNT_CACHE_SIZE", "10000"))
+
+
+def encode_token(payload: Dict[str, Any]) -> str:
+    """把排序键编码为不透明的游标字符串
+
+    Args:
+        payload: 可 JSON 序列化的排序键
+
+    Returns:
+        str: 游标字符串
+    """
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """解析 encode_token 生成的游标字符串
+
+    Args:
+        token: 游标字符串
+
+    Returns:
+        Dict[str, Any]: 排序键
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {token}") from e
+    if not isinstance(payload, dict):
+        raise ValueError(f"无效的分页游标: {token}")
+    return payload
+
+
+def encode_cursor(created_at: datetime, record_id: str) -> str:
+    """把 (created_at, id) 排序键编码为游标
+
+    Args:
+        created_at: 记录创建时间
+        record_id: 记录ID
+
+    Returns:
+        str: 游标字符串
+    """
+    return encode_token({"t": created_at.isoformat(), "i": record_id})
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析 (created_at, id) 游标
+
+    Args:
+        cursor: 游标字符串
+
+    Returns:
+        Tuple[datetime, str]: (创建时间, 记录ID)
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    payload = decode_token(cursor)
+    try:
+        return datetime.fromisoformat(payload["t"]), str(payload["i"])
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+class CountCache:
+    """带过期时间的总数缓存
+
+    键通常是 (user_id, 过滤条件)；缓存的总数在有效期内可能略微落后于实际值
+    """
+
+    def __init__(self, ttl: float = PAGINATION_COUNT_TTL, max_entries: int = PAGINATION_COUNT_CACHE_SIZE):
+        """初始化
+
+        Args:
+            ttl: 有效期（秒）
+            max_entries: 最大条目数
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Tuple[Hashable, ...], Tuple[float, int]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[int]:
+        """获取缓存的总数，不存在或已过期时返回 None"""
+        entry = self._counts.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self.stats["misses"] += 1
+            return None
+        self._counts.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def set(self, key: Tuple[Hashable, ...], total: int) -> None:
+        """缓存总数"""
+        self._counts[key] = (time.monotonic(), total)
+        self._counts.move_to_end(key)
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+
+    def invalidate(self, owner: Hashable) -> None:
+        """删除某个用户的所有缓存总数（键的第一个元素为用户ID）"""
+        for key in [key for key in self._counts if key[0] == owner]:
+            del self._counts[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {"entries": len(self._counts), "ttl": self.ttl, **self.stats}
+
+
+# 创建服务实例
+chat_history_counts = CountCache()
@@ -0,0 +1,202 @@
+"""
+密码哈希服务模块
+
+bcrypt 每次计算需要 100~300ms CPU，原来直接在 async 路由中调用，会阻塞整个事件循环：
+- 哈希和校验提交到有界线程池执行（bcrypt 计算时释放 GIL，多个线程可以并行）
+- 排队的任务超过上限时直接返回 429，登录高峰不会拖垮其他接口
+- 配置的 bcrypt 轮数变化后，用户下次登录成功时透明地重新哈希
+- 统计排队数和耗时分位数
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# bcrypt 轮数（cost），修改后旧密码在下次登录时重新哈希
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 哈希线程数
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 最多同时排队和执行的任务数，超过时返回 429
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+# 计算分位数时保留的最近样本数
+PASSWORD_HASH_LATENCY_SAMPLES = 1024
+
+
+def _bcrypt_rounds(hashed: str) -> Optional[int]:
+    """从 $2b$12$... 格式的哈希中取出轮数"""
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def _percentiles(samples: Deque[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        "p50": round(ordered[int(last * 0.50)], 2),
+        "p95": round(ordered[int(last * 0.95)], 2),
+        "p99": round(ordered[int(last * 0.99)], 2),
+        "max": round(ordered[last], 2),
+    }
+
+
+class PasswordHasher:
+    """在线程池中计算密码哈希"""
+
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING
+    ):
+        """初始化
+
+        Args:
+            rounds: bcrypt 轮数
+            workers: 线程数
+            max_pending: 最多同时排队和执行的任务数
+        """
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._latency: Dict[str, Deque[float]] = {
+            "hash": deque(maxlen=PASSWORD_HASH_LATENCY_SAMPLES),
+            "verify": deque(maxlen=PASSWORD_HASH_LATENCY_SAMPLES),
+        }
+        self._wait: Deque[float] = deque(maxlen=PASSWORD_HASH_LATENCY_SAMPLES)
+        self.stats = {
+            "hashed": 0,
+            "verified": 0,
+            "rehashed": 0,
+            "rejected": 0,
+            "max_pending": 0,
+        }
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """哈希线程池，首次使用时创建"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="password-hash"
+            )
+        return self._executor
+
+    async def _run(self, kind: str, func: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中执行，队列已满时返回 429"""
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            logger.warning(f"密码哈希队列已满: pending={self._pending}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="请求过多，请稍后重试",
+                headers={"Retry-After": "1"}
+            )
+
+        self._pending += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], self._pending)
+        submitted = time.perf_counter()
+
+        def timed() -> Any:
+            started = time.perf_counter()
+            self._wait.append((started - submitted) * 1000)
+            try:
+                return func(*args)
+            finally:
+                self._latency[kind].append((time.perf_counter() - started) * 1000)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, timed)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """生成密码哈希
+
+        Args:
+            password: 明文密码
+
+        Returns:
+            str: bcrypt 哈希
+        """
+        hashed = await self._run("hash", self.context.hash, password)
+        self.stats["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """校验密码
+
+        Args:
+            password: 明文密码
+            hashed: 保存的哈希
+
+        Returns:
+            bool: 密码是否匹配
+        """
+        matched = await self._run("verify", self.context.verify, password, hashed)
+        self.stats["verified"] += 1
+        return matched
+
+    def needs_update(self, hashed: str) -> bool:
+        """哈希的轮数是否与当前配置不同"""
+        return _bcrypt_rounds(hashed) != self.rounds or self.context.needs_update(hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """校验密码，轮数变化时同时生成新的哈希
+
+        Args:
+            password: 明文密码
+            hashed: 保存的哈希
+
+        Returns:
+            Tuple[bool, Optional[str]]: 是否匹配，以及需要保存的新哈希（不需要更新时为 None）
+        """
+        if not await self.verify(password, hashed):
+            return False, None
+        if not self.needs_update(hashed):
+            return True, None
+        self.stats["rehashed"] += 1
+        return True, await self.hash(password)
+
+    def shutdown(self) -> None:
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息
+
+        Returns:
+            Dict[str, Any]: 包含排队数、拒绝数和耗时分位数等指标
+        """
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "pending": self._pending,
+            "pending_capacity": self.max_pending,
+            **self.stats,
+            "hash_ms": _percentiles(self._latency["hash"]),
+            "verify_ms": _percentiles(self._latency["verify"]),
+            "queue_wait_ms": _percentiles(self._wait),
+        }
+
+
+# 创建服务实例
+password_hasher = PasswordHasher()
@@ -0,0 +1,250 @@
+"""
+用户画像提取服务模块
+
+在后台异步地从用户消息中提取用户画像更新，避免阻塞流式聊天响应
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ..database import async_session
+from .cache_service import profile_cache
+from .chat_context_cache import chat_context_cache
+from .prompt_templates import profile_block_cache
+
+logger = logging.getLogger(__name__)
+
+# 队列配置
+PROFILE_EXTRACTION_QUEUE_SIZE = int(os.getenv("PROFILE_EXTRACTION_QUEUE_SIZE", "1000"))
+PROFILE_EXTRACTION_WORKERS = int(os.getenv("PROFILE_EXTRACTION_WORKERS", "4"))
+# 单个用户最多合并的待处理消息数，超出时丢弃最早的消息
+PROFILE_EXTRACTION_MAX_BATCH = int(os.getenv("PROFILE_EXTRACTION_MAX_BATCH", "10"))
+
+
+async def invalidate_profile_caches(user_id: str) -> None:
+    """用户画像更新提交之后，失效所有缓存了该用户画像的地方
+
+    必须在事务提交成功之后调用：提前失效时，并发的请求可能在提交前重新加载旧画像并写回缓存
+
+    Args:
+        user_id: 用户ID
+    """
+    profile_block_cache.invalidate(user_id)
+    chat_context_cache.invalidate_profile(user_id)
+    await profile_cache.delete(user_id)
+
+
+class _PendingBatch:
+    """某个用户等待提取的消息批次"""
+
+    __slots__ = ("messages", "enqueued_at")
+
+    def __init__(self, enqueued_at: float):
+        self.messages: List[str] = []
+        self.enqueued_at = enqueued_at
+
+
+class ProfileExtractionQueue:
+    """用户画像提取队列
+
+    使用有界 asyncio 队列和固定数量的工作协程处理画像提取：
+    - 同一用户在排队期间的多条消息会合并成一次提取
+    - 队列已满时直接丢弃新任务并计数，不会阻塞调用方
+    - 提取结果在独立的数据库会话中通过 process_profile_updates 应用
+    """
+
+    def __init__(
+        self,
+        ai_client: Any = None,
+        session_factory: Callable = async_session,
+        maxsize: int = PROFILE_EXTRACTION_QUEUE_SIZE,
+        workers: int = PROFILE_EXTRACTION_WORKERS,
+        max_batch: int = PROFILE_EXTRACTION_MAX_BATCH
+    ):
+        """初始化画像提取队列
+
+        Args:
+            ai_client: AI服务客户端，为空时使用进程内共享的客户端
+            session_factory: 数据库会话工厂
+            maxsize: 队列最大长度（按用户计）
+            workers: 工作协程数量
+            max_batch: 单个用户最多合并的消息数
+        """
+        self._ai_client = ai_client
+        self.session_factory = session_factory
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_batch = max_batch
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[str, _PendingBatch] = {}
+        self._tasks: List[asyncio.Task] = []
+
+        # 统计指标
+        self.stats = {
+            "enqueued": 0,
+            "merged": 0,
+            "dropped": 0,
+            "processed": 0,
+            "failed": 0,
+            "updated": 0,
+            "last_lag_ms": 0.0,
+            "max_lag_ms": 0.0,
+            "total_lag_ms": 0.0
+        }
+
+    @property
+    def ai_client(self):
+        """AI服务客户端"""
+        if self._ai_client is None:
+            from .ai_service_client import get_ai_client
+            self._ai_client = get_ai_client()
+        return self._ai_client
+
+    def _ensure_started(self) -> None:
+        """在当前事件循环中启动工作协程"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks and all(not task.done() for task in self._tasks):
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._pending.clear()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"profile-extraction-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"用户画像提取队列已启动，工作协程数: {self.workers}")
+
+    def enqueue(self, user_id: str, message: str) -> bool:
+        """提交一条待提取的用户消息
+
+        Args:
+            user_id: 用户ID
+            message: 用户消息内容
+
+        Returns:
+            bool: 是否成功加入队列（合并到已有批次也视为成功）
+        """
+        if not message or not message.strip():
+            return False
+
+        self._ensure_started()
+
+        batch = self._pending.get(user_id)
+        if batch is not None:
+            # 该用户已在排队，合并到同一批次
+            batch.messages.append(message)
+            if len(batch.messages) > self.max_batch:
+                batch.messages.pop(0)
+            self.stats["merged"] += 1
+            return True
+
+        try:
+            self._queue.put_nowait(user_id)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning(f"用户画像提取队列已满，丢弃任务，用户ID: {user_id}")
+            return False
+
+        batch = _PendingBatch(time.monotonic())
+        batch.messages.append(message)
+        self._pending[user_id] = batch
+        self.stats["enqueued"] += 1
+        return True
+
+    async def _worker(self, index: int) -> None:
+        """工作协程：逐个处理排队用户的消息批次"""
+        while True:
+            user_id = await self._queue.get()
+            try:
+                batch = self._pending.pop(user_id, None)
+                if batch is None:
+                    continue
+
+                lag_ms = (time.monotonic() - batch.enqueued_at) * 1000
+                self.stats["last_lag_ms"] = lag_ms
+                self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag_ms)
+                self.stats["total_lag_ms"] += lag_ms
+
+                await self._process(user_id, "\n".join(batch.messages))
+                self.stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"用户画像提取失败，用户ID: {user_id}, 错误: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, user_id: str, content: str) -> None:
+        """提取并应用一个用户的画像更新"""
+        logger.info(f"正在从用户消息中提取用户画像更新信息，用户ID: {user_id}")
+        updates = await self.ai_client.extract_profile_updates(content)
+        if not updates:
+            logger.info(f"未检测到用户画像更新，用户ID: {user_id}")
+            return
+
+        async with self.session_factory() as session:
+            try:
+                result = await self.ai_client.process_profile_updates(
+                    user_id=user_id,
+                    updates=updates,
+                    db=session
+                )
+                if result["success"] and result["updated_fields"]:
+                    await session.commit()
+                    await invalidate_profile_caches(user_id)
+                    self.stats["updated"] += 1
+                    logger.info(f"用户画像更新成功，用户ID: {user_id}, 更新字段: {list(result['updated_fields'])}")
+                else:
+                    await session.rollback()
+                    logger.info(f"用户画像无需更新，用户ID: {user_id}, 结果: {result['message']}")
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def join(self) -> None:
+        """等待队列中所有任务处理完毕"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """停止所有工作协程"""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._pending.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计信息
+
+        Returns:
+            Dict[str, Any]: 包含队列深度、延迟、丢弃数等指标
+        """
+        processed = self.stats["processed"] + self.stats["failed"]
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.maxsize,
+            "workers": len([task for task in self._tasks if not task.done()]),
+            "enqueued": self.stats["enqueued"],
+            "merged": self.stats["merged"],
+            "dropped": self.stats["dropped"],
+            "processed": self.stats["processed"],
+            "failed": self.stats["failed"],
+            "updated": self.stats["updated"],
+            "lag_ms": {
+                "last": round(self.stats["last_lag_ms"], 2),
+                "max": round(self.stats["max_lag_ms"], 2),
+                "avg": round(self.stats["total_lag_ms"] / processed, 2) if processed else 0.0
+            }
+        }
+
+
+# 创建服务实例
+profile_extraction_queue = ProfileExtractionQueue()
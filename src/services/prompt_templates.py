@@ -0,0 +1,238 @@
+"""
+提示词模板模块
+
+聊天使用的静态系统提示词和用户画像块：
+- 系统提示词是模块级的驻留常量，每次请求复用同一个字符串，
+  同时保证发送给后端的消息前缀保持稳定，便于后端做前缀缓存
+- 用户画像块按 (user_id, updated_at) 缓存，画像更新之前只渲染一次
+"""
+
+import logging
+import os
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 用户画像块缓存的最大条目数
+PROFILE_BLOCK_CACHE_SIZE = int(os.getenv("PROFILE_BLOCK_CACHE_SIZE", "4096"))
+
+# 聊天的系统提示词
+SYSTEM_PROMPT = sys.intern("""你是一名专业的营养学家、健康管理师和运动指导专家。请基于用户画像和对话内容，为用户提供全方位的健康生活指导方案。
+
+营养建议要点：
+1. 宏量营养素分配：
+   - 根据用户的BMI、体脂率和运动水平，计算每日所需的蛋白质、碳水化合物和脂肪比例
+   - 考虑用户的运动强度和时间，调整碳水化合物的补充时机
+   - 确保优质蛋白的摄入，推荐具体的蛋白质来源
+
+2. 微量营养素补充：
+   - 基于用户的健康状况和营养目标，建议所需的维生素和矿物质补充
+   - 推荐富含特定营养素的食材
+   - 注意可能的营养素相互作用
+
+3. 膳食规划：
+   - 设计符合用户口味和烹饪水平的食谱
+   - 考虑用户的饮食限制和过敏原
+   - 提供详细的食材选购指南和烹饪方法
+   - 建议适合的进餐时间和份量
+
+健康管理建议：
+1. 体重管理：
+   - 根据用户的BMI和体脂率，制定合理的体重目标
+   - 设计可持续的减重/增重计划
+   - 建议每周体重监测频率
+
+2. 健康风险评估：
+   - 分析用户现有的健康问题
+   - 评估潜在的健康风险
+   - 提供针对性的预防建议
+
+3. 生活方式指导：
+   - 作息时间建议
+   - 压力管理方法
+   - 饮水建议
+   - 建议戒除不良习惯
+
+运动指导方案：
+1. 有氧运动：
+   - 根据用户的体能水平推荐合适的有氧运动
+   - 指导心率控制范围
+   - 建议运动时长和频率
+
+2. 力量训练：
+   - 设计适合用户水平的训练计划
+   - 推荐具体的动作和组数
+   - 注意动作要领和安全事项
+
+3. 运动营养策略：
+   - 运动前后的营养补充建议
+   - 运动期间的补水方案
+   - 恢复期的营养摄入指导
+
+回复要求：
+1. 专业性：
+   - 使用准确的专业术语
+   - 提供科学依据
+   - 引用权威研究或指南（如有）
+
+2. 个性化：
+   - 充分考虑用户的个人情况和限制
+   - 根据用户的生活方式调整建议
+   - 考虑实施建议的可行性
+
+3. 安全性：
+   - 注意可能的禁忌症
+   - 提醒潜在风险
+   - 建议必要时咨询医生
+
+4. 动态调整：
+   - 根据用户反馈调整方案
+   - 设定阶段性目标
+   - 提供进展监测方法
+
+5. 输入处理：
+   - 对于图片输入：分析食物的营养价值，评估是否符合用户的健康目标
+   - 对于语音输入：确保回复简明易懂，适合口头表达
+   - 对于文字输入：提供详细的专业建议和具体的执行方案
+
+7. 非相关问题处理：
+   - 礼貌地说明你只能回答与饮食、营养、运动、健康相关的问题
+   - 不要给出任何非饮食、营养、运动、健康相关的问题的回答
+   - 引导用户询问相关领域的问题
+   - 如果问题部分相关，尽量从健康角度给出建议
+
+请确保每次回复都体现专业性、针对性和全面性，帮助用户建立健康的生活方式。如果用户询问与饮食、营养、运动、健康无关的问题，请礼貌地说明你的专业范围并建议用户寻求相关领域的专家帮助。""")
+
+# 从用户消息中提取用户画像更新的系统提示词
+PROFILE_EXTRACTION_PROMPT = sys.intern("""你是一个专门用于分析用户消息并提取用户画像信息的AI助手。
+请分析用户消息中可能包含的个人信息，如身高、体重、年龄、性别、健康状况、饮食偏好、运动习惯等。
+只提取明确提及的信息，不要猜测。如果没有相关信息，返回空对象。
+返回格式必须是有效的JSON，包含以下可能的字段（只包含用户明确提及的字段）：
+{
+    "birth_date": "YYYY-MM-DD",  // 出生日期，格式为ISO日期
+    "gender": "男|女|其他",  // 性别
+    "height": 170.0,  // 身高，单位：厘米
+    "weight": 65.0,  // 体重，单位：千克
+    "body_fat_percentage": 20.0,  // 体脂率，单位：%
+    "muscle_mass": 50.0,  // 肌肉量，单位：千克
+    "health_conditions": ["高血压", "糖尿病"],  // 健康状况
+    "health_goals": ["减重", "增肌"],  // 健康目标
+    "cooking_skill_level": "初级|中级|高级",  // 烹饪技能水平
+    "favorite_cuisines": ["中餐", "日料"],  // 喜爱的菜系
+    "dietary_restrictions": ["无麸质", "素食"],  // 饮食限制
+    "allergies": ["花生", "海鲜"],  // 过敏原
+    "calorie_preference": 2000,  // 卡路里偏好，单位：卡路里
+    "nutrition_goals": {  // 营养目标
+        "protein": 150,  // 蛋白质，单位：克
+        "carbs": 200,  // 碳水化合物，单位：克
+        "fat": 60  // 脂肪，单位：克
+    },
+    "fitness_level": "初级|中级|高级",  // 健身水平
+    "exercise_frequency": 3,  // 运动频率，每周次数
+    "preferred_exercises": ["跑步", "力量训练"],  // 偏好的运动方式
+    "fitness_goals": ["增肌", "提高耐力"],  // 健身目标
+    "update_reason": "基于用户提供的信息..."  // 更新原因说明
+}
+只返回JSON对象，不要有任何其他文字说明。如果没有提取到任何信息，返回空对象 {}。""")
+
+
+def _join(values: Any, default: str = "无") -> str:
+    """把列表字段拼接为展示文本"""
+    if values is None:
+        values = [default]
+    return ", ".join(values)
+
+
+def render_profile_block(user_profile: Dict[str, Any]) -> str:
+    """渲染用户画像块
+
+    Args:
+        user_profile: 用户画像信息
+
+    Returns:
+        str: 用户画像块文本
+    """
+    get = user_profile.get
+    return f"""用户画像信息：
+- 性别：{get('gender', '未知')}
+- 年龄：{get('age', '未知')}岁
+- 身高：{get('height', '未知')}cm
+- 体重：{get('weight', '未知')}kg
+- BMI：{get('bmi', '未知')}
+- 体脂率：{get('body_fat_percentage', '未知')}%
+- 健康状况：{_join(get('health_conditions', ['无']))}
+- 健康目标：{_join(get('health_goals', ['无']))}
+- 饮食偏好：{_join(get('food_preferences', ['无']))}
+- 饮食限制：{_join(get('dietary_restrictions', ['无']))}
+- 食物过敏：{_join(get('allergies', ['无']))}
+- 烹饪水平：{get('cooking_level', '初级')}
+- 营养目标：{_join(get('nutrition_goals', ['无']))}
+- 健身水平：{get('fitness_level', '未知')}
+- 运动频率：每周{get('exercise_frequency', '未知')}次
+- 健身目标：{_join(get('fitness_goals', ['无']))}"""
+
+
+class ProfileBlockCache:
+    """用户画像块缓存
+
+    以 (user_id, updated_at) 为键；画像更新后 updated_at 改变，旧条目自然失效并被 LRU 淘汰
+    """
+
+    def __init__(self, max_entries: int = PROFILE_BLOCK_CACHE_SIZE):
+        """初始化缓存
+
+        Args:
+            max_entries: 最大条目数
+        """
+        self.max_entries = max_entries
+        self._blocks: "OrderedDict[Tuple[Hashable, Hashable], str]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(user_profile: Dict[str, Any]) -> Optional[Tuple[Hashable, Hashable]]:
+        user_id = user_profile.get("user_id")
+        updated_at = user_profile.get("updated_at")
+        if user_id is None or updated_at is None:
+            return None
+        return user_id, updated_at
+
+    def get(self, user_profile: Dict[str, Any]) -> str:
+        """获取用户画像块，未缓存时渲染并缓存
+
+        Args:
+            user_profile: 用户画像信息（包含 user_id 和 updated_at 时才会缓存）
+
+        Returns:
+            str: 用户画像块文本
+        """
+        key = self._key(user_profile)
+        if key is None:
+            return render_profile_block(user_profile)
+
+        block = self._blocks.get(key)
+        if block is not None:
+            self._blocks.move_to_end(key)
+            self.stats["hits"] += 1
+            return block
+
+        self.stats["misses"] += 1
+        block = render_profile_block(user_profile)
+        self._blocks[key] = block
+        if len(self._blocks) > self.max_entries:
+            self._blocks.popitem(last=False)
+        return block
+
+    def invalidate(self, user_id: Hashable) -> None:
+        """删除某个用户的所有画像块"""
+        for key in [key for key in self._blocks if key[0] == user_id]:
+            del self._blocks[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {"entries": len(self._blocks), "max_entries": self.max_entries, **self.stats}
+
+
+# 创建服务实例
+profile_block_cache = ProfileBlockCache()
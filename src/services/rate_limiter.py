@@ -0,0 +1,281 @@
+"""
+共享计数器和速率限制模块
+
+登录锁定计数和接口限流原来都保存在单个进程的内存里，多个 uvicorn worker 之间不共享，
+锁定计数还是先读后写，并发失败时会丢失计数。这里统一使用缓存服务的 Redis：
+- 登录失败计数：INCR 和 EXPIRE 在同一个 Lua 脚本中执行，达到上限时直接设置锁定时间
+- 接口限流：GCRA 算法，每个键只保存一个“理论到达时间”，一次脚本调用完成判断和更新，
+  时间取 Redis 服务器时间，多个 worker 的时钟偏差不影响结果
+- Redis 未配置或不可用时降级为进程内实现（单个事件循环内天然是原子的）
+"""
+
+import functools
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from .cache_service import CacheNamespace, CachePrefix, cache_service
+
+logger = logging.getLogger(__name__)
+
+# 降级为进程内限流时最多保存的限流键数
+RATE_LIMIT_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_KEYS", "100000"))
+
+# 登录失败计数：KEYS[1] 计数键，ARGV[1] 计数窗口（秒），ARGV[2] 锁定阈值，ARGV[3] 锁定时间（秒）
+FAILURE_SCRIPT = """
+local attempts = redis.call('INCR', KEYS[1])
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+else
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return {attempts, redis.call('TTL', KEYS[1])}
+"""
+
+# GCRA：KEYS[1] 理论到达时间（毫秒），ARGV[1] 请求间隔（毫秒），ARGV[2] 突发容忍（毫秒）
+# 返回 {是否允许, 需要等待的毫秒数, 计数完全恢复的毫秒数}
+GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+if now < tat - tolerance then
+    return {0, tat - tolerance - now, tat - now}
+end
+local new_tat = tat + emission
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, 0, new_tat - now}
+"""
+
+_PERIODS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+_LIMIT_PATTERN = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$")
+
+
+def parse_limit(value: str) -> Tuple[int, int]:
+    """解析 "60/minute"、"10 per minute"、"100/5 minutes" 格式的限制
+
+    Args:
+        value: 限制字符串
+
+    Returns:
+        Tuple[int, int]: 次数和时间窗口（秒）
+    """
+    match = _LIMIT_PATTERN.match(value)
+    if match is None:
+        raise ValueError(f"无法解析的速率限制: {value}")
+    count, multiple, unit = match.groups()
+    return int(count), int(multiple or 1) * _PERIODS[unit]
+
+
+def get_remote_address(request: Request) -> str:
+    """按客户端 IP 限流"""
+    return request.client.host if request.client else "127.0.0.1"
+
+
+class RateLimitExceeded(HTTPException):
+    """超出速率限制"""
+
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"请求过于频繁，请在 {math.ceil(retry_after)} 秒后重试（限制 {limit}）",
+            headers={
+                "Retry-After": str(math.ceil(retry_after)),
+                "X-RateLimit-Limit": limit,
+                "X-RateLimit-Remaining": "0",
+            }
+        )
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+class SharedCounter:
+    """多进程共享的失败计数器（登录锁定）"""
+
+    def __init__(self, namespace: CacheNamespace):
+        """初始化
+
+        Args:
+            namespace: 保存计数的缓存命名空间（不使用本地副本）
+        """
+        self.namespace = namespace
+
+    async def record_failure(self, key: str, window: int, threshold: int, lockout: int) -> int:
+        """记录一次失败
+
+        Args:
+            key: 计数键
+            window: 未达到阈值时计数保留的时间（秒）
+            threshold: 锁定阈值
+            lockout: 达到阈值后的锁定时间（秒）
+
+        Returns:
+            int: 当前失败次数
+        """
+        result = await self.namespace.run_script(FAILURE_SCRIPT, key, window, threshold, lockout)
+        if result is not None:
+            return int(result[0])
+        attempts = await self.namespace.incr(key, ttl=window)
+        if attempts >= threshold:
+            await self.namespace.expire(key, lockout)
+        return attempts
+
+    async def get(self, key: str) -> Tuple[int, int]:
+        """获取失败次数和剩余过期时间（秒）"""
+        attempts, ttl = await self.namespace.get_with_ttl(key)
+        return int(attempts or 0), ttl
+
+    async def reset(self, key: str) -> None:
+        """清除计数"""
+        await self.namespace.delete(key)
+
+
+class RateLimiter:
+    """基于 GCRA 的接口限流
+
+    用法与 slowapi 相同：被装饰的路由函数需要声明 request: Request 参数
+
+        @limiter.limit("60/minute")
+        async def endpoint(request: Request): ...
+    """
+
+    def __init__(
+        self,
+        namespace: CacheNamespace,
+        key_func: Callable[[Request], str] = get_remote_address,
+        enabled: bool = True,
+        local_max_keys: int = RATE_LIMIT_LOCAL_KEYS
+    ):
+        """初始化
+
+        Args:
+            namespace: 保存理论到达时间的缓存命名空间（不使用本地副本）
+            key_func: 从请求中取出限流键
+            enabled: 是否启用
+            local_max_keys: 进程内限流最多保存的键数
+        """
+        self.namespace = namespace
+        self.key_func = key_func
+        self.enabled = enabled
+        self.local_max_keys = max(1, local_max_keys)
+        # 进程内的理论到达时间，按最近更新排序；不放在缓存 L1 中，避免被其他缓存数据挤出后限流失效
+        self._local: "OrderedDict[str, float]" = OrderedDict()
+        self.stats = {"allowed": 0, "limited": 0, "local_evicted": 0}
+
+    async def hit(self, key: str, count: int, period: int) -> Tuple[bool, float, int]:
+        """记录一次请求
+
+        Args:
+            key: 限流键
+            count: 时间窗口内允许的请求数
+            period: 时间窗口（秒）
+
+        Returns:
+            Tuple[bool, float, int]: 是否允许、需要等待的秒数、剩余可用次数
+        """
+        emission = max(1, round(period * 1000 / count))
+        tolerance = emission * (count - 1)
+        result = await self.namespace.run_script(GCRA_SCRIPT, key, emission, tolerance)
+        if result is not None:
+            allowed, retry_after_ms, reset_after_ms = (float(value) for value in result)
+        else:
+            allowed, retry_after_ms, reset_after_ms = self._local_hit(key, emission, tolerance)
+
+        if not allowed:
+            self.stats["limited"] += 1
+            return False, retry_after_ms / 1000, 0
+        self.stats["allowed"] += 1
+        remaining = int((tolerance - (reset_after_ms - emission)) // emission)
+        return True, 0.0, max(0, remaining)
+
+    def _local_hit(self, key: str, emission: float, tolerance: float) -> Tuple[float, float, float]:
+        """进程内的 GCRA，理论到达时间保存在限流器自己的有界字典中"""
+        local = self._local
+        now = time.time() * 1000
+        tat = local.get(key)
+        if tat is None or tat < now:
+            tat = now
+        if now < tat - tolerance:
+            return 0, tat - tolerance - now, tat - now
+        new_tat = tat + emission
+        local[key] = new_tat
+        local.move_to_end(key)
+
+        # 理论到达时间已经过去的键等同于不存在，先删除；仍然超出上限时才淘汰最久未更新的键
+        while local:
+            oldest_key, oldest_tat = next(iter(local.items()))
+            if oldest_tat < now:
+                del local[oldest_key]
+            elif len(local) > self.local_max_keys:
+                del local[oldest_key]
+                self.stats["local_evicted"] += 1
+            else:
+                break
+        return 1, 0, new_tat - now
+
+    def limit(self, limit_value: str) -> Callable:
+        """限流装饰器
+
+        Args:
+            limit_value: 限制，如 "60/minute"
+        """
+        count, period = parse_limit(limit_value)
+
+        def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            scope = f"{func.__module__}.{func.__name__}"
+
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                request = kwargs.get("request")
+                if request is None:
+                    request = next((arg for arg in args if isinstance(arg, Request)), None)
+                if self.enabled and request is not None:
+                    allowed, retry_after, _ = await self.hit(
+                        f"{scope}:{self.key_func(request)}", count, period
+                    )
+                    if not allowed:
+                        logger.warning(f"触发速率限制: {scope}, key={self.key_func(request)}, limit={limit_value}")
+                        raise RateLimitExceeded(limit_value, retry_after)
+                return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    async def reset(self) -> None:
+        """清除所有限流状态（如测试之间）"""
+        self._local.clear()
+        await self.namespace.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "enabled": self.enabled,
+            "backend": "redis" if self.namespace.service.redis_available() else "local",
+            "local_keys": len(self._local),
+            **self.stats,
+        }
+
+
+# 登录失败计数
+login_attempts = SharedCounter(cache_service.namespace(CachePrefix.LOGIN_ATTEMPTS, ttl=None, l1=False))
+
+
+def get_login_attempts() -> SharedCounter:
+    """获取登录失败计数器"""
+    return login_attempts
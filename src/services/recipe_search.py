@@ -0,0 +1,422 @@
+"""
+菜谱全文检索模块
+
+原来的菜谱搜索用 title ILIKE '%关键词%'，用不上索引，只能搜标题，每页还要单独执行一次 COUNT(*)。
+这里沿用聊天记录检索的做法，为菜谱建立倒排索引：
+- 索引标题、描述、食材名称和菜系，中文按 bigram 切分（分词规则与聊天记录检索相同）
+- SQLite 使用 FTS5 虚拟表并按 BM25 排序，各字段权重不同；PostgreSQL 使用带权重的
+  tsvector + GIN 索引，按 ts_rank_cd 排序
+- 一次分组查询同时得到难度和菜系的分面计数以及总数，翻页时不再重复计数
+- 按 (rank, id) 或 (created_at, id) 游标分页
+- 菜谱插入、修改、删除时通过 ORM 事件在同一个事务中增量更新索引
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import DDL, and_, event, func, inspect, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.recipe import RecipeModel
+from .chat_search import build_tsquery, parse_query, tokenize
+from .pagination import decode_token, encode_token
+
+logger = logging.getLogger(__name__)
+
+# BM25 各字段的权重：标题、描述、食材、菜系
+RECIPE_SEARCH_WEIGHTS = tuple(
+    float(value) for value in os.getenv("RECIPE_SEARCH_WEIGHTS", "3.0,1.0,2.0,1.0").split(",")
+)
+
+SQLITE_TABLE = "recipes_fts"
+POSTGRES_TABLE = "recipes_search"
+
+# 参与检索的字段（recipe_key 只用于删除时定位，不参与检索）
+_SEARCH_COLUMNS = "{title description ingredients cuisine}"
+
+SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+    "title, description, ingredients, cuisine, recipe_key, recipe_id UNINDEXED, tokenize = 'unicode61')"
+)
+POSTGRES_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+    "recipe_id VARCHAR PRIMARY KEY REFERENCES recipes(id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS ix_{POSTGRES_TABLE}_document ON {POSTGRES_TABLE} USING GIN (document)",
+)
+
+
+def ingredient_names(ingredients: Any) -> List[str]:
+    """取出食材列表中的名称（[{"name": "...", "amount": "..."}] 或字符串列表）"""
+    names = []
+    for item in ingredients or []:
+        if isinstance(item, dict):
+            item = item.get("name")
+        if isinstance(item, str) and item:
+            names.append(item)
+    return names
+
+
+def index_fields(recipe: Any) -> Dict[str, str]:
+    """生成写入索引的各字段（空格分隔的词条）"""
+    return {
+        "title": " ".join(tokenize(recipe.title)),
+        "description": " ".join(tokenize(recipe.description)),
+        "ingredients": " ".join(tokenize(" ".join(ingredient_names(recipe.ingredients)))),
+        "cuisine": " ".join(tokenize(recipe.cuisine_type)),
+    }
+
+
+def _key(value: str) -> str:
+    """把 ID 转换为只包含字母和数字的索引词条"""
+    return "r" + "".join(char for char in str(value).lower() if char.isascii() and char.isalnum())
+
+
+def build_fts5_query(terms: List[Tuple[str, List[str]]]) -> str:
+    """生成 FTS5 的 MATCH 表达式（只在检索字段中匹配）"""
+    parts = []
+    for kind, tokens in terms:
+        if kind == "phrase":
+            parts.append(f'{_SEARCH_COLUMNS} : "{" ".join(tokens)}"')
+        else:
+            parts.append(f'{_SEARCH_COLUMNS} : "{tokens[0]}"*')
+    return " AND ".join(parts)
+
+
+def _dialect(connection: Any) -> str:
+    return connection.dialect.name
+
+
+def index_recipe(connection: Any, recipe: Any) -> None:
+    """把一个菜谱写入索引（在 ORM 刷新时的同一个事务中执行）"""
+    fields = index_fields(recipe)
+    dialect = _dialect(connection)
+    if dialect == "sqlite":
+        connection.execute(
+            text(
+                f"INSERT INTO {SQLITE_TABLE} (title, description, ingredients, cuisine, recipe_key, recipe_id) "
+                "VALUES (:title, :description, :ingredients, :cuisine, :recipe_key, :recipe_id)"
+            ),
+            {**fields, "recipe_key": _key(recipe.id), "recipe_id": recipe.id},
+        )
+    elif dialect == "postgresql":
+        connection.execute(
+            text(
+                f"INSERT INTO {POSTGRES_TABLE} (recipe_id, document) VALUES (:recipe_id, "
+                "setweight(to_tsvector('simple', :title), 'A') || "
+                "setweight(to_tsvector('simple', :ingredients), 'B') || "
+                "setweight(to_tsvector('simple', :cuisine), 'B') || "
+                "setweight(to_tsvector('simple', :description), 'C')) "
+                "ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            {**fields, "recipe_id": recipe.id},
+        )
+
+
+def unindex_recipe(connection: Any, recipe_id: str) -> None:
+    """从索引中删除一个菜谱"""
+    dialect = _dialect(connection)
+    if dialect == "sqlite":
+        # recipe_id 列不建索引，先通过 recipe_key 词条定位到 rowid
+        connection.execute(
+            text(
+                f"DELETE FROM {SQLITE_TABLE} WHERE rowid IN ("
+                f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH :match "
+                "AND recipe_id = :recipe_id)"
+            ),
+            {"match": f'recipe_key : "{_key(recipe_id)}"', "recipe_id": recipe_id},
+        )
+    elif dialect == "postgresql":
+        connection.execute(
+            text(f"DELETE FROM {POSTGRES_TABLE} WHERE recipe_id = :recipe_id"),
+            {"recipe_id": recipe_id},
+        )
+
+
+_INDEXED_ATTRIBUTES = ("title", "description", "ingredients", "cuisine_type")
+
+
+@event.listens_for(RecipeModel, "after_insert")
+def _index_after_insert(mapper, connection, target) -> None:
+    index_recipe(connection, target)
+
+
+@event.listens_for(RecipeModel, "after_update")
+def _index_after_update(mapper, connection, target) -> None:
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in _INDEXED_ATTRIBUTES):
+        unindex_recipe(connection, target.id)
+        index_recipe(connection, target)
+
+
+@event.listens_for(RecipeModel, "after_delete")
+def _index_after_delete(mapper, connection, target) -> None:
+    unindex_recipe(connection, target.id)
+
+
+# 随 recipes 表一起创建和删除索引表
+event.listen(RecipeModel.__table__, "after_create", DDL(SQLITE_DDL).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_DDL:
+    event.listen(RecipeModel.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(
+    RecipeModel.__table__, "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {SQLITE_TABLE}").execute_if(dialect="sqlite")
+)
+event.listen(
+    RecipeModel.__table__, "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}").execute_if(dialect="postgresql")
+)
+
+
+def count_facets(
+    rows: List[Tuple[Optional[str], Optional[str], int]],
+    difficulty: Optional[str],
+    cuisine_type: Optional[str]
+) -> Tuple[int, Dict[str, Dict[str, int]]]:
+    """由 (难度, 菜系, 数量) 交叉表计算总数和分面计数
+
+    每个分面的计数只应用另一个分面的过滤条件，这样已经选中某个难度时仍然能看到其他难度各有多少结果
+
+    Returns:
+        Tuple[int, Dict[str, Dict[str, int]]]: 同时满足两个过滤条件的总数，以及 difficulty、cuisine_type 的分面计数
+    """
+    total = 0
+    facets: Dict[str, Dict[str, int]] = {"difficulty": {}, "cuisine_type": {}}
+    for row_difficulty, row_cuisine, count in rows:
+        difficulty_matched = not difficulty or row_difficulty == difficulty
+        cuisine_matched = not cuisine_type or row_cuisine == cuisine_type
+        if cuisine_matched and row_difficulty:
+            facets["difficulty"][row_difficulty] = facets["difficulty"].get(row_difficulty, 0) + count
+        if difficulty_matched and row_cuisine:
+            facets["cuisine_type"][row_cuisine] = facets["cuisine_type"].get(row_cuisine, 0) + count
+        if difficulty_matched and cuisine_matched:
+            total += count
+    return total, facets
+
+
+class RecipeSearchService:
+    """菜谱检索服务"""
+
+    def _hits_sql(self, dialect: str) -> str:
+        """生成命中菜谱的子查询；rank 越小越相关"""
+        if dialect == "postgresql":
+            return (
+                "SELECT r.id, r.created_at, r.difficulty, r.cuisine_type, -ts_rank_cd(s.document, q) AS rank "
+                f"FROM {POSTGRES_TABLE} s JOIN recipes r ON r.id = s.recipe_id, "
+                "to_tsquery('simple', :query) q WHERE s.document @@ q"
+            )
+        weights = ", ".join(str(weight) for weight in RECIPE_SEARCH_WEIGHTS)
+        return (
+            "SELECT r.id, r.created_at, r.difficulty, r.cuisine_type, "
+            f"bm25({SQLITE_TABLE}, {weights}, 0.0, 0.0) AS rank "
+            f"FROM {SQLITE_TABLE} JOIN recipes r ON r.id = {SQLITE_TABLE}.recipe_id "
+            f"WHERE {SQLITE_TABLE} MATCH :query"
+        )
+
+    async def _search_keyword(
+        self,
+        db: AsyncSession,
+        terms: List[Tuple[str, List[str]]],
+        filters: Dict[str, Optional[str]],
+        limit: int,
+        position: Optional[Dict[str, Any]],
+        offset: int,
+        with_facets: bool
+    ) -> Tuple[List[Any], Optional[List[Tuple]]]:
+        dialect = db.bind.dialect.name
+        hits = self._hits_sql(dialect)
+        params: Dict[str, Any] = {
+            "query": build_tsquery(terms) if dialect == "postgresql" else build_fts5_query(terms),
+            "limit": limit + 1,
+            "offset": offset,
+        }
+
+        conditions = []
+        for name, value in filters.items():
+            if value:
+                conditions.append(f"{name} = :{name}")
+                params[name] = value
+        if position is not None:
+            conditions.append("(rank > :after_rank OR (rank = :after_rank AND id > :after_id))")
+            params["after_rank"] = float(position["r"])
+            params["after_id"] = str(position["i"])
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        statement = text(
+            f"SELECT id, rank FROM ({hits}) AS hits{where} ORDER BY rank, id LIMIT :limit OFFSET :offset"
+        )
+        rows = (await db.execute(statement, params)).all()
+
+        facet_rows = None
+        if with_facets:
+            # 分面计数不带难度和菜系过滤，由 count_facets 分别应用
+            facet_rows = (await db.execute(
+                text(
+                    f"SELECT difficulty, cuisine_type, COUNT(*) FROM ({hits}) AS hits "
+                    "GROUP BY difficulty, cuisine_type"
+                ),
+                {"query": params["query"]},
+            )).all()
+        return rows, facet_rows
+
+    async def _search_all(
+        self,
+        db: AsyncSession,
+        filters: Dict[str, Optional[str]],
+        limit: int,
+        position: Optional[Dict[str, Any]],
+        offset: int,
+        with_facets: bool
+    ) -> Tuple[List[Any], Optional[List[Tuple]]]:
+        query = select(RecipeModel.id, RecipeModel.created_at)
+        for name, value in filters.items():
+            if value:
+                query = query.where(getattr(RecipeModel, name) == value)
+        if position is not None:
+            after_time = datetime.fromisoformat(position["t"])
+            query = query.where(or_(
+                RecipeModel.created_at < after_time,
+                and_(RecipeModel.created_at == after_time, RecipeModel.id > str(position["i"]))
+            ))
+        query = query.order_by(RecipeModel.created_at.desc(), RecipeModel.id).offset(offset).limit(limit + 1)
+        rows = (await db.execute(query)).all()
+
+        facet_rows = None
+        if with_facets:
+            facet_rows = (await db.execute(
+                select(RecipeModel.difficulty, RecipeModel.cuisine_type, func.count())
+                .group_by(RecipeModel.difficulty, RecipeModel.cuisine_type)
+            )).all()
+        return rows, facet_rows
+
+    async def search(
+        self,
+        db: AsyncSession,
+        keyword: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        cuisine_type: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        with_facets: bool = True
+    ) -> Dict[str, Any]:
+        """检索菜谱
+
+        有关键词时按相关度排序，否则按创建时间倒序
+
+        Args:
+            db: 数据库会话
+            keyword: 关键词，在标题、描述、食材和菜系中检索
+            difficulty: 难度过滤
+            cuisine_type: 菜系过滤
+            limit: 每页条数
+            cursor: 上一页返回的游标，传入时忽略 offset
+            offset: 页码分页的偏移量
+            with_facets: 是否返回总数和分面计数
+
+        Returns:
+            Dict[str, Any]: 包含 recipes、next_cursor、has_more，以及 with_facets 时的 total 和 facets
+
+        Raises:
+            ValueError: 游标无效
+        """
+        terms = parse_query(keyword) if keyword else []
+        sort = "relevance" if terms else "recent"
+        filters = {"difficulty": difficulty or None, "cuisine_type": cuisine_type or None}
+
+        position = None
+        if cursor:
+            position = decode_token(cursor)
+            try:
+                if position.get("s") != sort or "i" not in position:
+                    raise ValueError("游标与检索条件不匹配")
+                if sort == "relevance":
+                    float(position["r"])
+                else:
+                    datetime.fromisoformat(position["t"])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"无效的分页游标: {cursor}") from e
+            offset = 0
+
+        if terms:
+            rows, facet_rows = await self._search_keyword(db, terms, filters, limit, position, offset, with_facets)
+        elif keyword and keyword.strip():
+            # 关键词中没有可检索的字符（如只有标点）
+            rows, facet_rows = [], ([] if with_facets else None)
+        else:
+            rows, facet_rows = await self._search_all(db, filters, limit, position, offset, with_facets)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        recipes: List[RecipeModel] = []
+        if rows:
+            ids = [row[0] for row in rows]
+            loaded = (await db.execute(select(RecipeModel).where(RecipeModel.id.in_(ids)))).scalars().all()
+            by_id = {recipe.id: recipe for recipe in loaded}
+            recipes = [by_id[recipe_id] for recipe_id in ids if recipe_id in by_id]
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            position = {"s": sort, "i": last[0]}
+            if sort == "relevance":
+                position["r"] = float(last[1])
+            else:
+                position["t"] = last[1].isoformat()
+            next_cursor = encode_token(position)
+
+        page: Dict[str, Any] = {"recipes": recipes, "next_cursor": next_cursor, "has_more": has_more}
+        if facet_rows is not None:
+            page["total"], page["facets"] = count_facets(
+                [tuple(row) for row in facet_rows], filters["difficulty"], filters["cuisine_type"]
+            )
+        return page
+
+    async def rebuild(self, db: AsyncSession, batch_size: int = 500) -> int:
+        """重建全部菜谱的索引（用于迁移后回填已有数据）
+
+        Args:
+            db: 数据库会话
+            batch_size: 每批处理的菜谱数
+
+        Returns:
+            int: 写入索引的菜谱数
+        """
+        connection = await db.connection()
+        return await connection.run_sync(rebuild_index, batch_size)
+
+
+def rebuild_index(connection: Any, batch_size: int = 500) -> int:
+    """在同步连接上重建索引，供服务和 Alembic 迁移共用"""
+    dialect = _dialect(connection)
+    if dialect == "sqlite":
+        connection.execute(text(f"DELETE FROM {SQLITE_TABLE}"))
+    elif dialect == "postgresql":
+        connection.execute(text(f"DELETE FROM {POSTGRES_TABLE}"))
+    else:
+        return 0
+
+    total = 0
+    last_id = ""
+    while True:
+        rows = connection.execute(
+            select(
+                RecipeModel.id, RecipeModel.title, RecipeModel.description,
+                RecipeModel.ingredients, RecipeModel.cuisine_type
+            ).where(RecipeModel.id > last_id).order_by(RecipeModel.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            index_recipe(connection, row)
+        total += len(rows)
+        last_id = rows[-1].id
+    logger.info(f"菜谱全文索引重建完成，共 {total} 个菜谱")
+    return total
+
+
+# 创建服务实例
+recipe_search = RecipeSearchService()
@@ -0,0 +1,169 @@
+"""
+食物识别结果缓存模块
+
+以图片内容的 SHA-256 为键缓存识别结果：内存 LRU 层 + 可选的磁盘层，
+支持过期时间和命中统计。客户端重试时重复上传的同一张图片无需再次调用视觉模型。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+# 缓存配置
+RECOGNITION_CACHE_MAX_ENTRIES = int(os.getenv("RECOGNITION_CACHE_MAX_ENTRIES", "1024"))
+RECOGNITION_CACHE_TTL = int(os.getenv("RECOGNITION_CACHE_TTL", str(7 * 24 * 3600)))
+# 磁盘缓存目录，设置为空字符串时禁用磁盘层
+RECOGNITION_CACHE_DIR = os.getenv("RECOGNITION_CACHE_DIR", os.path.join("uploads", ".recognition_cache"))
+
+# 超过该大小的数据在线程中计算哈希，避免阻塞事件循环
+_HASH_IN_THREAD_BYTES = 1024 * 1024
+
+
+def content_hash(data: Union[bytes, bytearray, memoryview]) -> str:
+    """计算内容的 SHA-256 十六进制摘要"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class RecognitionCache:
+    """食物识别结果缓存
+
+    键为图片内容哈希；值为可 JSON 序列化的识别结果
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RECOGNITION_CACHE_MAX_ENTRIES,
+        ttl: int = RECOGNITION_CACHE_TTL,
+        disk_dir: Optional[Union[str, Path]] = RECOGNITION_CACHE_DIR
+    ):
+        """初始化缓存
+
+        Args:
+            max_entries: 内存层最大条目数
+            ttl: 过期时间（秒）
+            disk_dir: 磁盘层目录，为空时禁用磁盘层
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+
+    async def key_for(self, data: Union[bytes, bytearray, memoryview]) -> str:
+        """计算图片数据的缓存键"""
+        if len(data) > _HASH_IN_THREAD_BYTES:
+            # hashlib 在处理大块数据时会释放 GIL
+            return await asyncio.to_thread(content_hash, data)
+        return content_hash(data)
+
+    def _disk_path(self, key: str) -> Path:
+        # 按哈希前两位分目录，避免单个目录下文件过多
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        """写入内存层并按 LRU 淘汰"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的识别结果
+
+        Args:
+            key: 图片内容哈希
+
+        Returns:
+            Optional[Dict[str, Any]]: 识别结果，未命中或已过期时返回 None
+        """
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+            self.stats["expired"] += 1
+
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            try:
+                async with aiofiles.open(path, "r", encoding="utf-8") as f:
+                    record = json.loads(await f.read())
+                if record["expires_at"] > now:
+                    self._remember(key, record["expires_at"], record["value"])
+                    self.stats["disk_hits"] += 1
+                    return record["value"]
+                self.stats["expired"] += 1
+                await asyncio.to_thread(path.unlink, True)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"读取识别结果磁盘缓存失败: {path}, 错误: {str(e)}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """缓存识别结果
+
+        Args:
+            key: 图片内容哈希
+            value: 识别结果
+        """
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, value)
+        self.stats["sets"] += 1
+
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # 先写临时文件再重命名，避免并发读取到不完整的内容
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+                    await f.write(json.dumps({"expires_at": expires_at, "value": value}, ensure_ascii=False))
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.warning(f"写入识别结果磁盘缓存失败: {path}, 错误: {str(e)}")
+
+    def clear(self) -> None:
+        """清空内存层"""
+        self._memory.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "disk_enabled": self.disk_dir is not None,
+            **self.stats,
+            "hit_rate": round(hits / total, 4) if total else 0.0
+        }
+
+
+# 创建服务实例
+recognition_cache = RecognitionCache()
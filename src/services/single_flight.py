@@ -0,0 +1,178 @@
+"""
+请求合并（single-flight）模块
+
+相同输入的并发调用只向上游发起一次请求：
+- SingleFlight：普通协程，所有调用方共享同一个结果
+- StreamSingleFlight：流式生成器，每个订阅者都从头回放同一个上游流
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts: Any) -> str:
+    """根据调用参数生成合并键
+
+    Args:
+        *parts: 可 JSON 序列化的参数
+
+    Returns:
+        str: 参数的 SHA-256 摘要
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """协程请求合并"""
+
+    def __init__(self, name: str):
+        """初始化
+
+        Args:
+            name: 名称（用于日志和统计）
+        """
+        self.name = name
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行调用，相同键的并发调用共享同一个结果
+
+        Args:
+            key: 合并键
+            factory: 创建上游调用的函数
+
+        Returns:
+            Any: 上游调用的结果
+        """
+        self.stats["calls"] += 1
+        future = self._flights.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            logger.info(f"合并重复的{self.name}请求: {key[:16]}")
+            # shield 避免某个调用方取消时影响其他调用方
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(factory())
+        self._flights[key] = future
+
+        def done(f: asyncio.Future) -> None:
+            self._flights.pop(key, None)
+            if not f.cancelled():
+                # 标记异常已被读取，所有调用方都离开时也不会产生告警
+                f.exception()
+
+        future.add_done_callback(done)
+        return await asyncio.shield(future)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {"in_flight": len(self._flights), **self.stats}
+
+
+class _SharedStream:
+    """一个正在进行的上游流"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """唤醒所有等待新数据的订阅者"""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class StreamSingleFlight:
+    """流式请求合并
+
+    第一个订阅者启动上游流，数据块被缓存下来；同一时间内相同键的订阅者
+    从第一个数据块开始回放并继续接收后续数据。所有订阅者都离开后取消上游流。
+    """
+
+    def __init__(self, name: str):
+        """初始化
+
+        Args:
+            name: 名称（用于日志和统计）
+        """
+        self.name = name
+        self._flights: Dict[str, _SharedStream] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "cancelled": 0}
+
+    async def _pump(self, key: str, shared: _SharedStream, upstream: AsyncGenerator[Any, None]) -> None:
+        """读取上游流并分发给订阅者"""
+        try:
+            async for chunk in upstream:
+                shared.chunks.append(chunk)
+                shared.notify()
+        except asyncio.CancelledError:
+            shared.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            shared.error = e
+        finally:
+            await upstream.aclose()
+            shared.done = True
+            if self._flights.get(key) is shared:
+                del self._flights[key]
+            shared.notify()
+
+    async def subscribe(
+        self,
+        key: str,
+        factory: Callable[[], AsyncGenerator[Any, None]]
+    ) -> AsyncGenerator[Any, None]:
+        """订阅流，相同键的并发订阅共享同一个上游流
+
+        Args:
+            key: 合并键
+            factory: 创建上游流的函数
+
+        Yields:
+            Any: 上游流的数据块（每个订阅者都从头开始）
+        """
+        self.stats["calls"] += 1
+        shared = self._flights.get(key)
+        if shared is None:
+            shared = _SharedStream()
+            self._flights[key] = shared
+            shared.task = asyncio.create_task(self._pump(key, shared, factory()))
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"合并重复的{self.name}请求: {key[:16]}")
+
+        shared.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(shared.chunks):
+                    yield shared.chunks[position]
+                    position += 1
+                if shared.done:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+                await shared.changed.wait()
+        finally:
+            shared.subscribers -= 1
+            if shared.subscribers == 0 and not shared.done and shared.task is not None:
+                # 没有订阅者了，停止上游流，后续的相同请求重新发起
+                self.stats["cancelled"] += 1
+                if self._flights.get(key) is shared:
+                    del self._flights[key]
+                shared.task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {"in_flight": len(self._flights), **self.stats}
@@ -0,0 +1,608 @@
+"""
+上传文件存储模块
+
+上传文件按内容寻址存储：
+- 上传数据按块流式写入暂存文件，同时计算 SHA-256，内存占用只有一个块的大小
+- 只用开头几 KB 数据检测 MIME 类型，不再把整个文件读入内存
+- 存储键为 <类别>/<哈希前两位>/<哈希三四位>/<哈希>.<扩展名>，单个目录不会无限增长
+- 相同内容的文件只保存一份，重复上传直接复用已有文件
+- 存储后端可替换：本地文件系统或 S3 兼容的对象存储
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional, Set
+from urllib.parse import quote, urlsplit
+
+import aiofiles
+import aiofiles.os
+import httpx
+import magic
+
+logger = logging.getLogger(__name__)
+
+# 上传文件根目录
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+# 上传文件的访问路径前缀
+UPLOAD_URL_PREFIX = "/uploads"
+# 存储后端："local"（默认）或 "s3"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+# 流式读写的块大小（字节）
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(64 * 1024)))
+# 检测 MIME 类型时读取的字节数
+STORAGE_SNIFF_BYTES = int(os.getenv("STORAGE_SNIFF_BYTES", "8192"))
+
+# S3 兼容存储配置
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+# 对外访问的地址（如 CDN），为空时使用 <endpoint>/<bucket>
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL", "")
+
+# 检测到的 MIME 类型对应的扩展名
+MIME_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/m4a": "m4a",
+    "audio/x-m4a": "m4a",
+    "audio/aac": "aac",
+    "audio/ogg": "ogg",
+}
+
+
+class StorageError(ValueError):
+    """文件存储错误"""
+
+
+class UnsupportedFileType(StorageError):
+    """文件类型不允许"""
+
+    def __init__(self, mime_type: str):
+        super().__init__(f"不支持的文件类型: {mime_type}")
+        self.mime_type = mime_type
+
+
+class FileTooLarge(StorageError):
+    """文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"文件大小超过限制: {max_size} bytes")
+        self.max_size = max_size
+
+
+@dataclass
+class StoredFile:
+    """已保存的文件"""
+
+    key: str
+    url: str
+    content_type: str
+    size: int
+    sha256: str
+    deduplicated: bool = False
+    local_path: Optional[Path] = None
+
+
+def shard_key(category: str, digest: str, ext: str) -> str:
+    """根据内容哈希生成分片的存储键
+
+    Args:
+        category: 文件类别（如 images、voices、avatars）
+        digest: 内容的 SHA-256 十六进制摘要
+        ext: 扩展名（不含点）
+
+    Returns:
+        str: 存储键
+    """
+    name = f"{digest}.{ext}" if ext else digest
+    return f"{category}/{digest[:2]}/{digest[2:4]}/{name}"
+
+
+class StorageBackend:
+    """存储后端基类"""
+
+    name = "base"
+
+    async def exists(self, key: str) -> bool:
+        """文件是否已存在"""
+        raise NotImplementedError
+
+    async def put_file(self, key: str, path: Path, content_type: str, sha256: str, size: int) -> None:
+        """把暂存文件保存到存储键（本地后端直接移动文件）"""
+        raise NotImplementedError
+
+    def open(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """按块读取文件内容"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """删除文件（不存在时忽略）"""
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        """文件的访问地址"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """文件的本地路径，不在本地时返回 None"""
+        return None
+
+    async def close(self) -> None:
+        """释放后端持有的资源"""
+
+
+class LocalStorageBackend(StorageBackend):
+    """本地文件系统存储"""
+
+    name = "local"
+
+    def __init__(self, root: Path = UPLOAD_DIR, url_prefix: str = UPLOAD_URL_PREFIX):
+        """初始化
+
+        Args:
+            root: 存储根目录
+            url_prefix: 访问路径前缀
+        """
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def local_path(self, key: str) -> Path:
+        root = self.root.resolve()
+        path = (root / key).resolve()
+        if root not in path.parents:
+            raise StorageError(f"非法的存储键: {key}")
+        return path
+
+    async def exists(self, key: str) -> bool:
+        return await aiofiles.os.path.exists(self.local_path(key))
+
+    async def put_file(self, key: str, path: Path, content_type: str, sha256: str, size: int) -> None:
+        target = self.local_path(key)
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        # 暂存目录与存储目录在同一文件系统，移动是原子的
+        await aiofiles.os.replace(path, target)
+
+    async def open(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.local_path(key), "rb") as f:
+            while True:
+                chunk = await f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def delete(self, key: str) -> None:
+        try:
+            await aiofiles.os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+class S3StorageBackend(StorageBackend):
+    """S3 兼容的对象存储（路径风格访问，AWS Signature V4 签名）"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        endpoint: str = S3_ENDPOINT,
+        bucket: str = S3_BUCKET,
+        access_key: str = S3_ACCESS_KEY,
+        secret_key: str = S3_SECRET_KEY,
+        region: str = S3_REGION,
+        public_url: str = S3_PUBLIC_URL,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        """初始化
+
+        Args:
+            endpoint: 服务地址，如 https://s3.amazonaws.com 或本地 MinIO 地址
+            bucket: 存储桶
+            access_key: 访问密钥ID
+            secret_key: 访问密钥
+            region: 区域
+            public_url: 对外访问的地址，为空时使用 <endpoint>/<bucket>
+            http_client: HTTP 客户端（测试时可以注入本地替身）
+        """
+        if not endpoint or not bucket:
+            raise StorageError("S3 存储需要配置 S3_ENDPOINT 和 S3_BUCKET")
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.public_url = (public_url or f"{self.endpoint}/{bucket}").rstrip("/")
+        self.http_client = http_client or httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=5.0))
+
+    def _path(self, key: str) -> str:
+        return "/" + quote(f"{self.bucket}/{key}", safe="/-_.~")
+
+    def _signed_headers(
+        self,
+        method: str,
+        path: str,
+        payload_hash: str = "UNSIGNED-PAYLOAD",
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
+        """生成带 Signature V4 签名的请求头"""
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date = now.strftime("%Y%m%d")
+
+        signed = {k.lower(): str(v).strip() for k, v in (headers or {}).items()}
+        signed.update({
+            "host": urlsplit(self.endpoint).netloc,
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": amz_date,
+        })
+        names = sorted(signed)
+        canonical_request = "\n".join([
+            method,
+            path,
+            "",
+            "".join(f"{name}:{signed[name]}\n" for name in names),
+            ";".join(names),
+            payload_hash,
+        ])
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ])
+        signing_key = _hmac(_hmac(_hmac(_hmac(f"AWS4{self.secret_key}".encode("utf-8"), date), self.region), "s3"), "aws4_request")
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        signed["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(names)}, Signature={signature}"
+        )
+        # host 由 HTTP 客户端自动设置
+        del signed["host"]
+        return signed
+
+    async def exists(self, key: str) -> bool:
+        path = self._path(key)
+        response = await self.http_client.head(self.endpoint + path, headers=self._signed_headers("HEAD", path))
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    async def put_file(self, key: str, path: Path, content_type: str, sha256: str, size: int) -> None:
+        async def body() -> AsyncIterator[bytes]:
+            async with aiofiles.open(path, "rb") as f:
+                while True:
+                    chunk = await f.read(STORAGE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        object_path = self._path(key)
+        headers = self._signed_headers(
+            "PUT",
+            object_path,
+            payload_hash=sha256,
+            headers={"content-type": content_type, "content-length": str(size)},
+        )
+        response = await self.http_client.put(self.endpoint + object_path, content=body(), headers=headers)
+        response.raise_for_status()
+        try:
+            await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def open(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        path = self._path(key)
+        async with self.http_client.stream("GET", self.endpoint + path, headers=self._signed_headers("GET", path)) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+
+    async def delete(self, key: str) -> None:
+        path = self._path(key)
+        response = await self.http_client.delete(self.endpoint + path, headers=self._signed_headers("DELETE", path))
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    async def close(self) -> None:
+        await self.http_client.aclose()
+
+
+class StagedUpload:
+    """正在写入的上传文件
+
+    数据先写入暂存文件，同时计算哈希和检测类型，提交时再按内容哈希保存到存储后端
+    """
+
+    def __init__(
+        self,
+        engine: "StorageEngine",
+        category: str,
+        allowed_types: Optional[Set[str]] = None,
+        max_size: Optional[int] = None,
+        ext: Optional[str] = None
+    ):
+        self.engine = engine
+        self.category = category
+        self.allowed_types = allowed_types
+        self.max_size = max_size
+        self.ext = ext
+        self.size = 0
+        self.content_type: Optional[str] = None
+        self.path = engine.staging_dir / f"{uuid.uuid4().hex}.part"
+        self._hash = hashlib.sha256()
+        self._head = bytearray()
+        self._file: Any = None
+
+    def _sniff(self) -> None:
+        """根据开头的数据检测 MIME 类型并校验"""
+        try:
+            self.content_type = magic.from_buffer(bytes(self._head[:self.engine.sniff_bytes]), mime=True)
+        except Exception as e:
+            logger.warning(f"文件类型检测失败: {str(e)}")
+            self.content_type = "application/octet-stream"
+        self._head = bytearray()
+        if self.allowed_types is not None and self.content_type not in self.allowed_types:
+            raise UnsupportedFileType(self.content_type)
+
+    async def write(self, chunk: bytes) -> None:
+        """写入一块数据
+
+        Raises:
+            UnsupportedFileType: 检测到的类型不允许
+            FileTooLarge: 超过大小限制
+        """
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise FileTooLarge(self.max_size)
+        if self.content_type is None:
+            self._head.extend(chunk)
+            if len(self._head) >= self.engine.sniff_bytes:
+                self._sniff()
+        self._hash.update(chunk)
+        if self._file is None:
+            await aiofiles.os.makedirs(self.path.parent, exist_ok=True)
+            self._file = await aiofiles.open(self.path, "wb")
+        await self._file.write(chunk)
+
+    async def commit(self) -> StoredFile:
+        """完成写入并保存到存储后端，相同内容的文件只保存一份"""
+        if self.size == 0:
+            await self.abort()
+            raise StorageError("文件内容为空")
+        if self.content_type is None:
+            self._sniff()
+        await self._file.close()
+        self._file = None
+
+        digest = self._hash.hexdigest()
+        ext = self.ext or MIME_EXTENSIONS.get(self.content_type, "bin")
+        key = shard_key(self.category, digest, ext)
+        backend = self.engine.backend
+        stats = self.engine.stats
+
+        deduplicated = await backend.exists(key)
+        if deduplicated:
+            await aiofiles.os.remove(self.path)
+            stats["deduplicated"] += 1
+            stats["bytes_deduplicated"] += self.size
+        else:
+            await backend.put_file(key, self.path, self.content_type, digest, self.size)
+            stats["bytes_written"] += self.size
+        stats["uploads"] += 1
+        logger.info(f"文件已保存: {key}, 大小: {self.size}, 类型: {self.content_type}, 复用已有文件: {deduplicated}")
+
+        return StoredFile(
+            key=key,
+            url=backend.url(key),
+            content_type=self.content_type,
+            size=self.size,
+            sha256=digest,
+            deduplicated=deduplicated,
+            local_path=backend.local_path(key),
+        )
+
+    async def abort(self) -> None:
+        """放弃写入并删除暂存文件"""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        try:
+            await aiofiles.os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class StorageEngine:
+    """上传文件存储引擎"""
+
+    def __init__(
+        self,
+        backend: Optional[StorageBackend] = None,
+        staging_dir: Path = UPLOAD_DIR / ".staging",
+        chunk_size: int = STORAGE_CHUNK_SIZE,
+        sniff_bytes: int = STORAGE_SNIFF_BYTES
+    ):
+        """初始化
+
+        Args:
+            backend: 存储后端，默认根据 STORAGE_BACKEND 创建
+            staging_dir: 暂存目录（本地后端应与存储目录在同一文件系统）
+            chunk_size: 流式读写的块大小
+            sniff_bytes: 检测 MIME 类型时读取的字节数
+        """
+        self.backend = backend or create_backend()
+        self.staging_dir = Path(staging_dir)
+        self.chunk_size = chunk_size
+        self.sniff_bytes = sniff_bytes
+        self.stats = {
+            "uploads": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "bytes_written": 0,
+            "bytes_deduplicated": 0,
+        }
+
+    def stage(
+        self,
+        category: str,
+        allowed_types: Optional[Set[str]] = None,
+        max_size: Optional[int] = None,
+        ext: Optional[str] = None
+    ) -> StagedUpload:
+        """开始一次分块写入，适用于边接收边处理的上传
+
+        Args:
+            category: 文件类别
+            allowed_types: 允许的 MIME 类型，为空时不校验
+            max_size: 最大文件大小（字节）
+            ext: 扩展名，为空时根据检测到的类型决定
+
+        Returns:
+            StagedUpload: 暂存的上传文件
+        """
+        return StagedUpload(self, category, allowed_types, max_size, ext)
+
+    async def save_stream(
+        self,
+        chunks: AsyncIterable[bytes],
+        category: str,
+        allowed_types: Optional[Set[str]] = None,
+        max_size: Optional[int] = None,
+        ext: Optional[str] = None
+    ) -> StoredFile:
+        """保存分块到达的文件
+
+        Args:
+            chunks: 数据块
+            category: 文件类别
+            allowed_types: 允许的 MIME 类型，为空时不校验
+            max_size: 最大文件大小（字节）
+            ext: 扩展名，为空时根据检测到的类型决定
+
+        Returns:
+            StoredFile: 已保存的文件
+
+        Raises:
+            StorageError: 文件为空、类型不允许或超过大小限制
+        """
+        staged = self.stage(category, allowed_types, max_size, ext)
+        try:
+            async for chunk in chunks:
+                await staged.write(chunk)
+            return await staged.commit()
+        except BaseException as e:
+            await staged.abort()
+            if isinstance(e, StorageError):
+                self.stats["rejected"] += 1
+            raise
+
+    async def save_upload(self, file: Any, category: str, **kwargs: Any) -> StoredFile:
+        """保存 FastAPI 的上传文件，按块读取而不是一次读入内存
+
+        Args:
+            file: UploadFile 对象
+            category: 文件类别
+            **kwargs: 传给 save_stream 的其他参数
+
+        Returns:
+            StoredFile: 已保存的文件
+        """
+        async def chunks() -> AsyncIterator[bytes]:
+            while True:
+                chunk = await file.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+        return await self.save_stream(chunks(), category, **kwargs)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> str:
+        """按指定的存储键保存生成的数据（如图片缩略图），返回访问地址
+
+        Args:
+            key: 存储键
+            data: 文件内容
+            content_type: MIME 类型
+
+        Returns:
+            str: 文件的访问地址
+        """
+        path = self.staging_dir / f"{uuid.uuid4().hex}.part"
+        await aiofiles.os.makedirs(self.staging_dir, exist_ok=True)
+        try:
+            async with aiofiles.open(path, "wb") as f:
+                await f.write(data)
+            await self.backend.put_file(key, path, content_type, hashlib.sha256(data).hexdigest(), len(data))
+        except BaseException:
+            try:
+                await aiofiles.os.remove(path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.stats["bytes_written"] += len(data)
+        return self.backend.url(key)
+
+    async def exists(self, key: str) -> bool:
+        """文件是否已存在"""
+        return await self.backend.exists(key)
+
+    async def read(self, key: str) -> bytes:
+        """读取完整的文件内容（用于需要整个文件的场景，如发送给识别服务）"""
+        return b"".join([chunk async for chunk in self.backend.open(key, self.chunk_size)])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计信息"""
+        return {
+            "backend": self.backend.name,
+            "chunk_size": self.chunk_size,
+            "sniff_bytes": self.sniff_bytes,
+            **self.stats,
+        }
+
+
+def create_backend(kind: str = STORAGE_BACKEND) -> StorageBackend:
+    """根据配置创建存储后端
+
+    Args:
+        kind: 后端类型，"local" 或 "s3"
+
+    Returns:
+        StorageBackend: 存储后端
+    """
+    if kind == "s3":
+        return S3StorageBackend()
+    if kind != "local":
+        logger.warning(f"未知的存储后端 {kind}，使用本地文件系统")
+    return LocalStorageBackend()
+
+
+# 创建服务实例
+storage_engine = StorageEngine()
@@ -8,13 +8,13 @@ from typing import Dict, Optional
 from datetime import datetime
 import logging
 from ..models.user import UserProfileModel
-from .cache_service import CacheService, CachePrefix
+from .cache_service import CachePrefix, cache_service
 from .error_service import error_handler, ErrorService, ErrorCode
 from ..validators import UserProfileInput
 
 class UserService:
     def __init__(self):
-        self.cache_service = CacheService()
+        self.cache_service = cache_service
         self.error_service = ErrorService()
         self.user_profiles = {}
         self.logger = logging.getLogger(__name__)
@@ -0,0 +1,346 @@
+"""
+流式语音转写服务模块
+
+边接收音频边转写：把上传的音频流切成固定长度的窗口，逐个送入语音识别服务，
+在上传结束之前就能产出部分转写结果。
+"""
+
+import asyncio
+import logging
+import os
+import re
+import struct
+from collections import deque
+from functools import partial
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import anyio
+import numpy as np
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .audio_decoder import TARGET_SAMPLE_RATE, _to_mono_float, audio_decoder, resample
+
+logger = logging.getLogger(__name__)
+
+# 每个转写窗口的时长（秒）
+VOICE_STREAM_WINDOW_SECONDS = float(os.getenv("VOICE_STREAM_WINDOW_SECONDS", "5"))
+# 同一个音频流中同时进行的窗口转写数量
+VOICE_STREAM_MAX_PENDING = int(os.getenv("VOICE_STREAM_MAX_PENDING", "2"))
+
+# 可以边接收边解码的 PCM 内容类型（其余格式需要完整接收后再解码）
+PCM_CONTENT_TYPES = {"audio/pcm", "audio/l16", "audio/x-pcm", "audio/raw"}
+WAV_CONTENT_TYPES = {"audio/wav", "audio/x-wav", "audio/wave"}
+
+_PCM_DTYPES = {
+    (1, 8): np.uint8,
+    (1, 16): np.dtype("<i2"),
+    (1, 32): np.dtype("<i4"),
+    (3, 32): np.dtype("<f4"),
+}
+
+# 中日韩文字和全角符号，两侧都是这类字符时窗口文本之间不加空格
+_CJK_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def join_transcripts(texts: List[str]) -> str:
+    """拼接各窗口的转写文本
+
+    中文等不以空格分词的文字直接拼接，其余情况用一个空格分隔，避免相邻窗口的单词粘在一起
+
+    Args:
+        texts: 按窗口顺序排列的转写文本
+
+    Returns:
+        str: 完整的转写文本
+    """
+    result = ""
+    for text in texts:
+        text = " ".join(text.split())
+        if not text:
+            continue
+        if result and not (_CJK_PATTERN.match(result[-1]) and _CJK_PATTERN.match(text[0])):
+            result += " "
+        result += text
+    return result
+
+
+class StreamingPCMDecoder:
+    """增量 PCM 解码器
+
+    支持 WAV（边接收边解析文件头）和裸 PCM；压缩格式会缓存全部数据，
+    在 finish() 时交给解码进程池一次性解码。输出为原始采样率下的单声道 float32 采样。
+    """
+
+    def __init__(
+        self,
+        content_type: str = "audio/wav",
+        sample_rate: int = TARGET_SAMPLE_RATE,
+        channels: int = 1
+    ):
+        """初始化解码器
+
+        Args:
+            content_type: 音频的内容类型
+            sample_rate: 裸 PCM 的采样率
+            channels: 裸 PCM 的声道数
+        """
+        content_type = content_type.split(";")[0].strip().lower()
+        self._buffer = bytearray()
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._dtype: Optional[np.dtype] = None
+        self._extensible_float = False
+
+        if content_type in PCM_CONTENT_TYPES:
+            self.mode = "pcm"
+            self._dtype = np.dtype("<i2")
+        elif content_type in WAV_CONTENT_TYPES:
+            self.mode = "wav_header"
+        else:
+            self.mode = "buffered"
+
+    @property
+    def streaming(self) -> bool:
+        """是否可以边接收边解码"""
+        return self.mode != "buffered"
+
+    def _parse_wav_header(self) -> bool:
+        """尝试从缓冲区解析 WAV 文件头，成功时把缓冲区截到 data 块开头"""
+        buf = self._buffer
+        if len(buf) < 12:
+            return False
+        if buf[:4] != b"RIFF" or buf[8:12] != b"WAVE":
+            # 不是 WAV，退回完整接收后再解码
+            self.mode = "buffered"
+            return False
+
+        offset = 12
+        fmt = None
+        while offset + 8 <= len(buf):
+            chunk_id = bytes(buf[offset:offset + 4])
+            chunk_size = struct.unpack_from("<I", buf, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAV 文件缺少 fmt 块")
+                format_tag, channels, sample_rate, _, _, bits = fmt
+                if format_tag == 0xFFFE:
+                    # WAVE_FORMAT_EXTENSIBLE，子格式与普通 PCM/浮点一致
+                    format_tag = 3 if bits == 32 and self._extensible_float else 1
+                dtype = _PCM_DTYPES.get((format_tag, bits))
+                if dtype is None:
+                    raise ValueError(f"不支持的 WAV 采样格式: format={format_tag}, bits={bits}")
+                self._dtype = np.dtype(dtype)
+                self.channels = channels
+                self.sample_rate = sample_rate
+                del buf[:body]
+                self.mode = "pcm"
+                return True
+            if body + chunk_size > len(buf):
+                return False
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack_from("<HHIIHH", buf, body)
+                # 扩展格式的子格式 GUID 前两个字节即格式编号
+                self._extensible_float = chunk_size >= 26 and struct.unpack_from("<H", buf, body + 24)[0] == 3
+            offset = body + chunk_size + (chunk_size & 1)
+        return False
+
+    def _drain_pcm(self) -> np.ndarray:
+        """取出缓冲区中完整的采样帧"""
+        frame_bytes = self._dtype.itemsize * self.channels
+        usable = len(self._buffer) - len(self._buffer) % frame_bytes
+        if usable == 0:
+            return np.zeros(0, dtype=np.float32)
+        samples = np.frombuffer(bytes(self._buffer[:usable]), dtype=self._dtype)
+        del self._buffer[:usable]
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels)
+        return _to_mono_float(samples)
+
+    def feed(self, chunk: bytes) -> np.ndarray:
+        """输入一段数据，返回本次可以解码出的采样
+
+        Args:
+            chunk: 音频数据片段
+
+        Returns:
+            np.ndarray: 原始采样率下的单声道 float32 采样
+        """
+        self._buffer += chunk
+        if self.mode == "wav_header" and not self._parse_wav_header():
+            return np.zeros(0, dtype=np.float32)
+        if self.mode == "pcm":
+            return self._drain_pcm()
+        return np.zeros(0, dtype=np.float32)
+
+    async def finish(self) -> np.ndarray:
+        """输入结束，返回剩余的采样
+
+        压缩格式在解码进程池中一次性解码为 16kHz，不阻塞事件循环
+        """
+        if self.mode == "buffered" or self.mode == "wav_header":
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            if not data:
+                return np.zeros(0, dtype=np.float32)
+            self.sample_rate = TARGET_SAMPLE_RATE
+            return _to_mono_float(await audio_decoder.decode(data))
+        return self._drain_pcm()
+
+
+class VoiceStreamTranscriber:
+    """流式语音转写器
+
+    把音频流切分为固定长度的窗口，每凑满一个窗口就提交转写，
+    转写结果按窗口顺序依次产出。
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[np.ndarray], Awaitable[str]],
+        window_seconds: float = VOICE_STREAM_WINDOW_SECONDS,
+        max_pending: int = VOICE_STREAM_MAX_PENDING
+    ):
+        """初始化转写器
+
+        Args:
+            transcribe: 转写函数，输入 16kHz 单声道 int16 数组，返回文本
+            window_seconds: 窗口时长（秒）
+            max_pending: 同时进行的窗口转写数量上限
+        """
+        self.transcribe = transcribe
+        self.window_seconds = window_seconds
+        self.max_pending = max(1, max_pending)
+
+    @staticmethod
+    def _to_int16(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+        samples = resample(samples, sample_rate)
+        return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+    async def run(
+        self,
+        chunks: AsyncIterator[bytes],
+        decoder: StreamingPCMDecoder,
+        max_bytes: Optional[int] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """边接收边转写
+
+        Args:
+            chunks: 音频数据流
+            decoder: 增量解码器
+            max_bytes: 允许接收的最大字节数
+
+        Yields:
+            Dict[str, Any]: {"type": "partial", ...} 每个窗口的转写结果，
+                最后是 {"type": "final", "text": ...} 完整的转写结果
+        """
+        pending: Deque[Tuple[asyncio.Task, int, float, float]] = deque()
+        windows: List[np.ndarray] = []
+        buffered = 0
+        received = 0
+        index = 0
+        texts: List[str] = []
+        position = 0.0
+
+        def submit(samples: np.ndarray, sample_rate: int) -> None:
+            nonlocal index, position
+            duration = samples.shape[0] / sample_rate
+            window = self._to_int16(samples, sample_rate)
+            task = asyncio.create_task(self.transcribe(window))
+            pending.append((task, index, position, position + duration))
+            index += 1
+            position += duration
+
+        async def next_result() -> Dict[str, Any]:
+            task, window_index, start, end = pending[0]
+            text = await task
+            pending.popleft()
+            texts.append(text)
+            return {
+                "type": "partial",
+                "index": window_index,
+                "text": text.strip(),
+                "start": round(start, 3),
+                "end": round(end, 3)
+            }
+
+        try:
+            async for chunk in chunks:
+                received += len(chunk)
+                if max_bytes is not None and received > max_bytes:
+                    raise ValueError(f"音频大小超过限制: {max_bytes} bytes")
+
+                samples = decoder.feed(chunk)
+                if samples.size:
+                    windows.append(samples)
+                    buffered += samples.size
+
+                window_size = int(self.window_seconds * decoder.sample_rate)
+                while decoder.streaming and buffered >= window_size:
+                    merged = np.concatenate(windows)
+                    submit(merged[:window_size], decoder.sample_rate)
+                    rest = merged[window_size:]
+                    windows, buffered = ([rest] if rest.size else []), rest.size
+
+                    # 转写跟不上接收速度时等待最早的窗口，限制内存和并发
+                    if len(pending) >= self.max_pending:
+                        yield await next_result()
+
+                # 已完成的窗口按顺序立即产出
+                while pending and pending[0][0].done():
+                    yield await next_result()
+
+            tail = await decoder.finish()
+            if tail.size:
+                windows.append(tail)
+            if windows:
+                merged = np.concatenate(windows)
+                window_size = int(self.window_seconds * decoder.sample_rate)
+                for start in range(0, merged.shape[0], window_size):
+                    submit(merged[start:start + window_size], decoder.sample_rate)
+
+            while pending:
+                yield await next_result()
+
+            yield {
+                "type": "final",
+                "text": join_transcripts(texts),
+                "duration": round(position, 3)
+            }
+        finally:
+            for task, *_ in pending:
+                task.cancel()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """边读取请求体边返回的流式响应
+
+    StreamingResponse 在发送响应的同时会读取 receive() 以检测客户端断开，
+    这会把尚未读取的请求体消息丢弃。这里在请求体读取完毕之后才开始监听断开连接。
+    """
+
+    def __init__(self, content: Any, body_consumed: asyncio.Event, **kwargs):
+        """初始化响应
+
+        Args:
+            content: 响应内容生成器
+            body_consumed: 请求体读取完毕时设置的事件
+            **kwargs: StreamingResponse 的其他参数
+        """
+        super().__init__(content, **kwargs)
+        self.body_consumed = body_consumed
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async with anyio.create_task_group() as task_group:
+
+            async def wrap(func: Callable[[], Awaitable[None]]) -> None:
+                await func()
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(wrap, partial(self.stream_response, send))
+            await self.body_consumed.wait()
+            await wrap(partial(self.listen_for_disconnect, receive))
+
+        if self.background is not None:
+            await self.background()
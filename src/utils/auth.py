@@ -1,10 +1,10 @@
 """认证工具模块"""
 
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 import logging
+import uuid
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,22 +13,25 @@ from ..models.user import User
 from ..config.settings import settings
 from ..database import get_db
 from ..schemas.auth import Token
+from ..auth.principal_cache import resolve_user
+from ..services.password_hasher import password_hasher
 
 logger = logging.getLogger(__name__)
 
-# 创建密码上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # 创建OAuth2密码Bearer
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（在哈希线程池中执行）"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码，bcrypt 轮数变化时同时返回新的哈希值"""
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    """获取密码哈希值"""
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    """获取密码哈希值（在哈希线程池中执行）"""
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict) -> Token:
     """创建访问令牌
@@ -40,6 +43,7 @@ def create_access_token(data: dict) -> Token:
         Token: 包含访问令牌信息的Token结构体
     """
     to_encode = data.copy()
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     expire = datetime.now() + expires_delta
     to_encode.update({"exp": expire})
@@ -54,6 +58,49 @@ def create_access_token(data: dict) -> Token:
         expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     )
 
+def create_refresh_token(data: dict) -> str:
+    """创建刷新令牌
+
+    刷新令牌带有独立的 jti 和 type=refresh 声明，只能用于 /auth/refresh，每次使用后被吊销
+
+    Args:
+        data: 要编码的数据
+
+    Returns:
+        str: 刷新令牌
+    """
+    to_encode = data.copy()
+    to_encode["jti"] = uuid.uuid4().hex
+    to_encode["type"] = "refresh"
+    to_encode["exp"] = datetime.now() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    return jwt.encode(
+        to_encode,
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM
+    )
+
+def decode_token(token: str) -> Optional[Dict[str, Any]]:
+    """解码令牌，签名无效或已过期时返回 None"""
+    try:
+        return jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM]
+        )
+    except JWTError:
+        return None
+
+async def get_token_claims(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    """获取当前访问令牌的声明（用于吊销当前令牌）"""
+    claims = decode_token(token)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的凭证",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
@@ -70,14 +117,7 @@ async def get_current_user(
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
         
-    user = await db.get(User, user_id)
-    if user is None:
-        raise credentials_exception
-        
-    return user 
\ No newline at end of file
+    return await resolve_user(payload, db, credentials_exception) 
\ No newline at end of file
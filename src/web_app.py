@@ -6,7 +6,7 @@ import logging
 from .config import config, setup_logging
 from .services.user_service import UserService
 from .services.recipe_service import RecipeService
-from .services.ai_service_client import AIServiceClient
+from .services.ai_service_client import get_ai_client
 import time
 import asyncio
 import os
@@ -27,7 +27,7 @@ class WebApp:
     def __init__(self):
         """初始化Web应用"""
         self.logger = logging.getLogger(__name__)
-        self.ai_client = AIServiceClient()
+        self.ai_client = get_ai_client()
         self.user_service = UserService()
         self.recipe_service = RecipeService()
         self.interface = None
@@ -34,8 +34,6 @@ os.environ["SECRET_KEY"] = "test_secret_key"
 os.environ["ALGORITHM"] = "HS256"
 os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "30"
 os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
-os.environ["RATE_LIMIT_TEST_MODE"] = "true"  # 添加速率限制测试模式
-os.environ["RATE_LIMIT_TEST_MAX_REQUESTS"] = "1000"  # 设置测试环境的请求限制
 os.environ["LOCKOUT_DURATION"] = "1"  # 设置测试环境的账户锁定时间为1秒
 os.environ["MAX_LOGIN_ATTEMPTS"] = "5"  # 设置最大登录尝试次数
 
@@ -88,7 +86,7 @@ async def setup_db():
     logger.info("测试数据库清理完成")
 
 # 导入应用实例（确保在设置环境变量后导入）
-from src.database import Base, get_db
+from src.database import Base, get_db, get_read_db
 from src.config.settings import settings
 from src.main import app
 
@@ -109,12 +107,11 @@ async def test_app() -> FastAPI:
     # 注册测试路由
     app.include_router(test_router)
     app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_read_db] = get_test_db
     
-    # 设置速率限制器为每分钟60个请求
+    # 每个测试从空的限流状态开始，各路由仍然使用自己的限制
     from src.main import limiter
-    limiter.is_testing = True
-    limiter.test_max_requests = 1000  # 增加到每分钟1000个请求
-    limiter.test_window_size = 60   # 60秒时间窗口
+    await limiter.reset()
     
     yield app
     app.dependency_overrides.clear()
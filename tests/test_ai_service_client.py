@@ -0,0 +1,165 @@
+"""AI服务客户端测试"""
+
+import asyncio
+import json
+import pytest
+import httpx
+
+from src.services.ai_service_client import AIServiceClient
+from src.services.ai_transport import AITransport
+
+
+def _sse_handler(events):
+    """构造模拟 Gradio 队列接口的请求处理函数"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(200, json={"event_id": "evt-1"})
+        body = "".join(
+            f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            for name, data in events
+        )
+        return httpx.Response(
+            200,
+            content=body.encode("utf-8"),
+            headers={"content-type": "text/event-stream"}
+        )
+    return handler
+
+
+def _make_client(handler) -> AIServiceClient:
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AIServiceClient(transport=AITransport(http_client=http_client))
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_yields_deltas():
+    """测试流式聊天只产出新增文本"""
+    client = _make_client(_sse_handler([
+        ("heartbeat", None),
+        ("generating", ["你"]),
+        ("generating", ["你好"]),
+        ("generating", ["你好"]),
+        ("generating", ["你好，世界"]),
+        ("complete", ["你好，世界"]),
+    ]))
+
+    chunks = [
+        chunk async for chunk in client.chat_stream(
+            messages=[{"role": "user", "content": "hi"}]
+        )
+    ]
+    await client.close()
+
+    assert chunks == ["你", "好", "，世界"]
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_error_event():
+    """测试服务端返回错误事件时抛出异常"""
+    client = _make_client(_sse_handler([("error", "模型不可用")]))
+
+    with pytest.raises(ValueError):
+        async for _ in client.chat_stream(messages=[{"role": "user", "content": "hi"}]):
+            pass
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_submit_retries_transient_errors(monkeypatch):
+    """测试提交任务遇到连接错误和 429 时会重试"""
+    monkeypatch.setattr("src.services.ai_transport.AI_RETRY_BASE_DELAY", 0)
+    attempts = []
+    inner = _sse_handler([("complete", ["好的"])])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            attempts.append(request)
+            if len(attempts) == 1:
+                raise httpx.ConnectError("connection refused", request=request)
+            if len(attempts) == 2:
+                return httpx.Response(429)
+        return inner(request)
+
+    client = _make_client(handler)
+    result = await client.transport.predict(client.chat_service_url, "/chat", [[], "m", 10])
+    stats = client.transport.get_stats()["endpoints"]["chat"]
+    await client.close()
+
+    assert result == "好的"
+    assert len(attempts) == 3
+    assert stats["retries"] == 2
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("failure", ["read_timeout", 503, 504])
+async def test_submit_not_retried_after_server_may_have_accepted(monkeypatch, failure):
+    """测试提交任务读取超时或返回网关错误时不重试，避免重复提交任务"""
+    monkeypatch.setattr("src.services.ai_transport.AI_RETRY_BASE_DELAY", 0)
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if failure == "read_timeout":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(failure)
+
+    client = _make_client(handler)
+    with pytest.raises((httpx.ReadTimeout, httpx.HTTPStatusError)):
+        await client.transport.predict(client.chat_service_url, "/chat", [[], "m", 10])
+    stats = client.transport.get_stats()["endpoints"]["chat"]
+    await client.close()
+
+    assert len(attempts) == 1
+    assert stats["retries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_idempotent_requests_retry_gateway_errors(monkeypatch):
+    """测试幂等请求遇到 503 和读取超时时会重试"""
+    monkeypatch.setattr("src.services.ai_transport.AI_RETRY_BASE_DELAY", 0)
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ReadTimeout("timed out", request=request)
+        if len(attempts) == 2:
+            return httpx.Response(503)
+        return httpx.Response(200, content=b"ok")
+
+    transport = AITransport(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    response = await transport.request("voice_download", "GET", "http://test/a.wav")
+    await transport.aclose()
+
+    assert response.content == b"ok"
+    assert len(attempts) == 3
+
+
+@pytest.mark.asyncio
+async def test_sync_calls_respect_endpoint_limit():
+    """测试同步调用在线程池中执行且受接口并发限制"""
+    import threading
+    import time
+
+    transport = AITransport(concurrency={"voice_transcribe": 2}, sync_pool_size=4)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def slow_predict(i):
+        with lock:
+            running.append(i)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(i)
+        return i
+
+    results = await asyncio.gather(
+        *(transport.run_sync("voice_transcribe", slow_predict, i) for i in range(6))
+    )
+    await transport.aclose()
+
+    assert results == list(range(6))
+    assert max(peak) <= 2
@@ -0,0 +1,99 @@
+"""音频解码服务测试"""
+
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+import scipy.io.wavfile
+
+from src.services.audio_decoder import (
+    AudioDecoder,
+    TARGET_SAMPLE_RATE,
+    decode_audio,
+    sniff_audio_format,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "audio"
+
+
+def _wav_bytes(samples: np.ndarray, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    scipy.io.wavfile.write(buffer, sample_rate, samples)
+    return buffer.getvalue()
+
+
+def test_sniff_audio_format():
+    """测试根据文件头识别音频格式"""
+    assert sniff_audio_format(_wav_bytes(np.zeros(10, dtype=np.int16), 16000)) == "wav"
+    assert sniff_audio_format(b"ID3\x04\x00" + b"\x00" * 10) == "mp3"
+    assert sniff_audio_format(b"\xff\xfb\x90\x00") == "mp3"
+    assert sniff_audio_format(b"\xff\xf1\x50\x80") == "aac"
+    assert sniff_audio_format(b"OggS\x00\x02") == "ogg"
+    assert sniff_audio_format(b"\x00\x00\x00\x20ftypM4A ") == "m4a"
+    assert sniff_audio_format(b"hello") == "unknown"
+
+
+def test_decode_stereo_44k_to_mono_16k():
+    """测试立体声 44.1kHz 音频被转换为 16kHz 单声道 int16"""
+    t = np.arange(44100) / 44100
+    tone = (np.sin(2 * np.pi * 440 * t) * 16000).astype(np.int16)
+    stereo = np.stack([tone, tone], axis=1)
+
+    result = decode_audio(memoryview(_wav_bytes(stereo, 44100)))
+
+    assert result.dtype == np.int16
+    assert result.ndim == 1
+    assert abs(result.shape[0] - TARGET_SAMPLE_RATE) <= 1
+    assert 15000 < np.abs(result).max() <= 16500
+
+
+def test_decode_target_format_is_passthrough():
+    """测试已是目标格式的音频不做转换"""
+    samples = np.arange(-100, 100, dtype=np.int16)
+    result = decode_audio(_wav_bytes(samples, TARGET_SAMPLE_RATE))
+    np.testing.assert_array_equal(result, samples)
+
+
+@pytest.mark.parametrize("name, fmt", [("tone_440hz.mp3", "mp3"), ("tone_440hz.ogg", "ogg")])
+def test_decode_compressed_fixture(name, fmt):
+    """测试解码真实的压缩音频（1 秒 440Hz 正弦波，mp3 为 22.05kHz，ogg 为 48kHz Opus）"""
+    data = (FIXTURES / name).read_bytes()
+    assert sniff_audio_format(data) == fmt
+
+    result = decode_audio(data)
+
+    assert result.dtype == np.int16
+    assert result.ndim == 1
+    # 编码器会在首尾补齐帧，时长允许有少量偏差
+    assert abs(result.shape[0] - TARGET_SAMPLE_RATE) < TARGET_SAMPLE_RATE // 10
+    assert 10000 < np.abs(result).max() < 20000
+    spectrum = np.abs(np.fft.rfft(result.astype(np.float32)))
+    peak = np.argmax(spectrum) * TARGET_SAMPLE_RATE / result.shape[0]
+    assert abs(peak - 440) < 5
+
+
+def test_decode_unknown_format():
+    """测试无法识别的格式抛出 ValueError"""
+    with pytest.raises(ValueError):
+        decode_audio(b"not audio at all")
+
+
+@pytest.mark.asyncio
+async def test_decode_file_from_upload_dir(tmp_path):
+    """测试上传路径直接映射到本地文件并解码"""
+    voice_dir = tmp_path / "voices"
+    voice_dir.mkdir()
+    samples = np.zeros(8000, dtype=np.int16)
+    (voice_dir / "a.wav").write_bytes(_wav_bytes(samples, 8000))
+
+    decoder = AudioDecoder(workers=0, upload_dir=tmp_path)
+    path = decoder.resolve_upload_path("/uploads/voices/a.wav")
+    assert path == (voice_dir / "a.wav").resolve()
+    assert decoder.resolve_upload_path("https://example.com/a.wav") is None
+    with pytest.raises(ValueError):
+        decoder.resolve_upload_path("/uploads/voices/../../etc/passwd")
+
+    result = await decoder.decode_file(path)
+    decoder.shutdown()
+    assert result.shape[0] == TARGET_SAMPLE_RATE
@@ -0,0 +1,167 @@
+"""统一缓存服务测试"""
+
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from src.services.cache_service import CacheService, LRUCache, PickleSerializer, recipe_cache
+
+
+def test_lru_cache_evicts_least_recently_used_and_expires():
+    """测试超过容量时淘汰最久未使用的条目，过期条目读取时删除"""
+    cache = LRUCache(max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a 变为最近使用
+    cache.set("c", 3)
+
+    assert cache.ttl("b") == -2
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.ttl("a") == -1
+    assert cache.stats["evictions"] == 1
+
+    cache.set("short", "x", ttl=0.001)
+    time.sleep(0.002)
+    assert cache.ttl("short") == -2
+    assert cache.stats["expirations"] == 1
+
+
+def test_lru_cache_enforces_byte_budget():
+    """测试按条目大小累计字节数，超过预算时淘汰最久未使用的条目"""
+    cache = LRUCache(max_items=1000, max_bytes=2000)
+    for i in range(100):
+        cache.set(f"k{i}", "x" * 50)
+
+    assert cache.bytes <= 2000
+    assert len(cache) < 100
+    assert cache.get("k99") == "x" * 50
+    assert cache.stats["evictions"] > 0
+
+    # 单个条目超过预算时不写入，也不挤掉已有条目
+    items = len(cache)
+    assert cache.set("big", "x" * 5000) is False
+    assert len(cache) == items and cache.stats["rejected"] == 1
+
+    cache.delete("k99")
+    assert cache.bytes == sum(entry.size for entry in cache._entries.values())
+
+
+def test_lru_cache_timer_wheel_expires_without_reads():
+    """测试到期的条目由时间轮清理，不需要逐个读取"""
+    cache = LRUCache(tick_seconds=0.01)
+    cache.set("keep", 1)
+    for i in range(10):
+        cache.set(f"t{i}", i, ttl=0.02)
+    time.sleep(0.05)
+
+    assert cache.get("keep") == 1
+    assert len(cache) == 1
+    assert cache.stats["expirations"] == 10
+    assert cache.bytes == cache._entries["keep"].size
+
+
+@pytest.mark.asyncio
+async def test_namespaces_are_isolated_and_counted_separately():
+    """测试命名空间互不影响，并分别统计命中率"""
+    service = CacheService(redis_url=None)
+    recipes = service.namespace("recipe", ttl=60)
+    profiles = service.namespace("user_profile", ttl=60)
+
+    await recipes.set("1", {"title": "番茄炒蛋"})
+    assert await recipes.get("1") == {"title": "番茄炒蛋"}
+    assert await profiles.get("1") is None
+    assert await recipes.get_many(["1", "2"]) == {"1": {"title": "番茄炒蛋"}}
+
+    await recipes.delete("1")
+    assert await recipes.get("1") is None
+
+    stats = service.get_stats()["namespaces"]
+    assert stats["recipe"]["l1_hits"] == 2
+    assert stats["recipe"]["misses"] == 2
+    assert stats["user_profile"]["misses"] == 1
+    assert service.namespace("recipe") is recipes
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_loads_once_for_concurrent_misses():
+    """测试并发未命中时只加载一次"""
+    service = CacheService(redis_url=None)
+    namespace = service.namespace("recipe")
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": "1"}
+
+    results = await asyncio.gather(*(namespace.get_or_set("1", loader) for _ in range(5)))
+    assert results == [{"id": "1"}] * 5
+    assert await namespace.get_or_set("1", loader) == {"id": "1"}
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_counters_keep_expiry_when_only_incremented():
+    """测试计数器按调用设置过期时间"""
+    service = CacheService(redis_url=None)
+    attempts = service.namespace("login_attempts", ttl=None, l1=False)
+
+    assert await attempts.incr("alice", ttl=300) == 1
+    assert await attempts.incr("alice", ttl=300) == 2
+    assert 290 < await attempts.ttl("alice") <= 300
+    assert await attempts.expire("alice", 900)
+    assert 890 < await attempts.ttl("alice") <= 900
+    assert await attempts.incr("alice") == 3
+    assert 890 < await attempts.ttl("alice") <= 900
+    assert await attempts.get("alice") == 3
+
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_falls_back_to_local_cache():
+    """测试 Redis 不可用时降级到进程内缓存，不影响调用方"""
+    service = CacheService(redis_url="redis://127.0.0.1:1/0", serializer=PickleSerializer())
+    namespace = service.namespace("recipe", ttl=60)
+    try:
+        assert await namespace.set("1", {"id": "1"})
+        assert await namespace.get("1") == {"id": "1"}
+        assert await namespace.incr("views") == 1
+
+        stats = service.get_stats()
+        assert stats["redis"]["enabled"] is True
+        assert stats["redis"]["available"] is False
+        assert stats["redis"]["redis_down"] == 1
+        assert stats["namespaces"]["recipe"]["errors"] == 1
+    finally:
+        await service.close()
+
+
+@pytest.mark.asyncio
+async def test_recipe_detail_is_cached_and_invalidated_on_update(
+    test_client: AsyncClient, test_user_token: str, test_recipe_data: dict
+):
+    """测试菜谱详情命中缓存时浏览次数仍然递增，修改后缓存失效"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    created = await test_client.post("/api/v1/recipes/create_recipe", json=test_recipe_data, headers=headers)
+    assert created.status_code == 201
+    recipe_id = created.json()["recipe"]["id"]
+
+    first = (await test_client.get(f"/api/v1/recipes/{recipe_id}")).json()["recipe"]
+    hits_before = recipe_cache.get_stats()["l1_hits"]
+    second = (await test_client.get(f"/api/v1/recipes/{recipe_id}")).json()["recipe"]
+    assert recipe_cache.get_stats()["l1_hits"] == hits_before + 1
+    assert (first["views_count"], second["views_count"]) == (1, 2)
+    assert second["title"] == test_recipe_data["title"]
+
+    updated = await test_client.patch(
+        f"/api/v1/recipes/{recipe_id}", json={"title": "新标题"}, headers=headers
+    )
+    assert updated.status_code == 200
+    third = (await test_client.get(f"/api/v1/recipes/{recipe_id}")).json()["recipe"]
+    assert third["title"] == "新标题"
+    assert third["views_count"] == 3
+
+    missing = await test_client.get("/api/v1/recipes/not-a-recipe")
+    assert missing.status_code == 404
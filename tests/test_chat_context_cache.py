@@ -0,0 +1,121 @@
+"""聊天上下文缓存测试"""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from src.services.chat_context_cache import ChatContextCache
+
+
+def _message(i: int):
+    return SimpleNamespace(
+        id=f"m{i}",
+        content=f"消息 {i}",
+        is_user=i % 2 == 0,
+        created_at=datetime(2025, 1, 1) + timedelta(seconds=i),
+        voice_url=None,
+        image_url=None,
+        transcribed_text=None,
+    )
+
+
+class _Store:
+    """模拟数据库，记录加载次数"""
+
+    def __init__(self, count: int = 0):
+        self.rows = [_message(i) for i in range(count)]
+        self.loads = 0
+
+    async def load(self, limit: int):
+        self.loads += 1
+        await asyncio.sleep(0)
+        return [{"id": m.id, "content": m.content, "is_user": m.is_user, "created_at": m.created_at,
+                 "voice_url": None, "image_url": None, "transcribed_text": None} for m in self.rows[-limit:]]
+
+
+@pytest.mark.asyncio
+async def test_messages_loaded_once_and_appended():
+    """测试首次访问加载后，后续读取和新消息都不再查询数据库"""
+    cache = ChatContextCache(ring_size=5)
+    store = _Store(8)
+
+    first = await cache.recent_messages("u1", 3, store.load)
+    assert [m["id"] for m in first] == ["m5", "m6", "m7"]
+
+    new = _message(8)
+    store.rows.append(new)
+    cache.append_message("u1", new)
+
+    latest = await cache.recent_messages("u1", 5, store.load)
+    assert [m["id"] for m in latest] == ["m4", "m5", "m6", "m7", "m8"]
+    assert store.loads == 1
+
+    # 超出缓冲区长度时回退到数据库
+    assert len(await cache.recent_messages("u1", 9, store.load)) == 9
+    assert store.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_append_during_load_is_not_lost():
+    """测试加载期间写入的新消息不会因为缓存旧的加载结果而丢失"""
+    cache = ChatContextCache(ring_size=5)
+    store = _Store(2)
+    cache._entry("u1")
+
+    async def append_later():
+        new = _message(2)
+        store.rows.append(new)
+        cache.append_message("u1", new)
+
+    await asyncio.gather(cache.recent_messages("u1", 5, store.load), append_later())
+    messages = await cache.recent_messages("u1", 5, store.load)
+    assert [m["id"] for m in messages] == ["m0", "m1", "m2"]
+
+
+@pytest.mark.asyncio
+async def test_profile_snapshot_invalidated_on_update():
+    """测试画像快照在更新后重新加载"""
+    cache = ChatContextCache()
+    versions = iter([{"height": 170}, {"height": 175}])
+    calls = []
+
+    async def load():
+        calls.append(True)
+        return next(versions)
+
+    assert await cache.profile("u1", load) == {"height": 170}
+    assert await cache.profile("u1", load) == {"height": 170}
+    cache.invalidate_profile("u1")
+    assert await cache.profile("u1", load) == {"height": 175}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_across_users():
+    """测试超出用户上限时淘汰最久未访问的用户"""
+    cache = ChatContextCache(max_users=2, ring_size=5)
+    store = _Store(1)
+
+    await cache.recent_messages("a", 1, store.load)
+    await cache.recent_messages("b", 1, store.load)
+    await cache.recent_messages("a", 1, store.load)
+    await cache.recent_messages("c", 1, store.load)
+
+    stats = cache.get_stats()
+    assert stats["users"] == 2
+    assert stats["evictions"] == 1
+    await cache.recent_messages("a", 1, store.load)
+    assert cache.get_stats()["message_hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_uncommitted_message_appended_before_first_load():
+    """测试首次加载前写入、尚未提交到数据库的消息也会出现在缓冲区中"""
+    cache = ChatContextCache(ring_size=5)
+    store = _Store(2)
+
+    cache.append_message("u1", _message(2))
+    messages = await cache.recent_messages("u1", 5, store.load)
+    assert [m["id"] for m in messages] == ["m0", "m1", "m2"]
@@ -0,0 +1,88 @@
+"""聊天历史分页测试"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from src.database import get_db
+from src.models.chat import ChatMessageModel, MessageType
+from src.models.user import User
+from src.services.pagination import decode_cursor, encode_cursor
+
+
+async def _seed_messages(test_app: FastAPI, count: int) -> None:
+    """直接写入聊天记录，其中每两条共享同一个创建时间，用于验证同一时间的记录不会重复或遗漏"""
+    async for session in test_app.dependency_overrides[get_db]():
+        user = (await session.execute(select(User).filter(User.username == "testuser"))).scalar_one()
+        base = datetime(2025, 1, 1, 12, 0, 0)
+        for i in range(count):
+            session.add(ChatMessageModel(
+                id=f"msg-{i:03d}",
+                user_id=user.id,
+                type=MessageType.text,
+                content=f"消息 {i}",
+                is_user=i % 2 == 0,
+                created_at=base + timedelta(seconds=i // 2),
+            ))
+        await session.commit()
+
+
+def test_cursor_round_trip():
+    """测试游标编码和解码"""
+    created_at = datetime(2025, 1, 1, 12, 0, 0, 123456)
+    assert decode_cursor(encode_cursor(created_at, "abc")) == (created_at, "abc")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_cursor_pagination_walks_all_messages(test_app: FastAPI, test_client: AsyncClient, test_user_token: str):
+    """测试游标分页按顺序返回全部消息，且与页码分页的顺序一致"""
+    await _seed_messages(test_app, 25)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    seen = []
+    cursor = ""
+    pages = 0
+    while True:
+        response = await test_client.get(
+            "/api/v1/chat/history",
+            params={"cursor": cursor, "per_page": 10, "include_total": True},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["pagination"]["total"] == 25
+        seen.extend(message["id"] for message in data["messages"])
+        pages += 1
+        if not data["pagination"]["has_more"]:
+            assert data["pagination"]["next_cursor"] is None
+            break
+        cursor = data["pagination"]["next_cursor"]
+
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == 25
+
+    offset_ids = []
+    for page in (1, 2, 3):
+        response = await test_client.get(
+            "/api/v1/chat/history", params={"page": page, "per_page": 10}, headers=headers
+        )
+        data = response.json()
+        assert data["pagination"]["total"] == 25
+        offset_ids.extend(message["id"] for message in data["messages"])
+    assert offset_ids == seen
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_rejected(test_client: AsyncClient, test_user_token: str):
+    """测试无效游标返回 400"""
+    response = await test_client.get(
+        "/api/v1/chat/history",
+        params={"cursor": "%%%"},
+        headers={"Authorization": f"Bearer {test_user_token}"},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,120 @@
+"""聊天记录全文检索测试"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from src.database import get_db
+from src.models.chat import ChatMessageModel, MessageType
+from src.models.user import User
+from src.services.chat_search import make_snippet, parse_query, tokenize
+
+
+def test_tokenize_chinese_bigrams():
+    """测试中文按 bigram 切分，英文按单词切分"""
+    assert tokenize("减肥餐 Low-Fat") == ["减肥", "肥餐", "餐", "low", "fat"]
+    assert parse_query("减肥餐 饭") == [("phrase", ["减肥", "肥餐"]), ("prefix", ["饭"])]
+
+
+def test_snippet_highlights_match():
+    """测试摘要截取命中位置附近的文本并给出高亮位置"""
+    text = "今天天气很好。" * 10 + "中午吃了减肥餐" + "，然后去散步了。" * 10
+    snippet, highlights = make_snippet(text, ["减肥餐"], width=20)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    start, end = highlights[0]
+    assert snippet[start:end] == "减肥餐"
+
+
+async def _seed(test_app: FastAPI, contents, username: str = "testuser"):
+    async for session in test_app.dependency_overrides[get_db]():
+        user = (await session.execute(select(User).filter(User.username == username))).scalar_one()
+        base = datetime(2025, 1, 1, 12, 0, 0)
+        for i, (content, transcribed) in enumerate(contents):
+            session.add(ChatMessageModel(
+                id=f"{username}-{i:03d}",
+                user_id=user.id,
+                type=MessageType.voice if transcribed else MessageType.text,
+                content=content,
+                transcribed_text=transcribed,
+                is_user=True,
+                created_at=base + timedelta(minutes=i),
+            ))
+        await session.commit()
+        return user.id
+
+
+@pytest.mark.asyncio
+async def test_search_ranked_with_cursor(test_app: FastAPI, test_client: AsyncClient, test_user_token: str):
+    """测试检索结果按相关度排序并可以用游标翻页"""
+    contents = [(f"第{i}天午餐吃了减肥餐" + "，还有一些别的内容" * (i % 3), None) for i in range(5)]
+    contents += [("今天吃了红烧肉", None), ("语音消息", "晚饭想吃减肥餐")]
+    await _seed(test_app, contents)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"q": "减肥餐", "per_page": 4}
+        if cursor:
+            params["cursor"] = cursor
+        response = await test_client.get("/api/v1/chat/search", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        seen.extend(data["results"])
+        cursor = data["pagination"]["next_cursor"]
+        if not data["pagination"]["has_more"]:
+            break
+
+    assert len(seen) == len({r["id"] for r in seen}) == 6
+    scores = [r["score"] for r in seen]
+    assert scores == sorted(scores, reverse=True)
+    voice = next(r for r in seen if r["matched_field"] == "transcribed_text")
+    start, end = voice["highlights"][0]
+    assert voice["snippet"][start:end] == "减肥餐"
+
+    response = await test_client.get(
+        "/api/v1/chat/search", params={"q": "减肥餐", "sort": "recent"}, headers=headers
+    )
+    results = response.json()["results"]
+    assert [r["id"] for r in results][0] == "testuser-006"
+
+
+@pytest.mark.asyncio
+async def test_search_is_scoped_and_incremental(test_app: FastAPI, test_client: AsyncClient, test_user_token: str):
+    """测试只检索当前用户的消息，且修改和删除消息后索引同步更新"""
+    await test_client.post("/api/v1/auth/register", json={"username": "otheruser", "password": "Test@123456"})
+    await _seed(test_app, [("别人的减肥餐", None)], username="otheruser")
+    await _seed(test_app, [("我的减肥餐", None), ("single 饭", None)])
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    async def ids(q):
+        response = await test_client.get("/api/v1/chat/search", params={"q": q}, headers=headers)
+        assert response.status_code == 200
+        return [r["id"] for r in response.json()["results"]]
+
+    assert await ids("减肥餐") == ["testuser-000"]
+    assert await ids("饭") == ["testuser-001"]
+    assert await ids("sing") == ["testuser-001"]
+
+    async for session in test_app.dependency_overrides[get_db]():
+        message = await session.get(ChatMessageModel, "testuser-000")
+        message.content = "我的早餐"
+        await session.delete(await session.get(ChatMessageModel, "testuser-001"))
+        await session.commit()
+
+    assert await ids("减肥餐") == []
+    assert await ids("早餐") == ["testuser-000"]
+    assert await ids("饭") == []
+
+
+@pytest.mark.asyncio
+async def test_search_rejects_bad_cursor(test_client: AsyncClient, test_user_token: str):
+    """测试无效的游标和排序方式返回 400"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = await test_client.get("/api/v1/chat/search", params={"q": "饭", "cursor": "bad"}, headers=headers)
+    assert response.status_code == 400
+    response = await test_client.get("/api/v1/chat/search", params={"q": "饭", "sort": "x"}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,113 @@
+"""聊天上下文构建测试"""
+
+import pytest
+
+from src.services.context_builder import (
+    MESSAGE_OVERHEAD_TOKENS,
+    TRUNCATION_MARKER,
+    CallableTokenizer,
+    CharTokenizer,
+    ContextBuilder,
+    load_tokenizer,
+)
+from src.services.prompt_templates import SYSTEM_PROMPT
+
+
+def _history(count: int, length: int = 20):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i}" + "饭" * length}
+        for i in range(count)
+    ]
+
+
+def test_char_tokenizer_counts_cjk_per_char():
+    """测试中文按字计数，英文按约 4 个字符 1 个 token 计数"""
+    tokenizer = CharTokenizer()
+    assert tokenizer.count("") == 0
+    assert tokenizer.count("你好") == 2
+    assert tokenizer.count("abcdefgh") == 2
+    assert tokenizer.truncate("一二三四五", 3) == "一二三"
+    assert tokenizer.truncate("一二三四五", 2, from_end=True) == "四五"
+
+
+def test_history_filled_newest_first_within_budget():
+    """测试历史消息从最新一条开始填充且不超过预算"""
+    tokenizer = CharTokenizer()
+    system_tokens = tokenizer.count(SYSTEM_PROMPT) + MESSAGE_OVERHEAD_TOKENS
+    per_turn = 21 + MESSAGE_OVERHEAD_TOKENS
+    current_tokens = 2 + MESSAGE_OVERHEAD_TOKENS
+    builder = ContextBuilder(tokenizer, budget=system_tokens + current_tokens + per_turn * 3, turn_max_tokens=100)
+
+    history = _history(10)
+    context = builder.build({}, "你好", history)
+
+    assert context.messages[0]["content"] is SYSTEM_PROMPT
+    assert context.messages[1:-1] == history[-3:]
+    assert context.messages[-1] == {"role": "user", "content": "你好"}
+    assert context.history_used == 3
+    assert context.history_dropped == 7
+    assert context.prompt_tokens == builder.budget
+
+
+def test_overlong_turn_is_truncated_head_and_tail():
+    """测试过长的历史消息保留首尾两段"""
+    builder = ContextBuilder(CharTokenizer(), budget=10000, turn_max_tokens=50)
+    transcript = "开" + "长" * 500 + "尾"
+    context = builder.build({}, "继续", [{"role": "user", "content": transcript}])
+
+    shortened = context.messages[1]["content"]
+    assert TRUNCATION_MARKER in shortened
+    assert shortened.startswith("开") and shortened.endswith("尾")
+    assert builder.tokenizer.count(shortened) <= 50
+    assert context.truncated == 1
+
+
+def test_current_message_not_duplicated_from_history():
+    """测试历史末尾已经包含当前消息时不会重复发送"""
+    builder = ContextBuilder(CharTokenizer())
+    history = [{"role": "assistant", "content": "你好"}, {"role": "user", "content": "吃什么"}]
+    context = builder.build({}, "吃什么", history)
+    assert [msg["content"] for msg in context.messages[1:]] == ["你好", "吃什么"]
+
+
+def test_pluggable_tokenizer():
+    """测试可以替换 token 计数器，未知配置回退到按字符估算"""
+    tokenizer = CallableTokenizer("words", str.split)
+    builder = ContextBuilder(tokenizer, budget=10000)
+    context = builder.build({}, "one two three")
+    assert context.tokenizer == "words"
+    assert context.usage()["prompt_tokens"] == len(SYSTEM_PROMPT.split()) + 3 + 2 * MESSAGE_OVERHEAD_TOKENS
+
+    assert isinstance(load_tokenizer("unknown"), CharTokenizer)
+
+
+def test_current_message_never_exceeds_budget():
+    """测试系统提示词和画像块占去大部分预算时，截断后的当前消息仍然不超出预算"""
+    tokenizer = CharTokenizer()
+    system_tokens = tokenizer.count(SYSTEM_PROMPT) + MESSAGE_OVERHEAD_TOKENS
+    builder = ContextBuilder(tokenizer, budget=system_tokens + 60, turn_max_tokens=400)
+    profile = {"user_id": "u1", "updated_at": "2025-01-01", "height": 170, "weight": 65, "health_goals": ["减重"]}
+
+    context = builder.build(profile, "长" * 1000)
+    assert context.prompt_tokens <= builder.budget
+    assert sum(tokenizer.count(msg["content"]) + MESSAGE_OVERHEAD_TOKENS for msg in context.messages) <= builder.budget
+    # 剩余预算放不下一条完整消息时去掉画像块，系统提示词仍然保留
+    assert [msg["role"] for msg in context.messages] == ["system", "user"]
+    assert context.messages[0]["content"] is SYSTEM_PROMPT
+    assert context.truncated == 1
+
+
+def test_profile_extraction_prompt_fits_backend_budget():
+    """测试画像提取的提示词按聊天预算发送时不会被后端整体丢弃"""
+    pytest.importorskip("ollama")
+    from ai_backend.chat_core import fit_to_budget
+    from src.services.context_builder import CHAT_CONTEXT_TOKEN_BUDGET
+    from src.services.prompt_templates import PROFILE_EXTRACTION_PROMPT
+
+    messages = [
+        {"role": "system", "content": PROFILE_EXTRACTION_PROMPT},
+        {"role": "user", "content": "我今年30岁，身高175厘米，体重70公斤，想减脂"},
+    ]
+    assert fit_to_budget(messages, CHAT_CONTEXT_TOKEN_BUDGET) == messages
+    # 原来传入的 500 不够放下提取提示词
+    assert fit_to_budget(messages, 500) == []
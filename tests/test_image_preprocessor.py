@@ -0,0 +1,60 @@
+"""图片预处理测试"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.services.image_preprocessor import ImagePreprocessor, preprocess_image
+
+
+def _noise_image(width: int, height: int, mode: str = "RGB") -> Image.Image:
+    rng = np.random.default_rng(0)
+    channels = len(mode)
+    pixels = rng.integers(0, 255, (height, width, channels), dtype=np.uint8)
+    return Image.fromarray(pixels, mode)
+
+
+def _encode(image: Image.Image, fmt: str, **kwargs) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format=fmt, **kwargs)
+    return output.getvalue()
+
+
+def test_small_image_is_returned_unchanged():
+    """测试小于阈值的图片不解码也不重新编码"""
+    data = _encode(_noise_image(64, 64), "PNG")
+    assert preprocess_image(memoryview(data), threshold=len(data)) == data
+
+
+def test_large_jpeg_is_downscaled_and_rotated():
+    """测试大图被缩小，且按 EXIF 方向旋转"""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 需要顺时针旋转 90 度
+    data = _encode(_noise_image(2400, 1600), "JPEG", quality=95, exif=exif)
+
+    result = Image.open(io.BytesIO(preprocess_image(data, max_side=800, threshold=0)))
+
+    assert result.format == "JPEG"
+    assert result.size == (533, 800)
+
+
+def test_rgba_png_is_converted():
+    """测试带透明通道的 PNG 可以编码为 JPEG"""
+    data = _encode(_noise_image(1200, 900, "RGBA"), "PNG")
+    result = Image.open(io.BytesIO(preprocess_image(data, max_side=800, threshold=0)))
+    assert result.mode == "RGB"
+    assert result.size == (800, 600)
+
+
+@pytest.mark.asyncio
+async def test_preprocessor_runs_off_loop():
+    """测试异步接口在进程池中处理大图"""
+    preprocessor = ImagePreprocessor(workers=1, threshold=1024)
+    data = _encode(_noise_image(1600, 1600), "JPEG", quality=95)
+    try:
+        result = await preprocessor.preprocess(data)
+    finally:
+        preprocessor.shutdown()
+    assert Image.open(io.BytesIO(result)).size == (800, 800)
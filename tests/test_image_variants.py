@@ -0,0 +1,105 @@
+"""图片衍生图测试"""
+
+import io
+
+import httpx
+import pytest
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from src.services.image_variants import (
+    IMMUTABLE_CACHE_CONTROL,
+    ImageVariantService,
+    UploadStaticFiles,
+    render_variants,
+    variant_urls,
+)
+from src.services.storage import LocalStorageBackend, StorageEngine
+
+
+def _jpeg(size=(1200, 800), orientation: int = 1) -> bytes:
+    image = Image.new("RGB", size, "green")
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+async def _chunks(data: bytes):
+    yield data
+
+
+def test_render_variants_resizes_without_upscaling_and_applies_orientation():
+    """测试按宽度缩小、不放大小图，并按 EXIF 方向旋转"""
+    outputs = render_variants(_jpeg(orientation=6), [(160, "webp"), (480, "jpg"), (2000, "jpg")])
+
+    sizes = [Image.open(io.BytesIO(output)).size for output in outputs]
+    formats = [Image.open(io.BytesIO(output)).format for output in outputs]
+    # 方向 6 表示需要旋转 90 度，旋转后宽 800 高 1200
+    assert sizes == [(160, 240), (480, 720), (800, 1200)]
+    assert formats == ["WEBP", "JPEG", "JPEG"]
+
+
+def test_render_variants_flattens_transparency_for_jpeg():
+    """测试透明图片生成 JPEG 时透明区域铺上背景色而不是黑色"""
+    image = Image.new("RGBA", (200, 100), (0, 0, 0, 0))
+    image.paste((255, 0, 0, 255), (100, 0, 200, 100))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+
+    white, custom = (
+        Image.open(io.BytesIO(output)).convert("RGB")
+        for output in [
+            render_variants(buffer.getvalue(), [(200, "jpg")])[0],
+            render_variants(buffer.getvalue(), [(200, "jpg")], background="#0000ff")[0],
+        ]
+    )
+    assert all(channel > 245 for channel in white.getpixel((20, 50)))
+    red, green, blue = white.getpixel((180, 50))
+    assert red > 230 and green < 30 and blue < 30
+    red, green, blue = custom.getpixel((20, 50))
+    assert red < 30 and green < 30 and blue > 230
+
+
+def test_variant_urls_only_for_content_addressed_images():
+    """测试只有按内容哈希命名的原图才有衍生图地址"""
+    digest = "ab" * 32
+    urls = variant_urls(f"/uploads/images/ab/ab/{digest}.png", widths=[160], formats=["webp", "jpg"])
+
+    assert urls == {
+        "160.webp": f"/uploads/images/ab/ab/{digest}_w160.webp",
+        "160.jpg": f"/uploads/images/ab/ab/{digest}_w160.jpg",
+    }
+    assert variant_urls("/uploads/images/legacy-uuid.jpg") is None
+    assert variant_urls(None) is None
+
+
+@pytest.mark.asyncio
+async def test_variants_generated_once_and_served_immutable(tmp_path):
+    """测试衍生图只生成一次，按需生成后以 immutable 缓存头返回"""
+    storage = StorageEngine(LocalStorageBackend(tmp_path), staging_dir=tmp_path / ".staging")
+    variants = ImageVariantService(storage, widths=[160, 480], formats=["webp"])
+    stored = await storage.save_stream(_chunks(_jpeg()), "images")
+    urls = variant_urls(stored.url, widths=[160, 480], formats=["webp"])
+
+    app = Starlette(routes=[
+        Mount("/uploads/images", UploadStaticFiles(directory=tmp_path / "images", category="images", variants=variants)),
+    ])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        # 尚未生成的衍生图在请求时生成
+        response = await client.get(urls["480.webp"])
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert Image.open(io.BytesIO(response.content)).size == (480, 320)
+
+        original = await client.get(stored.url)
+        assert original.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+        unknown = await client.get(stored.url.replace(".jpg", "_w333.webp"))
+        assert unknown.status_code == 404
+
+    assert await variants.generate(stored.key) == 0
+    assert variants.get_stats()["generated"] == 2
+    assert variants.get_stats()["on_demand"] == 1
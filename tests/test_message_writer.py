@@ -0,0 +1,85 @@
+"""聊天消息后台写入测试"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from src.models.chat import ChatMessageModel, MessageType
+from src.routers.chat import build_history_frame
+from src.services.chat_context_cache import chat_context_cache, snapshot_message
+from src.services.message_writer import MessageWriteBehind
+from tests.conftest import async_session_maker
+
+
+def _message(user_id: str = "user-1", content: str = "你好", message_id: str = None, **kwargs) -> ChatMessageModel:
+    return ChatMessageModel(
+        id=message_id or str(uuid.uuid4()),
+        user_id=user_id,
+        type=MessageType.text,
+        content=content,
+        is_user=kwargs.get("is_user", False),
+        created_at=kwargs.get("created_at", datetime.now()),
+    )
+
+
+async def _count() -> int:
+    async with async_session_maker() as session:
+        return await session.scalar(select(func.count()).select_from(ChatMessageModel))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_share_one_transaction():
+    """测试合并窗口内多个流提交的消息在同一个事务中写入"""
+    writer = MessageWriteBehind(session_factory=async_session_maker, interval_ms=50)
+
+    await asyncio.gather(*(writer.submit(_message(f"user-{i}")) for i in range(20)))
+    await writer.stop()
+
+    assert await _count() == 20
+    stats = writer.get_stats()
+    assert stats["written"] == 20
+    assert stats["batches"] == 1
+    assert stats["batch_size"]["max"] == 20
+    assert stats["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_single_writes():
+    """测试批量提交失败时逐条写入，只丢弃无法写入的消息并失效该用户的缓存"""
+    writer = MessageWriteBehind(session_factory=async_session_maker, interval_ms=50, retries=1)
+    duplicate_id = str(uuid.uuid4())
+    async with async_session_maker() as session:
+        session.add(_message("user-a", message_id=duplicate_id))
+        await session.commit()
+
+    chat_context_cache.append_message("user-b", _message("user-b"))
+    await asyncio.gather(
+        writer.submit(_message("user-a")),
+        writer.submit(_message("user-b", message_id=duplicate_id)),
+        writer.submit(_message("user-c")),
+    )
+    await writer.stop()
+
+    assert await _count() == 3
+    stats = writer.get_stats()
+    assert stats["failed"] == 1
+    assert stats["retries"] == 1
+    assert chat_context_cache._users.get("user-b") is None
+
+
+def test_history_frame_built_from_turn_without_duplicates():
+    """测试响应中的历史记录由最近消息和本轮消息构建，本轮的用户消息不会重复"""
+    now = datetime.now()
+    earlier = [_message(content=f"历史{i}", created_at=now - timedelta(minutes=10 - i)) for i in range(10)]
+    user_message = _message(content="现在吃什么", is_user=True, created_at=now)
+    reply = _message(content="建议吃沙拉", created_at=now + timedelta(seconds=1))
+    recent = [snapshot_message(msg) for msg in earlier + [user_message]]
+
+    history = build_history_frame(recent, user_message, reply)
+
+    assert len(history) == 10
+    assert [item["content"] for item in history[-3:]] == ["历史9", "现在吃什么", "建议吃沙拉"]
+    assert history[-2]["is_user"] is True
@@ -0,0 +1,63 @@
+"""密码哈希服务测试"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.services.password_hasher import PasswordHasher
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_run_in_thread_pool():
+    """测试哈希和校验结果正确，并记录耗时分位数"""
+    hasher = PasswordHasher(rounds=4, workers=2)
+    try:
+        hashed = await hasher.hash("Test@123456")
+        assert hashed.startswith("$2b$04$")
+        assert await hasher.verify("Test@123456", hashed)
+        assert not await hasher.verify("wrong", hashed)
+
+        stats = hasher.get_stats()
+        assert stats["hashed"] == 1 and stats["verified"] == 2
+        assert stats["verify_ms"]["max"] > 0
+        assert stats["pending"] == 0
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rehash_when_rounds_change():
+    """测试 bcrypt 轮数变化后登录时重新哈希"""
+    old = PasswordHasher(rounds=4, workers=1)
+    new = PasswordHasher(rounds=5, workers=1)
+    try:
+        hashed = await old.hash("Test@123456")
+
+        assert await old.verify_and_update("Test@123456", hashed) == (True, None)
+        assert await new.verify_and_update("wrong", hashed) == (False, None)
+
+        matched, rehashed = await new.verify_and_update("Test@123456", hashed)
+        assert matched and rehashed.startswith("$2b$05$")
+        assert await new.verify_and_update("Test@123456", rehashed) == (True, None)
+        assert new.get_stats()["rehashed"] == 1
+    finally:
+        old.shutdown()
+        new.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_returns_429():
+    """测试排队任务超过上限时拒绝新请求"""
+    hasher = PasswordHasher(rounds=8, workers=1, max_pending=2)
+    try:
+        results = await asyncio.gather(
+            *(hasher.hash("Test@123456") for _ in range(4)),
+            return_exceptions=True
+        )
+        rejected = [r for r in results if isinstance(r, HTTPException)]
+        assert len(rejected) == 2
+        assert all(r.status_code == 429 for r in rejected)
+        assert hasher.get_stats()["rejected"] == 2
+    finally:
+        hasher.shutdown()
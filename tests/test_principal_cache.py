@@ -0,0 +1,76 @@
+"""认证主体缓存测试"""
+
+import pytest
+from httpx import AsyncClient
+
+from src.auth.principal_cache import PrincipalCache, principal_cache
+from src.models.user import User
+
+
+def _user(user_id: str = "u1", token_version: int = 0) -> User:
+    return User(id=user_id, username=user_id, hashed_password="x", is_active=True, token_version=token_version)
+
+
+def test_invalidate_drops_every_token_of_the_user():
+    """测试按用户失效时删除该用户所有令牌的快照"""
+    cache = PrincipalCache(ttl=30, max_entries=3)
+    cache.put("u1", "a", _user("u1"))
+    cache.put("u1", "b", _user("u1"))
+    cache.put("u2", "c", _user("u2"))
+
+    assert cache.get("u1", "a")["username"] == "u1"
+    cache.invalidate("u1")
+    assert cache.get("u1", "a") is None and cache.get("u1", "b") is None
+    assert cache.get("u2", "c") is not None
+
+    # 超过上限时淘汰最久未使用的令牌
+    cache.put("u3", "d", _user("u3"))
+    cache.put("u4", "e", _user("u4"))
+    cache.put("u5", "f", _user("u5"))
+    assert cache.get("u2", "c") is None
+    assert cache.get_stats()["entries"] == 3
+
+
+def test_disabled_cache_stores_nothing():
+    """测试 TTL 为 0 时不缓存"""
+    cache = PrincipalCache(ttl=0)
+    cache.put("u1", "a", _user("u1"))
+    assert cache.get("u1", "a") is None
+
+
+@pytest.mark.asyncio
+async def test_repeated_requests_hit_principal_cache(test_client: AsyncClient, test_user_token: str):
+    """测试同一个令牌的后续请求命中主体缓存，修改用户后仍然返回最新数据"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    first = await test_client.get("/api/v1/auth/profile", headers=headers)
+    assert first.status_code == 200
+
+    hits_before = principal_cache.get_stats()["hits"]
+    second = await test_client.get("/api/v1/auth/profile", headers=headers)
+    assert second.status_code == 200
+    assert principal_cache.get_stats()["hits"] == hits_before + 1
+    assert second.json() == first.json()
+
+
+@pytest.mark.asyncio
+async def test_change_password_revokes_existing_tokens(test_client: AsyncClient, test_user_token: str):
+    """测试修改密码后旧令牌失效，新登录的令牌可以使用"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    assert (await test_client.get("/api/v1/auth/profile", headers=headers)).status_code == 200
+
+    response = await test_client.post(
+        "/api/v1/auth/change-password",
+        json={"current_password": "Test@123456", "new_password": "NewTest@123456"},
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    assert (await test_client.get("/api/v1/auth/profile", headers=headers)).status_code == 401
+
+    login = await test_client.post(
+        "/api/v1/auth/login",
+        data={"username": "testuser", "password": "NewTest@123456"}
+    )
+    assert login.status_code == 200
+    new_headers = {"Authorization": f"Bearer {login.json()['token']['access_token']}"}
+    assert (await test_client.get("/api/v1/auth/profile", headers=new_headers)).status_code == 200
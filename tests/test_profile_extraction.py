@@ -0,0 +1,118 @@
+"""用户画像后台提取队列测试"""
+
+import asyncio
+import pytest
+
+from src.services.chat_context_cache import chat_context_cache
+from src.services.profile_extraction_service import ProfileExtractionQueue
+
+
+class FakeSession:
+    """记录提交和回滚次数的假数据库会话"""
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeAIClient:
+    """模拟画像提取的AI客户端"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.extracted = []
+        self.applied = []
+
+    async def extract_profile_updates(self, message: str):
+        await asyncio.sleep(self.delay)
+        self.extracted.append(message)
+        return {"weight": 70.0}
+
+    async def process_profile_updates(self, user_id, updates, db):
+        self.applied.append((user_id, updates))
+        return {"success": True, "message": "ok", "updated_fields": {"weight": {"old": None, "new": 70.0}}}
+
+
+@pytest.mark.asyncio
+async def test_messages_are_batched_per_user():
+    """测试同一用户排队期间的消息会被合并"""
+    ai_client = FakeAIClient(delay=0.01)
+    sessions = []
+
+    def session_factory():
+        session = FakeSession()
+        sessions.append(session)
+        return session
+
+    queue = ProfileExtractionQueue(ai_client=ai_client, session_factory=session_factory, workers=1)
+    assert queue.enqueue("u1", "我身高175")
+    assert queue.enqueue("u1", "体重70公斤")
+    assert queue.enqueue("u2", "我喜欢跑步")
+    await queue.join()
+    await queue.stop()
+
+    assert ai_client.extracted == ["我身高175\n体重70公斤", "我喜欢跑步"]
+    assert [user_id for user_id, _ in ai_client.applied] == ["u1", "u2"]
+    assert all(session.commits == 1 for session in sessions)
+
+    stats = queue.get_stats()
+    assert stats["enqueued"] == 2
+    assert stats["merged"] == 1
+    assert stats["processed"] == 2
+    assert stats["updated"] == 2
+    assert stats["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_tasks():
+    """测试队列满时丢弃任务而不阻塞"""
+    ai_client = FakeAIClient(delay=0.05)
+    queue = ProfileExtractionQueue(ai_client=ai_client, session_factory=FakeSession, maxsize=1, workers=1)
+
+    queue.enqueue("u1", "a")
+    await asyncio.sleep(0)  # 让工作协程取走第一个任务
+    queue.enqueue("u2", "b")
+    assert not queue.enqueue("u3", "c")
+
+    await queue.join()
+    await queue.stop()
+    assert queue.get_stats()["dropped"] == 1
+    assert ai_client.extracted == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_profile_caches_invalidated_after_commit():
+    """测试画像缓存在事务提交之后才失效"""
+    session = FakeSession()
+
+    async def load():
+        return {"weight": 65.0}
+
+    class CheckingAIClient(FakeAIClient):
+        async def process_profile_updates(self, user_id, updates, db):
+            # 提交之前其他请求仍然读到旧画像，此时不能失效缓存
+            assert db.commits == 0
+            assert chat_context_cache._users[user_id].profile == {"weight": 65.0}
+            return await super().process_profile_updates(user_id, updates, db)
+
+    await chat_context_cache.profile("cache-u1", load)
+    queue = ProfileExtractionQueue(ai_client=CheckingAIClient(), session_factory=lambda: session, workers=1)
+    queue.enqueue("cache-u1", "体重70公斤")
+    await queue.join()
+    await queue.stop()
+
+    assert session.commits == 1
+    assert queue.get_stats()["updated"] == 1
+    assert chat_context_cache._users["cache-u1"].profile is None
@@ -0,0 +1,64 @@
+"""提示词模板测试"""
+
+from src.services.ai_service_client import AIServiceClient
+from src.services.prompt_templates import (
+    SYSTEM_PROMPT,
+    ProfileBlockCache,
+    render_profile_block,
+)
+
+
+def _profile(**overrides):
+    profile = {
+        "user_id": "u1",
+        "updated_at": "2024-01-01T00:00:00",
+        "height": 175,
+        "health_conditions": ["高血压"],
+        "fitness_goals": ["减脂", "增肌"],
+    }
+    profile.update(overrides)
+    return profile
+
+
+def test_render_profile_block_format():
+    """测试画像块包含各字段，缺失字段使用默认值"""
+    block = render_profile_block(_profile())
+    assert "- 身高：175cm" in block
+    assert "- 健康状况：高血压" in block
+    assert "- 健身目标：减脂, 增肌" in block
+    assert "- 饮食限制：无" in block
+    assert "- 体重：未知kg" in block
+
+
+def test_profile_block_cached_until_updated():
+    """测试相同 (user_id, updated_at) 命中缓存，更新后重新渲染"""
+    cache = ProfileBlockCache(max_entries=2)
+    first = cache.get(_profile())
+    assert cache.get(_profile(height=180)) is first
+
+    updated = cache.get(_profile(height=180, updated_at="2024-01-02T00:00:00"))
+    assert "- 身高：180cm" in updated
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+
+    cache.invalidate("u1")
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_profile_without_version_is_not_cached():
+    """测试缺少 updated_at 的画像不进入缓存"""
+    cache = ProfileBlockCache()
+    cache.get(_profile(updated_at=None))
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_chat_messages_reuse_system_prompt():
+    """测试每次构建的消息都复用同一个系统提示词对象"""
+    client = AIServiceClient()
+    first = client._build_chat_messages(_profile(), "你好")
+    second = client._build_chat_messages(_profile(), "在吗")
+
+    assert first[0]["content"] is SYSTEM_PROMPT
+    assert second[0]["content"] is first[0]["content"]
+    assert second[1]["content"] is first[1]["content"]
+    assert second[-1] == {"role": "user", "content": "在吗"}
@@ -0,0 +1,108 @@
+"""共享计数器和速率限制测试"""
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from src.services.cache_service import CacheService
+from src.services.rate_limiter import RateLimiter, RateLimitExceeded, SharedCounter, parse_limit
+
+
+def test_parse_limit():
+    """测试解析 slowapi 格式的限制字符串"""
+    assert parse_limit("60/minute") == (60, 60)
+    assert parse_limit("10 per minute") == (10, 60)
+    assert parse_limit("100/5 minutes") == (100, 300)
+    with pytest.raises(ValueError):
+        parse_limit("sixty a minute")
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_burst_then_limits():
+    """测试窗口内允许 count 次请求，之后拒绝并给出等待时间"""
+    service = CacheService(redis_url=None)
+    limiter = RateLimiter(service.namespace("rate_limit", ttl=None, l1=False))
+
+    results = [await limiter.hit("ip", 5, 60) for _ in range(5)]
+    assert all(allowed for allowed, _, _ in results)
+    assert [remaining for _, _, remaining in results] == [4, 3, 2, 1, 0]
+
+    allowed, retry_after, remaining = await limiter.hit("ip", 5, 60)
+    assert not allowed and remaining == 0
+    assert 0 < retry_after <= 12
+    assert (await limiter.hit("other", 5, 60))[0]
+    assert limiter.get_stats()["limited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_limit_decorator_returns_429():
+    """测试装饰器超出限制时返回 429 和 Retry-After"""
+    service = CacheService(redis_url=None)
+    limiter = RateLimiter(service.namespace("rate_limit", ttl=None, l1=False))
+    app = FastAPI()
+
+    @app.exception_handler(RateLimitExceeded)
+    async def handler(request: Request, exc: RateLimitExceeded):
+        return JSONResponse(status_code=429, content={"detail": exc.detail}, headers=exc.headers)
+
+    @app.get("/ping")
+    @limiter.limit("2/minute")
+    async def ping(request: Request):
+        return {"ok": True}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/ping")).status_code == 200
+        assert (await client.get("/ping")).status_code == 200
+        response = await client.get("/ping")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_local_state_is_bounded_and_owned_by_limiter():
+    """测试进程内限流状态不受缓存 L1 淘汰影响，超出上限时只淘汰最久未更新的键"""
+    service = CacheService(redis_url=None)
+    limiter = RateLimiter(service.namespace("rate_limit", ttl=None, l1=False), local_max_keys=2)
+
+    assert (await limiter.hit("ip", 1, 60))[0]
+    service.l1.clear_prefix("")
+    assert not (await limiter.hit("ip", 1, 60))[0]
+
+    assert (await limiter.hit("b", 1, 60))[0]
+    assert (await limiter.hit("c", 1, 60))[0]
+    stats = limiter.get_stats()
+    assert stats["local_keys"] == 2 and stats["local_evicted"] == 1
+    assert not (await limiter.hit("c", 1, 60))[0]
+
+
+@pytest.mark.asyncio
+async def test_reset_clears_limits():
+    """测试重置后之前的请求不再计入限制"""
+    service = CacheService(redis_url=None)
+    limiter = RateLimiter(service.namespace("rate_limit", ttl=None, l1=False))
+
+    assert (await limiter.hit("ip", 1, 60))[0]
+    assert not (await limiter.hit("ip", 1, 60))[0]
+    await limiter.reset()
+    assert (await limiter.hit("ip", 1, 60))[0]
+    assert limiter.get_stats()["local_keys"] == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_counter_locks_after_threshold():
+    """测试失败次数达到阈值后设置锁定时间，重置后清除"""
+    service = CacheService(redis_url=None)
+    counter = SharedCounter(service.namespace("login_attempts", ttl=None, l1=False))
+
+    for expected in range(1, 3):
+        assert await counter.record_failure("alice", window=300, threshold=3, lockout=900) == expected
+    attempts, ttl = await counter.get("alice")
+    assert attempts == 2 and 290 < ttl <= 300
+
+    assert await counter.record_failure("alice", window=300, threshold=3, lockout=900) == 3
+    attempts, ttl = await counter.get("alice")
+    assert attempts == 3 and 890 < ttl <= 900
+
+    await counter.reset("alice")
+    assert await counter.get("alice") == (0, -2)
@@ -0,0 +1,132 @@
+"""菜谱全文检索测试"""
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from src.database import get_db
+from src.models.recipe import RecipeModel
+from src.models.user import User
+from src.services.recipe_search import count_facets, index_fields
+
+
+def test_index_fields_include_ingredient_names():
+    """测试食材名称和菜系写入索引，食材用量不写入"""
+    recipe = RecipeModel(
+        id="r1", title="番茄炒蛋", description="家常菜",
+        ingredients=[{"name": "鸡蛋", "amount": "3个"}, {"name": "Tomato", "amount": "2"}],
+        steps=[], cuisine_type="中餐"
+    )
+    fields = index_fields(recipe)
+    assert fields["title"] == "番茄 茄炒 炒蛋 蛋"
+    assert fields["ingredients"] == "鸡蛋 蛋 tomato"
+    assert fields["cuisine"] == "中餐 餐"
+
+
+def test_facets_ignore_their_own_filter():
+    """测试每个分面只应用另一个分面的过滤条件"""
+    rows = [("简单", "中餐", 3), ("困难", "中餐", 1), ("简单", "西餐", 2)]
+    total, facets = count_facets(rows, "简单", "中餐")
+    assert total == 3
+    assert facets["difficulty"] == {"简单": 3, "困难": 1}
+    assert facets["cuisine_type"] == {"中餐": 3, "西餐": 2}
+
+
+async def _seed(test_app: FastAPI, recipes):
+    async for session in test_app.dependency_overrides[get_db]():
+        user = (await session.execute(select(User).filter(User.username == "testuser"))).scalar_one()
+        for i, (title, description, ingredients, difficulty, cuisine_type) in enumerate(recipes):
+            session.add(RecipeModel(
+                id=f"recipe-{i:03d}",
+                title=title,
+                description=description,
+                author_id=user.id,
+                ingredients=[{"name": name, "amount": "适量"} for name in ingredients],
+                steps=[{"step": 1, "description": "做"}],
+                cooking_time=20,
+                difficulty=difficulty,
+                cuisine_type=cuisine_type,
+            ))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_search_ranked_with_facets_and_cursor(test_app: FastAPI, test_client: AsyncClient, test_user_token: str):
+    """测试按相关度排序、返回分面计数，并可以用游标翻页"""
+    await _seed(test_app, [
+        ("番茄炒蛋", "家常快手菜", ["番茄", "鸡蛋"], "简单", "中餐"),
+        ("蛋炒饭", "用剩饭做", ["米饭", "鸡蛋"], "简单", "中餐"),
+        ("鸡蛋羹", "嫩滑", ["鸡蛋"], "中等", "中餐"),
+        ("玉子烧", "日式鸡蛋卷", ["鸡蛋", "糖"], "中等", "日料"),
+        ("红烧肉", "下饭菜", ["五花肉"], "困难", "中餐"),
+    ])
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = await test_client.get(
+        "/api/v1/recipes/", params={"keyword": "鸡蛋", "cursor": "", "per_page": 3}, headers=headers
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    # 标题命中的菜谱排在只有食材或描述命中的前面
+    assert data["recipes"][0]["title"] == "鸡蛋羹"
+    assert data["pagination"]["total"] == 4
+    assert data["facets"]["difficulty"] == {"简单": 2, "中等": 2}
+    assert data["facets"]["cuisine_type"] == {"中餐": 3, "日料": 1}
+
+    seen = [recipe["id"] for recipe in data["recipes"]]
+    response = await test_client.get(
+        "/api/v1/recipes/",
+        params={"keyword": "鸡蛋", "cursor": data["pagination"]["next_cursor"], "per_page": 3},
+        headers=headers
+    )
+    data = response.json()
+    seen += [recipe["id"] for recipe in data["recipes"]]
+    assert data["pagination"]["has_more"] is False
+    assert data["facets"] is None
+    assert sorted(seen) == ["recipe-000", "recipe-001", "recipe-002", "recipe-003"]
+
+    # 选中难度后，难度分面仍然给出其他难度的数量
+    response = await test_client.get(
+        "/api/v1/recipes/", params={"keyword": "鸡蛋", "difficulty": "中等"}, headers=headers
+    )
+    data = response.json()
+    assert {recipe["id"] for recipe in data["recipes"]} == {"recipe-002", "recipe-003"}
+    assert data["facets"]["difficulty"] == {"简单": 2, "中等": 2}
+    assert data["facets"]["cuisine_type"] == {"中餐": 1, "日料": 1}
+
+
+@pytest.mark.asyncio
+async def test_index_follows_updates_and_deletes(test_app: FastAPI, test_client: AsyncClient, test_user_token: str):
+    """测试修改和删除菜谱后索引同步更新"""
+    await _seed(test_app, [
+        ("清蒸鲈鱼", "鲜嫩", ["鲈鱼", "姜"], "中等", "中餐"),
+        ("凉拌黄瓜", "爽口", ["黄瓜", "蒜"], "简单", "中餐"),
+    ])
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    async def ids(keyword):
+        response = await test_client.get("/api/v1/recipes/", params={"keyword": keyword}, headers=headers)
+        assert response.status_code == 200
+        return [recipe["id"] for recipe in response.json()["recipes"]]
+
+    assert await ids("蒜") == ["recipe-001"]
+    assert await ids("鲈鱼") == ["recipe-000"]
+
+    async for session in test_app.dependency_overrides[get_db]():
+        recipe = await session.get(RecipeModel, "recipe-000")
+        recipe.ingredients = [{"name": "鳜鱼", "amount": "1条"}]
+        await session.delete(await session.get(RecipeModel, "recipe-001"))
+        await session.commit()
+
+    assert await ids("鲈鱼") == ["recipe-000"]  # 标题仍然包含鲈鱼
+    assert await ids("鳜鱼") == ["recipe-000"]
+    assert await ids("蒜") == []
+
+
+@pytest.mark.asyncio
+async def test_search_rejects_bad_cursor(test_client: AsyncClient, test_user_token: str):
+    """测试无效的游标返回 400"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = await test_client.get("/api/v1/recipes/", params={"keyword": "饭", "cursor": "bad"}, headers=headers)
+    assert response.status_code == 400
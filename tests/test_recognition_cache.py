@@ -0,0 +1,72 @@
+"""食物识别结果缓存测试"""
+
+import json
+
+import httpx
+import pytest
+
+from src.services import ai_service_client
+from src.services.ai_service_client import AIServiceClient
+from src.services.ai_transport import AITransport
+from src.services.recognition_cache import RecognitionCache
+
+
+@pytest.mark.asyncio
+async def test_memory_lru_and_ttl(monkeypatch):
+    """测试内存层的 LRU 淘汰和过期"""
+    cache = RecognitionCache(max_entries=2, ttl=60, disk_dir=None)
+    keys = [await cache.key_for(data) for data in (b"a", b"b", b"c")]
+
+    await cache.set(keys[0], {"n": 0})
+    await cache.set(keys[1], {"n": 1})
+    assert await cache.get(keys[0]) == {"n": 0}
+    await cache.set(keys[2], {"n": 2})  # 淘汰最久未使用的 keys[1]
+
+    assert await cache.get(keys[1]) is None
+    assert await cache.get(keys[2]) == {"n": 2}
+
+    now = __import__("time").time()
+    monkeypatch.setattr("src.services.recognition_cache.time.time", lambda: now + 61)
+    assert await cache.get(keys[0]) is None
+
+    stats = cache.get_stats()
+    assert stats["memory_hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+    assert stats["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path):
+    """测试磁盘层在内存层清空后仍能命中"""
+    cache = RecognitionCache(disk_dir=tmp_path)
+    key = await cache.key_for(b"image")
+    await cache.set(key, {"success": True, "food_items": [{"name": "苹果"}]})
+
+    restarted = RecognitionCache(disk_dir=tmp_path)
+    assert await restarted.get(key) == {"success": True, "food_items": [{"name": "苹果"}]}
+    assert restarted.get_stats()["disk_hits"] == 1
+    assert await restarted.get(key) is not None
+    assert restarted.get_stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_repeat_image_skips_vision_model(monkeypatch):
+    """测试重复上传的图片不再调用识别服务"""
+    monkeypatch.setattr(ai_service_client, "recognition_cache", RecognitionCache(disk_dir=None))
+    submits = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            submits.append(request)
+            return httpx.Response(200, json={"event_id": "evt-1"})
+        payload = json.dumps([json.dumps({"items": [{"name": "米饭", "confidence": 0.9}]})])
+        return httpx.Response(200, content=f"event: complete\ndata: {payload}\n\n".encode())
+
+    client = AIServiceClient(transport=AITransport(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))))
+    first = await client.recognize_food(b"same-photo")
+    second = await client.recognize_food(b"same-photo")
+    await client.close()
+
+    assert first == second == {"success": True, "food_items": [{"name": "米饭", "confidence": 0.9}]}
+    assert len(submits) == 1
@@ -0,0 +1,103 @@
+"""令牌吊销和刷新令牌轮换测试"""
+
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from src.auth.revocation import BloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """测试布隆过滤器不漏判，误判率接近目标值"""
+    bloom = BloomFilter(capacity=2000, fp_rate=0.01)
+    added = [uuid.uuid4().hex for _ in range(2000)]
+    for jti in added:
+        bloom.add(jti)
+    assert all(jti in bloom for jti in added)
+
+    # 非 uuid 格式的键走摘要哈希
+    bloom.add("legacy-token-id")
+    assert "legacy-token-id" in bloom
+
+    others = [uuid.uuid4().hex for _ in range(20000)]
+    false_positives = sum(1 for jti in others if jti in bloom)
+    assert false_positives / len(others) < 0.03
+
+
+async def _login(test_client: AsyncClient) -> dict:
+    response = await test_client.post(
+        "/api/v1/auth/login",
+        data={"username": "testuser", "password": "Test@123456"}
+    )
+    assert response.status_code == 200
+    return response.json()["token"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_rotation_and_reuse(test_client: AsyncClient, test_user_token: str):
+    """测试刷新令牌轮换：旧的刷新令牌失效，重复使用时该用户所有令牌失效"""
+    token = await _login(test_client)
+    assert token["refresh_token"]
+
+    # 刷新令牌不能当作访问令牌使用
+    response = await test_client.get(
+        "/api/v1/auth/profile",
+        headers={"Authorization": f"Bearer {token['refresh_token']}"}
+    )
+    assert response.status_code == 401
+
+    response = await test_client.post(
+        "/api/v1/auth/refresh",
+        json={"refresh_token": token["refresh_token"]}
+    )
+    assert response.status_code == 200
+    rotated = response.json()["token"]
+    assert rotated["refresh_token"] != token["refresh_token"]
+    new_headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+    assert (await test_client.get("/api/v1/auth/profile", headers=new_headers)).status_code == 200
+
+    # 旧的刷新令牌再次出现，视为被盗用
+    response = await test_client.post(
+        "/api/v1/auth/refresh",
+        json={"refresh_token": token["refresh_token"]}
+    )
+    assert response.status_code == 401
+    assert (await test_client.get("/api/v1/auth/profile", headers=new_headers)).status_code == 401
+    response = await test_client.post(
+        "/api/v1/auth/refresh",
+        json={"refresh_token": rotated["refresh_token"]}
+    )
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_access_and_refresh_tokens(test_client: AsyncClient, test_user_token: str):
+    """测试退出登录后访问令牌和刷新令牌都不能再使用"""
+    token = await _login(test_client)
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    assert (await test_client.get("/api/v1/auth/profile", headers=headers)).status_code == 200
+
+    response = await test_client.post(
+        "/api/v1/auth/logout",
+        json={"refresh_token": token["refresh_token"]},
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    assert (await test_client.get("/api/v1/auth/profile", headers=headers)).status_code == 401
+    response = await test_client.post(
+        "/api/v1/auth/refresh",
+        json={"refresh_token": token["refresh_token"]}
+    )
+    assert response.status_code == 401
+
+    # 登出后再刷新只是正常的竞争，不视为盗用，其他会话的令牌不受影响
+    other = {"Authorization": f"Bearer {test_user_token}"}
+    assert (await test_client.get("/api/v1/auth/profile", headers=other)).status_code == 200
+    other_session = await _login(test_client)
+    response = await test_client.post(
+        "/api/v1/auth/refresh",
+        json={"refresh_token": other_session["refresh_token"]}
+    )
+    assert response.status_code == 200
@@ -0,0 +1,121 @@
+"""请求合并测试"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.services.ai_service_client import AIServiceClient
+from src.services.ai_transport import AITransport
+from src.services.single_flight import SingleFlight, StreamSingleFlight, make_key
+
+
+async def _slow_stream(chunks, started: list, delay: float = 0.01):
+    started.append(True)
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_gets_full_replay():
+    """测试后加入的订阅者也能从头收到完整的流"""
+    flights = StreamSingleFlight("测试")
+    started = []
+
+    async def consume(delay: float):
+        await asyncio.sleep(delay)
+        return [chunk async for chunk in flights.subscribe(
+            "k", lambda: _slow_stream(["a", "b", "c", "d"], started)
+        )]
+
+    first, second = await asyncio.gather(consume(0), consume(0.025))
+
+    assert first == second == ["a", "b", "c", "d"]
+    assert len(started) == 1
+    assert flights.get_stats() == {"in_flight": 0, "calls": 2, "coalesced": 1, "cancelled": 0}
+
+
+@pytest.mark.asyncio
+async def test_upstream_cancelled_when_all_subscribers_leave():
+    """测试所有订阅者都离开后上游流被取消，其余订阅者不受单个订阅者离开的影响"""
+    flights = StreamSingleFlight("测试")
+    started = []
+    chunks = [str(i) for i in range(20)]
+
+    async def take(n: int):
+        received = []
+        stream = flights.subscribe("k", lambda: _slow_stream(chunks, started))
+        async for chunk in stream:
+            received.append(chunk)
+            if len(received) == n:
+                break
+        await stream.aclose()
+        return received
+
+    short, long = await asyncio.gather(take(2), take(5))
+    assert short == chunks[:2]
+    assert long == chunks[:5]
+    await asyncio.sleep(0.02)
+
+    stats = flights.get_stats()
+    assert stats["cancelled"] == 1
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_result_and_error():
+    """测试协程合并共享结果和异常"""
+    flights = SingleFlight("测试")
+    calls = []
+
+    async def work():
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    results = await asyncio.gather(*(flights.do("k", work) for _ in range(3)))
+    assert results == [{"ok": True}] * 3
+    assert len(calls) == 1
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    outcomes = await asyncio.gather(flights.do("e", fail), flights.do("e", fail), return_exceptions=True)
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+
+def test_make_key_is_order_insensitive_for_dicts():
+    """测试合并键不受字典键顺序影响"""
+    assert make_key([{"role": "user", "content": "hi"}], "m", 10) == \
+        make_key([{"content": "hi", "role": "user"}], "m", 10)
+    assert make_key("a", 1) != make_key("a", 2)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_chat_streams_share_one_upstream_job():
+    """测试相同输入的并发流式聊天只提交一次后端任务"""
+    submits = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            submits.append(request)
+            return httpx.Response(200, json={"event_id": "evt-1"})
+        body = "".join(
+            f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            for name, data in [("generating", ["你"]), ("generating", ["你好"]), ("complete", ["你好"])]
+        )
+        return httpx.Response(200, content=body.encode("utf-8"))
+
+    client = AIServiceClient(transport=AITransport(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))))
+
+    async def consume(content: str):
+        return [chunk async for chunk in client.chat_stream(messages=[{"role": "user", "content": content}])]
+
+    results = await asyncio.gather(consume("hi"), consume(" hi "), consume("hi"))
+    await client.close()
+
+    assert results == [["你", "好"]] * 3
+    assert len(submits) == 1
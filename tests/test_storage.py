@@ -0,0 +1,108 @@
+"""上传文件存储测试"""
+
+import hashlib
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from src.services.storage import (
+    FileTooLarge,
+    LocalStorageBackend,
+    S3StorageBackend,
+    StorageEngine,
+    UnsupportedFileType,
+)
+
+
+def _png(color: str = "red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def _chunks(data: bytes, size: int = 7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+@pytest.mark.asyncio
+async def test_local_storage_shards_and_deduplicates(tmp_path):
+    """测试按内容哈希分片保存，相同内容只保存一份"""
+    engine = StorageEngine(LocalStorageBackend(tmp_path), staging_dir=tmp_path / ".staging", sniff_bytes=16)
+    data = _png()
+    digest = hashlib.sha256(data).hexdigest()
+
+    first = await engine.save_stream(_chunks(data), "images", allowed_types={"image/png"})
+    second = await engine.save_stream(_chunks(data), "images", allowed_types={"image/png"})
+
+    assert first.key == f"images/{digest[:2]}/{digest[2:4]}/{digest}.png"
+    assert first.url == f"/uploads/{first.key}"
+    assert first.content_type == "image/png"
+    assert first.local_path.read_bytes() == data
+    assert not first.deduplicated and second.deduplicated
+    assert list((tmp_path / ".staging").iterdir()) == []
+    assert await engine.read(first.key) == data
+
+    stats = engine.get_stats()
+    assert stats["uploads"] == 2
+    assert stats["deduplicated"] == 1
+    assert stats["bytes_written"] == stats["bytes_deduplicated"] == len(data)
+
+
+@pytest.mark.asyncio
+async def test_rejected_uploads_leave_no_staging_files(tmp_path):
+    """测试类型不允许或超过大小限制时拒绝保存并清理暂存文件"""
+    engine = StorageEngine(LocalStorageBackend(tmp_path), staging_dir=tmp_path / ".staging", sniff_bytes=16)
+
+    with pytest.raises(UnsupportedFileType):
+        await engine.save_stream(_chunks(b"plain text, not an image" * 4), "images", allowed_types={"image/png"})
+    with pytest.raises(FileTooLarge):
+        await engine.save_stream(_chunks(_png()), "images", max_size=20)
+
+    assert engine.get_stats()["rejected"] == 2
+    assert not any(path.is_file() for path in tmp_path.rglob("*"))
+
+
+@pytest.mark.asyncio
+async def test_s3_backend_against_local_stand_in(tmp_path):
+    """测试 S3 后端的签名上传、存在性检查和读取"""
+    objects = {}
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        assert request.headers["authorization"].startswith("AWS4-HMAC-SHA256 Credential=key/")
+        path = request.url.path
+        if request.method == "HEAD":
+            return httpx.Response(200 if path in objects else 404)
+        if request.method == "PUT":
+            body = request.read()
+            assert hashlib.sha256(body).hexdigest() == request.headers["x-amz-content-sha256"]
+            objects[path] = body
+            return httpx.Response(200)
+        if request.method == "GET":
+            return httpx.Response(200, content=objects[path]) if path in objects else httpx.Response(404)
+        return httpx.Response(405)
+
+    backend = S3StorageBackend(
+        endpoint="http://minio.local:9000",
+        bucket="uploads",
+        access_key="key",
+        secret_key="secret",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    engine = StorageEngine(backend, staging_dir=tmp_path / ".staging")
+    data = _png("blue")
+
+    first = await engine.save_stream(_chunks(data, 1024), "avatars")
+    second = await engine.save_stream(_chunks(data, 1024), "avatars")
+    await backend.close()
+
+    assert first.url == f"http://minio.local:9000/uploads/{first.key}"
+    assert first.local_path is None
+    assert objects == {f"/uploads/{first.key}": data}
+    assert second.deduplicated
+    assert [request.method for request in requests] == ["HEAD", "PUT", "HEAD"]
+    assert list((tmp_path / ".staging").iterdir()) == []
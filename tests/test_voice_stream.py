@@ -0,0 +1,103 @@
+"""流式语音转写测试"""
+
+import io
+
+import numpy as np
+import pytest
+import scipy.io.wavfile
+
+from src.services.voice_stream_service import StreamingPCMDecoder, VoiceStreamTranscriber, join_transcripts
+
+
+def _wav_bytes(samples: np.ndarray, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    scipy.io.wavfile.write(buffer, sample_rate, samples)
+    return buffer.getvalue()
+
+
+async def _chunked(data: bytes, size: int, consumed: list):
+    for start in range(0, len(data), size):
+        consumed.append(start + size)
+        yield data[start:start + size]
+
+
+@pytest.mark.asyncio
+async def test_wav_header_split_across_chunks():
+    """测试 WAV 文件头被拆分到多个数据块时仍能正确解析"""
+    samples = (np.arange(48000) % 200 - 100).astype(np.int16)
+    data = _wav_bytes(np.stack([samples, samples], axis=1), 48000)
+
+    decoder = StreamingPCMDecoder("audio/wav")
+    decoded = [decoder.feed(data[i:i + 7]) for i in range(0, len(data), 7)]
+    decoded.append(await decoder.finish())
+    result = np.concatenate(decoded)
+
+    assert decoder.sample_rate == 48000
+    assert decoder.channels == 2
+    np.testing.assert_allclose(result, samples / 32768.0, atol=1e-6)
+
+
+@pytest.mark.asyncio
+async def test_partial_transcripts_before_upload_finishes():
+    """测试上传完成前就能产出部分转写结果"""
+    windows = []
+
+    async def transcribe(window: np.ndarray) -> str:
+        windows.append(window)
+        return f"段{len(windows)}"
+
+    # 5 秒 16kHz 音频，1 秒一个窗口
+    data = _wav_bytes(np.zeros(16000 * 5, dtype=np.int16), 16000)
+    consumed = []
+    transcriber = VoiceStreamTranscriber(transcribe, window_seconds=1, max_pending=1)
+
+    events = []
+    async for event in transcriber.run(_chunked(data, 4096, consumed), StreamingPCMDecoder("audio/wav")):
+        events.append((event, consumed[-1]))
+
+    partials = [event for event, _ in events if event["type"] == "partial"]
+    assert [event["text"] for event in partials] == ["段1", "段2", "段3", "段4", "段5"]
+    assert events[0][1] < len(data)
+    assert events[-1][0] == {"type": "final", "text": "段1 段2 段3 段4 段5", "duration": 5.0}
+    assert all(window.dtype == np.int16 and window.shape == (16000,) for window in windows)
+
+
+def test_join_transcripts_keeps_word_boundaries():
+    """测试拼接窗口文本时只在中文之间省略空格"""
+    assert join_transcripts(["今天跑了", "五公里"]) == "今天跑了五公里"
+    assert join_transcripts(["I ran five ", " kilometers", "today"]) == "I ran five kilometers today"
+    assert join_transcripts(["今天跑了", "5km"]) == "今天跑了 5km"
+    assert join_transcripts(["", "  ", "你好"]) == "你好"
+
+
+@pytest.mark.asyncio
+async def test_raw_pcm_is_resampled_per_window():
+    """测试裸 PCM 按声明的采样率重采样到 16kHz"""
+    windows = []
+
+    async def transcribe(window: np.ndarray) -> str:
+        windows.append(window)
+        return ""
+
+    data = np.zeros(8000 * 3, dtype="<i2").tobytes()
+    decoder = StreamingPCMDecoder("audio/L16; rate=8000", sample_rate=8000)
+    events = [event async for event in VoiceStreamTranscriber(transcribe, window_seconds=2).run(
+        _chunked(data, 1000, []), decoder
+    )]
+
+    assert [window.shape[0] for window in windows] == [32000, 16000]
+    assert events[-1]["duration"] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_upload_size_limit():
+    """测试超过大小限制时中止转写"""
+    async def transcribe(window: np.ndarray) -> str:
+        return ""
+
+    data = np.zeros(16000, dtype="<i2").tobytes()
+    with pytest.raises(ValueError):
+        async for _ in VoiceStreamTranscriber(transcribe).run(
+            _chunked(data, 1024, []), StreamingPCMDecoder("audio/pcm"), max_bytes=4096
+        ):
+            pass